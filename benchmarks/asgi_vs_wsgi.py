@@ -0,0 +1,213 @@
+"""
+Concurrent-generation capacity of the WSGI and ASGI deployments.
+
+Starts the fake Gemini provider with a fixed, long latency and then, for each
+deployment in turn, a fresh server process on a shared throwaway SQLite database:
+
+* ``wsgi`` - ``quizify.wsgi`` on a server with a fixed pool of ``--wsgi-threads``
+  worker threads (the model of a gunicorn ``gthread`` worker)
+* ``asgi`` - ``quizify.asgi`` on a single uvicorn worker
+
+``--concurrency`` clients each submit ``--requests-per-user`` quiz generations.
+The report gives, per deployment, throughput, latency percentiles, errors and
+the peak number of Gemini calls the fake provider saw in flight at once - the
+number of generations the deployment could actually keep going concurrently.
+Admission control (quiz.admission) is off unless ``--admission`` is given, in
+which case stored-quiz fallbacks and shed requests are reported separately
+(``outcomes``) rather than passing for fast generations.
+
+Example:
+    python -m benchmarks.asgi_vs_wsgi --concurrency 200 --latency fixed:2000 --wsgi-threads 8
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .fake_gemini import FakeGeminiConfig, start_fake_gemini
+from .loadtest import BASE_DIR, _QUIZ_ID_RE, Recorder, VirtualUser, summarise
+
+_FALLBACK_NOTICE = "Quiz generation is busy right now" # quiz.views.index, when admission serves a stored quiz
+
+
+def serve_wsgi(port: int, threads: int):
+    """Child-process entry point: serves quizify.wsgi with a bounded worker pool."""
+    from socketserver import ThreadingMixIn
+    from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+    sys.path.insert(0, str(BASE_DIR))
+    from quizify.wsgi import application
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    class PooledWSGIServer(ThreadingMixIn, WSGIServer):
+        request_queue_size = 1024
+        pool = ThreadPoolExecutor(max_workers=threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self.process_request_thread, request, client_address)
+
+    make_server('127.0.0.1', port, application, server_class=PooledWSGIServer, handler_class=QuietHandler).serve_forever()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_ready(url: str, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited early with code {process.returncode}.")
+        try:
+            urllib.request.urlopen(url, timeout=1).close()
+            return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not become ready within {timeout}s.")
+
+
+def start_server(mode: str, port: int, env: dict, wsgi_threads: int) -> subprocess.Popen:
+    if mode == 'asgi':
+        command = [sys.executable, '-m', 'uvicorn', 'quizify.asgi:application', '--host', '127.0.0.1',
+                   '--port', str(port), '--workers', '1', '--log-level', 'warning', '--backlog', '2048']
+    else:
+        command = [sys.executable, '-c', f"from benchmarks.asgi_vs_wsgi import serve_wsgi; serve_wsgi({port}, {wsgi_threads})"]
+    process = subprocess.Popen(command, cwd=BASE_DIR, env=env)
+    _wait_until_ready(f"http://127.0.0.1:{port}/", process)
+    return process
+
+
+def generation_burst(target: str, args) -> dict:
+    """``args.concurrency`` users each run ``args.requests_per_user`` generations; returns the summary."""
+    recorder = Recorder()
+    outcomes = Counter()
+    outcomes_lock = threading.Lock()
+
+    def user_flow(user_index: int):
+        user = VirtualUser(target, recorder, args, random.Random(user_index))
+        if user._request('index_get', '/')[1] is None:
+            return
+        for i in range(args.requests_per_user):
+            form = urllib.parse.urlencode({
+                'csrfmiddlewaretoken': user._csrf_token(),
+                'topic': f"Capacity {user_index}-{i}",
+                'question_type': 'mcq',
+                'difficulty': 'Easy',
+                'num_questions': str(args.questions),
+            }).encode()
+            latency, result = user._request('generate', '/', form, {'Content-Type': 'application/x-www-form-urlencoded'})
+            if result is None:
+                continue
+            status, body = result
+            text = body.decode(errors='replace')
+            ok = status == 200 and _QUIZ_ID_RE.search(text) is not None
+            recorder.add('generate', latency, ok, None if ok else f"http_{status}" if status != 200 else 'generation_error')
+            outcome = 'shed' if status == 503 else 'error' if not ok else 'fallback' if _FALLBACK_NOTICE in text else 'generated'
+            with outcomes_lock:
+                outcomes[outcome] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(user_flow, range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    summary = summarise(recorder, elapsed)
+    generate = summary['endpoints']['generate']
+    return {
+        'elapsed_seconds': summary['elapsed_seconds'],
+        'generations': generate['requests'],
+        'errors': generate['errors'],
+        'generations_per_second': generate['throughput_rps'],
+        'latency_ms': generate['latency_ms'],
+        'error_kinds': summary['error_kinds'],
+        'outcomes': dict(outcomes),
+    }
+
+
+def run(args) -> dict:
+    fake_config = FakeGeminiConfig(args.latency, 0.0, 'valid=1', args.seed)
+    fake_server = start_fake_gemini(fake_config)
+    db_dir = tempfile.mkdtemp(prefix='quizify-capacity-')
+    env = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': 'quizify.settings',
+        'QUIZIFY_GENAI_BASE_URL': f"http://127.0.0.1:{fake_server.server_address[1]}",
+        'GOOGLE_GENAI_API_KEY': 'fake-benchmark-key',
+        'QUIZIFY_DB_PATH': str(Path(db_dir) / 'capacity.sqlite3'),
+        'QUIZIFY_GENAI_REPLAY_MODE': 'off',
+        'QUIZIFY_LOG_LEVEL': 'WARNING',
+        'PYTHONUNBUFFERED': '1',
+        'QUIZIFY_ADMISSION': str(args.admission),
+    }
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '--verbosity', '0'], cwd=BASE_DIR, env=env, check=True)
+
+    results = {}
+    for mode in args.modes:
+        port = _free_port()
+        process = start_server(mode, port, env, args.wsgi_threads)
+        try:
+            fake_config.stats['max_in_flight'] = 0
+            results[mode] = generation_burst(f"http://127.0.0.1:{port}", args)
+            results[mode]['max_llm_calls_in_flight'] = fake_config.stats['max_in_flight']
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'config': {
+            'concurrency': args.concurrency,
+            'requests_per_user': args.requests_per_user,
+            'questions': args.questions,
+            'latency': args.latency,
+            'wsgi_threads': args.wsgi_threads,
+            'admission': args.admission,
+        },
+        'results': results,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Compare concurrent-generation capacity of the WSGI and ASGI deployments.")
+    parser.add_argument('--modes', nargs='+', default=['wsgi', 'asgi'], choices=['wsgi', 'asgi'])
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--requests-per-user', type=int, default=2)
+    parser.add_argument('--questions', type=int, default=5)
+    parser.add_argument('--latency', default='fixed:2000', help="Fake Gemini latency distribution (see benchmarks.fake_gemini)")
+    parser.add_argument('--wsgi-threads', type=int, default=8, help="Worker threads of the WSGI server")
+    parser.add_argument('--admission', action='store_true',
+                        help="Keep admission control on (fallbacks and sheds are then reported under 'outcomes')")
+    parser.add_argument('--timeout', type=float, default=300.0)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', help="Write the JSON artifact here (default: stdout only)")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    result = run(args)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
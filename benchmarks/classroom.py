@@ -0,0 +1,146 @@
+"""
+Cost of a live classroom leaderboard as the class grows.
+
+Drives the Django app in-process on a throwaway SQLite database. For each
+class size it stores one named attempt per participant and compares:
+
+* ``requery`` - what a refresh costs without quiz.classroom: load every
+  attempt on the quiz, keep each participant's best and sort them
+* ``incremental`` - quiz.classroom.Leaderboard: recording one attempt, and
+  building the pushed snapshot (top N plus totals) after a change
+
+It also times ``check/`` submissions with and without a participant name, to
+show what keeping the leaderboard adds to grading.
+
+Example:
+    python -m benchmarks.classroom --sizes 200,2000,5000 --submissions 200
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .loadtest import BASE_DIR, percentile
+
+
+def _us(seconds: float) -> float:
+    return round(seconds * 1e6, 1)
+
+
+def run(args) -> dict:
+    db_dir = tempfile.mkdtemp(prefix='quizify-classroom-')
+    os.environ.update({
+        'DJANGO_SETTINGS_MODULE': 'quizify.settings',
+        'QUIZIFY_DB_PATH': str(Path(db_dir) / 'classroom.sqlite3'),
+        'QUIZIFY_RATE_LIMIT': 'False',
+    })
+    sys.path.insert(0, str(BASE_DIR))
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from django.urls import reverse
+    from quiz import classroom
+    from quiz.models import Quiz, QuizAttempt
+    setup_test_environment()
+    call_command('migrate', verbosity=0)
+
+    rng = random.Random(args.seed)
+    questions = [{'question_text': f"Statement {i}?", 'type': 'tf', 'difficulty': 'Easy', 'answer': i % 2 == 0} for i in range(10)]
+    results = {}
+    for size in args.sizes:
+        quiz = Quiz.objects.create(topic=f"Classroom {size}", difficulty='Easy', question_type='tf', questions_data=questions)
+        QuizAttempt.objects.bulk_create(
+            QuizAttempt(quiz=quiz, submitted_answers={}, results_data=[], score=score, total_questions=10,
+                        percentage=score * 10, participant=f"Student {i}")
+            for i, score in enumerate(rng.randint(0, 10) for _ in range(size))
+        )
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            best = {}
+            for row in QuizAttempt.objects.filter(quiz=quiz).exclude(participant='').values(
+                    'participant', 'score', 'total_questions', 'percentage', 'attempted_at'):
+                current = best.get(row['participant'])
+                if current is None or row['percentage'] > current['percentage']:
+                    best[row['participant']] = row
+            sorted(best.values(), key=lambda row: (-row['percentage'], row['attempted_at']))[:args.top]
+        requery = (time.perf_counter() - started) / args.repeat
+
+        classroom.reset()
+        started = time.perf_counter()
+        board = classroom.get_board(quiz.id)
+        load = time.perf_counter() - started
+        next_id = QuizAttempt.objects.order_by('-id').values_list('id', flat=True).first() + 1
+        add_times, snapshot_times = [], []
+        for i in range(args.repeat):
+            attempt = {'id': next_id + i, 'participant': f"Student {rng.randrange(size)}", 'score': 10,
+                       'total_questions': 10, 'percentage': 100, 'attempted_at': None}
+            started = time.perf_counter()
+            board.add(attempt)
+            add_times.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            board.snapshot(args.top)
+            snapshot_times.append(time.perf_counter() - started)
+
+        results[str(size)] = {
+            'requery_ms': round(requery * 1000, 2),
+            'leaderboard_load_ms': round(load * 1000, 2),
+            'add_us_p50': _us(percentile(sorted(add_times), 50)),
+            'snapshot_us_p50': _us(percentile(sorted(snapshot_times), 50)),
+            'speedup_per_refresh': round(requery / (percentile(sorted(add_times), 50) + percentile(sorted(snapshot_times), 50))),
+        }
+
+    client = Client()
+    quiz = Quiz.objects.create(topic="Classroom grading", difficulty='Easy', question_type='tf', questions_data=questions)
+    grading = {}
+    for label, named in (('anonymous', False), ('named', True)):
+        timings = []
+        for i in range(args.submissions):
+            body = {'quiz_id': quiz.id, 'compact': True, 'answers': {f"q{n + 1}": rng.choice(['True', 'False']) for n in range(10)}}
+            if named:
+                body['participant'] = f"Student {i}"
+            started = time.perf_counter()
+            response = client.post(reverse('quiz:check_answers'), json.dumps(body), content_type='application/json')
+            timings.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise RuntimeError(f"check/ failed with HTTP {response.status_code}.")
+        timings.sort()
+        grading[label] = {'p50_ms': round(1000 * percentile(timings, 50), 2), 'p90_ms': round(1000 * percentile(timings, 90), 2)}
+
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'config': {'top': args.top, 'repeat': args.repeat, 'submissions': args.submissions},
+        'results': results,
+        'check_answers': grading,
+        'classroom': classroom.stats(),
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Compare leaderboard refreshes by re-query with the incremental leaderboard.")
+    parser.add_argument('--sizes', type=lambda value: [int(v) for v in value.split(',')], default=[200, 2000, 5000])
+    parser.add_argument('--top', type=int, default=20, help="Leaderboard rows pushed to the teacher page")
+    parser.add_argument('--repeat', type=int, default=50, help="Refreshes / attempts timed per size")
+    parser.add_argument('--submissions', type=int, default=200, help="check/ requests timed per mode")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', help="Write the JSON artifact here (default: stdout only)")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    text = json.dumps(run(args), indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+"""
+Local stand-in for the Gemini ``generateContent`` REST endpoint.
+
+Point the Django app at it with ``QUIZIFY_GENAI_BASE_URL=http://127.0.0.1:<port>``.
+The server reads the requested topic, difficulty and per-type question counts
+back out of the prompt built by ``quiz.views._build_generation_prompt`` and
+answers with one of several canned payload kinds:
+
+* ``valid``       - well-formed JSON matching the request
+* ``fenced``      - the same JSON wrapped in a ```json fence (exercises the regex fallback)
+* ``wrong_count`` - valid JSON with one question fewer than requested
+* ``malformed``   - truncated JSON that cannot be parsed
+
+Explanation-only prompts (lazy explanations) are answered with plain text, and
+question-only prompts with JSON that has no "explanation" key. The questions
+for a batch of a large quiz (quiz.chunking) name the batch, so batches do not
+repeat each other.
+
+Latency is drawn from a configurable distribution, plus an optional
+``--ms-per-token`` decode cost per output token (so longer responses take
+longer, as with a real model), and a fraction of calls can fail with HTTP 503,
+so throughput ceilings can be measured without real quota.
+
+Run standalone with ``python -m benchmarks.fake_gemini --port 8765``.
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAYLOAD_KINDS = ('valid', 'fenced', 'wrong_count', 'malformed')
+_PATH_RE = re.compile(r'^/v1\w*/models/(?P<model>[^/:]+):generateContent')
+
+
+def parse_latency(spec: str):
+    """
+    Builds a latency sampler (returning seconds) from a spec string:
+    ``fixed:MS``, ``uniform:MIN_MS,MAX_MS``, ``normal:MEAN_MS,STDDEV_MS`` or ``lognormal:MEDIAN_MS,SIGMA``.
+    """
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',') if v]
+    if kind == 'fixed':
+        return lambda rng: values[0] / 1000
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if kind == 'normal':
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1])) / 1000
+    if kind == 'lognormal':
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1]) / 1000
+    raise ValueError(f"Unknown latency distribution '{spec}'.")
+
+
+def parse_mix(spec: str) -> dict:
+    """Parses ``valid=0.9,fenced=0.05,...`` into normalised payload-kind weights."""
+    weights = {}
+    for part in spec.split(','):
+        if not part:
+            continue
+        kind, _, weight = part.partition('=')
+        if kind not in PAYLOAD_KINDS:
+            raise ValueError(f"Unknown payload kind '{kind}'. Expected one of {PAYLOAD_KINDS}.")
+        weights[kind] = float(weight)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("Payload mix weights must sum to a positive number.")
+    return {kind: weight / total for kind, weight in weights.items()}
+
+
+class FakeGeminiConfig:
+    def __init__(self, latency: str = 'lognormal:800,0.5', error_rate: float = 0.0,
+                 payload_mix: str = 'valid=1', seed: int = None, ms_per_token: float = 0.0):
+        self.latency_spec = latency
+        self.sample_latency = parse_latency(latency)
+        self.ms_per_token = ms_per_token
+        self.error_rate = error_rate
+        self.payload_mix = parse_mix(payload_mix)
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, **{kind: 0 for kind in PAYLOAD_KINDS}, 'in_flight': 0, 'max_in_flight': 0}
+
+    def draw(self):
+        """Returns (latency_seconds, fail, payload_kind) for one call."""
+        with self.rng_lock:
+            latency = self.sample_latency(self.rng)
+            fail = self.rng.random() < self.error_rate
+            kind = self.rng.choices(list(self.payload_mix), weights=list(self.payload_mix.values()))[0]
+            self.stats['requests'] += 1
+            self.stats['errors' if fail else kind] += 1
+        return latency, fail, kind
+
+    def call_started(self):
+        with self.rng_lock:
+            self.stats['in_flight'] += 1
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.stats['in_flight'])
+
+    def call_finished(self):
+        with self.rng_lock:
+            self.stats['in_flight'] -= 1
+
+
+# --- Payload construction ---
+
+def parse_prompt(prompt: str) -> dict:
+    """Recovers the quiz request encoded in a Quizify generation prompt."""
+    topic = re.search(r'about the topic "(.*?)" suitable', prompt, re.DOTALL)
+    difficulty = re.search(r'suitable for a "(\w+)" difficulty', prompt)
+    counts = {q_type: int(n) for n, q_type in re.findall(r'Exactly (\d+) questions of type "(\w+)"', prompt)}
+    batch = re.search(r'This request is (batch \d+(?: \(retry \d+\))?)', prompt)
+    if not counts:
+        total = re.search(r'exactly (\d+) questions about the topic', prompt)
+        q_type = re.search(r'"type" key with the value "(\w+)"', prompt)
+        counts = {q_type.group(1) if q_type else 'mcq': int(total.group(1)) if total else 5}
+    return {
+        'topic': topic.group(1) if topic else 'Benchmark Topic',
+        'difficulty': difficulty.group(1) if difficulty else 'Easy',
+        'counts': counts,
+        'explanation': 'A key "explanation"' in prompt,
+        'batch': batch.group(1) if batch else None,
+    }
+
+
+def parse_explanation_prompt(prompt: str):
+    """(topic, difficulty) for a Quizify explanation-only prompt, or None for any other prompt."""
+    match = re.search(r'concise explanation of the topic "(.*?)" suitable for a "(\w+)" difficulty', prompt, re.DOTALL)
+    return (match.group(1), match.group(2)) if match else None
+
+
+def build_explanation_text(topic: str, difficulty: str) -> str:
+    return f"{topic} explained at {difficulty} level. " + ("Lorem ipsum dolor sit amet. " * 40)
+
+
+def build_quiz_json(request: dict) -> dict:
+    topic, difficulty = request['topic'], request['difficulty']
+    suffix = f" ({request['batch']})" if request.get('batch') else ''
+    questions = []
+    for q_type, count in request['counts'].items():
+        for i in range(count):
+            question = {'question_text': f"Benchmark {q_type} question {i + 1} about {topic}{suffix}?", 'type': q_type, 'difficulty': difficulty}
+            if q_type == 'mcq':
+                question['options'] = [f"Option {letter} ({i + 1})" for letter in 'ABCD']
+                question['answer'] = question['options'][i % 4]
+            elif q_type == 'tf':
+                question['answer'] = i % 2 == 0
+            else:
+                question['question_text'] = f"Benchmark fill question {i + 1}{suffix}: {topic} is ____."
+                question['answer'] = f"answer{i + 1}"
+            questions.append(question)
+    data = {'questions': questions}
+    if request.get('explanation', True):
+        data = {'explanation': build_explanation_text(topic, difficulty), **data}
+    return data
+
+
+def build_payload_text(prompt: str, kind: str) -> str:
+    explanation_request = parse_explanation_prompt(prompt)
+    if explanation_request:
+        return build_explanation_text(*explanation_request)
+    data = build_quiz_json(parse_prompt(prompt))
+    if kind == 'wrong_count' and data['questions']:
+        data['questions'] = data['questions'][:-1]
+    text = json.dumps(data)
+    if kind == 'fenced':
+        return f"Here is your quiz:\n```json\n{text}\n```\nGood luck!"
+    if kind == 'malformed':
+        return text[:len(text) // 2]
+    return text
+
+
+def build_response(text: str, prompt: str) -> dict:
+    return {
+        'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'}, 'finishReason': 'STOP', 'index': 0}],
+        'usageMetadata': {
+            'promptTokenCount': len(prompt) // 4,
+            'candidatesTokenCount': len(text) // 4,
+            'totalTokenCount': (len(prompt) + len(text)) // 4,
+        },
+        'modelVersion': 'fake-gemini',
+    }
+
+
+# --- HTTP server ---
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    server_version = 'FakeGemini/1.0'
+
+    def do_POST(self):
+        match = _PATH_RE.match(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if not match:
+            return self._send_json(404, {'error': {'code': 404, 'message': f'Unknown path {self.path}', 'status': 'NOT_FOUND'}})
+        try:
+            request_body = json.loads(body or b'{}')
+            prompt = ''.join(part.get('text', '') for content in request_body.get('contents', []) for part in content.get('parts', []))
+        except (ValueError, AttributeError):
+            return self._send_json(400, {'error': {'code': 400, 'message': 'Invalid JSON body', 'status': 'INVALID_ARGUMENT'}})
+
+        config = self.server.config
+        latency, fail, kind = config.draw()
+        text = build_payload_text(prompt, kind)
+        if not fail:
+            latency += len(text) // 4 * config.ms_per_token / 1000 # Decode time grows with the response length
+        config.call_started() # max_in_flight is the concurrency the app actually achieved
+        try:
+            time.sleep(latency)
+        finally:
+            config.call_finished()
+        if fail:
+            return self._send_json(503, {'error': {'code': 503, 'message': 'The model is overloaded (injected).', 'status': 'UNAVAILABLE'}})
+        self._send_json(200, build_response(text, prompt))
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass # Keep load-test output readable
+
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024 # Capacity benchmarks open hundreds of concurrent connections
+
+
+def start_fake_gemini(config: FakeGeminiConfig, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    """Starts the server on a daemon thread; the bound port is ``server.server_address[1]``."""
+    server = FakeGeminiServer((host, port), FakeGeminiHandler)
+    server.config = config
+    threading.Thread(target=server.serve_forever, name='fake-gemini', daemon=True).start()
+    return server
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--latency', default='lognormal:800,0.5', help="Latency distribution, e.g. fixed:200, uniform:100,900, lognormal:800,0.5")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of calls answered with HTTP 503")
+    parser.add_argument('--payload-mix', default='valid=1', help="Weights per payload kind, e.g. valid=0.85,fenced=0.05,wrong_count=0.05,malformed=0.05")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--ms-per-token', type=float, default=0.0, help="Extra latency per output token (~4 characters)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    config = FakeGeminiConfig(args.latency, args.error_rate, args.payload_mix, args.seed, args.ms_per_token)
+    server = FakeGeminiServer((args.host, args.port), FakeGeminiHandler)
+    server.config = config
+    print(f"Fake Gemini listening on http://{args.host}:{args.port} (latency {args.latency}, error rate {args.error_rate})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"Stats: {config.stats}")
+
+
+if __name__ == '__main__':
+    main()
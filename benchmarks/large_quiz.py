@@ -0,0 +1,119 @@
+"""
+How large-quiz generation scales with the number of questions.
+
+Starts the fake Gemini provider with a per-output-token decode cost (so a
+batch of 20 questions takes as long to generate as it would with the live
+model) and drives the Django app in-process on a throwaway SQLite database.
+For each size it measures:
+
+* the time until the first page arrives (the first chunk, generated in the request)
+* the time until every chunk has been appended (background batches)
+* the size of the first page and of one question window
+* the peak Python memory allocated meanwhile (tracemalloc)
+
+Example:
+    python -m benchmarks.large_quiz --sizes 20,100,250,500 --latency fixed:300 --ms-per-token 4
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .fake_gemini import FakeGeminiConfig, start_fake_gemini
+from .loadtest import BASE_DIR, _QUIZ_ID_RE
+
+
+def run(args) -> dict:
+    fake_server = start_fake_gemini(FakeGeminiConfig(args.latency, 0.0, 'valid=1', args.seed, args.ms_per_token))
+    db_dir = tempfile.mkdtemp(prefix='quizify-large-')
+    os.environ.update({
+        'DJANGO_SETTINGS_MODULE': 'quizify.settings',
+        'QUIZIFY_GENAI_BASE_URL': f"http://127.0.0.1:{fake_server.server_address[1]}",
+        'GOOGLE_GENAI_API_KEY': os.environ.get('GOOGLE_GENAI_API_KEY', 'fake-benchmark-key'),
+        'QUIZIFY_DB_PATH': str(Path(db_dir) / 'large.sqlite3'),
+        'QUIZIFY_GENAI_REPLAY_MODE': 'off',
+        'QUIZIFY_TELEMETRY_ASYNC': 'False',
+        'QUIZIFY_RATE_LIMIT': 'False',
+        'QUIZIFY_LARGE_QUIZ_CONCURRENCY': str(args.concurrency),
+    })
+    sys.path.insert(0, str(BASE_DIR))
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from django.urls import reverse
+    from quiz import largequiz
+    from quiz.models import Quiz
+    setup_test_environment()
+    call_command('migrate', verbosity=0)
+
+    client = Client()
+    client.post(reverse('quiz:index'), {'topic': "Benchmark warm-up", 'question_type': 'mcq', 'difficulty': 'Medium',
+                                        'num_questions': '1'}) # Imports, template compilation
+    results = {}
+    for size in args.sizes:
+        tracemalloc.start()
+        started = time.perf_counter()
+        response = client.post(reverse('quiz:index'), {'topic': f"Benchmark bank {size}", 'question_type': 'mcq',
+                                                        'difficulty': 'Medium', 'num_questions': str(size)})
+        first_page = time.perf_counter() - started
+        match = _QUIZ_ID_RE.search(response.content.decode())
+        if response.status_code != 200 or not match:
+            raise RuntimeError(f"Generation of {size} questions failed (HTTP {response.status_code}).")
+        quiz_id = int(match.group(1))
+        deadline = started + args.timeout
+        while (quiz := Quiz.objects.only('question_count', 'questions_pending', 'created_at').get(pk=quiz_id)).questions_pending:
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f"{size}-question quiz still had {quiz.questions_pending} questions pending after {args.timeout}s.")
+            time.sleep(0.05)
+        complete = time.perf_counter() - started
+        window = client.get(reverse('quiz:quiz_questions', args=[quiz_id]), {'offset': max(0, quiz.question_count - largequiz.window_size())})
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[str(size)] = {
+            'questions_stored': quiz.question_count,
+            'first_page_ms': round(first_page * 1000, 1),
+            'complete_ms': round(complete * 1000, 1),
+            'complete_ms_per_question': round(complete * 1000 / quiz.question_count, 2),
+            'first_page_bytes': len(response.content),
+            'window_bytes': len(window.content),
+            'peak_python_kib': round(peak / 1024, 1),
+            'peak_kib_per_question': round(peak / 1024 / quiz.question_count, 2),
+        }
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'config': {'latency': args.latency, 'ms_per_token': args.ms_per_token, 'concurrency': args.concurrency},
+        'results': results,
+        'fake_gemini': fake_server.config.stats,
+        'large_quiz': largequiz.stats(),
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Measure large-quiz generation time, page size and memory by question count.")
+    parser.add_argument('--sizes', type=lambda value: [int(v) for v in value.split(',')], default=[20, 100, 250, 500])
+    parser.add_argument('--latency', default='fixed:300', help="Fake Gemini base latency (see benchmarks.fake_gemini)")
+    parser.add_argument('--ms-per-token', type=float, default=4.0, help="Fake Gemini decode cost per output token")
+    parser.add_argument('--concurrency', type=int, default=4, help="LARGE_QUIZ_CONCURRENCY")
+    parser.add_argument('--timeout', type=float, default=600, help="Seconds to wait for a quiz to complete")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', help="Write the JSON artifact here (default: stdout only)")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    text = json.dumps(run(args), indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
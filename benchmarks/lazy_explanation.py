@@ -0,0 +1,119 @@
+"""
+Time-to-interactive with eager vs lazy explanation generation.
+
+Starts the fake Gemini provider with a per-output-token decode cost (so the
+explanation really costs time to generate, as with the live model) and drives
+the Django app in-process on a throwaway SQLite database:
+
+* ``eager`` - one call returns explanation and questions (the default mode)
+* ``lazy``  - ``LAZY_EXPLANATIONS``: the page is served after the questions-only
+  call; the explanation is fetched from ``/api/quiz/<id>/explanation`` as if
+  the user expanded it straight away
+
+Time-to-interactive is the latency of the generation POST (the quiz can be
+taken once the page arrives). For lazy mode the report also gives the time
+until the explanation is on screen (POST + explanation fetch).
+
+Example:
+    python -m benchmarks.lazy_explanation --runs 20 --latency fixed:300 --ms-per-token 8 --questions 5
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .fake_gemini import FakeGeminiConfig, start_fake_gemini
+from .loadtest import BASE_DIR, _QUIZ_ID_RE, percentile
+
+_EXPLANATION_URL_RE = re.compile(r'data-explanation-url="([^"]+)"')
+
+
+def _ms_summary(seconds: list) -> dict:
+    values = sorted(seconds)
+    return {
+        'mean': round(1000 * sum(values) / len(values), 1),
+        **{f"p{p}": round(1000 * percentile(values, p), 1) for p in (50, 90, 99)},
+    }
+
+
+def run(args) -> dict:
+    fake_server = start_fake_gemini(FakeGeminiConfig(args.latency, 0.0, 'valid=1', args.seed, args.ms_per_token))
+    db_dir = tempfile.mkdtemp(prefix='quizify-lazy-')
+    os.environ.update({
+        'DJANGO_SETTINGS_MODULE': 'quizify.settings',
+        'QUIZIFY_GENAI_BASE_URL': f"http://127.0.0.1:{fake_server.server_address[1]}",
+        'GOOGLE_GENAI_API_KEY': os.environ.get('GOOGLE_GENAI_API_KEY', 'fake-benchmark-key'),
+        'QUIZIFY_DB_PATH': str(Path(db_dir) / 'lazy.sqlite3'),
+        'QUIZIFY_GENAI_REPLAY_MODE': 'off',
+        'QUIZIFY_LAZY_EXPLANATIONS_BACKGROUND': 'False', # Measure the on-demand path
+        'QUIZIFY_TELEMETRY_ASYNC': 'False',
+    })
+    sys.path.insert(0, str(BASE_DIR))
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from django.test import Client, override_settings
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    call_command('migrate', verbosity=0)
+
+    client = Client()
+    form = {'question_type': 'mcq', 'difficulty': 'Medium', 'num_questions': str(args.questions)}
+    results = {}
+    for mode in ('eager', 'lazy'):
+        tti, explanation_ready = [], []
+        with override_settings(LAZY_EXPLANATIONS=mode == 'lazy'):
+            for i in range(args.runs):
+                started = time.perf_counter()
+                response = client.post('/', {**form, 'topic': f"Benchmark {mode} {i}"})
+                interactive = time.perf_counter() - started
+                body = response.content.decode()
+                if response.status_code != 200 or not _QUIZ_ID_RE.search(body):
+                    raise RuntimeError(f"Generation failed in {mode} mode (HTTP {response.status_code}).")
+                tti.append(interactive)
+                url = _EXPLANATION_URL_RE.search(body)
+                if url:
+                    explanation = client.get(url.group(1))
+                    if explanation.status_code != 200:
+                        raise RuntimeError(f"Explanation fetch failed (HTTP {explanation.status_code}).")
+                explanation_ready.append(time.perf_counter() - started)
+        results[mode] = {
+            'time_to_interactive_ms': _ms_summary(tti),
+            'time_to_explanation_ms': _ms_summary(explanation_ready),
+        }
+    eager_p50 = results['eager']['time_to_interactive_ms']['p50']
+    lazy_p50 = results['lazy']['time_to_interactive_ms']['p50']
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'config': {'runs': args.runs, 'questions': args.questions, 'latency': args.latency, 'ms_per_token': args.ms_per_token},
+        'results': results,
+        'tti_p50_improvement_pct': round(100 * (eager_p50 - lazy_p50) / eager_p50, 1),
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Compare time-to-interactive with eager and lazy explanations.")
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--questions', type=int, default=5)
+    parser.add_argument('--latency', default='fixed:300', help="Fake Gemini base latency (see benchmarks.fake_gemini)")
+    parser.add_argument('--ms-per-token', type=float, default=8.0, help="Fake Gemini decode cost per output token")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', help="Write the JSON artifact here (default: stdout only)")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    text = json.dumps(run(args), indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
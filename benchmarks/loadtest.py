@@ -0,0 +1,339 @@
+"""
+Load-test harness for Quizify.
+
+By default this starts everything locally: the fake Gemini provider
+(``benchmarks.fake_gemini``), an SMTP sink (``benchmarks.smtp_sink``) and the
+Django app itself on a threaded WSGI server backed by a throwaway SQLite
+database. Virtual users then loop through the real user flow
+
+    GET /  ->  POST / (generate)  ->  POST /check/  ->  POST /send_quiz_email/
+
+at the requested concurrency, and the run is summarised as JSON: throughput,
+latency percentiles and error rates per endpoint. ``--compare`` diffs the
+result against an earlier artifact.
+
+Pass ``--target http://host:port`` to drive an already running deployment
+instead (it must be configured with QUIZIFY_GENAI_BASE_URL and EMAIL_HOST/PORT
+pointing at local stand-ins, see ``--fake-port``/``--smtp-port``).
+
+Example:
+    python -m benchmarks.loadtest --concurrency 20 --duration 60 \\
+        --latency lognormal:800,0.5 --payload-mix valid=0.9,fenced=0.05,malformed=0.05 \\
+        --output bench_results.json --compare bench_baseline.json
+"""
+import argparse
+import http.cookiejar
+import json
+import math
+import os
+import platform
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .fake_gemini import FakeGeminiConfig, add_arguments as add_fake_gemini_arguments, start_fake_gemini
+from .smtp_sink import start_smtp_sink
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+ENDPOINTS = ('index_get', 'generate', 'check', 'send_email')
+_QUIZ_ID_RE = re.compile(r'data-quiz-id="(\d+)"')
+_INPUT_RE = re.compile(r'name="(q\d+)"(?: value="([^"]*)")?[^>]*?data-question-type="(mcq|fill|tf)"')
+
+
+# --- Local stack ---
+
+def start_local_stack(args) -> dict:
+    """Starts fake Gemini, the SMTP sink and the Django app; returns their addresses and handles."""
+    fake_config = FakeGeminiConfig(args.latency, args.error_rate, args.payload_mix, args.seed, args.ms_per_token)
+    fake_server = start_fake_gemini(fake_config, port=args.fake_port)
+    smtp_sink = start_smtp_sink(port=args.smtp_port)
+    db_dir = tempfile.mkdtemp(prefix='quizify-bench-')
+
+    os.environ.update({
+        'DJANGO_SETTINGS_MODULE': 'quizify.settings',
+        'QUIZIFY_GENAI_BASE_URL': f"http://127.0.0.1:{fake_server.server_address[1]}",
+        'GOOGLE_GENAI_API_KEY': 'fake-benchmark-key',
+        'QUIZIFY_DB_PATH': str(Path(db_dir) / 'bench.sqlite3'),
+        'EMAIL_HOST': '127.0.0.1',
+        'EMAIL_PORT': str(smtp_sink.server_address[1]),
+        'EMAIL_USE_TLS': 'False',
+        'EMAIL_HOST_USER': 'bench@example.com',
+        'EMAIL_HOST_PASSWORD': 'bench',
+        'QUIZIFY_LOG_LEVEL': 'WARNING',
+    })
+    sys.path.insert(0, str(BASE_DIR))
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from django.core.wsgi import get_wsgi_application
+    from django.conf import settings
+    call_command('migrate', verbosity=0)
+    settings.ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+
+    from socketserver import ThreadingMixIn
+    from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+        daemon_threads = True
+        request_queue_size = 1024
+
+    app_server = make_server('127.0.0.1', args.app_port, get_wsgi_application(), server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+    threading.Thread(target=app_server.serve_forever, name='quizify-wsgi', daemon=True).start()
+    return {
+        'target': f"http://127.0.0.1:{app_server.server_address[1]}",
+        'fake_config': fake_config,
+        'smtp_sink': smtp_sink,
+    }
+
+
+# --- Virtual user ---
+
+class Recorder:
+    def __init__(self):
+        self.samples = {endpoint: [] for endpoint in ENDPOINTS} # (latency_seconds, ok)
+        self.error_kinds = {}
+        self._lock = threading.Lock()
+
+    def add(self, endpoint: str, latency: float, ok: bool, error_kind: str = None):
+        with self._lock:
+            self.samples[endpoint].append((latency, ok))
+            if error_kind:
+                key = f"{endpoint}:{error_kind}"
+                self.error_kinds[key] = self.error_kinds.get(key, 0) + 1
+
+
+class VirtualUser:
+    """One browser-like client with its own cookie jar (session + CSRF cookie)."""
+
+    def __init__(self, target: str, recorder: Recorder, args, rng: random.Random):
+        self.target = target.rstrip('/')
+        self.recorder = recorder
+        self.args = args
+        self.rng = rng
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+
+    def _csrf_token(self) -> str:
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def _request(self, endpoint: str, path: str, data: bytes = None, headers: dict = None):
+        request = urllib.request.Request(self.target + path, data=data, headers=headers or {})
+        request.add_header('Referer', self.target + '/')
+        start = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=self.args.timeout) as response:
+                body = response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            body, status = e.read(), e.code
+        except (urllib.error.URLError, OSError) as e:
+            self.recorder.add(endpoint, time.perf_counter() - start, False, type(e).__name__)
+            return None, None
+        return time.perf_counter() - start, (status, body)
+
+    def run_flow(self):
+        latency, result = self._request('index_get', '/')
+        if result is None:
+            return
+        self.recorder.add('index_get', latency, result[0] == 200, None if result[0] == 200 else f"http_{result[0]}")
+
+        form = {
+            'csrfmiddlewaretoken': self._csrf_token(),
+            'topic': f"{self.args.topic} {self.rng.randint(1, self.args.topic_variants)}",
+            'question_type': self.args.question_type,
+            'difficulty': self.rng.choice(['Easy', 'Medium', 'Hard']),
+            'num_questions': str(self.args.questions),
+            'num_mcq': str(self.args.questions // 3 + self.args.questions % 3),
+            'num_fill': str(self.args.questions // 3),
+            'num_tf': str(self.args.questions // 3),
+        }
+        latency, result = self._request('generate', '/', urllib.parse.urlencode(form).encode(),
+                                        {'Content-Type': 'application/x-www-form-urlencoded'})
+        if result is None:
+            return
+        status, body = result
+        html = body.decode(errors='replace')
+        quiz_id = _QUIZ_ID_RE.search(html)
+        if status != 200 or not quiz_id:
+            self.recorder.add('generate', latency, False, f"http_{status}" if status != 200 else 'generation_error')
+            return
+        self.recorder.add('generate', latency, True)
+
+        choices = {}
+        for key, value, q_type in _INPUT_RE.findall(html):
+            choices.setdefault(key, []).append('answer1' if q_type == 'fill' else value)
+        answers = {key: self.rng.choice(values) for key, values in choices.items()}
+        json_headers = {'Content-Type': 'application/json', 'X-CSRFToken': self._csrf_token()}
+        latency, result = self._request('check', '/check/', json.dumps({'quiz_id': quiz_id.group(1), 'answers': answers}).encode(), json_headers)
+        if result is None:
+            return
+        status, body = result
+        self.recorder.add('check', latency, status == 200, None if status == 200 else f"http_{status}")
+        if status != 200 or self.rng.random() >= self.args.email_fraction:
+            return
+
+        attempt_id = json.loads(body).get('attempt_id')
+        payload = json.dumps({'email_address': 'student@example.com', 'attempt_id': attempt_id}).encode()
+        latency, result = self._request('send_email', '/send_quiz_email/', payload, json_headers)
+        if result is None:
+            return
+        self.recorder.add('send_email', latency, result[0] == 200, None if result[0] == 200 else f"http_{result[0]}")
+
+
+# --- Reporting ---
+
+def percentile(sorted_values: list, pct: float):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = math.ceil(pct / 100 * len(sorted_values)) - 1
+    return sorted_values[min(max(rank, 0), len(sorted_values) - 1)]
+
+
+def summarise(recorder: Recorder, elapsed: float) -> dict:
+    endpoints = {}
+    for endpoint, samples in recorder.samples.items():
+        latencies = sorted(latency for latency, _ in samples)
+        errors = sum(1 for _, ok in samples if not ok)
+        endpoints[endpoint] = {
+            'requests': len(samples),
+            'errors': errors,
+            'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+            'throughput_rps': round(len(samples) / elapsed, 3) if elapsed else 0.0,
+            'latency_ms': {
+                'mean': round(1000 * sum(latencies) / len(latencies), 2) if latencies else None,
+                **{f"p{p}": round(1000 * percentile(latencies, p), 2) if latencies else None for p in (50, 90, 95, 99)},
+                'max': round(1000 * latencies[-1], 2) if latencies else None,
+            },
+        }
+    completed = sum(1 for latency, ok in recorder.samples['check'] if ok)
+    return {
+        'elapsed_seconds': round(elapsed, 3),
+        'completed_flows': completed,
+        'flows_per_second': round(completed / elapsed, 3) if elapsed else 0.0,
+        'endpoints': endpoints,
+        'error_kinds': recorder.error_kinds,
+    }
+
+
+def compare(current: dict, baseline: dict) -> dict:
+    """Relative change (current vs baseline) of throughput, p50/p99 latency and error rate per endpoint."""
+    def delta(new, old):
+        if new is None or old in (None, 0):
+            return None
+        return round((new - old) / old * 100, 1)
+
+    diff = {'flows_per_second_pct': delta(current['flows_per_second'], baseline.get('flows_per_second'))}
+    for endpoint, stats in current['endpoints'].items():
+        old = baseline.get('endpoints', {}).get(endpoint)
+        if not old:
+            continue
+        diff[endpoint] = {
+            'throughput_pct': delta(stats['throughput_rps'], old['throughput_rps']),
+            'p50_pct': delta(stats['latency_ms']['p50'], old['latency_ms']['p50']),
+            'p99_pct': delta(stats['latency_ms']['p99'], old['latency_ms']['p99']),
+            'error_rate_delta': round(stats['error_rate'] - old['error_rate'], 4),
+        }
+    return diff
+
+
+def run(args) -> dict:
+    stack = None
+    target = args.target
+    if not target:
+        stack = start_local_stack(args)
+        target = stack['target']
+
+    recorder = Recorder()
+    deadline = time.perf_counter() + args.duration if args.duration else None
+    flows_started = 0
+    flows_lock = threading.Lock()
+
+    def worker(user_index: int):
+        nonlocal flows_started
+        user = VirtualUser(target, recorder, args, random.Random((args.seed or 0) + user_index))
+        while True:
+            with flows_lock:
+                if (deadline and time.perf_counter() >= deadline) or (args.iterations and flows_started >= args.iterations):
+                    return
+                flows_started += 1
+            user.run_flow()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(worker, range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    result = {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'config': {
+            'target': args.target or 'local',
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'iterations': args.iterations,
+            'question_type': args.question_type,
+            'questions': args.questions,
+            'email_fraction': args.email_fraction,
+            'latency': args.latency,
+            'error_rate': args.error_rate,
+            'payload_mix': args.payload_mix,
+            'python': platform.python_version(),
+        },
+        **summarise(recorder, elapsed),
+    }
+    if stack:
+        result['provider'] = dict(stack['fake_config'].stats)
+        result['smtp'] = {'messages': stack['smtp_sink'].messages, 'bytes': stack['smtp_sink'].bytes}
+    if args.compare:
+        result['comparison'] = compare(result, json.loads(Path(args.compare).read_text()))
+    return result
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Drive Quizify with concurrent virtual users against a fake Gemini provider.")
+    parser.add_argument('--target', help="Base URL of a running deployment; omit to start a local stack")
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds to run (0 to use --iterations only)")
+    parser.add_argument('--iterations', type=int, default=0, help="Stop after this many user flows (0 = unlimited)")
+    parser.add_argument('--question-type', default='mixed', choices=['mcq', 'fill', 'tf', 'mixed'])
+    parser.add_argument('--questions', type=int, default=10)
+    parser.add_argument('--topic', default='Photosynthesis')
+    parser.add_argument('--topic-variants', type=int, default=50, help="Distinct topics to spread requests across")
+    parser.add_argument('--email-fraction', type=float, default=0.3, help="Fraction of graded attempts that also send an email")
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--app-port', type=int, default=0)
+    parser.add_argument('--fake-port', type=int, default=0)
+    parser.add_argument('--smtp-port', type=int, default=0)
+    parser.add_argument('--output', help="Write the JSON artifact here (default: stdout only)")
+    parser.add_argument('--compare', help="Earlier JSON artifact to diff against")
+    add_fake_gemini_arguments(parser)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    result = run(args)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
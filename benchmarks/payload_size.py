@@ -0,0 +1,109 @@
+"""
+Payload sizes for a 20-question mixed quiz, with and without compression.
+
+Stores a quiz built by the fake Gemini provider (7 MCQ, 7 fill-in, 6
+true/false, with an explanation) in a throwaway SQLite database and measures,
+in-process, the response body bytes of:
+
+* ``check_answers`` - full response vs ``compact`` mode
+* the quiz page (``/quiz/<id>/``) and ``/api/quiz/<id>``
+* a revalidation of the quiz page with ``If-None-Match`` (304, no body)
+
+each as identity, gzip and (when the Brotli package is installed) br.
+
+The fake questions are more repetitive than real ones, so the compression
+ratios here are an upper bound. The compact/full ratio does not depend on that.
+
+Example:
+    python -m benchmarks.payload_size --output payload_size.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .fake_gemini import build_quiz_json
+from .loadtest import BASE_DIR
+
+
+def run(args) -> dict:
+    db_dir = tempfile.mkdtemp(prefix='quizify-payload-')
+    os.environ.update({
+        'DJANGO_SETTINGS_MODULE': 'quizify.settings',
+        'GOOGLE_GENAI_API_KEY': os.environ.get('GOOGLE_GENAI_API_KEY', 'fake-benchmark-key'),
+        'QUIZIFY_DB_PATH': str(Path(db_dir) / 'payload.sqlite3'),
+        'QUIZIFY_COMPRESSION': 'True',
+    })
+    sys.path.insert(0, str(BASE_DIR))
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from django.urls import reverse
+    from quiz import compression
+    from quiz.models import Quiz
+    setup_test_environment()
+    call_command('migrate', verbosity=0)
+
+    data = build_quiz_json({'topic': 'Photosynthesis', 'difficulty': 'Medium', 'counts': {'mcq': 7, 'fill': 7, 'tf': 6}})
+    quiz = Quiz.objects.create(topic='Photosynthesis', difficulty='Medium', question_type='mixed',
+                               explanation=data['explanation'], questions_data=data['questions'])
+    # Every third answer wrong, as a realistic mix of feedback
+    answers = {f"q{i + 1}": 'wrong' if i % 3 == 0 else str(q['answer']) for i, q in enumerate(quiz.get_questions())}
+    encodings = ['identity', 'gzip'] + (['br'] if compression.brotli is not None else [])
+    client = Client()
+
+    def sizes(send):
+        return {encoding: len(send(HTTP_ACCEPT_ENCODING=encoding).content) for encoding in encodings}
+
+    def check(compact):
+        body = {'quiz_id': quiz.id, 'answers': answers, **({'compact': True} if compact else {})}
+        return lambda **headers: client.post(reverse('quiz:check_answers'), body, content_type='application/json', **headers)
+
+    page_url = reverse('quiz:quiz_detail', args=[quiz.id])
+    api_url = reverse('quiz:quiz_api', args=[quiz.id])
+    results = {
+        'check_answers_full': sizes(check(False)),
+        'check_answers_compact': sizes(check(True)),
+        'quiz_page': sizes(lambda **headers: client.get(page_url, **headers)),
+        'quiz_api': sizes(lambda **headers: client.get(api_url, **headers)),
+    }
+    etag = client.get(page_url)['ETag']
+    results['quiz_page_revalidation'] = {'status': client.get(page_url, HTTP_IF_NONE_MATCH=etag).status_code, 'body_bytes': 0}
+
+    best = encodings[-1]
+    full, compact = results['check_answers_full'], results['check_answers_compact']
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'quiz': {'questions': quiz.question_count, 'explanation_chars': len(quiz.explanation)},
+        'brotli_available': compression.brotli is not None,
+        'results': results,
+        'savings_pct': {
+            'check_answers_compact_vs_full': round(100 * (1 - compact['identity'] / full['identity']), 1),
+            f"check_answers_compact_{best}_vs_full_identity": round(100 * (1 - compact[best] / full['identity']), 1),
+            f"quiz_page_{best}": round(100 * (1 - results['quiz_page'][best] / results['quiz_page']['identity']), 1),
+            f"quiz_api_{best}": round(100 * (1 - results['quiz_api'][best] / results['quiz_api']['identity']), 1),
+        },
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Measure response sizes for a 20-question mixed quiz.")
+    parser.add_argument('--output', help="Write the JSON artifact here (default: stdout only)")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    text = json.dumps(run(args), indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Ingestion throughput of the question timing endpoint.
+
+Drives the Django app in-process on a throwaway SQLite database and posts
+question timings to ``/api/events`` as the quiz page would, either one
+request per event (``--batch-sizes 1``, what per-interaction requests would
+cost) or in beacon batches. For each batch size it reports the requests
+needed, events accepted per second by the view, and how long the background
+writer took to store them with bulk inserts.
+
+Example:
+    python -m benchmarks.question_timing --events 20000 --batch-sizes 1,25,100
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .loadtest import BASE_DIR
+
+
+def run(args) -> dict:
+    db_dir = tempfile.mkdtemp(prefix='quizify-timing-')
+    os.environ.update({
+        'DJANGO_SETTINGS_MODULE': 'quizify.settings',
+        'QUIZIFY_DB_PATH': str(Path(db_dir) / 'timing.sqlite3'),
+        'QUIZIFY_RATE_LIMIT': 'False',
+        'QUIZIFY_QUESTION_TIMING_ASYNC': 'True',
+    })
+    sys.path.insert(0, str(BASE_DIR))
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from django.urls import reverse
+    from quiz import interactions
+    from quiz.models import QuestionTiming, Quiz
+    setup_test_environment()
+    call_command('migrate', verbosity=0)
+
+    rng = random.Random(args.seed)
+    quiz = Quiz.objects.create(topic="Timing benchmark", difficulty='Easy', question_type='tf', questions_data=[])
+    client = Client()
+    url = reverse('quiz:question_events')
+    results = {}
+    for batch_size in args.batch_sizes:
+        QuestionTiming.objects.all().delete()
+        bodies = []
+        for start in range(0, args.events, batch_size):
+            events = [[rng.randrange(20), rng.randrange(1000, 60000), rng.randrange(2)] for _ in range(min(batch_size, args.events - start))]
+            bodies.append(json.dumps({'quiz_id': quiz.id, 'client': f"c{start}", 'events': events}))
+        started = time.perf_counter()
+        for body in bodies:
+            response = client.post(url, body, content_type='text/plain;charset=UTF-8')
+            if response.status_code != 204:
+                raise RuntimeError(f"/api/events answered HTTP {response.status_code}.")
+        ingest = time.perf_counter() - started
+        interactions.flush()
+        stored = time.perf_counter() - started
+        results[str(batch_size)] = {
+            'requests': len(bodies),
+            'ingest_s': round(ingest, 3),
+            'events_per_s': round(args.events / ingest),
+            'request_ms': round(1000 * ingest / len(bodies), 3),
+            'stored_after_s': round(stored, 3),
+            'rows_stored': QuestionTiming.objects.count(),
+        }
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'config': {'events': args.events},
+        'results': results,
+        'interactions': interactions.stats(),
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Measure question timing ingestion by batch size.")
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--batch-sizes', type=lambda value: [int(v) for v in value.split(',')], default=[1, 25, 100])
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', help="Write the JSON artifact here (default: stdout only)")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    text = json.dumps(run(args), indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Minimal SMTP sink for load tests.
+
+Accepts EHLO/HELO, AUTH (any credentials), MAIL, RCPT, DATA, RSET, NOOP and
+QUIT, counts delivered messages and throws their content away. No TLS, so
+point Django at it with ``EMAIL_USE_TLS=False``.
+"""
+import socketserver
+import threading
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self._reply("220 quizify-smtp-sink ready")
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            command = raw.decode(errors='replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self._reply("250-quizify-smtp-sink")
+                self._reply("250-AUTH PLAIN LOGIN")
+                self._reply("250 8BITMIME")
+            elif verb == 'HELO':
+                self._reply("250 quizify-smtp-sink")
+            elif verb == 'AUTH':
+                parts = command.split()
+                if len(parts) == 2 and parts[1].upper() == 'LOGIN':
+                    self._reply("334 VXNlcm5hbWU6")
+                    self.rfile.readline()
+                    self._reply("334 UGFzc3dvcmQ6")
+                    self.rfile.readline()
+                elif len(parts) == 2: # AUTH PLAIN without initial response
+                    self._reply("334 ")
+                    self.rfile.readline()
+                self._reply("235 Authentication successful")
+            elif verb in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self._reply("250 OK")
+            elif verb == 'DATA':
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line in (b".\r\n", b".\n"):
+                        break
+                    size += len(line)
+                self.server.record(size)
+                self._reply("250 OK queued")
+            elif verb == 'QUIT':
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address):
+        super().__init__(address, SMTPSinkHandler)
+        self.messages = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def record(self, size: int):
+        with self._lock:
+            self.messages += 1
+            self.bytes += size
+
+
+def start_smtp_sink(host: str = '127.0.0.1', port: int = 0) -> SMTPSink:
+    """Starts the sink on a daemon thread; the bound port is ``sink.server_address[1]``."""
+    sink = SMTPSink((host, port))
+    threading.Thread(target=sink.serve_forever, name='smtp-sink', daemon=True).start()
+    return sink
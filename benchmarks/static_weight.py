@@ -0,0 +1,109 @@
+"""
+Bytes over the wire for the static assets of templates/base.html.
+
+Runs ``collectstatic`` with the asset pipeline (quiz.assets) into a throwaway
+STATIC_ROOT, renders the home page in-process and fetches every local
+stylesheet and script it references through ``StaticAssetMiddleware`` the way a
+browser would (``Accept-Encoding: gzip, deflate, br``):
+
+* ``before`` - the source file as served without the pipeline (uncompressed,
+  no Cache-Control, so every later visit revalidates it)
+* ``after``  - the minified, precompressed variant actually sent, plus the
+  Cache-Control the browser gets
+
+CDN assets (Bootstrap, fonts) are not served by the app and are left out.
+
+Example:
+    python -m benchmarks.static_weight --output static_weight.json
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .loadtest import BASE_DIR
+
+_ASSET_RE = re.compile(r'<(?:link[^>]+href|script[^>]+src)="(/static/[^"]+)"')
+
+
+def run(args) -> dict:
+    static_root = tempfile.mkdtemp(prefix='quizify-static-')
+    db_dir = tempfile.mkdtemp(prefix='quizify-static-db-')
+    os.environ.update({
+        'DJANGO_SETTINGS_MODULE': 'quizify.settings',
+        'DJANGO_DEBUG': 'False', # Hashed URLs are only rendered with DEBUG off
+        'GOOGLE_GENAI_API_KEY': os.environ.get('GOOGLE_GENAI_API_KEY', 'fake-benchmark-key'),
+        'QUIZIFY_DB_PATH': str(Path(db_dir) / 'static.sqlite3'),
+        'QUIZIFY_STATIC_ROOT': static_root,
+        'QUIZIFY_STATIC_MANIFEST': 'True',
+        'QUIZIFY_SERVE_STATIC': 'True',
+    })
+    sys.path.insert(0, str(BASE_DIR))
+    import django
+    django.setup()
+    from django.contrib.staticfiles import finders
+    from django.contrib.staticfiles.storage import staticfiles_storage
+    from django.core.management import call_command
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    call_command('migrate', verbosity=0)
+    call_command('collectstatic', interactive=False, verbosity=0)
+
+    client = Client()
+    page = client.get('/')
+    original_names = {hashed: name for name, hashed in staticfiles_storage.hashed_files.items()}
+    assets = []
+    for url in _ASSET_RE.findall(page.content.decode()):
+        hashed = url[len('/static/'):]
+        name = original_names.get(hashed, hashed)
+        response = client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        if response.status_code != 200:
+            raise RuntimeError(f"{url} returned HTTP {response.status_code}.")
+        assets.append({
+            'name': name,
+            'url': url,
+            'before_bytes': Path(finders.find(name)).stat().st_size,
+            'after_bytes': len(response.content),
+            'content_encoding': response.get('Content-Encoding', 'identity'),
+            'cache_control': response.get('Cache-Control'),
+        })
+    before = sum(asset['before_bytes'] for asset in assets)
+    after = sum(asset['after_bytes'] for asset in assets)
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'html_bytes': len(page.content),
+        'assets': assets,
+        'first_visit': {
+            'before_bytes': before,
+            'after_bytes': after,
+            'reduction_pct': round(100 * (before - after) / before, 1) if before else None,
+        },
+        # Without Cache-Control every asset is revalidated on each visit; immutable hashed files are not.
+        'repeat_visit_requests': {
+            'before': len(assets),
+            'after': sum('immutable' not in (asset['cache_control'] or '') for asset in assets),
+        },
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Report bytes over the wire for base.html's static assets.")
+    parser.add_argument('--output', help="Write the JSON artifact here (default: stdout only)")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    text = json.dumps(run(args), indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
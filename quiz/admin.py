@@ -1,24 +1,191 @@
+import math
+from datetime import timedelta
 from django.contrib import admin
-from .models import Quiz, QuizAttempt
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from django.utils.functional import cached_property
+from .models import Quiz, QuizAttempt, GenerationRun, PregenerationTask
+from .search import matching_quiz_ids_sql
 
-class QuizAdmin(admin.ModelAdmin):
+# Below this many rows an exact COUNT(*) is cheap enough and always used.
+EXACT_COUNT_THRESHOLD = 10000
+
+def estimate_row_count(model):
+    """
+    Cheap row-count estimate for a whole table from database statistics, or None when the backend has none.
+    SQLite's MAX(rowid) is an upper bound (deleted rows are not subtracted) read from the primary key index.
+    """
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute("SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s", [table])
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f"SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}")
+        else:
+            return None
+        row = cursor.fetchone()
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginates unfiltered changelists of large tables from an estimated row count instead of COUNT(*).
+    Filtered or searched changelists still get an exact count, which their WHERE clause keeps selective.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not getattr(queryset, 'query', None) or queryset.query.where:
+            return super().count
+        estimate = estimate_row_count(queryset.model)
+        if estimate is None or estimate < EXACT_COUNT_THRESHOLD:
+            return super().count
+        return estimate
+
+class LargeTableAdminMixin:
+    """Changelist settings shared by admins over tables that grow without bound."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False # Skip the second, unfiltered COUNT(*) behind "N results (M total)"
+    changelist_defer = () # Heavy columns the changelist never displays
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        match = getattr(request, 'resolver_match', None)
+        if self.changelist_defer and match and match.url_name and match.url_name.endswith('_changelist'):
+            queryset = queryset.defer(*self.changelist_defer)
+        return queryset
+
+class QuizAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('topic', 'difficulty', 'question_type', 'created_at', 'get_question_count')
     list_filter = ('difficulty', 'question_type', 'created_at')
-    search_fields = ('topic', 'explanation')
-    readonly_fields = ('created_at',)
+    search_fields = ('topic',) # Fallback when the full-text index is unavailable (see get_search_results)
+    readonly_fields = ('created_at', 'question_count')
+    date_hierarchy = 'created_at'
+    changelist_defer = ('explanation', 'questions_data')
 
     def get_question_count(self, obj):
-        return len(obj.get_questions())
+        return obj.question_count
     get_question_count.short_description = 'No. Questions'
+    get_question_count.admin_order_field = 'question_count'
 
-class QuizAttemptAdmin(admin.ModelAdmin):
-    list_display = ('quiz', 'score', 'total_questions', 'percentage', 'attempted_at')
+    def get_search_results(self, request, queryset, search_term):
+        # Search topic, explanation and question text through the FTS5 index instead of LIKE scans.
+        fts_query = matching_quiz_ids_sql(search_term)
+        if fts_query is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(pk__in=RawSQL(*fts_query)), False
+
+class QuizAttemptAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('quiz', 'participant', 'score', 'total_questions', 'percentage', 'attempted_at')
     list_filter = ('attempted_at', 'quiz__difficulty')
-    search_fields = ('quiz__topic',)
+    search_fields = ('quiz__topic', 'participant')
+    list_select_related = ('quiz',) # Avoid one quiz lookup per row in the changelist
     readonly_fields = ('attempted_at', 'quiz', 'submitted_answers', 'results_data') # Make fields non-editable in admin
+    raw_id_fields = ('quiz',) # Never render a <select> of every quiz (e.g. if 'quiz' becomes editable)
+    date_hierarchy = 'attempted_at'
+    changelist_defer = ('submitted_answers', 'results_data', 'quiz__explanation', 'quiz__questions_data')
 
     # Optional: If using User model
     # raw_id_fields = ('user',)
 
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list (None when empty)."""
+    if not sorted_values:
+        return None
+    rank = math.ceil(pct / 100 * len(sorted_values)) - 1
+    return sorted_values[min(max(rank, 0), len(sorted_values) - 1)]
+
+class GenerationRunAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('created_at', 'model_name', 'topic', 'question_type', 'difficulty', 'succeeded', 'parse_path',
+                    'prompt_tokens', 'response_tokens', 'wall_time_ms', 'retry_count')
+    list_filter = ('model_name', 'question_type', 'difficulty', 'succeeded', 'parse_path', 'created_at')
+    search_fields = ('topic',)
+    list_select_related = ('quiz',)
+    raw_id_fields = ('quiz',)
+    readonly_fields = [f.name for f in GenerationRun._meta.fields]
+    date_hierarchy = 'created_at'
+
+    # The percentile summary covers the last PERCENTILE_WINDOW unless the changelist is already filtered on
+    # created_at, and at most the newest PERCENTILE_MAX_ROWS runs, so it stays bounded as the table grows.
+    PERCENTILE_WINDOW = timedelta(days=7)
+    PERCENTILE_MAX_ROWS = 20000
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context=extra_context)
+        context_data = getattr(response, 'context_data', None) # Absent on redirects (e.g. bulk actions)
+        if context_data and 'cl' in context_data:
+            queryset, window = self.get_percentile_window(request, context_data['cl'].queryset)
+            summary = self.get_percentile_summary(queryset)
+            if sum(row['runs'] for row in summary) >= self.PERCENTILE_MAX_ROWS:
+                window = f'the newest {self.PERCENTILE_MAX_ROWS} of {window}'
+            context_data['percentile_summary'] = summary
+            context_data['percentile_window'] = window
+        return response
+
+    def get_percentile_window(self, request, queryset):
+        """The changelist queryset narrowed to the summary window, and a label describing that window."""
+        if any(param.startswith('created_at') for param in request.GET):
+            return queryset, 'the runs matching the current filters'
+        since = timezone.now() - self.PERCENTILE_WINDOW
+        return queryset.filter(created_at__gte=since), f'the runs matching the current filters from the last {self.PERCENTILE_WINDOW.days} days'
+
+    def get_percentile_summary(self, queryset):
+        """
+        Latency and size percentiles per (model, question type) over the newest PERCENTILE_MAX_ROWS runs of ``queryset``.
+        Computed in Python because SQLite has no percentile aggregate; only the needed columns are fetched.
+        """
+        groups = {}
+        rows = queryset.order_by('-created_at').values_list(
+            'model_name', 'question_type', 'wall_time_ms', 'prompt_tokens', 'response_tokens', 'parse_path', 'succeeded'
+        )[:self.PERCENTILE_MAX_ROWS]
+        for model_name, question_type, wall_time_ms, prompt_tokens, response_tokens, parse_path, succeeded in rows.iterator(chunk_size=2000):
+            group = groups.setdefault((model_name, question_type), {
+                'wall': [], 'prompt': [], 'response': [], 'runs': 0, 'failures': 0, 'fallbacks': 0,
+            })
+            group['runs'] += 1
+            group['wall'].append(wall_time_ms)
+            if prompt_tokens is not None:
+                group['prompt'].append(prompt_tokens)
+            if response_tokens is not None:
+                group['response'].append(response_tokens)
+            if not succeeded:
+                group['failures'] += 1
+            if parse_path in ('fenced', 'braces'):
+                group['fallbacks'] += 1
+
+        type_labels = dict(GenerationRun._meta.get_field('question_type').choices)
+        summary = []
+        for (model_name, question_type), group in sorted(groups.items()):
+            for key in ('wall', 'prompt', 'response'):
+                group[key].sort()
+            summary.append({
+                'model_name': model_name,
+                'question_type': type_labels.get(question_type, question_type),
+                'runs': group['runs'],
+                'failure_rate': round(100 * group['failures'] / group['runs'], 1),
+                'fallback_rate': round(100 * group['fallbacks'] / group['runs'], 1),
+                'wall_p50': _percentile(group['wall'], 50),
+                'wall_p90': _percentile(group['wall'], 90),
+                'wall_p99': _percentile(group['wall'], 99),
+                'prompt_p50': _percentile(group['prompt'], 50),
+                'prompt_p90': _percentile(group['prompt'], 90),
+                'response_p50': _percentile(group['response'], 50),
+                'response_p90': _percentile(group['response'], 90),
+            })
+        return summary
+
+class PregenerationTaskAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('batch', 'topic', 'difficulty', 'question_type', 'status', 'attempts', 'updated_at')
+    list_filter = ('batch', 'status', 'difficulty', 'question_type')
+    search_fields = ('topic',)
+    raw_id_fields = ('quiz',)
+    readonly_fields = [f.name for f in PregenerationTask._meta.fields]
+
 admin.site.register(Quiz, QuizAdmin)
 admin.site.register(QuizAttempt, QuizAttemptAdmin)
+admin.site.register(GenerationRun, GenerationRunAdmin)
+admin.site.register(PregenerationTask, PregenerationTaskAdmin)
@@ -0,0 +1,244 @@
+"""
+Admission control and a circuit breaker for quiz generation.
+
+Generation requests hold a worker for as long as the LLM takes to answer, so
+when the provider slows down or fails they pile up until nothing else (grading
+included) can be served. Instead of queueing them, ``index`` asks the
+controller for a slot first:
+
+* Every provider call reports its latency and outcome (``record_outcome``).
+  Over the last ``ADMISSION_WINDOW`` seconds, once at least
+  ``ADMISSION_MIN_CALLS`` calls have finished, an error rate of
+  ``ADMISSION_ERROR_RATE`` or more, or a median latency of
+  ``ADMISSION_SLOW_SECONDS`` or more, opens the breaker.
+* While open, no generation is admitted. After ``ADMISSION_COOLDOWN`` seconds
+  the breaker is half-open and admits a single probe; the probe's outcome
+  closes it again or reopens it for another cooldown.
+* While closed, at most ``ADMISSION_MAX_IN_FLIGHT`` generations run at once,
+  scaled down in proportion when the median latency exceeds
+  ``ADMISSION_TARGET_LATENCY`` (a slow provider gets fewer concurrent calls).
+
+A request that is not admitted is served a stored quiz for the same topic,
+type and difficulty when there is one (``find_banked_quiz``), else a 503 with
+an estimate of when to try again. Grading and email never call the provider
+and are not affected.
+
+The breaker, the outcome window and the in-flight count are per process.
+"""
+import math
+import statistics
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from .instrumentation import ADMISSION_DECISIONS, BREAKER_STATE, is_enabled as instrumentation_enabled
+from .models import Quiz, quiz_topic_key
+
+CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2} # Value of the quizify_llm_breaker_state gauge
+
+_stats = Counter() # admitted, probe, fallback, shed, trips
+
+
+@dataclass
+class Decision:
+    admitted: bool
+    reason: str # 'admitted', 'probe', 'open', 'probing' or 'busy'
+    retry_after: float = 0.0 # Seconds until a retry is likely to be admitted (when not admitted)
+
+
+class AdmissionController:
+    """Circuit breaker plus an adaptive in-flight limit (see the module docstring). Thread-safe."""
+
+    def __init__(self, max_in_flight: int = 64, target_latency: float = 15, window: float = 60, min_calls: int = 5,
+                 error_rate: float = 0.5, slow_seconds: float = 45, cooldown: float = 30, clock=time.monotonic):
+        self.max_in_flight = max_in_flight
+        self.target_latency = target_latency
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.cooldown = cooldown
+        self.clock = clock
+        self.in_flight = 0
+        self._outcomes = deque() # (finished_at, seconds, ok), oldest first
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        BREAKER_STATE.set((), STATE_VALUES[CLOSED])
+
+    # --- Provider outcomes ---
+
+    def record_outcome(self, seconds: float, ok: bool):
+        """Reports one finished provider call."""
+        now = self.clock()
+        with self._lock:
+            self._outcomes.append((now, seconds, ok))
+            self._expire(now)
+            if self._state == HALF_OPEN:
+                self._probing = False
+                if ok:
+                    self._outcomes.clear() # Start the closed state with a clean window
+                    self._set_state(CLOSED)
+                else:
+                    self._trip(now)
+            elif self._state == CLOSED and self._unhealthy():
+                self._trip(now)
+
+    def _expire(self, now: float):
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+    def _median_latency(self):
+        latencies = [seconds for _, seconds, ok in self._outcomes if ok]
+        return statistics.median(latencies) if latencies else None
+
+    def _unhealthy(self) -> bool:
+        if len(self._outcomes) < self.min_calls:
+            return False
+        errors = sum(1 for _, _, ok in self._outcomes if not ok)
+        if errors / len(self._outcomes) >= self.error_rate:
+            return True
+        median = self._median_latency()
+        return median is not None and median >= self.slow_seconds
+
+    def _trip(self, now: float):
+        self._opened_at = now
+        self._set_state(OPEN)
+        _stats['trips'] += 1
+        print(f"Generation circuit breaker opened; retrying the provider in {self.cooldown:.0f}s.")
+
+    def _set_state(self, state: str):
+        self._state = state
+        BREAKER_STATE.set((), STATE_VALUES[state])
+
+    # --- Admission ---
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(self.clock())
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self.cooldown:
+            self._set_state(HALF_OPEN)
+        return self._state
+
+    def limit(self) -> int:
+        """Generations allowed in flight at the current median latency."""
+        median = self._median_latency()
+        if median is None or median <= self.target_latency:
+            return self.max_in_flight
+        return max(1, math.floor(self.max_in_flight * self.target_latency / median))
+
+    def try_admit(self) -> Decision:
+        """Takes a generation slot when one is available; pair every admitted decision with release()."""
+        now = self.clock()
+        with self._lock:
+            self._expire(now)
+            state = self._current_state(now)
+            expected = self._median_latency() or self.target_latency
+            if state == OPEN:
+                decision = Decision(False, 'open', self.cooldown - (now - self._opened_at))
+            elif state == HALF_OPEN:
+                if self._probing:
+                    decision = Decision(False, 'probing', expected)
+                else:
+                    self._probing = True
+                    decision = Decision(True, 'probe')
+            elif self.in_flight >= self.limit():
+                decision = Decision(False, 'busy', expected)
+            else:
+                decision = Decision(True, 'admitted')
+            if decision.admitted:
+                self.in_flight += 1
+        return decision
+
+    def release(self, decision: Decision):
+        with self._lock:
+            self.in_flight -= 1
+            if decision.reason == 'probe' and self._state == HALF_OPEN:
+                self._probing = False # The probe ended without reaching the provider; let the next request try
+
+    def snapshot(self) -> dict:
+        now = self.clock()
+        with self._lock:
+            self._expire(now)
+            median = self._median_latency()
+            return {
+                'state': self._current_state(now),
+                'in_flight': self.in_flight,
+                'limit': self.limit(),
+                'recent_calls': len(self._outcomes),
+                'recent_errors': sum(1 for _, _, ok in self._outcomes if not ok),
+                'median_latency': round(median, 3) if median is not None else None,
+            }
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController(
+                    max_in_flight=getattr(settings, 'ADMISSION_MAX_IN_FLIGHT', 64),
+                    target_latency=getattr(settings, 'ADMISSION_TARGET_LATENCY', 15),
+                    window=getattr(settings, 'ADMISSION_WINDOW', 60),
+                    min_calls=getattr(settings, 'ADMISSION_MIN_CALLS', 5),
+                    error_rate=getattr(settings, 'ADMISSION_ERROR_RATE', 0.5),
+                    slow_seconds=getattr(settings, 'ADMISSION_SLOW_SECONDS', 45),
+                    cooldown=getattr(settings, 'ADMISSION_COOLDOWN', 30),
+                )
+    return _controller
+
+
+def admission_enabled() -> bool:
+    return getattr(settings, 'ADMISSION_ENABLED', True)
+
+
+def record_outcome(seconds: float, ok: bool):
+    """Reports a provider call to the controller (a no-op when admission control is off)."""
+    if admission_enabled():
+        get_controller().record_outcome(seconds, ok)
+
+
+def record_decision(outcome: str):
+    """Counts an admission outcome: admitted, probe, fallback or shed."""
+    _stats[outcome] += 1
+    if instrumentation_enabled():
+        ADMISSION_DECISIONS.inc((outcome,))
+
+
+def stats() -> dict:
+    """Admission outcomes in this process, plus the controller's current state."""
+    return {**{outcome: _stats[outcome] for outcome in ('admitted', 'probe', 'fallback', 'shed', 'trips')},
+            **get_controller().snapshot()}
+
+
+def reset():
+    """Forgets the controller and the statistics (used by the tests)."""
+    global _controller
+    with _controller_lock:
+        _controller = None
+    _stats.clear()
+    BREAKER_STATE.set((), STATE_VALUES[CLOSED])
+
+
+# --- Fallback ---
+
+def find_banked_quiz(topic: str, question_type: str, difficulty: str, num_questions: int):
+    """
+    A stored quiz with the same (normalised) topic, question type and difficulty, or None.
+    Prefers one with the requested number of questions, then the most recent. Unclaimed prefetch inventory is skipped.
+    """
+    matches = (Quiz.objects.filter(topic_key=quiz_topic_key(topic), question_type=question_type, difficulty=difficulty)
+               .exclude(prefetch_entry__isnull=False).order_by('-created_at'))
+    return matches.filter(question_count=num_questions).first() or matches.first()
@@ -0,0 +1,358 @@
+"""
+Static asset pipeline: minified, content-hashed, precompressed files.
+
+``MinifiedManifestStaticFilesStorage`` plugs into ``collectstatic``. It
+minifies JS and CSS, lets Django's ``ManifestStaticFilesStorage`` write
+content-hashed copies (``script.3f2a9c0d1b7e.js``) plus the
+``staticfiles.json`` manifest used by ``{% static %}``, and then writes ``.gz``
+and, when the optional ``brotli`` package is installed, ``.br`` variants next
+to every compressible file.
+
+``StaticAssetMiddleware`` serves ``STATIC_ROOT`` from the app itself. It picks
+the best precompressed variant the client accepts, and sends hashed files with
+a far-future ``immutable`` Cache-Control so browsers never revalidate them.
+Unhashed names get a short max-age plus an ETag.
+
+The minifiers are deliberately conservative: comments and indentation go, but
+JavaScript line breaks are kept so automatic semicolon insertion behaves
+exactly as before.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.decorators import sync_and_async_middleware
+
+try:
+    import brotli
+except ImportError: # Optional: without it only gzip variants are written
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.js', '.css', '.svg', '.html', '.txt', '.json', '.map', '.xml', '.ico')
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+UNHASHED_CACHE_CONTROL = 'public, max-age=60'
+_HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+
+
+# --- Minifiers ---
+
+_CSS_PUNCTUATION_RE = re.compile(r'\s*([{};,>])\s*')
+
+
+def _squeeze_css(code: str) -> str:
+    code = re.sub(r'\s+', ' ', code)
+    code = _CSS_PUNCTUATION_RE.sub(r'\1', code)
+    return code.replace(': ', ':').replace(';}', '}')
+
+
+def minify_css(source: str) -> str:
+    """Drops comments (except /*! ... */ notices) and redundant whitespace; string contents are untouched."""
+    pieces, code = [], []
+    i, n = 0, len(source)
+    while i < n:
+        c = source[i]
+        if c in '"\'':
+            end = _string_end(source, i)
+            pieces.append(_squeeze_css(''.join(code)))
+            pieces.append(source[i:end])
+            code.clear()
+            i = end
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            if source.startswith('/*!', i):
+                pieces.append(_squeeze_css(''.join(code)))
+                pieces.append(source[i:end] + '\n')
+                code.clear()
+            else:
+                code.append(' ')
+            i = end
+        else:
+            code.append(c)
+            i += 1
+    pieces.append(_squeeze_css(''.join(code)))
+    return ''.join(pieces).strip()
+
+
+def _string_end(source: str, start: int) -> int:
+    """Index just past the quoted string starting at ``start`` (stops at an unescaped newline)."""
+    quote, j, n = source[start], start + 1, len(source)
+    while j < n and source[j] != quote and source[j] != '\n':
+        j += 2 if source[j] == '\\' else 1
+    return min(j + 1, n)
+
+
+# Characters after which a '/' starts a regular expression literal rather than a division.
+_JS_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+_JS_REGEX_KEYWORDS_RE = re.compile(r'(?:^|[^\w$])(?:return|typeof|case|do|else|in|of|new|delete|void|throw|instanceof|yield|await)$')
+_JS_PUNCTUATION_RE = re.compile(r' ?([{}()\[\];,:=!&|?*%^~]) ?')
+
+
+def _squeeze_js(code: str) -> str:
+    lines = [re.sub(r'[ \t]+', ' ', line).strip() for line in code.split('\n')]
+    text = '\n'.join(_JS_PUNCTUATION_RE.sub(r'\1', line) for line in lines if line)
+    stripped = code.strip(' \t\r')
+    # Keep a line break at either edge: it may terminate a statement next to a string literal.
+    if stripped.startswith('\n') and (text or '\n' in code):
+        text = '\n' + text
+    if stripped.endswith('\n') and text and not text.endswith('\n'):
+        text += '\n'
+    return text
+
+
+def minify_js(source: str) -> str:
+    """Drops comments and indentation, and spaces around punctuation; keeps line breaks and every literal verbatim."""
+    pieces, code = [], []
+    template_depth = [] # Brace depth inside each open ${...} of a template literal
+    last_was_literal = False
+    i, n = 0, len(source)
+
+    def emit_literal(text):
+        nonlocal last_was_literal
+        pieces.append(_squeeze_js(''.join(code)))
+        pieces.append(text)
+        code.clear()
+        last_was_literal = True
+
+    def regex_allowed() -> bool:
+        before = ''.join(code).rstrip()
+        if not before:
+            return not last_was_literal
+        return before[-1] in _JS_REGEX_PRECEDERS or bool(_JS_REGEX_KEYWORDS_RE.search(before))
+
+    while i < n:
+        c = source[i]
+        if c in '"\'':
+            end = _string_end(source, i)
+            emit_literal(source[i:end])
+            i = end
+        elif c == '`' or (c == '}' and template_depth and template_depth[-1] == 0):
+            # A template literal chunk: from ` (or the } closing a ${...}) up to the closing ` or the next ${
+            j, opened = i + 1, False
+            while j < n:
+                if source[j] == '\\':
+                    j += 2
+                    continue
+                if source[j] == '`':
+                    j += 1
+                    break
+                if source.startswith('${', j):
+                    j += 2
+                    opened = True
+                    break
+                j += 1
+            if c == '}':
+                template_depth.pop()
+            if opened:
+                template_depth.append(0)
+            emit_literal(source[i:j])
+            i = j
+        elif source.startswith('//', i):
+            end = source.find('\n', i)
+            i = n if end == -1 else end
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            code.append('\n' if '\n' in source[i:end] else ' ')
+            i = end
+        elif c == '/' and regex_allowed():
+            j, in_class = i + 1, False
+            while j < n and source[j] != '\n':
+                if source[j] == '\\':
+                    j += 2
+                    continue
+                if source[j] == '[':
+                    in_class = True
+                elif source[j] == ']':
+                    in_class = False
+                elif source[j] == '/' and not in_class:
+                    break
+                j += 1
+            j += 1
+            while j < n and (source[j].isalpha()):
+                j += 1 # Flags
+            emit_literal(source[i:j])
+            i = j
+        else:
+            if template_depth and c == '{':
+                template_depth[-1] += 1
+            elif template_depth and c == '}':
+                template_depth[-1] -= 1
+            code.append(c)
+            last_was_literal = last_was_literal and c in ' \t'
+            i += 1
+    pieces.append(_squeeze_js(''.join(code)))
+    return ''.join(pieces).strip() + '\n'
+
+
+MINIFIERS = {'.js': minify_js, '.css': minify_css}
+
+
+# --- collectstatic storage ---
+
+def compress_variants(data: bytes) -> dict:
+    """{'.gz': bytes, '.br': bytes} for the encodings that actually shrink ``data``."""
+    variants = {}
+    if len(data) < MIN_COMPRESS_SIZE:
+        return variants
+    gz = gzip.compress(data, compresslevel=9, mtime=0) # mtime=0 keeps output deterministic
+    if len(gz) < len(data) * 0.95:
+        variants['.gz'] = gz
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data) * 0.95:
+            variants['.br'] = br
+    return variants
+
+
+class MinifiedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that minifies JS/CSS before hashing and precompresses the results."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        paths = dict(paths)
+        for name in paths:
+            minifier = MINIFIERS.get(os.path.splitext(name)[1])
+            if minifier is None or re.search(r'\.min\.\w+$', name):
+                continue
+            with self.open(name) as f:
+                original = f.read().decode('utf-8')
+            minified = minifier(original)
+            if minified != original:
+                self.delete(name)
+                self._save(name, ContentFile(minified.encode('utf-8')))
+            # The hashing pass reads from the storage given here; point it at the minified copy, not the source.
+            paths[name] = (self, name)
+
+        yield from super().post_process(paths, dry_run, **options)
+
+        for name in {*paths, *self.hashed_files.values()}:
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS) or not self.exists(name):
+                continue
+            with self.open(name) as f:
+                data = f.read()
+            for suffix, compressed in compress_variants(data).items():
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
+
+
+# --- Serving ---
+
+class _Asset:
+    __slots__ = ('content_type', 'cache_control', 'variants')
+
+    def __init__(self, content_type, cache_control, variants):
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.variants = variants # encoding ('' for identity) -> (bytes, etag)
+
+
+_ENCODING_SUFFIXES = (('br', '.br'), ('gzip', '.gz'))
+
+
+def build_asset_index(root) -> dict:
+    """Maps URL paths under STATIC_URL to in-memory assets with their precompressed variants."""
+    index = {}
+    prefix = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else '/' + settings.STATIC_URL
+    if not root or not os.path.isdir(root):
+        return index
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            if filename.endswith(('.gz', '.br')):
+                continue
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, root).replace(os.sep, '/')
+            variants = {'': path}
+            for encoding, suffix in _ENCODING_SUFFIXES:
+                if os.path.exists(path + suffix):
+                    variants[encoding] = path + suffix
+            content_type, _ = mimetypes.guess_type(filename)
+            content_type = content_type or 'application/octet-stream'
+            if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+                content_type += '; charset=utf-8'
+            loaded = {}
+            for encoding, variant_path in variants.items():
+                with open(variant_path, 'rb') as f:
+                    data = f.read()
+                loaded[encoding] = (data, '"%s"' % hashlib.md5(data, usedforsecurity=False).hexdigest()[:20])
+            cache_control = IMMUTABLE_CACHE_CONTROL if _HASHED_NAME_RE.search(filename) else UNHASHED_CACHE_CONTROL
+            index[prefix + name] = _Asset(content_type, cache_control, loaded)
+    return index
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_asset_index() -> dict:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = build_asset_index(getattr(settings, 'STATIC_ROOT', None))
+    return _index
+
+
+def reset_asset_index():
+    global _index
+    _index = None
+
+
+def _accepted_encodings(header: str) -> set:
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def serve_asset(request):
+    """The response for a collected static file, or None when ``request`` is not for one."""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    asset = get_asset_index().get(request.path_info)
+    if asset is None:
+        return None
+    accepted = _accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    encoding = next((e for e, _ in _ENCODING_SUFFIXES if e in asset.variants and e in accepted), '')
+    data, etag = asset.variants[encoding]
+
+    if etag in [tag.strip() for tag in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(b'' if request.method == 'HEAD' else data, content_type=asset.content_type)
+        response['Content-Length'] = str(len(data))
+    response['ETag'] = etag
+    response['Cache-Control'] = asset.cache_control
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if len(asset.variants) > 1:
+        response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+@sync_and_async_middleware
+def StaticAssetMiddleware(get_response):
+    """Serves STATIC_ROOT ahead of the rest of the stack (see serve_asset)."""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            response = serve_asset(request)
+            return response if response is not None else await get_response(request)
+    else:
+        def middleware(request):
+            response = serve_asset(request)
+            return response if response is not None else get_response(request)
+    return middleware
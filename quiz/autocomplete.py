@@ -0,0 +1,196 @@
+"""
+Topic autocomplete from an in-memory prefix index over historical quiz topics.
+
+``TopicIndex`` keeps normalised topics in a sorted list, so every topic
+starting with a prefix is one contiguous slice found with ``bisect``. Each
+slice is ranked by popularity (number of quizzes on that topic). Rankings for
+all prefixes of up to three characters are precomputed, and longer prefixes
+matching many topics are memoised in a bounded LRU, so lookups stay
+sub-millisecond. The process-wide index is built lazily
+on first use from one aggregate query, grows as quizzes are generated
+(``note_topic``) and is rebuilt once older than ``TOPIC_AUTOCOMPLETE_MAX_AGE``
+seconds to pick up quizzes created by other processes.
+"""
+import heapq
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Count
+from django.http import HttpRequest, JsonResponse
+
+from .models import Quiz, normalise_topic
+
+MAX_SUGGESTIONS = 20
+
+
+def _prefix_end(keys: list, prefix: str, start: int) -> int:
+    """The position just past the keys starting with ``prefix`` (sorted ``keys``, the first of them at ``start``)."""
+    # Bisect to the smallest string above every string with the prefix: the last character bumped, after dropping
+    # trailing U+10FFFF characters, which have no successor. Nothing left means the slice runs to the end.
+    stem = prefix.rstrip(chr(sys.maxunicode))
+    if not stem:
+        return len(keys)
+    return bisect_left(keys, stem[:-1] + chr(ord(stem[-1]) + 1), lo=start)
+
+
+class TopicIndex:
+    """Sorted-array prefix index with popularity counts. Safe for concurrent readers and writers."""
+
+    # Rankings for every prefix up to this length are computed at build time (their slices are the largest).
+    PRECOMPUTED_PREFIX_LENGTH = 3
+    # Longer prefixes whose slice exceeds this many topics are ranked once and memoised.
+    MEMO_THRESHOLD = 256
+    MEMO_SIZE = 4096
+    DEPTH = MAX_SUGGESTIONS
+
+    def __init__(self, topic_counts=(), max_topics: int = 500000):
+        self.max_topics = max_topics
+        self._lock = threading.Lock()
+        self._memo = OrderedDict()
+        merged = {}
+        for topic, count in topic_counts:
+            key = normalise_topic(topic)
+            if not key:
+                continue
+            if key in merged:
+                merged[key][1] += count
+            else:
+                merged[key] = [topic.strip(), count]
+        # Keep only the most popular topics so memory stays bounded.
+        if len(merged) > max_topics:
+            merged = dict(heapq.nlargest(max_topics, merged.items(), key=lambda item: item[1][1]))
+        self._keys = sorted(merged)
+        self._display = [merged[key][0] for key in self._keys]
+        self._counts = [merged[key][1] for key in self._keys]
+        self._top = self._precompute()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _precompute(self) -> dict:
+        """Ranked [key, display, count] lists for every short prefix; prefixes are contiguous in the sorted keys."""
+        top = {}
+        keys = self._keys
+        for length in range(1, self.PRECOMPUTED_PREFIX_LENGTH + 1):
+            i = 0
+            while i < len(keys):
+                prefix = keys[i][:length]
+                if len(prefix) < length: # Shorter topic, already covered at a smaller length
+                    i += 1
+                    continue
+                j = _prefix_end(keys, prefix, i)
+                top[prefix] = [[keys[k], self._display[k], self._counts[k]] for k in self._rank_slice(i, j, self.DEPTH)]
+                i = j
+        return top
+
+    def add(self, topic: str, count: int = 1):
+        """Records ``count`` more quizzes on ``topic``."""
+        key = normalise_topic(topic)
+        if not key:
+            return
+        with self._lock:
+            position = bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                self._counts[position] += count
+            elif len(self._keys) < self.max_topics:
+                self._keys.insert(position, key)
+                self._display.insert(position, topic.strip())
+                self._counts.insert(position, count)
+            else:
+                return
+            display, total = self._display[position], self._counts[position]
+            # Counts only grow, so each precomputed ranking can be patched in place.
+            for length in range(1, min(len(key), self.PRECOMPUTED_PREFIX_LENGTH) + 1):
+                ranked = self._top.setdefault(key[:length], [])
+                entry = next((e for e in ranked if e[0] == key), None)
+                if entry is None:
+                    ranked.append([key, display, total])
+                else:
+                    entry[2] = total
+                ranked.sort(key=lambda e: e[2], reverse=True)
+                del ranked[self.DEPTH:]
+            # Longer memoised rankings this topic could now appear in are recomputed on demand.
+            for length in range(self.PRECOMPUTED_PREFIX_LENGTH + 1, len(key) + 1):
+                self._memo.pop(key[:length], None)
+
+    def suggest(self, prefix: str, limit: int = 8) -> list:
+        """Up to ``limit`` (topic, count) pairs starting with ``prefix``, most popular first."""
+        key = normalise_topic(prefix)
+        if not key:
+            return []
+        limit = max(1, min(limit, MAX_SUGGESTIONS))
+        with self._lock:
+            if len(key) <= self.PRECOMPUTED_PREFIX_LENGTH:
+                return [(display, count) for _, display, count in self._top.get(key, [])[:limit]]
+            ranked = self._memo.get(key)
+            if ranked is not None:
+                self._memo.move_to_end(key)
+                return ranked[:limit]
+            start = bisect_left(self._keys, key)
+            end = _prefix_end(self._keys, key, start)
+            if end - start > self.MEMO_THRESHOLD:
+                ranked = [(self._display[i], self._counts[i]) for i in self._rank_slice(start, end, self.DEPTH)]
+                self._memo[key] = ranked
+                if len(self._memo) > self.MEMO_SIZE:
+                    self._memo.popitem(last=False)
+                return ranked[:limit]
+            return [(self._display[i], self._counts[i]) for i in self._rank_slice(start, end, limit)]
+
+    def _rank_slice(self, start: int, end: int, limit: int) -> list:
+        """Positions of the ``limit`` most popular topics in keys[start:end]."""
+        return heapq.nlargest(limit, range(start, end), key=self._counts.__getitem__)
+
+
+_index = None
+_index_built_at = 0.0
+_index_lock = threading.Lock()
+
+
+def get_topic_index() -> TopicIndex:
+    """The process-wide index, built on first use and rebuilt after TOPIC_AUTOCOMPLETE_MAX_AGE seconds."""
+    global _index, _index_built_at
+    max_age = getattr(settings, 'TOPIC_AUTOCOMPLETE_MAX_AGE', 3600)
+    if _index is not None and time.monotonic() - _index_built_at < max_age:
+        return _index
+    with _index_lock:
+        if _index is None or time.monotonic() - _index_built_at >= max_age:
+            max_topics = getattr(settings, 'TOPIC_AUTOCOMPLETE_MAX_TOPICS', 500000)
+            rows = (Quiz.objects.values('topic').annotate(quizzes=Count('id')).order_by('-quizzes')
+                    .values_list('topic', 'quizzes')[:max_topics])
+            _index = TopicIndex(rows.iterator(), max_topics)
+            _index_built_at = time.monotonic()
+    return _index
+
+
+def note_topic(topic: str):
+    """Counts a newly generated quiz in the index (no-op until the index has been built)."""
+    if _index is not None:
+        _index.add(topic)
+
+
+def reset_topic_index():
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def topic_suggestions_view(request: HttpRequest) -> JsonResponse:
+    """GET /api/topics?q=<prefix>&limit=<n> - popular past topics starting with the prefix."""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid request method. Use GET.'}, status=405)
+    prefix = request.GET.get('q', '')
+    try:
+        limit = int(request.GET.get('limit', '8'))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit.'}, status=400)
+    suggestions = get_topic_index().suggest(prefix, limit) if prefix.strip() else []
+    response = JsonResponse({
+        'query': prefix,
+        'suggestions': [{'topic': topic, 'count': count} for topic, count in suggestions],
+    })
+    response['Cache-Control'] = 'private, max-age=60'
+    return response
@@ -0,0 +1,93 @@
+"""
+Splitting large quizzes into prompt-sized chunks, and de-duplicating the
+questions the chunks return.
+
+One prompt cannot reliably return more than about 20 questions, so a
+100-500 question bank is generated as several independent requests ("batches")
+that run concurrently. Every batch prompt carries its batch number and a
+short sample of questions that already exist, which steers the model towards
+different questions; ``QuestionDeduper`` then drops any repeats that still get
+through.
+
+No Django imports: the Streamlit app uses this module too.
+"""
+import math
+import re
+from collections import Counter
+
+QUESTION_TYPES = ('mcq', 'fill', 'tf')
+AVOID_SAMPLE = 15 # Existing questions quoted per prompt; a fixed number keeps the prompt size flat
+
+_NON_WORD_RE = re.compile(r'[\W_]+')
+
+
+def plan_chunks(question_type: str, num_questions: int, num_questions_per_type: dict = None, chunk_size: int = 20) -> list:
+    """
+    Splits a request into chunks of at most ``chunk_size`` questions, as evenly as possible.
+    Returns [{'num_questions': n, 'num_questions_per_type': {...} or None}, ...]; for 'mixed'
+    each type's count is spread over the chunks, so each chunk has the same mix.
+    """
+    if question_type == 'mixed':
+        num_questions = sum((num_questions_per_type or {}).values())
+    parts = max(1, math.ceil(num_questions / chunk_size))
+    chunks = []
+    for i in range(parts):
+        if question_type == 'mixed':
+            per_type = {t: _share(num_questions_per_type.get(t, 0), i, parts) for t in QUESTION_TYPES}
+            chunks.append({'num_questions': sum(per_type.values()), 'num_questions_per_type': per_type})
+        else:
+            chunks.append({'num_questions': _share(num_questions, i, parts), 'num_questions_per_type': None})
+    return [chunk for chunk in chunks if chunk['num_questions']]
+
+
+def _share(total: int, index: int, parts: int) -> int:
+    return (index + 1) * total // parts - index * total // parts
+
+
+def question_key(question: dict) -> str:
+    """Normalised question text: questions that differ only in case, spacing or punctuation are duplicates."""
+    return _NON_WORD_RE.sub(' ', str(question.get('question_text', ''))).strip().casefold()
+
+
+class QuestionDeduper:
+    """Remembers the questions accepted so far and filters repeats out of each new chunk."""
+
+    def __init__(self, questions: list = ()):
+        self.keys = {question_key(question) for question in questions}
+
+    def add(self, questions: list) -> list:
+        """The questions not seen before (also within ``questions``), which are now remembered."""
+        fresh = []
+        for question in questions:
+            key = question_key(question)
+            if key and key not in self.keys:
+                self.keys.add(key)
+                fresh.append(question)
+        return fresh
+
+
+def missing(chunk: dict, accepted: list) -> dict:
+    """
+    What a chunk still owes after de-duplication, in plan_chunks form (num_questions 0 when nothing).
+    For mixed chunks the shortfall is worked out per type.
+    """
+    if chunk['num_questions_per_type'] is None:
+        return {'num_questions': max(0, chunk['num_questions'] - len(accepted)), 'num_questions_per_type': None}
+    got = Counter(question.get('type') for question in accepted)
+    per_type = {t: max(0, chunk['num_questions_per_type'].get(t, 0) - got[t]) for t in QUESTION_TYPES}
+    return {'num_questions': sum(per_type.values()), 'num_questions_per_type': per_type}
+
+
+def batch_instructions(batch: int, existing: list, top_up: int = 0) -> str:
+    """
+    Extra prompt text for one batch of a large quiz: its number and a sample of questions to avoid.
+    ``top_up`` counts the repeats of a batch whose questions were duplicates, so each prompt differs.
+    """
+    label = f"batch {batch}" + (f" (retry {top_up})" if top_up else "")
+    lines = [
+        f"    This request is {label} of a larger question bank on the same topic. "
+        "Cover different aspects of the topic than a typical first batch would, and do not repeat any of these existing questions:",
+    ]
+    step = max(1, len(existing) // AVOID_SAMPLE)
+    lines.extend(f"    - {question.get('question_text', '')}" for question in existing[::step][:AVOID_SAMPLE])
+    return "\n".join(lines)
@@ -0,0 +1,371 @@
+"""
+Live classroom leaderboards.
+
+A teacher opens ``/quiz/<id>/classroom/`` and students take the quiz from the
+share link with ``?classroom=1``, which asks for a name. Each named attempt
+updates the quiz's ``Leaderboard`` in memory; the teacher page receives the
+ranking over Server-Sent Events, at most once per
+``CLASSROOM_PUSH_INTERVAL`` seconds however many attempts arrive meanwhile.
+
+Percentages are whole numbers, so the leaderboard keeps participants in 101
+buckets with a Fenwick tree of bucket sizes: recording an attempt and looking
+up a rank are O(log 101), and the top of the table is read from the highest
+buckets, never by sorting attempts. Each participant counts once, with their
+best attempt; equal percentages rank in order of arrival.
+
+``QuizAttempt`` rows (indexed on quiz, percentage and attempted_at) remain the
+durable source: a leaderboard is built from them on first use, and every
+named attempt bumps a version number in Django's cache, from which the other
+worker processes notice that they must read the new rows. With the default
+per-process cache only the process that records an attempt sees it, so run
+several workers only with a shared cache backend (see CACHES).
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpRequest, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render
+from django.urls import reverse
+
+from .models import Quiz, QuizAttempt
+
+BUCKETS = 101 # Whole percentages 0-100
+MAX_PARTICIPANT_LENGTH = 60
+HEARTBEAT_SECONDS = 15 # Comment lines keep idle connections from being closed by proxies
+_FIELDS = ('id', 'participant', 'score', 'total_questions', 'percentage', 'attempted_at')
+
+_stats = Counter()
+
+
+def clean_participant(name) -> str:
+    """The display name submitted with an attempt ('' when none): whitespace collapsed, length capped."""
+    return ' '.join(str(name or '').split())[:MAX_PARTICIPANT_LENGTH]
+
+
+class Leaderboard:
+    """Best attempt per participant on one quiz, ranked by percentage. Safe for concurrent use."""
+
+    def __init__(self, quiz_id: int):
+        self.quiz_id = quiz_id
+        self.version = 0 # Bumped on every change; streams push when it moved
+        self.shared_version = None # Last seen cache version (see sync)
+        self.synced_id = 0 # Every attempt up to this id has been applied
+        self._tree = [0] * (BUCKETS + 1) # Fenwick tree of bucket sizes
+        self._buckets = [{} for _ in range(BUCKETS)] # percentage -> {participant key: entry}, in arrival order
+        self._best = {} # participant key -> entry
+        self._applied = set() # Attempt ids above synced_id applied from this process
+        self._percentage_sum = 0
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._best)
+
+    def _adjust(self, bucket: int, delta: int):
+        i = bucket + 1
+        while i <= BUCKETS:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _count_up_to(self, bucket: int) -> int:
+        total, i = 0, bucket + 1
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _rank_of(self, bucket: int) -> int:
+        return len(self._best) - self._count_up_to(bucket) + 1 # 1 + participants with a higher percentage
+
+    def add(self, attempt: dict):
+        """
+        Records an attempt (a dict with the QuizAttempt fields in _FIELDS). Returns the participant's
+        rank, 1 for the best percentage, with equal percentages sharing a rank; None without a participant.
+        """
+        name = clean_participant(attempt.get('participant'))
+        if not name:
+            return None
+        key = name.casefold()
+        bucket = min(BUCKETS - 1, max(0, round(attempt['percentage'])))
+        with self._lock:
+            if attempt['id'] in self._applied or attempt['id'] <= self.synced_id:
+                current = self._best.get(key)
+                return self._rank_of(current['bucket']) if current else None
+            self._applied.add(attempt['id'])
+            current = self._best.get(key)
+            if current is not None:
+                if current['bucket'] >= bucket:
+                    return self._rank_of(current['bucket']) # Earlier attempt was at least as good
+                del self._buckets[current['bucket']][key]
+                self._adjust(current['bucket'], -1)
+                self._percentage_sum -= current['percentage']
+            entry = {
+                'bucket': bucket,
+                'participant': name,
+                'score': attempt['score'],
+                'total_questions': attempt['total_questions'],
+                'percentage': attempt['percentage'],
+                'attempted_at': attempt['attempted_at'].isoformat() if attempt.get('attempted_at') else None,
+            }
+            self._best[key] = entry
+            self._buckets[bucket][key] = entry
+            self._adjust(bucket, 1)
+            self._percentage_sum += entry['percentage']
+            self.version += 1
+            _stats['attempts'] += 1
+            return self._rank_of(bucket)
+
+    def rank(self, participant: str):
+        with self._lock:
+            entry = self._best.get(clean_participant(participant).casefold())
+            return self._rank_of(entry['bucket']) if entry else None
+
+    def top(self, limit: int) -> list:
+        """The leading ``limit`` participants, highest percentage first."""
+        leaders = []
+        with self._lock:
+            for bucket in range(BUCKETS - 1, -1, -1):
+                if len(leaders) >= limit:
+                    break
+                if self._buckets[bucket]:
+                    rank = self._rank_of(bucket)
+                    leaders.extend({'rank': rank, **{k: v for k, v in entry.items() if k != 'bucket'}}
+                                   for entry in list(self._buckets[bucket].values())[:limit - len(leaders)])
+        return leaders
+
+    def snapshot(self, limit: int) -> dict:
+        """JSON-ready leaderboard, built once per version however many viewers ask for it."""
+        version = self.version
+        cached = self._snapshots.get(limit)
+        if cached is not None and cached['version'] == version:
+            return cached
+        participants = len(self._best)
+        snapshot = {
+            'quiz_id': self.quiz_id,
+            'version': version,
+            'participants': participants,
+            'average_percentage': round(self._percentage_sum / participants, 1) if participants else None,
+            'leaders': self.top(limit),
+        }
+        self._snapshots[limit] = snapshot
+        _stats['snapshots'] += 1
+        return snapshot
+
+    def sync(self):
+        """Applies attempts recorded since the last sync, including those from other processes."""
+        rows = list(QuizAttempt.objects.filter(quiz_id=self.quiz_id, id__gt=self.synced_id)
+                    .exclude(participant='').order_by('id').values(*_FIELDS))
+        for row in rows:
+            self.add(row)
+        with self._lock:
+            if rows:
+                self.synced_id = max(self.synced_id, rows[-1]['id'])
+                self._applied = {attempt_id for attempt_id in self._applied if attempt_id > self.synced_id}
+        _stats['syncs'] += 1
+
+    def load(self):
+        """
+        Builds the leaderboard from the database, best first (the (quiz, -percentage, attempted_at) index), so the
+        first row seen for each participant is their best attempt and ties end up in order of attempt time.
+        """
+        rows = QuizAttempt.objects.filter(quiz_id=self.quiz_id).exclude(participant='') \
+            .order_by('-percentage', 'attempted_at').values(*_FIELDS)
+        synced_id = 0
+        for row in rows.iterator(chunk_size=2000):
+            self.add(row)
+            synced_id = max(synced_id, row['id'])
+        with self._lock:
+            self.synced_id = synced_id
+            self._applied.clear()
+
+
+# --- Process-wide leaderboards ---
+
+_boards = OrderedDict() # quiz id -> Leaderboard, least recently used first
+_boards_lock = threading.Lock()
+
+
+def _cache():
+    return caches[getattr(settings, 'CLASSROOM_CACHE', 'default')]
+
+
+def _version_key(quiz_id: int) -> str:
+    return f"classroom:{quiz_id}:version"
+
+
+def active_board(quiz_id: int):
+    """The quiz's leaderboard if this process already has one (no database access), else None."""
+    board = _boards.get(quiz_id)
+    if board is not None:
+        with _boards_lock:
+            if quiz_id in _boards:
+                _boards.move_to_end(quiz_id)
+    return board
+
+
+def get_board(quiz_id: int) -> Leaderboard:
+    """The quiz's leaderboard, built from the database on first use. Raises Quiz.DoesNotExist."""
+    board = active_board(quiz_id)
+    if board is not None:
+        return board
+    if not Quiz.objects.filter(pk=quiz_id).exists():
+        raise Quiz.DoesNotExist()
+    board = Leaderboard(quiz_id)
+    board.shared_version = _cache().get(_version_key(quiz_id)) # Before loading, so later attempts trigger a sync
+    board.load()
+    _stats['loads'] += 1
+    with _boards_lock:
+        board = _boards.setdefault(quiz_id, board) # Another request may have built it meanwhile
+        while len(_boards) > getattr(settings, 'CLASSROOM_MAX_BOARDS', 64):
+            _boards.popitem(last=False)
+    return board
+
+
+def catch_up(board: Leaderboard):
+    """Syncs the leaderboard if any process recorded an attempt since it last looked."""
+    shared_version = _cache().get(_version_key(board.quiz_id))
+    if shared_version != board.shared_version:
+        board.shared_version = shared_version
+        board.sync()
+
+
+def record_attempt(attempt: QuizAttempt):
+    """
+    Called after a named attempt is saved: updates this process's leaderboard and tells the other processes.
+    Returns (rank, participants).
+    """
+    cache = _cache()
+    if not cache.add(_version_key(attempt.quiz_id), 1, timeout=None):
+        try:
+            cache.incr(_version_key(attempt.quiz_id))
+        except ValueError: # Evicted between add and incr
+            cache.add(_version_key(attempt.quiz_id), 1, timeout=None)
+    board = get_board(attempt.quiz_id)
+    rank = board.add({field: getattr(attempt, field) for field in _FIELDS})
+    return rank, len(board)
+
+
+def standing(attempt: QuizAttempt):
+    """(rank, participants) for a named attempt recorded earlier, e.g. when a submission is replayed."""
+    board = get_board(attempt.quiz_id)
+    catch_up(board)
+    return board.rank(attempt.participant), len(board)
+
+
+def stats() -> dict:
+    """Per-process counters: attempts applied, leaderboards loaded, syncs, snapshots built and events pushed."""
+    return {name: _stats[name] for name in ('attempts', 'loads', 'syncs', 'snapshots', 'events')}
+
+
+def reset():
+    """Forgets every leaderboard and counter (tests)."""
+    with _boards_lock:
+        _boards.clear()
+    _stats.clear()
+
+
+# --- Server-Sent Events ---
+
+class _EventStream:
+    """
+    One viewer's stream. ``poll`` returns the next chunk to send: a leaderboard event when the ranking changed
+    since the last one, a heartbeat comment now and then, '' when there is nothing to send, or None when the
+    stream has run for CLASSROOM_STREAM_SECONDS (the browser then reconnects).
+    """
+
+    def __init__(self, board: Leaderboard, limit: int):
+        self.board = board
+        self.limit = limit
+        self.interval = getattr(settings, 'CLASSROOM_PUSH_INTERVAL', 1.0)
+        self.started = self.last_sent = time.monotonic()
+        self.sent_version = None
+
+    def poll(self):
+        now = time.monotonic()
+        if now - self.started >= getattr(settings, 'CLASSROOM_STREAM_SECONDS', 300):
+            return None
+        catch_up(self.board)
+        if self.board.version != self.sent_version:
+            # The first event also tells the browser how soon to reconnect once the stream ends.
+            retry = f"retry: {int(self.interval * 1000) + 1000}\n" if self.sent_version is None else ''
+            snapshot = self.board.snapshot(self.limit)
+            self.sent_version = snapshot['version']
+            self.last_sent = now
+            _stats['events'] += 1
+            return f"{retry}id: {snapshot['version']}\nevent: leaderboard\ndata: {json.dumps(snapshot)}\n\n"
+        if now - self.last_sent >= HEARTBEAT_SECONDS:
+            self.last_sent = now
+            return ": heartbeat\n\n"
+        return ''
+
+
+def _events(stream: _EventStream):
+    while (chunk := stream.poll()) is not None:
+        if chunk:
+            yield chunk
+        time.sleep(stream.interval)
+
+
+async def _aevents(stream: _EventStream):
+    # Under ASGI the wait must not hold a thread, so this cannot reuse _events through sync_to_async.
+    while (chunk := await sync_to_async(stream.poll)()) is not None:
+        if chunk:
+            yield chunk
+        await asyncio.sleep(stream.interval)
+
+
+def _leaderboard_size(request: HttpRequest) -> int:
+    default = getattr(settings, 'CLASSROOM_LEADERBOARD_SIZE', 20)
+    try:
+        return max(1, min(int(request.GET.get('limit', default)), 100))
+    except ValueError:
+        return default
+
+
+# --- Views ---
+
+def classroom_view(request: HttpRequest, quiz_id: int):
+    """GET /quiz/<id>/classroom/ - the teacher's live leaderboard page, with the link students join by."""
+    try:
+        quiz = Quiz.objects.only('id', 'topic', 'difficulty').get(pk=quiz_id)
+    except Quiz.DoesNotExist:
+        raise Http404("Quiz not found.")
+    join_url = request.build_absolute_uri(reverse('quiz:quiz_detail', args=[quiz.id])) + '?classroom=1'
+    return render(request, 'quiz/classroom.html', {'quiz': quiz, 'join_url': join_url})
+
+
+def leaderboard_view(request: HttpRequest, quiz_id: int) -> JsonResponse:
+    """GET /api/quiz/<id>/leaderboard?limit=<n> - the current leaderboard (for clients without EventSource)."""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid request method. Use GET.'}, status=405)
+    try:
+        board = get_board(quiz_id)
+    except Quiz.DoesNotExist:
+        return JsonResponse({'error': 'Quiz not found.'}, status=404)
+    catch_up(board)
+    response = JsonResponse(board.snapshot(_leaderboard_size(request)))
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def leaderboard_stream_view(request: HttpRequest, quiz_id: int):
+    """GET /api/quiz/<id>/leaderboard/stream?limit=<n> - the leaderboard as Server-Sent Events ('leaderboard' events)."""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid request method. Use GET.'}, status=405)
+    try:
+        board = get_board(quiz_id)
+    except Quiz.DoesNotExist:
+        return JsonResponse({'error': 'Quiz not found.'}, status=404)
+    stream = _EventStream(board, _leaderboard_size(request))
+    response = StreamingHttpResponse(_aevents(stream) if isinstance(request, ASGIRequest) else _events(stream),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no' # Stop nginx from buffering the events
+    return response
@@ -0,0 +1,76 @@
+"""
+Content-negotiated compression of HTML, JSON and other text responses.
+
+Takes the place of django.middleware.gzip.GZipMiddleware. Responses of at
+least ``COMPRESSION_MIN_SIZE`` bytes are sent brotli-encoded when the client
+accepts ``br`` and the optional ``brotli`` package is installed, and
+gzip-encoded otherwise. Like Django's middleware it pads gzip output with
+random bytes against BREACH-style length attacks, weakens strong ETags (the
+bytes on the wire now depend on the encoding) and adds ``Vary:
+Accept-Encoding``. Streaming responses and responses that already have a
+Content-Encoding (the precompressed files from quiz.assets) pass through
+untouched.
+"""
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError: # Optional: without it only gzip is offered
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+BROTLI_QUALITY = 5 # Dynamic responses: most of quality 11's ratio at a fraction of the CPU
+GZIP_MAX_RANDOM_BYTES = 100
+
+
+def _accepts(request, coding: str) -> bool:
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = part.strip().partition(';')
+        if name.strip().lower() == coding:
+            return params.strip().replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+def compress_response(request, response):
+    """Compresses ``response`` in place when it is worth it and the client accepts it."""
+    if response.streaming or response.has_header('Content-Encoding'):
+        return response
+    content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+    if not content_type.startswith(COMPRESSIBLE_TYPES):
+        return response
+    if len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+        return response
+    patch_vary_headers(response, ('Accept-Encoding',))
+
+    if brotli is not None and _accepts(request, 'br'):
+        encoding, compressed = 'br', brotli.compress(response.content, quality=BROTLI_QUALITY)
+    elif _accepts(request, 'gzip'):
+        encoding, compressed = 'gzip', compress_string(response.content, max_random_bytes=GZIP_MAX_RANDOM_BYTES)
+    else:
+        return response
+    if len(compressed) >= len(response.content):
+        return response
+
+    response.content = compressed
+    response['Content-Length'] = str(len(compressed))
+    response['Content-Encoding'] = encoding
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag # Django's If-None-Match comparison is weak, so 304s keep working
+    return response
+
+
+@sync_and_async_middleware
+def CompressionMiddleware(get_response):
+    """Applies compress_response to every response (see the module docstring)."""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            return compress_response(request, await get_response(request))
+    else:
+        def middleware(request):
+            return compress_response(request, get_response(request))
+    return middleware
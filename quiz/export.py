@@ -0,0 +1,198 @@
+"""
+Streaming JSONL/CSV export of quizzes and quiz attempts.
+
+Rows are read in keyset pages (``id > last_id ORDER BY id``), each page
+streamed through ``.iterator(chunk_size)``, so memory use does not depend on
+the table size and an interrupted export can be resumed by passing the last
+exported id as ``after_id``. Output can be gzip-compressed on the fly.
+
+Used by the staff-only ``/export/<dataset>.<format>`` endpoint and the
+``export_data`` management command.
+"""
+import csv
+import json
+import zlib
+from datetime import datetime, time as dt_time
+
+from asgiref.sync import sync_to_async
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpRequest, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Quiz, QuizAttempt
+
+FORMATS = ('jsonl', 'csv')
+DEFAULT_CHUNK_SIZE = 2000
+_GZIP_FLUSH_BYTES = 64 * 1024
+
+# dataset -> (model, date field, topic/difficulty lookup prefix, exported columns)
+DATASETS = {
+    'quizzes': (Quiz, 'created_at', '', (
+        'id', 'topic', 'difficulty', 'question_type', 'question_count', 'created_at', 'explanation', 'questions_data',
+    )),
+    'attempts': (QuizAttempt, 'attempted_at', 'quiz__', (
+        'id', 'quiz_id', 'score', 'total_questions', 'percentage', 'attempted_at', 'submitted_answers', 'results_data',
+    )),
+}
+_JSON_COLUMNS = {'questions_data', 'submitted_answers', 'results_data'}
+
+
+class ExportError(ValueError):
+    """Invalid export parameters."""
+
+
+def _parse_bound(value: str, end_of_day: bool):
+    """Accepts an ISO date or datetime; a bare date 'until' bound covers that whole day."""
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+        parsed = datetime.combine(day, dt_time.max if end_of_day else dt_time.min) if day else parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ExportError(f"Invalid date '{value}'. Use YYYY-MM-DD or an ISO datetime.")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def build_queryset(dataset: str, since: str = None, until: str = None, topic: str = None, difficulty: str = None):
+    """The filtered, id-ordered queryset for ``dataset`` (without keyset bounds)."""
+    if dataset not in DATASETS:
+        raise ExportError(f"Unknown dataset '{dataset}'. Expected one of {tuple(DATASETS)}.")
+    model, date_field, prefix, columns = DATASETS[dataset]
+    queryset = model.objects.order_by('id')
+    if model is Quiz:
+        queryset = queryset.exclude(prefetch_entry__isnull=False) # Unclaimed prefetch inventory nobody requested (quiz.prefetch)
+    since_bound, until_bound = _parse_bound(since, False), _parse_bound(until, True)
+    if since_bound:
+        queryset = queryset.filter(**{f"{date_field}__gte": since_bound})
+    if until_bound:
+        queryset = queryset.filter(**{f"{date_field}__lte": until_bound})
+    if topic:
+        queryset = queryset.filter(**{f"{prefix}topic__iexact": topic})
+    if difficulty:
+        queryset = queryset.filter(**{f"{prefix}difficulty": difficulty})
+    return queryset.values_list(*columns)
+
+
+def iter_rows(queryset, after_id: int = 0, limit: int = None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Yields value tuples in id order, one keyset page of ``chunk_size`` rows at a time."""
+    last_id = after_id or 0
+    remaining = limit
+    while remaining is None or remaining > 0:
+        page_size = chunk_size if remaining is None else min(chunk_size, remaining)
+        fetched = 0
+        for row in queryset.filter(id__gt=last_id)[:page_size].iterator(chunk_size=chunk_size):
+            fetched += 1
+            last_id = row[0]
+            yield row
+        if remaining is not None:
+            remaining -= fetched
+        if fetched < page_size:
+            return
+
+
+class _Echo:
+    """File-like object whose write() returns the written text (lets csv.writer produce strings)."""
+
+    def write(self, value):
+        return value
+
+
+def iter_encoded(dataset: str, rows, fmt: str):
+    """Encodes rows as JSONL or CSV text, one line per yielded string."""
+    columns = DATASETS[dataset][3]
+    if fmt == 'jsonl':
+        encoder = DjangoJSONEncoder(separators=(',', ':'))
+        for row in rows:
+            yield encoder.encode(dict(zip(columns, row))) + '\n'
+    elif fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(columns)
+        json_positions = [i for i, column in enumerate(columns) if column in _JSON_COLUMNS]
+        for row in rows:
+            row = list(row)
+            for i in json_positions:
+                row[i] = json.dumps(row[i], separators=(',', ':'))
+            for i, value in enumerate(row):
+                if isinstance(value, datetime):
+                    row[i] = value.isoformat()
+            yield writer.writerow(row)
+    else:
+        raise ExportError(f"Unknown format '{fmt}'. Expected one of {FORMATS}.")
+
+
+def iter_bytes(lines, compress: bool = False):
+    """UTF-8 encodes lines into ~64 KB chunks, gzip-compressing them on the fly if requested."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None # wbits=31: gzip container
+    buffer, size = [], 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= _GZIP_FLUSH_BYTES:
+            chunk = b''.join(buffer)
+            buffer, size = [], 0
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+    chunk = b''.join(buffer)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def export_chunks(dataset: str, fmt: str, compress: bool = False, after_id: int = 0, limit: int = None,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE, **filters):
+    """Byte chunks of the whole export; validates parameters before the first chunk is produced."""
+    queryset = build_queryset(dataset, **filters)
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown format '{fmt}'. Expected one of {FORMATS}.")
+    return iter_bytes(iter_encoded(dataset, iter_rows(queryset, after_id, limit, chunk_size), fmt), compress)
+
+
+async def _aiterate(chunks):
+    # Under ASGI, Django would buffer a synchronous iterator completely before sending it.
+    iterator = iter(chunks)
+    done = object()
+    while True:
+        chunk = await sync_to_async(next)(iterator, done)
+        if chunk is done:
+            return
+        yield chunk
+
+
+@staff_member_required
+def export_view(request: HttpRequest, dataset: str, fmt: str):
+    """
+    GET /export/<quizzes|attempts>.<jsonl|csv>?since=&until=&topic=&difficulty=&after_id=&limit=&gzip=1
+    Resume an interrupted download by passing the last exported id as after_id.
+    """
+    try:
+        after_id = int(request.GET.get('after_id') or 0)
+        limit = int(request.GET['limit']) if request.GET.get('limit') else None
+        compress = request.GET.get('gzip') in ('1', 'true', 'True')
+        chunks = export_chunks(
+            dataset, fmt, compress=compress, after_id=after_id, limit=limit,
+            since=request.GET.get('since'), until=request.GET.get('until'),
+            topic=request.GET.get('topic'), difficulty=request.GET.get('difficulty'),
+        )
+    except (ExportError, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    filename = f"quizify-{dataset}-{timezone.now().strftime('%Y%m%dT%H%M%S')}.{fmt}"
+    if compress:
+        content_type, filename = 'application/gzip', filename + '.gz'
+    else:
+        content_type = 'application/x-ndjson' if fmt == 'jsonl' else 'text/csv'
+    response = StreamingHttpResponse(_aiterate(chunks) if isinstance(request, ASGIRequest) else chunks,
+                                     content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'no-store'
+    return response
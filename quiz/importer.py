@@ -0,0 +1,141 @@
+"""
+Bulk import of externally authored question banks from JSONL.
+
+Each line is one quiz::
+
+    {"topic": "...", "difficulty": "Easy|Medium|Hard", "question_type": "mcq|fill|tf|mixed",
+     "explanation": "...", "questions": [{"question_text": ..., "type": ..., "difficulty": ..., "answer": ...}, ...]}
+
+``question_type`` may be omitted (it is inferred from the questions) and
+``questions_data`` is accepted in place of ``questions``, so files written by
+``export_data quizzes`` import as-is. Every record is checked with the same
+rules applied to Gemini output (``models.validate_generated_data``),
+deduplicated by ``quiz_content_hash`` within each batch and against the
+database, and inserted with ``bulk_create`` one chunk per transaction, so a
+repeat in a later batch is caught once the earlier copy is stored (in a dry
+run only repeats within a batch are). Bad lines are reported and skipped; they
+never abort the import. Memory stays bounded by the batch size: only the first
+``MAX_REPORTED_ERRORS`` errors are kept, the rest are only counted.
+"""
+import json
+from dataclasses import dataclass, field
+
+from django.db import transaction
+
+from .models import Quiz, quiz_content_hash, quiz_topic_key, validate_generated_data
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+_QUESTION_TYPES = ('mcq', 'fill', 'tf')
+_DIFFICULTIES = {value for value, _ in Quiz.DIFFICULTY_CHOICES}
+_TOPIC_MAX_LENGTH = Quiz._meta.get_field('topic').max_length
+
+
+@dataclass
+class ImportReport:
+    lines: int = 0
+    created: int = 0
+    questions: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    errors: list = field(default_factory=list) # (line number, message) of the first MAX_REPORTED_ERRORS invalid lines
+
+
+def parse_record(line: str) -> Quiz:
+    """Validates one JSONL line and returns the unsaved Quiz. Raises ValueError with a readable message."""
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if not isinstance(record, dict):
+        raise ValueError("Record must be a JSON object.")
+
+    topic = record.get('topic')
+    if not isinstance(topic, str) or not topic.strip():
+        raise ValueError("Missing 'topic'.")
+    topic = topic.strip()
+    if len(topic) > _TOPIC_MAX_LENGTH:
+        raise ValueError(f"'topic' is longer than {_TOPIC_MAX_LENGTH} characters.")
+    difficulty = record.get('difficulty')
+    if difficulty not in _DIFFICULTIES:
+        raise ValueError(f"Invalid 'difficulty' {difficulty!r}. Expected one of {sorted(_DIFFICULTIES)}.")
+
+    questions = record.get('questions', record.get('questions_data'))
+    if not isinstance(questions, list) or not questions:
+        raise ValueError("'questions' must be a non-empty list.")
+    if not all(isinstance(q, dict) for q in questions):
+        raise ValueError("Every question must be a JSON object.")
+    question_type = record.get('question_type')
+    if question_type is None:
+        types = {q.get('type') for q in questions}
+        question_type = types.pop() if len(types) == 1 else 'mixed'
+
+    generated_data = {'explanation': record.get('explanation'), 'questions': questions}
+    if generated_data['explanation'] is None and 'explanation' in record:
+        generated_data['explanation'] = '' # Exported quizzes may have a null explanation
+    if question_type == 'mixed':
+        # The file is the source of truth for the mix; only the question types themselves are checked.
+        per_type = {q_type: sum(q.get('type') == q_type for q in questions) for q_type in _QUESTION_TYPES}
+    elif question_type in _QUESTION_TYPES:
+        per_type = None
+    else:
+        raise ValueError(f"Invalid 'question_type' {question_type!r}.")
+    validate_generated_data(generated_data, question_type, per_type, len(questions))
+
+    return Quiz(
+        topic=topic,
+        difficulty=difficulty,
+        question_type=question_type,
+        explanation=generated_data['explanation'],
+        questions_data=questions,
+        # bulk_create() bypasses Quiz.save(), so the derived fields are filled in here.
+        question_count=len(questions),
+        content_hash=quiz_content_hash(topic, questions),
+        topic_key=quiz_topic_key(topic),
+    )
+
+
+def import_quizzes(lines, batch_size: int = DEFAULT_BATCH_SIZE, dry_run: bool = False, progress=None) -> ImportReport:
+    """
+    Imports quizzes from an iterable of JSONL lines. ``progress(report)`` is
+    called after every batch. With ``dry_run`` nothing is written.
+    """
+    report = ImportReport()
+    batch = {} # content_hash -> Quiz; repeats within the batch are dropped on arrival
+
+    def flush():
+        hashes = list(batch)
+        existing = set()
+        for start in range(0, len(hashes), 500): # Stay well below SQLite's bound-parameter limit
+            existing.update(Quiz.objects.filter(content_hash__in=hashes[start:start + 500]).values_list('content_hash', flat=True))
+        new = [quiz for content_hash, quiz in batch.items() if content_hash not in existing]
+        report.duplicates += len(batch) - len(new)
+        if new and not dry_run:
+            with transaction.atomic():
+                Quiz.objects.bulk_create(new, batch_size=batch_size)
+        report.created += len(new)
+        report.questions += sum(quiz.question_count for quiz in new)
+        batch.clear()
+        if progress:
+            progress(report)
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        report.lines += 1
+        try:
+            quiz = parse_record(line)
+        except (ValueError, TypeError) as e: # TypeError: wrongly typed values inside a question
+            report.invalid += 1
+            if len(report.errors) < MAX_REPORTED_ERRORS:
+                report.errors.append((line_number, str(e)))
+            continue
+        if quiz.content_hash in batch:
+            report.duplicates += 1
+            continue
+        batch[quiz.content_hash] = quiz
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return report
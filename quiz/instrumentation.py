@@ -0,0 +1,322 @@
+"""
+Lightweight request-stage instrumentation for Quizify.
+
+Views wrap interesting stages in ``span('name')``; the middleware collects the
+spans of the current request, emits them as a ``Server-Timing`` header plus a
+structured JSON log line, and feeds process-wide histograms that are exposed in
+Prometheus text format by ``metrics_view``.
+
+Everything is switched off unless ``settings.INSTRUMENTATION_ENABLED`` is true.
+While off, ``span`` returns a shared no-op context manager and the middleware
+passes requests straight through, so the cost is one attribute lookup.
+"""
+import bisect
+import contextvars
+import hmac
+import json
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpRequest, HttpResponse
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger('quiz.instrumentation')
+
+# Upper bounds (seconds) shared by every latency histogram. LLM calls dominate the tail, hence the long end.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def is_enabled() -> bool:
+    return getattr(settings, 'INSTRUMENTATION_ENABLED', False)
+
+
+# --- Metric primitives ---
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            label_str = _format_labels(self.label_names, labels)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, series):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label_str}{"," if label_str else ""}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label_str}{"," if label_str else ""}le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{label_str}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{label_str}}} {series[-1]}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for labels, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{{{_format_labels(self.label_names, labels)}}} {value}")
+        return lines
+
+
+class Gauge:
+    """Last-set value keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, labels: tuple, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for labels, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{{{_format_labels(self.label_names, labels)}}} {value}")
+        return lines
+
+
+def _format_labels(label_names: tuple, labels: tuple) -> str:
+    return ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(label_names, labels))
+
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+VIEW_LATENCY = Histogram('quizify_view_duration_seconds', 'Wall time spent handling a request, per view.', ('view', 'method', 'status'))
+STAGE_LATENCY = Histogram('quizify_stage_duration_seconds', 'Wall time spent in an instrumented stage, per view and stage.', ('view', 'stage'))
+DB_QUERIES = Counter('quizify_db_queries_total', 'Database queries executed, per view.', ('view',))
+LLM_CALLS = Counter('quizify_llm_calls_total', 'Calls made to the generation provider, by outcome.', ('model', 'outcome'))
+PREFETCH_EVENTS = Counter('quizify_prefetch_total', 'Prefetcher events: hit, miss, generated, failed, wasted.', ('outcome',))
+RATE_LIMITED = Counter('quizify_rate_limited_total', 'Requests rejected with 429 by the rate limiter, per budget.', ('budget',))
+BREAKER_STATE = Gauge('quizify_llm_breaker_state', 'Generation circuit breaker state: 0 closed, 1 half-open, 2 open.', ())
+ADMISSION_DECISIONS = Counter('quizify_admission_total', 'Generation requests by admission outcome: admitted, probe, fallback, shed.', ('outcome',))
+
+REGISTRY = [VIEW_LATENCY, STAGE_LATENCY, DB_QUERIES, LLM_CALLS, PREFETCH_EVENTS, RATE_LIMITED, BREAKER_STATE, ADMISSION_DECISIONS]
+
+
+# --- Per-request span collection ---
+
+class RequestTimings:
+    """Spans and query counts gathered while a single request is handled."""
+
+    def __init__(self):
+        self.spans = []  # (name, seconds) in completion order
+        self.db_queries = 0
+        self.db_time = 0.0
+
+    def add(self, name: str, seconds: float):
+        self.spans.append((name, seconds))
+
+
+_current_timings = contextvars.ContextVar('quizify_request_timings', default=None)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ('name', 'timings', 'start')
+
+    def __init__(self, name: str, timings: RequestTimings):
+        self.name = name
+        self.timings = timings
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.timings.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def span(name: str):
+    """
+    Times the enclosed block as a named stage of the current request.
+    Outside an instrumented request (or when disabled) this is a no-op.
+    """
+    timings = _current_timings.get()
+    if timings is None:
+        return _NOOP_SPAN
+    return _Span(name, timings)
+
+
+def record_llm_call(model: str, outcome: str):
+    if is_enabled():
+        LLM_CALLS.inc((model, outcome))
+
+
+# --- Middleware & metrics endpoint ---
+
+def _count_query(execute, sql, params, many, context):
+    """Execute wrapper on every connection: counts the query against the current request, if it is instrumented."""
+    timings = _current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db_queries += 1
+        timings.db_time += time.perf_counter() - start
+
+
+def _install_query_counter(connection, **kwargs):
+    # Connections are per thread, and under ASGI the queries run in sync_to_async threads (which inherit the
+    # request's context), so the wrapper goes on each connection rather than around the request.
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+connection_created.connect(_install_query_counter)
+
+
+def _record_request(request: HttpRequest, response: HttpResponse, timings: RequestTimings, total: float) -> HttpResponse:
+    match = getattr(request, 'resolver_match', None)
+    view_name = match.view_name if match else 'unresolved'
+
+    VIEW_LATENCY.observe((view_name, request.method, str(response.status_code)), total)
+    DB_QUERIES.inc((view_name,), timings.db_queries)
+    for stage, seconds in timings.spans:
+        STAGE_LATENCY.observe((view_name, stage), seconds)
+
+    server_timing = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.spans]
+    server_timing.append(f"db;desc=\"{timings.db_queries} queries\";dur={timings.db_time * 1000:.1f}")
+    server_timing.append(f"total;dur={total * 1000:.1f}")
+    response['Server-Timing'] = ", ".join(server_timing)
+
+    logger.info(json.dumps({
+        'event': 'request',
+        'method': request.method,
+        'path': request.path,
+        'view': view_name,
+        'status': response.status_code,
+        'duration_ms': round(total * 1000, 2),
+        'db_queries': timings.db_queries,
+        'db_ms': round(timings.db_time * 1000, 2),
+        'stages_ms': {stage: round(seconds * 1000, 2) for stage, seconds in timings.spans},
+    }))
+    return response
+
+
+@sync_and_async_middleware
+def InstrumentationMiddleware(get_response):
+    """
+    Collects spans and DB query counts for each request, then adds a
+    ``Server-Timing`` header, logs one JSON line and updates the histograms.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            if not is_enabled():
+                return await get_response(request)
+            timings = RequestTimings()
+            token = _current_timings.set(timings)
+            start = time.perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                _current_timings.reset(token)
+            return _record_request(request, response, timings, time.perf_counter() - start)
+    else:
+        def middleware(request):
+            if not is_enabled():
+                return get_response(request)
+            _install_query_counter(connection) # In case it was opened before this module was imported
+            timings = RequestTimings()
+            token = _current_timings.set(timings)
+            start = time.perf_counter()
+            try:
+                response = get_response(request)
+            finally:
+                _current_timings.reset(token)
+            return _record_request(request, response, timings, time.perf_counter() - start)
+    return middleware
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _metrics_response(request: HttpRequest) -> HttpResponse:
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+_staff_metrics_response = staff_member_required(_metrics_response)
+
+
+def _has_metrics_token(request: HttpRequest) -> bool:
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    return bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}")
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """
+    Prometheus text exposition of the process-local metrics, for staff users or scrapers sending
+    ``Authorization: Bearer <METRICS_TOKEN>``.
+    """
+    if not is_enabled():
+        raise Http404("Instrumentation is disabled.")
+    if _has_metrics_token(request):
+        return _metrics_response(request)
+    return _staff_metrics_response(request)
@@ -0,0 +1,177 @@
+"""
+Per-question timing reported by the quiz page.
+
+script.js measures how long each question card is on screen and buffers the
+measurements, sending them in batches with ``navigator.sendBeacon`` (when the
+buffer fills, when the quiz is submitted and when the page is hidden), so
+timing costs one request per batch rather than one per question.
+``question_events_view`` validates a batch and queues its rows without
+touching the database; a daemon writer thread stores them with bulk inserts
+as ``QuestionTiming`` rows, like generation telemetry (quiz.telemetry). The
+queue is bounded: when the writer falls behind, batches are dropped rather
+than slowing requests down.
+
+``timing_stats`` aggregates the rows into per-question dwell times; see the
+``question_timing`` management command.
+"""
+import json
+import queue
+import re
+import threading
+from collections import Counter, defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count, Q, Sum
+from django.http import HttpRequest, HttpResponse, JsonResponse
+
+from .models import Quiz, QuestionTiming
+
+MAX_BODY_BYTES = 32 * 1024
+MAX_EVENTS = 200 # Per batch
+MAX_QUESTION_INDEX = 10000
+MAX_DWELL_MS = 60 * 60 * 1000 # Longer stays are the tab left open, not time spent on the question
+_BATCH_SIZE = 2000 # Rows per bulk insert
+_CLIENT_RE = re.compile(r'[A-Za-z0-9_-]{1,32}')
+
+_queue = queue.Queue(maxsize=1000) # Batches, not rows
+_writer = None
+_writer_lock = threading.Lock()
+_stats = Counter()
+
+
+def parse_batch(payload: dict) -> list:
+    """
+    Unsaved QuestionTiming rows for a batch: {"quiz_id": 1, "client": "k3j9x", "events": [[question index,
+    milliseconds, answered 0/1], ...]}. Raises ValueError for a malformed batch; malformed events are skipped.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("Expected a JSON object.")
+    quiz_id, client, events = payload.get('quiz_id'), payload.get('client'), payload.get('events')
+    if not isinstance(quiz_id, int) or isinstance(quiz_id, bool) or quiz_id < 1:
+        raise ValueError("Invalid quiz_id.")
+    if not isinstance(client, str) or not _CLIENT_RE.fullmatch(client):
+        raise ValueError("Invalid client.")
+    if not isinstance(events, list) or not 0 < len(events) <= MAX_EVENTS:
+        raise ValueError(f"Expected 1 to {MAX_EVENTS} events.")
+    rows = []
+    for event in events:
+        if (isinstance(event, list) and len(event) == 3 and all(type(value) is int for value in event)
+                and 0 <= event[0] < MAX_QUESTION_INDEX and 0 <= event[1] <= MAX_DWELL_MS and event[2] in (0, 1)):
+            rows.append(QuestionTiming(quiz_id=quiz_id, client=client, question_index=event[0], dwell_ms=event[1], answered=bool(event[2])))
+    _stats['rejected'] += len(events) - len(rows)
+    return rows
+
+
+def record_timings(rows: list):
+    """Stores ``rows`` in the background (or inline when QUESTION_TIMING_ASYNC is off)."""
+    if not rows:
+        return
+    if not getattr(settings, 'QUESTION_TIMING_ASYNC', True):
+        _write(rows)
+        return
+    _ensure_writer()
+    try:
+        _queue.put_nowait(rows)
+    except queue.Full:
+        _stats['dropped'] += len(rows) # Best-effort, like generation telemetry
+
+
+def flush():
+    """Blocks until every queued row has been written."""
+    if _writer is not None:
+        _queue.join()
+
+
+def stats() -> dict:
+    """Per-process counters: events accepted, stored, rejected as malformed or for unknown quizzes, and dropped."""
+    return {name: _stats[name] for name in ('accepted', 'stored', 'rejected', 'dropped')}
+
+
+def _write(rows: list):
+    known = set(Quiz.objects.filter(pk__in={row.quiz_id for row in rows}).values_list('pk', flat=True))
+    valid = [row for row in rows if row.quiz_id in known]
+    QuestionTiming.objects.bulk_create(valid, batch_size=_BATCH_SIZE)
+    _stats['stored'] += len(valid)
+    _stats['rejected'] += len(rows) - len(valid)
+
+
+def _ensure_writer():
+    global _writer
+    if _writer is not None and _writer.is_alive():
+        return
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_drain_forever, name='quizify-timing-writer', daemon=True)
+            _writer.start()
+
+
+def _drain_forever():
+    while True:
+        batches = [_queue.get()]
+        rows = list(batches[0])
+        while len(rows) < _BATCH_SIZE:
+            try:
+                batches.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+            rows.extend(batches[-1])
+        try:
+            close_old_connections()
+            _write(rows)
+        except Exception as e:
+            print(f"Error writing {len(rows)} question timing rows: {e}")
+        finally:
+            for _ in batches:
+                _queue.task_done()
+
+
+def timing_stats(quiz_id: int) -> list:
+    """
+    Per-question dwell times for a quiz: one entry per question index with the number of visitors, how many
+    answered it, and the mean, median and 90th percentile of the time each visitor spent on it in total.
+    """
+    per_visitor = QuestionTiming.objects.filter(quiz_id=quiz_id).values('question_index', 'client').annotate(
+        total_ms=Sum('dwell_ms'), answered_events=Count('id', filter=Q(answered=True)))
+    totals, answered = defaultdict(list), Counter()
+    for row in per_visitor:
+        totals[row['question_index']].append(row['total_ms'])
+        answered[row['question_index']] += row['answered_events'] > 0
+    stats = []
+    for question_index in sorted(totals):
+        values = sorted(totals[question_index])
+        stats.append({
+            'question_index': question_index,
+            'visitors': len(values),
+            'answered': answered[question_index],
+            'mean_ms': round(sum(values) / len(values)),
+            'p50_ms': values[(len(values) - 1) // 2],
+            'p90_ms': values[min(len(values) - 1, int(0.9 * len(values)))],
+        })
+    return stats
+
+
+async def question_events_view(request: HttpRequest) -> HttpResponse:
+    """
+    POST /api/events - a batch of question timings from navigator.sendBeacon (see parse_batch). Beacons cannot
+    carry a CSRF token, so the view is exempt; it only ever appends timing rows. Answers 204 No Content.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method. Use POST.'}, status=405)
+    if len(request.body) > MAX_BODY_BYTES:
+        return JsonResponse({'error': 'Batch too large.'}, status=413)
+    try:
+        rows = parse_batch(json.loads(request.body))
+    except ValueError as e: # Includes json.JSONDecodeError
+        return JsonResponse({'error': str(e)}, status=400)
+    if getattr(settings, 'QUESTION_TIMING_ENABLED', True):
+        _stats['accepted'] += len(rows)
+        if getattr(settings, 'QUESTION_TIMING_ASYNC', True):
+            record_timings(rows)
+        else:
+            await sync_to_async(record_timings)(rows)
+    return HttpResponse(status=204)
+
+
+question_events_view.csrf_exempt = True # csrf_exempt() would wrap the coroutine function in a sync one (Django < 5.0)
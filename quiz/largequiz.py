@@ -0,0 +1,204 @@
+"""
+Large quizzes: more questions than one prompt can reliably return (up to
+``LARGE_QUIZ_MAX_QUESTIONS``), generated in chunks.
+
+``index`` splits the request with quiz.chunking.plan_chunks, generates the
+first chunk itself (with the explanation, as for any quiz) and stores the quiz
+with ``questions_pending`` set to the rest. ``schedule_chunks`` hands the other
+chunks to a thread pool that runs ``LARGE_QUIZ_CONCURRENCY`` question-only
+batches at a time, each through the admission controller. Every batch is
+de-duplicated against the questions stored so far and appended as soon as it
+arrives, so the quiz grows while it is being taken. Questions dropped as
+duplicates are asked for again, at most ``LARGE_QUIZ_TOP_UPS`` times per
+chunk; a batch that fails or runs out of top-ups just makes the quiz smaller.
+
+Pages show ``LARGE_QUIZ_WINDOW`` questions at a time and script.js loads the
+next window from ``/api/quiz/<id>/questions`` as the student gets near the end
+of the loaded ones. A quiz whose generation was cut short (for instance by a
+restart) stops counting as generating ``LARGE_QUIZ_TIMEOUT`` seconds after it
+was created.
+
+The thread pool and the append lock are per process, so the chunks of a quiz
+are always generated by the process that created it.
+"""
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .admission import admission_enabled, get_controller
+from .chunking import QuestionDeduper, batch_instructions, missing
+from .models import Quiz, quiz_content_hash
+from .prefetch import live_generation
+from .telemetry import record_generation_run
+
+SINGLE_PROMPT_MAX_QUESTIONS = 20
+ADMISSION_ATTEMPTS = 10 # A batch waits at most this many Retry-After periods for a generation slot
+
+_executor = None
+_executor_lock = threading.Lock()
+_append_lock = threading.Lock()
+_stats = Counter() # batches, failed, duplicates, top_ups
+
+
+def large_quiz_enabled() -> bool:
+    return getattr(settings, 'LARGE_QUIZ_ENABLED', True)
+
+
+def max_questions() -> int:
+    """The most questions a generation request may ask for."""
+    if large_quiz_enabled():
+        return getattr(settings, 'LARGE_QUIZ_MAX_QUESTIONS', 500)
+    return SINGLE_PROMPT_MAX_QUESTIONS
+
+
+def chunk_size() -> int:
+    return getattr(settings, 'LARGE_QUIZ_CHUNK_SIZE', SINGLE_PROMPT_MAX_QUESTIONS)
+
+
+def window_size() -> int:
+    return getattr(settings, 'LARGE_QUIZ_WINDOW', 20)
+
+
+def still_generating(quiz: Quiz) -> bool:
+    if not quiz.questions_pending:
+        return False
+    return quiz.created_at > timezone.now() - timedelta(seconds=getattr(settings, 'LARGE_QUIZ_TIMEOUT', 900))
+
+
+def expected_questions(quiz: Quiz) -> int:
+    """Questions the quiz has now plus those still being generated."""
+    return quiz.question_count + (quiz.questions_pending if still_generating(quiz) else 0)
+
+
+def is_windowed(quiz: Quiz) -> bool:
+    """Whether the quiz is longer than one window, so pages load it in windows and accept partial submissions."""
+    return expected_questions(quiz) > window_size()
+
+
+def stats() -> dict:
+    """Batches generated, failed, duplicate questions dropped and top-up batches, in this process."""
+    return {outcome: _stats[outcome] for outcome in ('batches', 'failed', 'duplicates', 'top_ups')}
+
+
+# --- Storage ---
+
+def append_questions(quiz_id: int, chunk: dict, questions: list) -> dict:
+    """
+    Appends the questions of ``chunk`` that are not duplicates to the stored quiz.
+    Returns what the chunk still owes (quiz.chunking.missing); that much stays pending.
+    """
+    with _append_lock, transaction.atomic():
+        # Write first: on SQLite a transaction that reads and then writes fails with "database is locked" when another
+        # connection writes in between, instead of waiting for it; a leading write takes the lock up front.
+        Quiz.objects.filter(pk=quiz_id).update(questions_pending=F('questions_pending'))
+        quiz = Quiz.objects.only('topic', 'questions_data', 'questions_pending').get(pk=quiz_id)
+        stored = quiz.get_questions()
+        fresh = QuestionDeduper(stored).add(questions)
+        stored.extend(fresh)
+        Quiz.objects.filter(pk=quiz_id).update(
+            questions_data=stored,
+            question_count=len(stored),
+            content_hash=quiz_content_hash(quiz.topic, stored),
+            questions_pending=max(0, quiz.questions_pending - len(fresh)),
+        )
+    _stats['duplicates'] += len(questions) - len(fresh)
+    return missing(chunk, fresh)
+
+
+def _give_up(quiz_id: int, count: int):
+    """Stops waiting for ``count`` questions that will not be generated."""
+    Quiz.objects.filter(pk=quiz_id).update(questions_pending=Greatest(F('questions_pending') - count, 0))
+
+
+# --- Generation ---
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=getattr(settings, 'LARGE_QUIZ_CONCURRENCY', 4),
+                                               thread_name_prefix='quizify-large-quiz')
+    return _executor
+
+
+def _submit(*job):
+    if getattr(settings, 'LARGE_QUIZ_BACKGROUND', True):
+        _get_executor().submit(_run_background_batch, *job)
+    else:
+        _run_batch(*job)
+
+
+def _run_background_batch(*job):
+    try:
+        close_old_connections()
+        _run_batch(*job)
+    finally:
+        close_old_connections()
+
+
+def schedule_chunks(quiz: Quiz, chunks: list):
+    """
+    Starts generating the remaining chunks of a large quiz (all but the first, which the caller
+    generated). With LARGE_QUIZ_BACKGROUND off they are generated one after another before this returns.
+    """
+    for batch, chunk in enumerate(chunks, start=2):
+        _submit(quiz.id, quiz.topic, quiz.question_type, quiz.difficulty, chunk, batch, 0)
+
+
+def _admit():
+    """A generation slot from the admission controller, waiting while the provider is overloaded; None when admission control is off."""
+    if not admission_enabled():
+        return None
+    for _ in range(ADMISSION_ATTEMPTS):
+        decision = get_controller().try_admit()
+        if decision.admitted:
+            return decision
+        time.sleep(min(max(decision.retry_after, 1), 30))
+    raise RuntimeError("no generation slot became available")
+
+
+def _run_batch(quiz_id: int, topic: str, question_type: str, difficulty: str, chunk: dict, batch: int, top_up: int):
+    from .views import generate_quiz_content # views imports this module
+
+    try:
+        existing = Quiz.objects.filter(pk=quiz_id).values_list('questions_data', flat=True).first()
+        if existing is None:
+            return # Quiz deleted meanwhile
+        decision = _admit()
+        try:
+            with live_generation():
+                quiz_data = generate_quiz_content(
+                    topic, question_type, difficulty,
+                    num_questions=chunk['num_questions'],
+                    num_questions_per_type=chunk['num_questions_per_type'],
+                    lazy_explanation=True,
+                    extra_instructions=batch_instructions(batch, existing, top_up),
+                )
+        finally:
+            if decision is not None:
+                get_controller().release(decision)
+        _stats['batches'] += 1
+        owed = append_questions(quiz_id, chunk, quiz_data['questions'])
+        generation_run = quiz_data['generation_run']
+        generation_run.quiz_id = quiz_id
+        generation_run.retry_count = top_up # Top-ups re-request the questions an earlier call failed to deliver
+        record_generation_run(generation_run)
+
+        if owed['num_questions'] and top_up < getattr(settings, 'LARGE_QUIZ_TOP_UPS', 2):
+            _stats['top_ups'] += 1
+            _submit(quiz_id, topic, question_type, difficulty, owed, batch, top_up + 1)
+        elif owed['num_questions']:
+            _give_up(quiz_id, owed['num_questions'])
+    except Exception as e:
+        print(f"Large quiz {quiz_id}: batch {batch} failed: {e}")
+        _stats['failed'] += 1
+        _give_up(quiz_id, chunk['num_questions'])
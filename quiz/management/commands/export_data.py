@@ -0,0 +1,53 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.export import DATASETS, DEFAULT_CHUNK_SIZE, FORMATS, ExportError, build_queryset, iter_bytes, iter_encoded, iter_rows
+
+
+class Command(BaseCommand):
+    help = "Streams quizzes or quiz attempts to a JSONL/CSV file (optionally gzipped) in constant memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(DATASETS))
+        parser.add_argument('--format', dest='fmt', choices=FORMATS, default='jsonl')
+        parser.add_argument('--output', '-o', default='-', help="Output file (default: stdout)")
+        parser.add_argument('--gzip', action='store_true', help="Compress the output with gzip")
+        parser.add_argument('--since', help="Only rows created on/after this date (YYYY-MM-DD or ISO datetime)")
+        parser.add_argument('--until', help="Only rows created on/before this date")
+        parser.add_argument('--topic', help="Exact topic (case-insensitive)")
+        parser.add_argument('--difficulty', choices=['Easy', 'Medium', 'Hard'])
+        parser.add_argument('--after-id', type=int, default=0, help="Resume after this id (printed at the end of every run)")
+        parser.add_argument('--limit', type=int, default=None)
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            queryset = build_queryset(options['dataset'], options['since'], options['until'], options['topic'], options['difficulty'])
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        exported = 0
+        last_id = options['after_id']
+
+        def tracked(rows):
+            nonlocal exported, last_id
+            for row in rows:
+                exported += 1
+                last_id = row[0]
+                yield row
+
+        rows = tracked(iter_rows(queryset, options['after_id'], options['limit'], options['chunk_size']))
+        chunks = iter_bytes(iter_encoded(options['dataset'], rows, options['fmt']), options['gzip'])
+        started = time.perf_counter()
+        output = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+            # Report on stderr so it never mixes with data written to stdout.
+            self.stderr.write(f"Exported {exported} {options['dataset']} in {time.perf_counter() - started:.2f}s; "
+                              f"last id {last_id} (resume with --after-id {last_id}).")
@@ -0,0 +1,53 @@
+import gzip
+import io
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.importer import DEFAULT_BATCH_SIZE, import_quizzes
+
+
+class Command(BaseCommand):
+    help = "Bulk-imports quizzes from a JSONL file (optionally gzipped), skipping invalid lines and duplicates."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="JSONL file, .jsonl.gz, or - for stdin")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Quizzes per transaction")
+        parser.add_argument('--dry-run', action='store_true', help="Validate and deduplicate without writing")
+        parser.add_argument('--show-errors', type=int, default=50, help="Print at most this many line errors")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            if path == '-':
+                source = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+            elif path.endswith('.gz'):
+                source = gzip.open(path, 'rt', encoding='utf-8')
+            else:
+                source = open(path, encoding='utf-8')
+        except OSError as e:
+            raise CommandError(str(e))
+
+        started = time.perf_counter()
+
+        def progress(report):
+            elapsed = time.perf_counter() - started
+            self.stderr.write(f"  {report.lines} lines, {report.created} created, {report.duplicates} duplicates, "
+                              f"{report.invalid} errors ({report.questions / elapsed * 60:,.0f} questions/min)")
+
+        with source:
+            report = import_quizzes(source, options['batch_size'], options['dry_run'],
+                                    progress if options['verbosity'] > 1 else None)
+        elapsed = time.perf_counter() - started
+
+        for line_number, message in report.errors[:options['show_errors']]:
+            self.stderr.write(f"Line {line_number}: {message}")
+        shown = min(len(report.errors), options['show_errors'])
+        if report.invalid > shown:
+            self.stderr.write(f"... and {report.invalid - shown} more errors.")
+        verb = "Would create" if options['dry_run'] else "Created"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {report.created} quizzes ({report.questions} questions) from {report.lines} lines in {elapsed:.2f}s; "
+            f"{report.duplicates} duplicates skipped, {report.invalid} invalid lines."
+        ))
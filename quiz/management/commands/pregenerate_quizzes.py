@@ -0,0 +1,62 @@
+import os
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz import telemetry
+from quiz.models import PregenerationTask, Quiz
+from quiz.pregenerate import plan_batch, read_topics, run_batch
+
+
+class Command(BaseCommand):
+    help = ("Generates quizzes ahead of time for a topic x difficulty x question type matrix. "
+            "Progress is checkpointed per cell, so rerunning the same --batch resumes it.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', required=True, help="Batch name; rerun with the same name to resume")
+        parser.add_argument('--topics', help="Text file with one topic per line (adds missing cells to the batch)")
+        parser.add_argument('--difficulties', nargs='+', default=['Easy', 'Medium', 'Hard'],
+                            choices=[value for value, _ in Quiz.DIFFICULTY_CHOICES])
+        parser.add_argument('--types', nargs='+', default=['mcq'], choices=['mcq', 'fill', 'tf'])
+        parser.add_argument('--num-questions', type=int, default=5)
+        parser.add_argument('--concurrency', type=int, default=4, help="Gemini calls in flight at once")
+        parser.add_argument('--rate', type=float, default=None, help="Maximum generations started per minute")
+        parser.add_argument('--max-attempts', type=int, default=3, help="Attempts per cell before it is marked failed")
+        parser.add_argument('--skip-failed', action='store_true', help="Do not retry cells that failed in earlier runs")
+        parser.add_argument('--report-every', type=float, default=10.0, help="Seconds between progress lines")
+
+    def handle(self, *args, **options):
+        if not 1 <= options['num_questions'] <= 20:
+            raise CommandError("--num-questions must be between 1 and 20.")
+        if not settings.GOOGLE_API_KEY and getattr(settings, 'GENAI_REPLAY_MODE', 'off') != 'replay':
+            raise CommandError("GOOGLE_GENAI_API_KEY is not configured.")
+
+        batch = options['batch']
+        if options['topics']:
+            if not os.path.exists(options['topics']):
+                raise CommandError(f"Topics file '{options['topics']}' does not exist.")
+            with open(options['topics'], encoding='utf-8') as f:
+                topics = read_topics(f)
+            total = plan_batch(batch, topics, options['difficulties'], options['types'], options['num_questions'])
+            self.stdout.write(f"Batch '{batch}': {len(topics)} topics, {total} cells.")
+        elif not PregenerationTask.objects.filter(batch=batch).exists():
+            raise CommandError(f"Batch '{batch}' does not exist; pass --topics to create it.")
+
+        # async_to_sync runs the ORM calls made through sync_to_async back on this thread and its connection.
+        progress = async_to_sync(run_batch)(
+            batch, options['concurrency'], options['rate'], options['max_attempts'],
+            retry_failed=not options['skip_failed'],
+            report=self._report, report_every=options['report_every'],
+        )
+        telemetry.flush()
+
+        for message, count in progress.errors.most_common(5):
+            self.stderr.write(f"{count} x {message}")
+        remaining = PregenerationTask.objects.filter(batch=batch).exclude(status='done').count()
+        style = self.style.SUCCESS if remaining == 0 else self.style.WARNING
+        self.stdout.write(style(f"Batch '{batch}': {progress.done} generated this run, {remaining} cells not done."))
+
+    def _report(self, progress):
+        self.stdout.write(f"  {progress.summary()}")
+        self.stdout.flush()
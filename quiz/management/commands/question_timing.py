@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.interactions import timing_stats
+from quiz.models import Quiz
+
+
+class Command(BaseCommand):
+    help = "Prints per-question dwell times for a quiz, from the timings reported by the quiz page."
+
+    def add_arguments(self, parser):
+        parser.add_argument('quiz_id', type=int)
+        parser.add_argument('--json', action='store_true', help="Print JSON instead of a table")
+
+    def handle(self, *args, **options):
+        try:
+            quiz = Quiz.objects.only('id', 'topic').get(pk=options['quiz_id'])
+        except Quiz.DoesNotExist:
+            raise CommandError(f"Quiz {options['quiz_id']} not found.")
+        stats = timing_stats(quiz.id)
+        if options['json']:
+            self.stdout.write(json.dumps({'quiz_id': quiz.id, 'topic': quiz.topic, 'questions': stats}, indent=2))
+            return
+        if not stats:
+            self.stdout.write(f"No question timings recorded for quiz {quiz.id} ({quiz.topic}).")
+            return
+        self.stdout.write(f"Quiz {quiz.id}: {quiz.topic}")
+        self.stdout.write(f"{'Question':>8} {'Visitors':>9} {'Answered':>9} {'Mean s':>8} {'Median s':>9} {'p90 s':>8}")
+        for row in stats:
+            self.stdout.write(f"{row['question_index'] + 1:>8} {row['visitors']:>9} {row['answered']:>9} "
+                              f"{row['mean_ms'] / 1000:>8.1f} {row['p50_ms'] / 1000:>9.1f} {row['p90_ms'] / 1000:>8.1f}")
@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quiz.search import fts_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the quiz full-text search index (quiz_quiz_fts) from the quiz table."
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            raise CommandError("Full-text search needs SQLite with migration quiz.0005_quiz_fts applied.")
+        started = time.perf_counter()
+        indexed = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} quizzes in {time.perf_counter() - started:.2f}s."))
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-19 14:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0002_alter_quiz_id_alter_quizattempt_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='quiz',
+            name='question_type',
+            field=models.CharField(choices=[('mcq', 'Multiple Choice'), ('fill', 'Fill in the Blank'), ('tf', 'True/False'), ('mixed', 'Mixed Types')], max_length=10),
+        ),
+        migrations.CreateModel(
+            name='GenerationRun',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('model_name', models.CharField(max_length=100)),
+                ('topic', models.CharField(max_length=255)),
+                ('question_type', models.CharField(choices=[('mcq', 'Multiple Choice'), ('fill', 'Fill in the Blank'), ('tf', 'True/False'), ('mixed', 'Mixed Types')], max_length=10)),
+                ('difficulty', models.CharField(choices=[('Easy', 'Easy'), ('Medium', 'Medium'), ('Hard', 'Hard')], max_length=10)),
+                ('num_questions_requested', models.IntegerField(default=0)),
+                ('num_questions_returned', models.IntegerField(default=0)),
+                ('prompt_chars', models.IntegerField(default=0)),
+                ('response_chars', models.IntegerField(default=0)),
+                ('prompt_tokens', models.IntegerField(blank=True, null=True)),
+                ('response_tokens', models.IntegerField(blank=True, null=True)),
+                ('wall_time_ms', models.FloatField()),
+                ('parse_path', models.CharField(choices=[('direct', 'Direct JSON'), ('fenced', 'Fenced ```json block'), ('braces', 'Outermost braces'), ('failed', 'Unparseable')], max_length=10)),
+                ('validation_error', models.TextField(blank=True, default='')),
+                ('retry_count', models.IntegerField(default=0)),
+                ('succeeded', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('quiz', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='generation_runs', to='quiz.quiz')),
+            ],
+        ),
+    ]
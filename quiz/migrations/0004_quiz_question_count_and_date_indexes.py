@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-19 14:32
+
+from django.db import migrations, models
+
+
+def backfill_question_count(apps, schema_editor):
+    Quiz = apps.get_model('quiz', 'Quiz')
+    batch = []
+    for quiz in Quiz.objects.only('id', 'questions_data').iterator(chunk_size=2000):
+        quiz.question_count = len(quiz.questions_data) if isinstance(quiz.questions_data, list) else 0
+        batch.append(quiz)
+        if len(batch) >= 2000:
+            Quiz.objects.bulk_update(batch, ['question_count'])
+            batch = []
+    if batch:
+        Quiz.objects.bulk_update(batch, ['question_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0003_generationrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='question_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_question_count, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='quiz',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='quizattempt',
+            name='attempted_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+# FTS5 index over quiz topic, explanation and question text (see quiz/search.py).
+# Triggers keep it in sync with quiz_quiz, including bulk_create() and update().
+# SQLite only: other backends use the icontains fallback in quiz.search.
+
+QUESTIONS_TEXT_SQL = (
+    "(SELECT group_concat(json_extract(q.value, '$.question_text'), ' ') "
+    "FROM json_each(CASE WHEN json_valid({row}.questions_data) THEN {row}.questions_data ELSE '[]' END) AS q "
+    "WHERE q.type = 'object')"
+)
+
+INSERT_ROW_SQL = (
+    "INSERT INTO quiz_quiz_fts (rowid, topic, explanation, questions) "
+    "VALUES (NEW.id, NEW.topic, COALESCE(NEW.explanation, ''), COALESCE(" + QUESTIONS_TEXT_SQL.format(row='NEW') + ", ''));"
+)
+
+FORWARD_SQL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS quiz_quiz_fts USING fts5(topic, explanation, questions, tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS quiz_quiz_fts_ai AFTER INSERT ON quiz_quiz BEGIN " + INSERT_ROW_SQL + " END",
+    "CREATE TRIGGER IF NOT EXISTS quiz_quiz_fts_ad AFTER DELETE ON quiz_quiz BEGIN DELETE FROM quiz_quiz_fts WHERE rowid = OLD.id; END",
+    "CREATE TRIGGER IF NOT EXISTS quiz_quiz_fts_au AFTER UPDATE OF topic, explanation, questions_data ON quiz_quiz BEGIN "
+    "DELETE FROM quiz_quiz_fts WHERE rowid = OLD.id; " + INSERT_ROW_SQL + " END",
+    "INSERT INTO quiz_quiz_fts (rowid, topic, explanation, questions) "
+    "SELECT quiz_quiz.id, quiz_quiz.topic, COALESCE(quiz_quiz.explanation, ''), COALESCE(" + QUESTIONS_TEXT_SQL.format(row='quiz_quiz') + ", '') FROM quiz_quiz",
+]
+
+REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS quiz_quiz_fts_au",
+    "DROP TRIGGER IF EXISTS quiz_quiz_fts_ad",
+    "DROP TRIGGER IF EXISTS quiz_quiz_fts_ai",
+    "DROP TABLE IF EXISTS quiz_quiz_fts",
+]
+
+
+def _run(statements):
+    def apply(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0004_quiz_question_count_and_date_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(FORWARD_SQL), _run(REVERSE_SQL)),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:05
+
+import hashlib
+import importlib
+import json
+
+from django.db import migrations, models
+
+# On SQLite, adding or removing a column rebuilds quiz_quiz, which drops the FTS
+# sync triggers created in 0005; recreate them after the rebuild in both directions.
+fts = importlib.import_module('quiz.migrations.0005_quiz_fts')
+recreate_fts_triggers = fts._run(fts.FORWARD_SQL[1:4])
+
+
+def backfill_content_hash(apps, schema_editor):
+    # Frozen copy of quiz.models.quiz_content_hash.
+    Quiz = apps.get_model('quiz', 'Quiz')
+    batch = []
+    for quiz in Quiz.objects.only('id', 'topic', 'questions_data').iterator(chunk_size=2000):
+        questions = quiz.questions_data if isinstance(quiz.questions_data, list) else []
+        payload = json.dumps([' '.join(quiz.topic.split()).casefold(), questions], sort_keys=True, separators=(',', ':'))
+        quiz.content_hash = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        batch.append(quiz)
+        if len(batch) >= 2000:
+            Quiz.objects.bulk_update(batch, ['content_hash'])
+            batch = []
+    if batch:
+        Quiz.objects.bulk_update(batch, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0005_quiz_fts'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recreate_fts_triggers),
+        migrations.AddField(
+            model_name='quiz',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.RunPython(recreate_fts_triggers, migrations.RunPython.noop),
+        migrations.RunPython(backfill_content_hash, migrations.RunPython.noop),
+    ]
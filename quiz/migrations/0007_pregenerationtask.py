@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-19 14:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0006_quiz_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PregenerationTask',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('batch', models.CharField(max_length=100)),
+                ('topic', models.CharField(max_length=255)),
+                ('difficulty', models.CharField(choices=[('Easy', 'Easy'), ('Medium', 'Medium'), ('Hard', 'Hard')], max_length=10)),
+                ('question_type', models.CharField(choices=[('mcq', 'Multiple Choice'), ('fill', 'Fill in the Blank'), ('tf', 'True/False'), ('mixed', 'Mixed Types')], max_length=10)),
+                ('num_questions', models.PositiveIntegerField(default=5)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('quiz', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='quiz.quiz')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['batch', 'status'], name='quiz_pregen_batch_3a97fb_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pregenerationtask',
+            constraint=models.UniqueConstraint(fields=('batch', 'topic', 'difficulty', 'question_type'), name='unique_pregeneration_cell'),
+        ),
+    ]
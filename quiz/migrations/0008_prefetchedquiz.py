@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-19 14:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0007_pregenerationtask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrefetchedQuiz',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('key', models.CharField(db_index=True, max_length=300)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('quiz', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='prefetch_entry', to='quiz.quiz')),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:06
+
+import importlib
+
+from django.db import migrations, models
+
+# Adding the column rebuilds quiz_quiz on SQLite, which drops the FTS sync triggers (see 0006).
+fts = importlib.import_module('quiz.migrations.0005_quiz_fts')
+recreate_fts_triggers = fts._run(fts.FORWARD_SQL[1:4])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0008_prefetchedquiz'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recreate_fts_triggers),
+        migrations.AddField(
+            model_name='quiz',
+            name='questions_pending',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(recreate_fts_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0009_quiz_questions_pending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizattempt',
+            name='participant',
+            field=models.CharField(blank=True, default='', max_length=60),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['quiz', '-percentage', 'attempted_at'], name='quizattempt_leaderboard_idx'),
+        ),
+    ]
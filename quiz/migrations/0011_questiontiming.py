@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0010_quizattempt_participant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionTiming',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('client', models.CharField(max_length=32)),
+                ('question_index', models.PositiveIntegerField()),
+                ('dwell_ms', models.PositiveIntegerField()),
+                ('answered', models.BooleanField(default=False)),
+                ('recorded_at', models.DateTimeField(auto_now_add=True)),
+                ('quiz', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='quiz.quiz')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['quiz', 'question_index'], name='questiontiming_question_idx')],
+            },
+        ),
+    ]
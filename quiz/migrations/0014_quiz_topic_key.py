@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:40
+
+import hashlib
+import importlib
+
+from django.db import migrations, models
+
+# Adding the column rebuilds quiz_quiz on SQLite, which drops the FTS sync triggers (see 0006).
+fts = importlib.import_module('quiz.migrations.0005_quiz_fts')
+recreate_fts_triggers = fts._run(fts.FORWARD_SQL[1:4])
+
+
+def backfill_topic_key(apps, schema_editor):
+    # Frozen copy of quiz.models.quiz_topic_key.
+    Quiz = apps.get_model('quiz', 'Quiz')
+    batch = []
+    for quiz in Quiz.objects.only('id', 'topic').iterator(chunk_size=2000):
+        quiz.topic_key = hashlib.sha256(' '.join(quiz.topic.split()).casefold().encode('utf-8')).hexdigest()
+        batch.append(quiz)
+        if len(batch) >= 2000:
+            Quiz.objects.bulk_update(batch, ['topic_key'])
+            batch = []
+    if batch:
+        Quiz.objects.bulk_update(batch, ['topic_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0013_quizattempt_idempotency_scope'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recreate_fts_triggers),
+        migrations.AddField(
+            model_name='quiz',
+            name='topic_key',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.RunPython(recreate_fts_triggers, migrations.RunPython.noop),
+        migrations.RunPython(backfill_topic_key, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['topic_key', 'question_type', 'difficulty', '-created_at'], name='quiz_bank_lookup_idx'),
+        ),
+    ]
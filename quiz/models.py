@@ -1,8 +1,75 @@
 
 from django.db import models
 from django.conf import settings # To potentially link to the User model
+import hashlib
 import json
 
+
+def quiz_content_hash(topic: str, questions) -> str:
+    """Fingerprint of a quiz's content (normalised topic + questions) used to detect duplicate imports."""
+    payload = json.dumps([' '.join(topic.split()).casefold(), questions], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def normalise_topic(topic: str) -> str:
+    """Topic with whitespace collapsed and case folded: spellings that differ only in that are the same topic."""
+    return ' '.join(topic.split()).casefold()
+
+
+def quiz_topic_key(topic: str) -> str:
+    """Fixed-length key of the normalised topic, for exact indexed lookups of a topic (casefolding may lengthen it)."""
+    return hashlib.sha256(normalise_topic(topic).encode('utf-8')).hexdigest()
+
+
+def validate_generated_data(generated_data: dict, question_type: str, num_questions_per_type: dict, actual_num_questions: int, require_explanation: bool = True):
+    """
+    Checks parsed quiz data (AI output, or an imported record) against the requested quiz shape.
+    Raises ValueError on structural problems; coerces "true"/"false" strings on T/F answers in place.
+    """
+    if require_explanation and ('explanation' not in generated_data or not isinstance(generated_data['explanation'], str)):
+        raise ValueError("Generated JSON is missing 'explanation' key or it's not a string.")
+    if 'questions' not in generated_data or not isinstance(generated_data['questions'], list):
+        raise ValueError("Generated JSON is missing 'questions' key or it's not a list.")
+    
+    # Validate number of questions returned vs requested
+    if question_type == "mixed" and num_questions_per_type:
+        type_counts_returned = {'mcq': 0, 'fill': 0, 'tf': 0}
+        for q_gen in generated_data['questions']:
+            q_gen_type = q_gen.get('type')
+            if q_gen_type in type_counts_returned:
+                type_counts_returned[q_gen_type] += 1
+        
+        valid_mix = True
+        for q_type_req, count_req in num_questions_per_type.items():
+            if count_req > 0 and type_counts_returned.get(q_type_req, 0) != count_req:
+                print(f"Warning: AI returned {type_counts_returned.get(q_type_req, 0)} '{q_type_req}' questions, but {count_req} were requested.")
+                # valid_mix = False # Decided to proceed with what AI returned, but log warning
+        
+        if len(generated_data['questions']) != actual_num_questions:
+             print(f"Warning: AI returned {len(generated_data['questions'])} total questions for mixed type, but {actual_num_questions} were expected. Using the {len(generated_data['questions'])} questions returned by the AI.")
+    elif question_type != "mixed":
+        if len(generated_data['questions']) != actual_num_questions:
+             print(f"Warning: AI returned {len(generated_data['questions'])} questions, but {actual_num_questions} were requested for single type. Using the {len(generated_data['questions'])} questions returned by the AI.")
+
+    for i, q in enumerate(generated_data['questions']):
+         if not all(k in q for k in ['question_text', 'type', 'difficulty', 'answer']):
+             raise ValueError(f"Question {i+1} is missing required keys (question_text, type, difficulty, answer).")
+         q_type_from_ai = q.get('type')
+         if q_type_from_ai == 'mcq' and (not isinstance(q.get('options'), list) or len(q['options']) != 4 or q.get('answer') not in q['options']):
+             raise ValueError(f"MCQ Question {i+1} (text: {q.get('question_text')[:50]}...) has invalid 'options' or 'answer'. Options must be a list of 4 strings, and answer must match one option.")
+         if q_type_from_ai == 'tf' and not isinstance(q.get('answer'), bool):
+             if isinstance(q.get('answer'), str):
+                 if q['answer'].lower() == 'true': q['answer'] = True
+                 elif q['answer'].lower() == 'false': q['answer'] = False
+                 else: raise ValueError(f"True/False Question {i+1} (text: {q.get('question_text')[:50]}...) has non-boolean answer: {q['answer']}.")
+             else: raise ValueError(f"True/False Question {i+1} (text: {q.get('question_text')[:50]}...) has non-boolean answer: {q['answer']}.")
+         # Ensure the type in the question matches what was expected if single type, or is one of the mixed types.
+         if question_type != 'mixed' and q_type_from_ai != question_type:
+             raise ValueError(f"Question {i+1} has type '{q_type_from_ai}' but '{question_type}' was expected.")
+         elif question_type == 'mixed' and q_type_from_ai not in num_questions_per_type:
+             raise ValueError(f"Question {i+1} has unexpected type '{q_type_from_ai}' for mixed request.")
+
+
 class Quiz(models.Model):
     """Stores the details of a generated quiz."""
     QUESTION_TYPE_CHOICES = [
@@ -24,7 +91,31 @@ class Quiz(models.Model):
     question_type = models.CharField(max_length=10, choices=QUESTION_TYPE_CHOICES) 
     explanation = models.TextField(blank=True, null=True)
     questions_data = models.JSONField(default=list) # Each question in this list will have its own 'type' key
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Kept in sync with questions_data on save() so listings never have to decode the JSON just to count it.
+    # bulk_create()/update() bypass save(); set it explicitly there.
+    question_count = models.PositiveIntegerField(default=0)
+    # quiz_content_hash(topic, questions_data), also maintained on save(); blank for rows that predate it.
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Large quizzes (quiz.largequiz): questions still being generated in the background; 0 once complete.
+    questions_pending = models.PositiveIntegerField(default=0)
+    # quiz_topic_key(topic), maintained on save() like content_hash; the banked-quiz fallback looks topics up by it.
+    topic_key = models.CharField(max_length=64, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            # Stored quizzes for one configuration, newest first (quiz.admission.find_banked_quiz).
+            models.Index(fields=['topic_key', 'question_type', 'difficulty', '-created_at'], name='quiz_bank_lookup_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.question_count = len(self.get_questions())
+        self.content_hash = quiz_content_hash(self.topic, self.get_questions())
+        self.topic_key = quiz_topic_key(self.topic)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'questions_data', 'topic'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'question_count', 'content_hash', 'topic_key'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         type_display = dict(self.QUESTION_TYPE_CHOICES).get(self.question_type, self.question_type.capitalize())
@@ -42,7 +133,22 @@ class QuizAttempt(models.Model):
     total_questions = models.IntegerField()
     percentage = models.FloatField()
     results_data = models.JSONField(default=list) 
-    attempted_at = models.DateTimeField(auto_now_add=True)
+    attempted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    participant = models.CharField(max_length=60, blank=True, default='') # Name given in classroom mode (quiz.classroom)
+    # Sent with each check/ submission by the quiz page; a retried submission (offline queue, flaky network)
+    # returns the attempt already stored under its key instead of creating another. Keys are unique per
+    # session: idempotency_scope is a hash of the submitting session's key (never the key itself).
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+    idempotency_scope = models.CharField(max_length=64, blank=True, default='')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['idempotency_scope', 'idempotency_key'], name='quizattempt_idempotency_key'),
+        ]
+        indexes = [
+            # Classroom leaderboards are built from the best attempts first (quiz.classroom.Leaderboard.load).
+            models.Index(fields=['quiz', '-percentage', 'attempted_at'], name='quizattempt_leaderboard_idx'),
+        ]
 
     def __str__(self):
         user_info = f"User {self.user_id}" if hasattr(self, 'user') and self.user else "Anonymous User" # Placeholder if user model is added
@@ -52,4 +158,91 @@ class QuizAttempt(models.Model):
         return self.results_data if isinstance(self.results_data, list) else []
 
 
-    
+class QuestionTiming(models.Model):
+    """Time one visitor spent on one question card, reported in batches by the quiz page (quiz.interactions)."""
+    id = models.BigAutoField(primary_key=True)
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='+', db_index=False) # Covered by the index below
+    client = models.CharField(max_length=32) # Random per page view, not a user id
+    question_index = models.PositiveIntegerField()
+    dwell_ms = models.PositiveIntegerField()
+    answered = models.BooleanField(default=False)
+    recorded_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['quiz', 'question_index'], name='questiontiming_question_idx')]
+
+
+class GenerationRun(models.Model):
+    """Telemetry for one call to the generation provider (one per generated quiz, plus failed attempts)."""
+    PARSE_PATH_CHOICES = [
+        ('direct', 'Direct JSON'),
+        ('fenced', 'Fenced ```json block'),
+        ('braces', 'Outermost braces'),
+        ('failed', 'Unparseable'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    quiz = models.ForeignKey(Quiz, on_delete=models.SET_NULL, null=True, blank=True, related_name='generation_runs')
+    model_name = models.CharField(max_length=100)
+    topic = models.CharField(max_length=255)
+    question_type = models.CharField(max_length=10, choices=Quiz.QUESTION_TYPE_CHOICES)
+    difficulty = models.CharField(max_length=10, choices=Quiz.DIFFICULTY_CHOICES)
+    num_questions_requested = models.IntegerField(default=0)
+    num_questions_returned = models.IntegerField(default=0)
+    prompt_chars = models.IntegerField(default=0)
+    response_chars = models.IntegerField(default=0)
+    prompt_tokens = models.IntegerField(null=True, blank=True) # As reported by the provider's usage metadata
+    response_tokens = models.IntegerField(null=True, blank=True)
+    wall_time_ms = models.FloatField()
+    parse_path = models.CharField(max_length=10, choices=PARSE_PATH_CHOICES)
+    validation_error = models.TextField(blank=True, default='')
+    retry_count = models.IntegerField(default=0) # Earlier calls for the same questions (pre-generation retries, large-quiz top-ups)
+    succeeded = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        status = "ok" if self.succeeded else "failed"
+        return f"{self.model_name} run for '{self.topic}' ({status}, {self.wall_time_ms:.0f} ms)"
+
+
+
+class PregenerationTask(models.Model):
+    """One cell of a pre-generation matrix (see quiz.pregenerate); its status is the resume checkpoint."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    batch = models.CharField(max_length=100) # Name given on the command line; rerunning a batch resumes it
+    topic = models.CharField(max_length=255)
+    difficulty = models.CharField(max_length=10, choices=Quiz.DIFFICULTY_CHOICES)
+    question_type = models.CharField(max_length=10, choices=Quiz.QUESTION_TYPE_CHOICES)
+    num_questions = models.PositiveIntegerField(default=5)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    quiz = models.ForeignKey(Quiz, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['batch', 'topic', 'difficulty', 'question_type'], name='unique_pregeneration_cell'),
+        ]
+        indexes = [models.Index(fields=['batch', 'status'])]
+
+    def __str__(self):
+        return f"[{self.batch}] {self.topic} ({self.question_type}, {self.difficulty}) - {self.status}"
+
+
+class PrefetchedQuiz(models.Model):
+    """A quiz generated ahead of demand for a popular configuration (see quiz.prefetch), not yet served."""
+    id = models.AutoField(primary_key=True)
+    key = models.CharField(max_length=300, db_index=True) # quiz.prefetch.config_key()
+    quiz = models.OneToOneField(Quiz, on_delete=models.CASCADE, related_name='prefetch_entry')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Prefetched quiz {self.quiz_id} for {self.key}"
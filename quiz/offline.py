@@ -0,0 +1,80 @@
+"""
+Offline quiz taking with a service worker.
+
+``/sw.js`` serves the service worker rendered from templates/quiz/sw.js. It
+is served from the site root so that its scope covers every page, and is
+never cached by the browser (a changed worker is picked up on the next page
+load). The worker:
+
+* precaches the app shell on install: the generation page and the
+  (content-hashed, with STATIC_MANIFEST) CSS and JS, plus the CDN assets
+  from base.html when they can be reached
+* answers static assets from its cache and refreshes them in the
+  background, and the generation page, shared quiz pages and quiz JSON
+  from the network, falling back to the cached copy when the network fails
+  or is slower than ``OFFLINE_NETWORK_TIMEOUT_MS``. Other pages (admin,
+  profiles, exports) are left alone, and responses marked ``no-store`` or
+  ``private`` and downloads are never cached
+* caches the quiz being taken (its shareable page) when script.js asks, so
+  it can be reopened without a connection
+* queues ``check/`` submissions that fail for lack of a connection in
+  IndexedDB and replays them with Background Sync (or, in browsers without
+  it, when a page reports that the connection is back), with a fresh CSRF
+  token: tokens are ``private, no-store`` and are not cached
+
+Each submission carries an ``Idempotency-Key`` header, stored on the
+QuizAttempt (unique), so however often a queued submission is replayed
+check_answers stores one attempt and answers every retry with it.
+"""
+import hashlib
+import json
+import re
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from django.template.loader import render_to_string
+from django.templatetags.static import static
+from django.urls import reverse
+
+# Loaded by base.html from public CDNs. Precached when reachable; a failure does not fail the worker's install.
+CDN_ASSETS = (
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css',
+    'https://cdnjs.cloudflare.com/ajax/libs/animate.css/4.1.1/animate.min.css',
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js',
+)
+STATIC_ASSETS = ('css/style.css', 'js/script.js')
+SYNC_TAG = 'quizify-check'
+
+
+def _id_pattern(url_name: str) -> str:
+    """Regular expression for the paths of ``url_name`` (a URL taking a quiz id)."""
+    return r'\d+'.join(re.escape(part) for part in reverse(url_name, args=[0]).rsplit('0', 1))
+
+
+def worker_config() -> dict:
+    """Settings rendered into the service worker. ``version`` names its caches and changes with the static files."""
+    static_urls = [static(path) for path in STATIC_ASSETS]
+    config = {
+        'enabled': getattr(settings, 'OFFLINE_ENABLED', True),
+        'app_shell': [reverse('quiz:index'), *static_urls],
+        'cdn_assets': list(CDN_ASSETS),
+        'static_prefix': static(''),
+        'check_url': reverse('quiz:check_answers'),
+        'csrf_url': reverse('quiz:csrf_token'),
+        # Navigations cached: the generation page and shared quiz pages (never admin, profiles or exports)
+        'cached_page_pattern': '^({}|{})$'.format(re.escape(reverse('quiz:index')), _id_pattern('quiz:quiz_detail')),
+        # Quiz JSON and question windows; not the leaderboard (a live stream)
+        'cached_api_pattern': '^{}(/questions)?$'.format(_id_pattern('quiz:quiz_api')),
+        'network_timeout_ms': getattr(settings, 'OFFLINE_NETWORK_TIMEOUT_MS', 4000),
+        'sync_tag': SYNC_TAG,
+    }
+    config['version'] = hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:12]
+    return config
+
+
+def service_worker_view(request: HttpRequest) -> HttpResponse:
+    """GET /sw.js - the service worker (see the module docstring)."""
+    script = render_to_string('quiz/sw.js', {'config': json.dumps(worker_config())})
+    response = HttpResponse(script, content_type='text/javascript; charset=utf-8')
+    response['Cache-Control'] = 'no-cache' # Revalidated on every update check
+    return response
@@ -0,0 +1,249 @@
+"""
+Predictive prefetching of quizzes for popular configurations.
+
+Every generation request in ``index`` is counted per configuration key
+(normalised topic, question type, difficulty and question counts) in a
+sliding window. A background thread periodically tops up the hottest keys to
+``PREFETCH_INVENTORY`` ready quizzes each, stored as ``Quiz`` rows with a
+``PrefetchedQuiz`` entry, but only while fewer than
+``PREFETCH_MAX_LIVE_GENERATIONS`` user-triggered generations are in flight, so
+prefetching only uses idle LLM capacity. ``take_prefetched`` hands the oldest
+ready quiz to the request (a hit) and wakes the thread to replenish; entries
+left unserved for ``PREFETCH_MAX_AGE`` seconds are deleted and counted as
+wasted generations.
+
+Request counts and the hit/miss/waste statistics are per process; the
+inventory lives in the database and is shared by all processes.
+"""
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count
+from django.utils import timezone
+
+from .admission import CLOSED, admission_enabled, get_controller
+from .autocomplete import normalise_topic
+from .instrumentation import PREFETCH_EVENTS, is_enabled as instrumentation_enabled
+from .models import PrefetchedQuiz, Quiz
+from .telemetry import record_generation_run
+
+
+def prefetch_enabled() -> bool:
+    return getattr(settings, 'PREFETCH_ENABLED', False)
+
+
+def config_key(topic: str, question_type: str, difficulty: str, num_questions: int, num_questions_per_type: dict = None) -> str:
+    """Inventory key for a generation request; requests with the same key can be served the same quiz."""
+    if question_type == 'mixed':
+        shape = '-'.join(str((num_questions_per_type or {}).get(t, 0)) for t in ('mcq', 'fill', 'tf'))
+    else:
+        shape = str(num_questions)
+    return f"{question_type}|{difficulty}|{shape}|{normalise_topic(topic)}"
+
+
+class RequestTracker:
+    """Request counts per key over the last ``window`` seconds, kept in ``buckets`` time slices."""
+
+    def __init__(self, window: float = 900, buckets: int = 15):
+        self.bucket_seconds = window / buckets
+        self.buckets = buckets
+        self._slices = deque() # (slice number, Counter)
+        self._totals = Counter()
+        self._specs = {} # key -> generation arguments of the latest request
+        self._lock = threading.Lock()
+
+    def record(self, key: str, spec: dict, now: float = None):
+        current = int((time.monotonic() if now is None else now) // self.bucket_seconds)
+        with self._lock:
+            self._expire(current)
+            if not self._slices or self._slices[-1][0] != current:
+                self._slices.append((current, Counter()))
+            self._slices[-1][1][key] += 1
+            self._totals[key] += 1
+            self._specs[key] = spec
+
+    def hottest(self, limit: int, min_requests: int = 1, now: float = None) -> list:
+        """Up to ``limit`` (key, spec, requests) with at least ``min_requests`` in the window, busiest first."""
+        current = int((time.monotonic() if now is None else now) // self.bucket_seconds)
+        with self._lock:
+            self._expire(current)
+            return [(key, self._specs[key], count) for key, count in self._totals.most_common(limit) if count >= min_requests]
+
+    def _expire(self, current: int):
+        while self._slices and self._slices[0][0] <= current - self.buckets:
+            _, expired = self._slices.popleft()
+            self._totals.subtract(expired)
+            for key in expired:
+                if self._totals[key] <= 0:
+                    del self._totals[key]
+                    self._specs.pop(key, None)
+
+
+# --- Process state ---
+
+_tracker = None
+_tracker_lock = threading.Lock()
+_stats = Counter() # hit, miss, generated, failed, wasted
+_live_generations = 0
+_live_lock = threading.Lock()
+_wake = threading.Event()
+_worker = None
+
+
+def get_tracker() -> RequestTracker:
+    global _tracker
+    if _tracker is None:
+        with _tracker_lock:
+            if _tracker is None:
+                _tracker = RequestTracker(getattr(settings, 'PREFETCH_WINDOW', 900))
+    return _tracker
+
+
+def _count(outcome: str, amount: int = 1):
+    _stats[outcome] += amount
+    if instrumentation_enabled():
+        PREFETCH_EVENTS.inc((outcome,), amount)
+
+
+def stats() -> dict:
+    """Hit rate and waste of this process's prefetcher."""
+    hits, misses = _stats['hit'], _stats['miss']
+    generated, wasted = _stats['generated'], _stats['wasted']
+    return {
+        **{outcome: _stats[outcome] for outcome in ('hit', 'miss', 'generated', 'failed', 'wasted')},
+        'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+        'waste_rate': round(wasted / generated, 4) if generated else None,
+    }
+
+
+def reset():
+    """Clears the request counts and statistics (used by the tests)."""
+    global _tracker
+    with _tracker_lock:
+        _tracker = None
+    _stats.clear()
+
+
+@contextmanager
+def live_generation():
+    """Marks a user-triggered generation as in flight; the prefetcher stays idle while there are too many."""
+    global _live_generations
+    with _live_lock:
+        _live_generations += 1
+    try:
+        yield
+    finally:
+        with _live_lock:
+            _live_generations -= 1
+
+
+def _llm_idle() -> bool:
+    if admission_enabled() and get_controller().state != CLOSED:
+        return False # Leave a slow or failing provider alone until the circuit breaker closes
+    return _live_generations < getattr(settings, 'PREFETCH_MAX_LIVE_GENERATIONS', 4)
+
+
+# --- Serving ---
+
+def take_prefetched(topic: str, question_type: str, difficulty: str, num_questions: int, num_questions_per_type: dict = None):
+    """
+    Counts the request and returns a ready quiz for its configuration, or None.
+    Claiming is a DELETE of the inventory row, so concurrent requests never get the same quiz.
+    """
+    key = config_key(topic, question_type, difficulty, num_questions, num_questions_per_type)
+    get_tracker().record(key, {
+        'topic': topic, 'question_type': question_type, 'difficulty': difficulty,
+        'num_questions': num_questions, 'num_questions_per_type': num_questions_per_type,
+    })
+    _ensure_worker()
+    for entry in PrefetchedQuiz.objects.filter(key=key).select_related('quiz').order_by('id')[:3]:
+        if PrefetchedQuiz.objects.filter(id=entry.id).delete()[0]:
+            _count('hit')
+            _wake.set() # Replenish the key that was just drawn down
+            return entry.quiz
+    _count('miss')
+    return None
+
+
+# --- Background refill ---
+
+def expire_stale() -> int:
+    """
+    Deletes prefetched quizzes nobody was served within PREFETCH_MAX_AGE seconds. Returns how many.
+    A stale quiz that has attempts anyway (its id was reached directly) is kept as an ordinary quiz: deleting it
+    would cascade to the attempts and break its share link.
+    """
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'PREFETCH_MAX_AGE', 86400))
+    stale = list(PrefetchedQuiz.objects.filter(created_at__lt=cutoff).values_list('quiz_id', flat=True)[:1000])
+    if not stale:
+        return 0
+    deleted = Quiz.objects.filter(id__in=stale, attempts__isnull=True).delete()[1].get(Quiz._meta.label, 0) # Cascades to the entries
+    PrefetchedQuiz.objects.filter(quiz_id__in=stale).delete() # Those with attempts leave the inventory
+    _count('wasted', deleted)
+    return deleted
+
+
+def refill() -> int:
+    """One refill pass over the hottest keys while the LLM is idle. Returns the number of quizzes generated."""
+    from .views import generate_quiz_content # views imports this module
+
+    expire_stale()
+    hot = get_tracker().hottest(getattr(settings, 'PREFETCH_TOP_KEYS', 20), getattr(settings, 'PREFETCH_MIN_REQUESTS', 3))
+    if not hot:
+        return 0
+    target = getattr(settings, 'PREFETCH_INVENTORY', 2)
+    stock = dict(PrefetchedQuiz.objects.filter(key__in=[key for key, _, _ in hot])
+                 .values('key').annotate(ready=Count('id')).values_list('key', 'ready'))
+    generated = 0
+    for key, spec, _ in hot:
+        for _ in range(target - stock.get(key, 0)):
+            if not _llm_idle():
+                return generated
+            try:
+                quiz_data = generate_quiz_content(**spec)
+            except Exception as e:
+                print(f"Prefetch generation failed for {key}: {e}")
+                _count('failed')
+                break
+            quiz = Quiz.objects.create(
+                topic=quiz_data['topic'],
+                difficulty=quiz_data['difficulty'],
+                question_type=quiz_data['question_type'],
+                explanation=quiz_data['content'],
+                questions_data=quiz_data['questions'],
+            )
+            PrefetchedQuiz.objects.create(key=key, quiz=quiz)
+            generation_run = quiz_data['generation_run']
+            generation_run.quiz = quiz
+            record_generation_run(generation_run)
+            _count('generated')
+            generated += 1
+    return generated
+
+
+def _ensure_worker():
+    global _worker
+    if not getattr(settings, 'PREFETCH_BACKGROUND', True):
+        return
+    if _worker is not None and _worker.is_alive():
+        return
+    with _tracker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_refill_forever, name='quizify-prefetcher', daemon=True)
+            _worker.start()
+
+
+def _refill_forever():
+    while True:
+        _wake.wait(getattr(settings, 'PREFETCH_INTERVAL', 5))
+        _wake.clear()
+        try:
+            close_old_connections()
+            refill()
+        except Exception as e:
+            print(f"Error in prefetch refill: {e}")
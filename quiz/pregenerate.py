@@ -0,0 +1,168 @@
+"""
+Resumable batch pre-generation of quizzes.
+
+A batch is a topic x difficulty x question type matrix stored as
+``PregenerationTask`` rows. ``run_batch`` works through the unfinished rows
+with ``agenerate_quiz_content``, keeping at most ``concurrency`` Gemini calls
+in flight and starting at most ``rate_per_minute`` per minute. Each finished
+cell is saved as a normal ``Quiz`` in the same transaction that marks the task
+done, so the task table doubles as the checkpoint: rerunning an interrupted
+batch picks up exactly the cells that have no quiz yet.
+"""
+import asyncio
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from itertools import product
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+
+from .models import PregenerationTask, Quiz
+from .telemetry import record_generation_run
+from .views import agenerate_quiz_content
+
+RETRY_BACKOFF_SECONDS = 2.0
+
+
+def read_topics(lines) -> list:
+    """Topics from a text file: one per line, blank lines and '#' comments ignored, duplicates dropped."""
+    topics, seen = [], set()
+    for line in lines:
+        topic = line.split('#', 1)[0].strip()
+        if topic and topic.casefold() not in seen:
+            seen.add(topic.casefold())
+            topics.append(topic)
+    return topics
+
+
+def plan_batch(batch: str, topics, difficulties, question_types, num_questions: int = 5) -> int:
+    """Adds the matrix cells missing from ``batch`` (existing cells keep their progress). Returns the batch size."""
+    cells = [
+        PregenerationTask(batch=batch, topic=topic, difficulty=difficulty, question_type=question_type, num_questions=num_questions)
+        for topic, difficulty, question_type in product(topics, difficulties, question_types)
+    ]
+    PregenerationTask.objects.bulk_create(cells, batch_size=500, ignore_conflicts=True)
+    return PregenerationTask.objects.filter(batch=batch).count()
+
+
+class RateLimiter:
+    """Spaces call starts at least 60 / ``per_minute`` seconds apart; no limit when ``per_minute`` is falsy."""
+
+    def __init__(self, per_minute: float = None):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+@dataclass
+class BatchProgress:
+    total: int
+    done: int = 0
+    failed: int = 0
+    retries: int = 0
+    started: float = field(default_factory=time.monotonic)
+    errors: Counter = field(default_factory=Counter)
+
+    def summary(self) -> str:
+        elapsed = time.monotonic() - self.started
+        per_minute = self.done / elapsed * 60 if elapsed else 0.0
+        remaining = self.total - self.done - self.failed
+        eta = f"{remaining / per_minute:.1f} min" if per_minute else "n/a"
+        return (f"{self.done + self.failed}/{self.total} processed: {self.done} done, {self.failed} failed, "
+                f"{self.retries} retries | {per_minute:.1f} quizzes/min | ETA {eta}")
+
+
+def _reset_interrupted(batch: str):
+    # Cells left 'running' belong to a run that was killed mid-call; their quiz was never saved.
+    PregenerationTask.objects.filter(batch=batch, status='running').update(status='pending')
+
+
+def _save_task(task: PregenerationTask, *fields):
+    task.save(update_fields=[*fields, 'updated_at'])
+
+
+def _store_result(task: PregenerationTask, quiz_data: dict, attempt: int = 1):
+    with transaction.atomic():
+        quiz = Quiz.objects.create(
+            topic=quiz_data['topic'],
+            difficulty=quiz_data['difficulty'],
+            question_type=quiz_data['question_type'],
+            explanation=quiz_data['content'],
+            questions_data=quiz_data['questions'],
+        )
+        task.quiz, task.status, task.last_error = quiz, 'done', ''
+        _save_task(task, 'quiz', 'status', 'last_error')
+    generation_run = quiz_data['generation_run']
+    generation_run.quiz = quiz
+    generation_run.retry_count = attempt - 1 # Earlier attempts at this cell in this run
+    record_generation_run(generation_run)
+
+
+async def run_batch(batch: str, concurrency: int = 4, rate_per_minute: float = None, max_attempts: int = 3,
+                    retry_failed: bool = True, report=None, report_every: float = 10.0) -> BatchProgress:
+    """
+    Generates every pending (and, with ``retry_failed``, previously failed) cell
+    of ``batch``. ``report(progress)`` is called every ``report_every`` seconds
+    and once at the end.
+    """
+    await sync_to_async(_reset_interrupted)(batch)
+    statuses = ['pending', 'failed'] if retry_failed else ['pending']
+    queryset = PregenerationTask.objects.filter(batch=batch, status__in=statuses).order_by('id')
+    queue = asyncio.Queue()
+    for task in await sync_to_async(list)(queryset):
+        queue.put_nowait(task)
+    progress = BatchProgress(total=queue.qsize())
+    limiter = RateLimiter(rate_per_minute)
+
+    async def generate(task: PregenerationTask):
+        for attempt in range(1, max_attempts + 1):
+            await limiter.wait()
+            task.status = 'running'
+            task.attempts += 1
+            await sync_to_async(_save_task)(task, 'status', 'attempts')
+            try:
+                quiz_data = await agenerate_quiz_content(task.topic, task.question_type, task.difficulty, num_questions=task.num_questions)
+            except Exception as e:
+                task.last_error = str(e)
+                if attempt < max_attempts:
+                    progress.retries += 1
+                    await asyncio.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+                    continue
+                task.status = 'failed'
+                await sync_to_async(_save_task)(task, 'status', 'last_error')
+                progress.failed += 1
+                progress.errors[str(e)[:120]] += 1
+                return
+            await sync_to_async(_store_result)(task, quiz_data, attempt)
+            progress.done += 1
+            return
+
+    async def worker():
+        while not queue.empty():
+            await generate(queue.get_nowait())
+
+    async def reporter():
+        while True:
+            await asyncio.sleep(report_every)
+            report(progress)
+
+    reporting = asyncio.create_task(reporter()) if report else None
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    finally:
+        if reporting:
+            reporting.cancel()
+    if report:
+        report(progress)
+    return progress
@@ -0,0 +1,237 @@
+"""
+Opt-in sampling profiler for production requests.
+
+``ProfilingMiddleware`` runs cProfile around a sampled fraction of requests
+(``PROFILING_SAMPLE_RATE``), around requests whose path matches one of
+``PROFILING_URL_PATTERNS``, or around requests carrying the
+``X-Quizify-Profile`` header with the configured ``PROFILING_TOKEN``. Each
+captured profile is written to ``PROFILING_DIR`` as ``<name>.prof`` plus a
+``<name>.json`` metadata file; only the newest ``PROFILING_MAX_FILES`` are
+kept. Staff can browse the slowest captures at ``/profiles/``.
+
+The middleware works under WSGI and ASGI. Under ASGI a capture covers the
+event-loop thread, one capture at a time. Under WSGI Django runs async views
+on an event loop in a separate thread, so the view is profiled there too and
+the two profiles are stored as one capture.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpRequest, HttpResponse
+from django.shortcuts import render
+from django.utils.decorators import sync_and_async_middleware
+
+PROFILE_HEADER = 'HTTP_X_QUIZIFY_PROFILE'
+_NAME_RE = re.compile(r'^[0-9TZ_a-f-]+$')
+
+
+def _profile_dir() -> Path:
+    return Path(getattr(settings, 'PROFILING_DIR', settings.BASE_DIR / 'profiles'))
+
+
+class RequestProfiler:
+    """Decides which requests ProfilingMiddleware profiles, and stores the captures on disk."""
+
+    def __init__(self):
+        self.sample_rate = float(getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0))
+        self.url_patterns = [re.compile(p) for p in getattr(settings, 'PROFILING_URL_PATTERNS', [])]
+        self.token = getattr(settings, 'PROFILING_TOKEN', '')
+        self.max_files = int(getattr(settings, 'PROFILING_MAX_FILES', 200))
+
+    def trigger(self, request: HttpRequest):
+        """Returns why this request should be profiled ('header', 'url' or 'sample'), or None."""
+        if sys.getprofile() is not None:
+            return None # A capture is already running on this thread (an overlapping request under ASGI)
+        if self.token and request.META.get(PROFILE_HEADER) == self.token:
+            return 'header'
+        if any(p.search(request.path) for p in self.url_patterns):
+            return 'url'
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return 'sample'
+        return None
+
+    def save(self, profiler, request, response, duration, trigger):
+        try:
+            self._save(profiler, request, response, duration, trigger)
+        except OSError as e:
+            print(f"Error saving request profile: {e}")
+
+    def _save(self, profiler, request, response, duration, trigger):
+        directory = _profile_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        now = datetime.now(timezone.utc)
+        name = f"{now.strftime('%Y%m%dT%H%M%S%f')}_{uuid.uuid4().hex[:8]}"
+
+        profiler.dump_stats(directory / f"{name}.prof")
+        match = getattr(request, 'resolver_match', None)
+        metadata = {
+            'name': name,
+            'captured_at': now.isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'trigger': trigger,
+        }
+        (directory / f"{name}.json").write_text(json.dumps(metadata))
+        self._rotate(directory)
+
+    def _rotate(self, directory: Path):
+        captures = sorted(directory.glob('*.json'))
+        for stale in captures[:max(0, len(captures) - self.max_files)]:
+            for path in (stale, stale.with_suffix('.prof')):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+
+@sync_and_async_middleware
+def ProfilingMiddleware(get_response):
+    """
+    Profiles selected requests with cProfile and stores the result on disk. Under ASGI the profiler runs on the
+    event-loop thread around the awaited view, so a capture also contains whatever other requests ran on the loop
+    meanwhile, and the work views hand to sync_to_async threads shows up as the await. Under WSGI an async view
+    is run by process_view with a second profiler on its event-loop thread, merged into the capture.
+    """
+    profiler = RequestProfiler()
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            trigger = profiler.trigger(request)
+            if trigger is None:
+                return await get_response(request)
+            profile = cProfile.Profile()
+            start = time.perf_counter()
+            try:
+                profile.enable()
+            except ValueError: # Python 3.12+ refuses a second profiler on the thread, as trigger() does on 3.11
+                return await get_response(request)
+            try:
+                response = await get_response(request)
+            finally:
+                profile.disable()
+            duration = time.perf_counter() - start
+            await sync_to_async(profiler.save)(profile, request, response, duration, trigger) # File I/O off the loop
+            return response
+    else:
+        def middleware(request):
+            trigger = profiler.trigger(request)
+            if trigger is None:
+                return get_response(request)
+            profile = cProfile.Profile()
+            request._view_profiles = [] # Filled by process_view when the view runs on another thread
+            start = time.perf_counter()
+            profile.enable()
+            try:
+                response = get_response(request)
+            finally:
+                profile.disable()
+            duration = time.perf_counter() - start
+            if request._view_profiles:
+                profile = pstats.Stats(profile, stream=io.StringIO())
+                profile.add(*request._view_profiles)
+            profiler.save(profile, request, response, duration, trigger)
+            return response
+
+        def process_view(request, view_func, view_args, view_kwargs):
+            """
+            Runs a profiled async view under its own profiler: cProfile only sees the thread it was enabled on,
+            and Django would otherwise run the view on a new event-loop thread (async_to_sync) that no one profiles.
+            """
+            view_profiles = getattr(request, '_view_profiles', None)
+            if view_profiles is None or not iscoroutinefunction(view_func):
+                return None
+
+            async def profiled_view():
+                view_profile = cProfile.Profile()
+                try:
+                    view_profile.enable()
+                except ValueError: # Python 3.12+ profiles every thread already, and refuses a second profiler
+                    return await view_func(request, *view_args, **view_kwargs)
+                try:
+                    return await view_func(request, *view_args, **view_kwargs)
+                finally:
+                    view_profile.disable()
+                    view_profiles.append(view_profile)
+            return async_to_sync(profiled_view)()
+
+        middleware.process_view = process_view # Django picks view hooks up from the middleware instance
+    return middleware
+
+
+def load_captures() -> list:
+    """Metadata of every stored capture, slowest first."""
+    captures = []
+    directory = _profile_dir()
+    if not directory.is_dir():
+        return captures
+    for path in directory.glob('*.json'):
+        try:
+            captures.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    captures.sort(key=lambda c: c.get('duration_ms', 0), reverse=True)
+    return captures
+
+
+def top_functions(profile_path: Path, limit: int = 40) -> list:
+    """The ``limit`` functions with the highest cumulative time in a stored profile."""
+    stats = pstats.Stats(str(profile_path), stream=io.StringIO())
+    rows = []
+    for (filename, lineno, func_name), (prim_calls, total_calls, total_time, cum_time, _callers) in stats.stats.items():
+        rows.append({
+            'function': f"{_short_filename(filename)}:{lineno}({func_name})",
+            'calls': total_calls if total_calls == prim_calls else f"{total_calls}/{prim_calls}",
+            'total_ms': round(total_time * 1000, 3),
+            'cumulative_ms': round(cum_time * 1000, 3),
+        })
+    rows.sort(key=lambda r: r['cumulative_ms'], reverse=True)
+    return rows[:limit]
+
+
+def _short_filename(filename: str) -> str:
+    base_dir = str(settings.BASE_DIR)
+    return os.path.relpath(filename, base_dir) if filename.startswith(base_dir) else filename
+
+
+@staff_member_required
+def profile_list_view(request: HttpRequest) -> HttpResponse:
+    context = {
+        'title': 'Captured request profiles',
+        'captures': load_captures()[:100],
+    }
+    return render(request, 'quiz/profiles/list.html', context)
+
+
+@staff_member_required
+def profile_detail_view(request: HttpRequest, name: str) -> HttpResponse:
+    if not _NAME_RE.match(name):
+        raise Http404("Unknown profile.")
+    directory = _profile_dir()
+    profile_path = directory / f"{name}.prof"
+    if not profile_path.is_file():
+        raise Http404("Profile not found (it may have been rotated out).")
+    try:
+        metadata = json.loads((directory / f"{name}.json").read_text())
+    except (OSError, ValueError):
+        metadata = {'name': name}
+    context = {
+        'title': f"Profile {name}",
+        'capture': metadata,
+        'functions': top_functions(profile_path),
+    }
+    return render(request, 'quiz/profiles/detail.html', context)
@@ -0,0 +1,161 @@
+"""
+Per-client token-bucket rate limiting for the endpoints that spend LLM
+capacity or send mail.
+
+Every POST to a budgeted view (``generation``: index, ``grading``:
+check_answers, ``email``: send_quiz_email) takes one token from two buckets:
+
+* the client's own, keyed by its ``X-Api-Key`` header, else its session
+  cookie, else its CSRF cookie (which every browser form POST carries), else
+  its IP address
+* one shared by its whole IP address, holding ``RATE_LIMIT_IP_MULTIPLIER``
+  times as many tokens, so a classroom behind one NAT address fits while a
+  client that invents new cookies for every request is still capped
+
+When either bucket is empty the request is answered with 429 and a
+``Retry-After`` header without reaching the view.
+
+Budgets are written ``'<tokens>/<seconds>'``: a bucket holds ``tokens`` and
+refills completely over ``seconds``. Each bucket is stored in the
+``RATE_LIMIT_CACHE`` cache as a single number, the time at which it will be
+full again (the GCRA formulation of a token bucket), so a shared backend
+enforces the limits across worker processes. The read and write are not
+atomic: concurrent requests for the same bucket in different processes can
+each be admitted, which over-admits by at most the number of racing workers.
+"""
+import hashlib
+import math
+import time
+from collections import Counter
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from django.shortcuts import render
+from django.urls import reverse
+from django.utils.decorators import sync_and_async_middleware
+
+from .instrumentation import RATE_LIMITED, is_enabled as instrumentation_enabled
+
+# Budget name -> URL name of the view it protects (POST only)
+BUDGET_VIEWS = {
+    'generation': 'quiz:index',
+    'grading': 'quiz:check_answers',
+    'email': 'quiz:send_quiz_email',
+    'events': 'quiz:question_events',
+}
+
+_stats = Counter() # Throttled requests per budget, this process
+
+
+@lru_cache(maxsize=32)
+def parse_rate(spec: str) -> tuple:
+    """'10/600' -> (10, 600.0): ten tokens, refilled completely over 600 seconds."""
+    tokens, _, seconds = spec.partition('/')
+    capacity, period = int(tokens), float(seconds)
+    if capacity < 1 or period <= 0:
+        raise ValueError(f"Invalid rate limit {spec!r}; expected '<tokens>/<seconds>'.")
+    return capacity, period
+
+
+_budget_paths = None
+
+
+def budget_for(request) -> str:
+    """The budget a request draws from, or None for requests that are not limited."""
+    global _budget_paths
+    if request.method != 'POST':
+        return None
+    if _budget_paths is None:
+        _budget_paths = {reverse(view): budget for budget, view in BUDGET_VIEWS.items()}
+    budget = _budget_paths.get(request.path_info)
+    return budget if budget in getattr(settings, 'RATE_LIMITS', {}) else None
+
+
+def client_ip(request) -> str:
+    if getattr(settings, 'RATE_LIMIT_TRUST_X_FORWARDED_FOR', False):
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _client_identity(request) -> str:
+    api_key = request.META.get('HTTP_X_API_KEY')
+    if api_key:
+        return 'key:' + hashlib.sha256(api_key.encode()).hexdigest()[:24]
+    cookie = request.COOKIES.get(settings.SESSION_COOKIE_NAME) or request.COOKIES.get(settings.CSRF_COOKIE_NAME)
+    if cookie:
+        return 'cookie:' + hashlib.sha256(cookie.encode()).hexdigest()[:24]
+    return 'ip:' + client_ip(request)
+
+
+def take_token(request, budget: str, now: float = None) -> float:
+    """
+    Takes a token for ``request`` from ``budget``. Returns None when the
+    request may proceed, else the seconds until it would be allowed.
+    """
+    capacity, period = parse_rate(settings.RATE_LIMITS[budget])
+    buckets = { # Cache key -> seconds per token
+        f"ratelimit:{budget}:{_client_identity(request)}": period / capacity,
+        f"ratelimit:{budget}:network:{client_ip(request)}": period / (capacity * getattr(settings, 'RATE_LIMIT_IP_MULTIPLIER', 10)),
+    }
+    now = time.time() if now is None else now
+
+    cache = caches[getattr(settings, 'RATE_LIMIT_CACHE', 'default')]
+    full_at = cache.get_many(list(buckets))
+    updated, wait = {}, 0.0
+    for key, interval in buckets.items():
+        # Time at which the bucket is full again after this request; at most `period` ahead while a token is left.
+        next_full = max(full_at.get(key, now), now) + interval
+        wait = max(wait, next_full - now - period)
+        updated[key] = next_full
+    if wait > 0:
+        return wait
+    cache.set_many(updated, timeout=math.ceil(period) + 1)
+    return None
+
+
+def stats() -> dict:
+    """Throttled requests per budget in this process."""
+    return dict(_stats)
+
+
+def throttled_response(request, budget: str, retry_after: float):
+    _stats[budget] += 1
+    if instrumentation_enabled():
+        RATE_LIMITED.inc((budget,))
+    seconds = max(1, math.ceil(retry_after))
+    message = f"Too many requests. Please try again in {seconds} seconds."
+    if budget == 'generation':
+        # The generation form posts a normal page; show the error there with the form still filled in.
+        response = render(request, 'quiz/index.html', {'form_data': request.POST.dict(), 'error': message}, status=429)
+    else:
+        response = JsonResponse({'error': message}, status=429)
+    response['Retry-After'] = str(seconds)
+    return response
+
+
+@sync_and_async_middleware
+def RateLimitMiddleware(get_response):
+    """Rejects requests over their budget with 429 before they reach the view (see the module docstring)."""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            budget = budget_for(request)
+            if budget is not None:
+                # One thread hop for the cache round trips; cache backends may not be used from the event loop.
+                retry_after = await sync_to_async(take_token)(request, budget)
+                if retry_after is not None:
+                    return throttled_response(request, budget, retry_after)
+            return await get_response(request)
+    else:
+        def middleware(request):
+            budget = budget_for(request)
+            if budget is not None:
+                retry_after = take_token(request, budget)
+                if retry_after is not None:
+                    return throttled_response(request, budget, retry_after)
+            return get_response(request)
+    return middleware
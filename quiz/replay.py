@@ -0,0 +1,234 @@
+"""
+Record/replay layer for Gemini generation calls.
+
+Wrap the live model call in a ``ReplayProvider`` to either record every
+response (prompt fingerprint -> raw text, latency and token usage) to an
+append-only store, or serve previously recorded responses without touching
+the network. Modes:
+
+* ``off``    - call the live model only (default)
+* ``record`` - call the live model and append each response to the store
+* ``replay`` - answer from the store only; a missing recording raises ``ReplayMiss``
+* ``auto``   - replay when a recording exists, otherwise call live and record it
+
+The store is a JSONL file (one record per line) or, when the path ends in
+``.sqlite3``/``.db``, a SQLite database. This module deliberately has no
+Django imports so ``streamlit_app.py`` can use it too; the Django app reads
+its configuration from settings, Streamlit from the ``QUIZIFY_GENAI_REPLAY_*``
+environment variables (see ``provider_from_env``).
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+MODES = ('off', 'record', 'replay', 'auto')
+DEFAULT_STORE_PATH = 'recordings/generations.jsonl'
+
+
+class ReplayMiss(LookupError):
+    """Raised in replay mode when no recording exists for a prompt."""
+
+
+def fingerprint(model: str, prompt: str) -> str:
+    """Stable key for a (model, prompt) pair."""
+    return hashlib.sha256(f"{model}\0{prompt}".encode('utf-8')).hexdigest()
+
+
+class _Usage:
+    def __init__(self, prompt_token_count=None, candidates_token_count=None):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class ReplayedResponse:
+    """Quacks like a Gemini response for the attributes Quizify reads (``text`` and ``usage_metadata``)."""
+    replayed = True
+
+    def __init__(self, record: dict):
+        self.record = record
+        self.text = record['text']
+        self.usage_metadata = _Usage(record.get('prompt_tokens'), record.get('response_tokens'))
+
+
+# --- Stores ---
+
+class JSONLStore:
+    """Append-only JSONL store. The whole file is indexed on first lookup; later lines win."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        index = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        index[record['fingerprint']] = record
+                    except (ValueError, KeyError):
+                        continue # Skip a torn final line from an interrupted write
+        return index
+
+    def get(self, key: str):
+        with self._lock:
+            if self._index is None:
+                self._index = self._load()
+            return self._index.get(key)
+
+    def append(self, record: dict):
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            if self._index is not None:
+                self._index[record['fingerprint']] = record
+
+    def __len__(self):
+        with self._lock:
+            if self._index is None:
+                self._index = self._load()
+            return len(self._index)
+
+
+class SQLiteStore:
+    """SQLite store keyed by fingerprint; re-recording a prompt replaces the old row."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS recordings (fingerprint TEXT PRIMARY KEY, record TEXT NOT NULL)")
+        self._conn.commit()
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute("SELECT record FROM recordings WHERE fingerprint = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def append(self, record: dict):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO recordings (fingerprint, record) VALUES (?, ?)",
+                               (record['fingerprint'], json.dumps(record, separators=(',', ':'))))
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM recordings").fetchone()[0]
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path: str):
+    """Shared store instance for ``path`` (SQLite for .sqlite3/.db, JSONL otherwise)."""
+    path = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store_class = SQLiteStore if path.endswith(('.sqlite3', '.db')) else JSONLStore
+            store = _stores[path] = store_class(path)
+        return store
+
+
+# --- Provider wrapper ---
+
+class ReplayProvider:
+    """
+    Wraps ``live_call(model, prompt) -> response`` with record/replay behaviour.
+    ``async_live_call`` is the awaitable counterpart used by ``agenerate``. Either
+    may be None in replay mode (no API key needed).
+    """
+
+    def __init__(self, live_call, mode: str = 'off', store=None, replay_latency: bool = False, async_live_call=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown replay mode '{mode}'. Expected one of {MODES}.")
+        if mode != 'off' and store is None:
+            raise ValueError(f"Replay mode '{mode}' needs a store.")
+        self.live_call = live_call
+        self.async_live_call = async_live_call
+        self.mode = mode
+        self.store = store
+        self.replay_latency = replay_latency
+
+    def generate(self, model: str, prompt: str):
+        key = fingerprint(model, prompt)
+        record = self._lookup(key, model)
+        if record is not None:
+            if self.replay_latency:
+                time.sleep(record.get('latency_ms', 0) / 1000)
+            return ReplayedResponse(record)
+
+        if self.live_call is None:
+            raise ValueError("No live model call configured.")
+        started = time.perf_counter()
+        response = self.live_call(model, prompt)
+        self._record(key, model, prompt, response, started)
+        return response
+
+    async def agenerate(self, model: str, prompt: str):
+        # Store reads and writes are blocking file/SQLite I/O, so they run in a worker thread off the event loop.
+        key = fingerprint(model, prompt)
+        record = await asyncio.to_thread(self._lookup, key, model) if self.mode in ('replay', 'auto') else None
+        if record is not None:
+            if self.replay_latency:
+                await asyncio.sleep(record.get('latency_ms', 0) / 1000)
+            return ReplayedResponse(record)
+
+        if self.async_live_call is None:
+            raise ValueError("No async live model call configured.")
+        started = time.perf_counter()
+        response = await self.async_live_call(model, prompt)
+        if self.mode in ('record', 'auto'):
+            await asyncio.to_thread(self.store.append, self._recording(key, model, prompt, response, started))
+        return response
+
+    def _lookup(self, key: str, model: str):
+        """The recording to replay for ``key``, or None when the live model should be called."""
+        if self.mode not in ('replay', 'auto'):
+            return None
+        record = self.store.get(key)
+        if record is None and self.mode == 'replay':
+            raise ReplayMiss(f"No recorded response for model '{model}' and prompt fingerprint {key[:12]}.")
+        return record
+
+    def _record(self, key: str, model: str, prompt: str, response, started: float):
+        if self.mode not in ('record', 'auto'):
+            return
+        self.store.append(self._recording(key, model, prompt, response, started))
+
+    def _recording(self, key: str, model: str, prompt: str, response, started: float) -> dict:
+        usage = getattr(response, 'usage_metadata', None)
+        return {
+            'fingerprint': key,
+            'model': model,
+            'prompt_chars': len(prompt),
+            'text': response.text,
+            'latency_ms': round((time.perf_counter() - started) * 1000, 1),
+            'prompt_tokens': getattr(usage, 'prompt_token_count', None),
+            'response_tokens': getattr(usage, 'candidates_token_count', None),
+            'recorded_at': datetime.now(timezone.utc).isoformat(),
+        }
+
+
+def provider_from_env(live_call, environ=None) -> ReplayProvider:
+    """Builds a provider from QUIZIFY_GENAI_REPLAY_MODE / _STORE / _LATENCY (used by streamlit_app.py)."""
+    environ = os.environ if environ is None else environ
+    mode = environ.get('QUIZIFY_GENAI_REPLAY_MODE', 'off')
+    store_path = environ.get('QUIZIFY_GENAI_REPLAY_STORE', DEFAULT_STORE_PATH)
+    replay_latency = environ.get('QUIZIFY_GENAI_REPLAY_LATENCY', 'False') == 'True'
+    return ReplayProvider(live_call, mode, get_store(store_path) if mode != 'off' else None, replay_latency)
@@ -0,0 +1,159 @@
+"""
+Full-text search over quizzes (topic, explanation and question text).
+
+On SQLite the ``quiz_quiz_fts`` FTS5 table (created by migration 0005) holds
+one row per quiz, keyed by the quiz id, and is kept in sync by triggers on
+``quiz_quiz`` - so bulk_create(), update() and raw SQL writes are indexed too.
+SQLite drops those triggers whenever a migration rebuilds ``quiz_quiz`` (adding
+or altering a column), so such migrations must recreate them (see 0006).
+Results are ranked with bm25, weighting topic matches above explanation and
+question-text matches. Other database backends fall back to a topic
+``icontains`` filter. ``python manage.py rebuild_search_index`` repopulates
+the table from scratch.
+"""
+import hashlib
+import json
+import re
+import time
+
+from django.db import connection
+from django.http import HttpRequest, JsonResponse
+from django.utils.cache import get_conditional_response
+
+from .models import PrefetchedQuiz, Quiz
+
+FTS_TABLE = 'quiz_quiz_fts'
+# bm25 column weights: topic, explanation, questions
+RANK_WEIGHTS = (10.0, 2.0, 1.0)
+MAX_LIMIT = 100
+_RESULT_FIELDS = ('id', 'topic', 'difficulty', 'question_type', 'question_count', 'created_at')
+
+_QUESTIONS_TEXT_SQL = (
+    "(SELECT group_concat(json_extract(q.value, '$.question_text'), ' ') "
+    "FROM json_each(CASE WHEN json_valid(quiz_quiz.questions_data) THEN quiz_quiz.questions_data ELSE '[]' END) AS q "
+    "WHERE q.type = 'object')"
+)
+REBUILD_SQL = [
+    f"DELETE FROM {FTS_TABLE}",
+    f"INSERT INTO {FTS_TABLE} (rowid, topic, explanation, questions) "
+    f"SELECT quiz_quiz.id, quiz_quiz.topic, COALESCE(quiz_quiz.explanation, ''), COALESCE({_QUESTIONS_TEXT_SQL}, '') FROM quiz_quiz",
+    f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')",
+]
+
+_fts_available = None
+
+
+def fts_available() -> bool:
+    """True when the database is SQLite and the FTS table exists (checked once per process)."""
+    global _fts_available
+    if _fts_available is None:
+        if connection.vendor != 'sqlite':
+            _fts_available = False
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+                _fts_available = cursor.fetchone() is not None
+    return _fts_available
+
+
+def build_match_expression(query: str) -> str:
+    """
+    Turns free text into a safe FTS5 MATCH expression: every word must match,
+    and the last word is a prefix so results appear while the user is typing.
+    Returns '' when the query has no searchable words.
+    """
+    words = re.findall(r'\w+', query.lower())[:16]
+    if not words:
+        return ''
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_quizzes(query: str, limit: int = 20) -> list:
+    """
+    Best-matching quizzes for ``query``, best first. Unclaimed prefetch inventory (quiz.prefetch) is left out: it is
+    deleted if nobody asks for it, so it must not be handed out before it is claimed.
+    """
+    limit = max(1, min(limit, MAX_LIMIT))
+    if not fts_available():
+        rows = Quiz.objects.filter(topic__icontains=query.strip()).exclude(prefetch_entry__isnull=False).order_by('-created_at')[:limit]
+        return [_result(quiz, None, '') for quiz in rows.only(*_RESULT_FIELDS)]
+
+    match = build_match_expression(query)
+    if not match:
+        return []
+    weights = ', '.join(str(w) for w in RANK_WEIGHTS)
+    sql = (
+        f"SELECT rowid, bm25({FTS_TABLE}, {weights}) AS rank, snippet({FTS_TABLE}, -1, '', '', '...', 12) "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid NOT IN (SELECT quiz_id FROM {PrefetchedQuiz._meta.db_table}) "
+        f"ORDER BY rank LIMIT %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, limit])
+        hits = cursor.fetchall()
+    quizzes = Quiz.objects.only(*_RESULT_FIELDS).exclude(prefetch_entry__isnull=False).in_bulk([hit[0] for hit in hits])
+    return [
+        _result(quiz, rank, snippet)
+        for quiz_id, rank, snippet in hits
+        if (quiz := quizzes.get(quiz_id)) is not None
+    ]
+
+
+def matching_quiz_ids_sql(query: str):
+    """(sql, params) selecting the ids of quizzes matching ``query``, for use in a pk__in subquery; None if unsupported."""
+    match = build_match_expression(query)
+    if not match or not fts_available():
+        return None
+    return f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]
+
+
+def rebuild_index():
+    """Repopulates the FTS table from quiz_quiz. Returns the number of indexed quizzes."""
+    with connection.cursor() as cursor:
+        for statement in REBUILD_SQL:
+            cursor.execute(statement)
+        cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def _result(quiz: Quiz, rank, snippet: str) -> dict:
+    return {
+        'id': quiz.id,
+        'topic': quiz.topic,
+        'difficulty': quiz.difficulty,
+        'question_type': quiz.question_type,
+        'question_count': quiz.question_count,
+        'created_at': quiz.created_at.isoformat(),
+        'score': round(-rank, 4) if rank is not None else None, # bm25 is lower-is-better; flip it for clients
+        'snippet': snippet,
+    }
+
+
+def search_view(request: HttpRequest) -> JsonResponse:
+    """GET /api/search?q=<text>&limit=<n> - ranked quiz search."""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid request method. Use GET.'}, status=405)
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'error': 'Query parameter "q" is required.'}, status=400)
+    try:
+        limit = int(request.GET.get('limit', '20'))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit.'}, status=400)
+
+    started = time.perf_counter()
+    results = search_quizzes(query, limit)
+    # took_ms differs on every call, so the ETag covers the results only.
+    etag = '"%s"' % hashlib.sha256(json.dumps([query, results], default=str).encode()).hexdigest()[:32]
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        not_modified['ETag'] = etag
+        return not_modified
+    response = JsonResponse({
+        'query': query,
+        'results': results,
+        'took_ms': round((time.perf_counter() - started) * 1000, 2),
+    })
+    response['ETag'] = etag
+    return response
@@ -0,0 +1,70 @@
+"""
+Off-request persistence of generation telemetry.
+
+``record_generation_run`` hands a finished ``GenerationRun`` to a daemon writer
+thread that batches inserts, so recording telemetry never adds a database
+round-trip to the request that triggered the generation. Set
+``GENERATION_TELEMETRY_ASYNC = False`` to write inline (used by the tests).
+"""
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import GenerationRun
+
+_BATCH_SIZE = 100
+_queue = queue.Queue(maxsize=10000)
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def record_generation_run(run: GenerationRun):
+    """Persists ``run`` in the background (or inline when async telemetry is disabled)."""
+    if not getattr(settings, 'GENERATION_TELEMETRY_ENABLED', True):
+        return
+    if not getattr(settings, 'GENERATION_TELEMETRY_ASYNC', True):
+        run.save()
+        return
+
+    _ensure_writer()
+    try:
+        _queue.put_nowait(run)
+    except queue.Full:
+        # Telemetry is best-effort: dropping a row is better than blocking a request.
+        print("Warning: generation telemetry queue is full; dropping run record.")
+
+
+def flush():
+    """Blocks until every queued run has been written."""
+    if _writer is not None:
+        _queue.join()
+
+
+def _ensure_writer():
+    global _writer
+    if _writer is not None and _writer.is_alive():
+        return
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_drain_forever, name='quizify-telemetry-writer', daemon=True)
+            _writer.start()
+
+
+def _drain_forever():
+    while True:
+        batch = [_queue.get()]
+        while len(batch) < _BATCH_SIZE:
+            try:
+                batch.append(_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            close_old_connections()
+            GenerationRun.objects.bulk_create(batch)
+        except Exception as e:
+            print(f"Error writing {len(batch)} generation telemetry rows: {e}")
+        finally:
+            for _ in batch:
+                _queue.task_done()
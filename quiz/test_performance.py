@@ -0,0 +1,196 @@
+"""
+Performance regression tests: pinned DB query counts per endpoint and latency budgets.
+
+The generator is stubbed throughout, so these tests never reach the Gemini API.
+If a change legitimately alters a query count, update the pinned number in the
+same commit and explain why in the message.
+"""
+import json
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.template.loader import render_to_string
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from quiz.models import Quiz, QuizAttempt
+
+
+def make_questions(count: int = 20) -> list:
+    """A mixed set of questions cycling through mcq, fill and tf."""
+    questions = []
+    for i in range(count):
+        q_type = ('mcq', 'fill', 'tf')[i % 3]
+        question = {'question_text': f"Question {i + 1}?", 'type': q_type, 'difficulty': 'Medium'}
+        if q_type == 'mcq':
+            question['options'] = [f"Option {letter}" for letter in 'ABCD']
+            question['answer'] = 'Option B'
+        elif q_type == 'fill':
+            question['answer'] = f"answer {i + 1}"
+        else:
+            question['answer'] = i % 2 == 0
+        questions.append(question)
+    return questions
+
+
+def make_answers(questions: list) -> dict:
+    """Answers every other question correctly."""
+    answers = {}
+    for i, question in enumerate(questions):
+        if i % 2 == 0:
+            answers[f"q{i + 1}"] = str(question['answer']) if question['type'] == 'tf' else question['answer']
+        elif question['type'] == 'tf':
+            answers[f"q{i + 1}"] = str(not question['answer'])
+        else:
+            answers[f"q{i + 1}"] = 'wrong'
+    return answers
+
+
+def stub_generation(questions: list):
+    return {
+        'topic': 'Performance', 'difficulty': 'Medium', 'question_type': 'mixed',
+        'num_questions_requested_details': {'mcq': 7, 'fill': 7, 'tf': 6},
+        'content': 'Explanation ' * 200,
+        'questions': questions,
+        'generation_run': mock.Mock(),
+    }
+
+
+class Budget:
+    """Context manager asserting the enclosed block finishes within ``seconds`` of wall time."""
+
+    def __init__(self, test: TestCase, seconds: float):
+        self.test = test
+        self.seconds = seconds
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        if exc_type is None:
+            self.test.assertLess(elapsed, self.seconds, f"Latency budget exceeded: {elapsed * 1000:.1f} ms > {self.seconds * 1000:.0f} ms")
+        return False
+
+
+@override_settings(GENERATION_TELEMETRY_ASYNC=False)
+class EndpointQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.questions = make_questions(20)
+        cls.quiz = Quiz.objects.create(topic='Performance', difficulty='Medium', question_type='mixed',
+                                       explanation='Explanation', questions_data=cls.questions)
+
+    def test_index_get_queries(self):
+        with self.assertNumQueries(0):
+            self.client.get(reverse('quiz:index'))
+
+    def test_index_generate_queries(self):
+        # Quiz insert + session existence check and insert (wrapped in a savepoint).
+        with mock.patch('quiz.views.agenerate_quiz_content', new=mock.AsyncMock(return_value=stub_generation(self.questions))), \
+                mock.patch('quiz.views.record_generation_run'):
+            with self.assertNumQueries(5):
+                response = self.client.post(reverse('quiz:index'), {
+                    'topic': 'Performance', 'question_type': 'mixed', 'difficulty': 'Medium',
+                    'num_mcq': '7', 'num_fill': '7', 'num_tf': '6',
+                })
+        self.assertContains(response, 'data-quiz-id=')
+
+    def test_check_answers_queries(self):
+        # Quiz lookup + attempt insert + new session (existence check, savepoint, insert, release).
+        with self.assertNumQueries(6):
+            response = self.client.post(reverse('quiz:check_answers'),
+                                        json.dumps({'quiz_id': self.quiz.id, 'answers': make_answers(self.questions)}),
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        # With an idempotency key the insert runs in its own savepoint; the session now exists (select, update).
+        with self.assertNumQueries(8):
+            response = self.client.post(reverse('quiz:check_answers'),
+                                        json.dumps({'quiz_id': self.quiz.id, 'answers': make_answers(self.questions)}),
+                                        content_type='application/json', HTTP_IDEMPOTENCY_KEY='perf-test-key')
+        self.assertEqual(response.status_code, 200)
+
+    def test_send_quiz_email_queries(self):
+        attempt = QuizAttempt.objects.create(quiz=self.quiz, submitted_answers={}, score=0, total_questions=20,
+                                             percentage=0, results_data=[])
+        # Attempt and quiz are fetched together.
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('quiz:send_quiz_email'),
+                                        json.dumps({'attempt_id': attempt.id, 'email_address': 'student@example.com'}),
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+
+class LatencyBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.questions = make_questions(20)
+        cls.quiz = Quiz.objects.create(topic='Performance', difficulty='Medium', question_type='mixed',
+                                       explanation='Explanation ' * 200, questions_data=cls.questions)
+
+    def test_grading_twenty_questions_within_budget(self):
+        payload = json.dumps({'quiz_id': self.quiz.id, 'answers': make_answers(self.questions)})
+        self.client.post(reverse('quiz:check_answers'), payload, content_type='application/json') # Warm-up
+        with Budget(self, 0.25):
+            response = self.client.post(reverse('quiz:check_answers'), payload, content_type='application/json')
+        self.assertEqual(response.json()['score'], 10)
+
+    def test_result_email_render_within_budget(self):
+        attempt = QuizAttempt.objects.create(quiz=self.quiz, submitted_answers={}, score=10, total_questions=20,
+                                             percentage=50, results_data=[
+                                                 {'question_index': i, 'question_text': q['question_text'], 'submitted_answer': 'x',
+                                                  'correct_answer': q['answer'], 'is_correct': i % 2 == 0}
+                                                 for i, q in enumerate(self.questions)])
+        context = {
+            'quiz_topic': self.quiz.topic, 'quiz_difficulty': self.quiz.difficulty, 'quiz_explanation': self.quiz.explanation,
+            'quiz_questions': self.quiz.get_questions(), 'quiz_attempt_score': attempt.score,
+            'quiz_attempt_total_questions': attempt.total_questions, 'quiz_attempt_percentage': attempt.percentage,
+            'detailed_results': attempt.get_detailed_results(),
+        }
+        render_to_string('quiz/email/quiz_results_email.html', context) # Warm the template cache
+        with Budget(self, 0.1):
+            for _ in range(10):
+                render_to_string('quiz/email/quiz_results_email.html', context)
+
+
+class AdminChangelistScalingTests(TestCase):
+    """Changelists must issue a constant number of queries regardless of row count (no per-row lookups)."""
+    ROWS = 3000
+
+    @classmethod
+    def setUpTestData(cls):
+        questions = make_questions(5)
+        Quiz.objects.bulk_create([
+            Quiz(topic=f"Topic {i}", difficulty='Easy', question_type='mixed', explanation='x', questions_data=questions)
+            for i in range(cls.ROWS)
+        ], batch_size=500)
+        quiz_ids = list(Quiz.objects.values_list('id', flat=True))
+        QuizAttempt.objects.bulk_create([
+            QuizAttempt(quiz_id=quiz_ids[i % len(quiz_ids)], submitted_answers={}, score=1, total_questions=5,
+                        percentage=20, results_data=[])
+            for i in range(cls.ROWS)
+        ], batch_size=500)
+        cls.admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.admin_user)
+
+    def _changelist_queries(self, url_name: str) -> int:
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def test_quiz_changelist_query_count_is_constant(self):
+        with Budget(self, 2.0):
+            queries = self._changelist_queries('admin:quiz_quiz_changelist')
+        self.assertLessEqual(queries, 10)
+
+    def test_quizattempt_changelist_does_not_query_per_row(self):
+        with Budget(self, 2.0):
+            queries = self._changelist_queries('admin:quiz_quizattempt_changelist')
+        self.assertLessEqual(queries, 10) # A per-row quiz lookup would add ~100 queries per page
@@ -1,5 +1,42 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+
+from quiz import admin as quiz_admin
+from quiz.assets import minify_css, minify_js, reset_asset_index
+from quiz.autocomplete import TopicIndex, reset_topic_index
+from quiz.chunking import QuestionDeduper, missing, plan_chunks
+from quiz.export import export_chunks
+from quiz.importer import import_quizzes
+from quiz import admission, classroom, interactions, largequiz, prefetch, ratelimit
+from quiz.models import GenerationRun, PregenerationTask, PrefetchedQuiz, QuestionTiming, Quiz, QuizAttempt
+from quiz.profiling import load_captures, top_functions
+from quiz.replay import ReplayMiss, ReplayProvider, get_store
+from quiz.search import search_quizzes
+from quiz.telemetry import record_generation_run
+from quiz.views import _build_generation_prompt, _extract_json_payload, _fill_explanation
 
 class QuizViewTests(TestCase):
     def test_index_view_get(self):
@@ -24,3 +61,1033 @@ class QuizViewTests(TestCase):
         self.assertContains(response, "Test Topic")
         self.assertContains(response, "Easy")
         self.assertContains(response, "Placeholder Q1 (mcq)")
+
+
+INSTRUMENTED_MIDDLEWARE = ['quiz.instrumentation.InstrumentationMiddleware'] + [
+    m for m in settings.MIDDLEWARE if m != 'quiz.instrumentation.InstrumentationMiddleware'
+]
+
+
+@override_settings(INSTRUMENTATION_ENABLED=True, MIDDLEWARE=INSTRUMENTED_MIDDLEWARE)
+class InstrumentationTests(TestCase):
+    def test_server_timing_header_lists_stages(self):
+        """
+        Instrumented requests report their stages, DB time and total in Server-Timing.
+        """
+        response = self.client.get(reverse('quiz:index'))
+        header = response['Server-Timing']
+        self.assertIn('render;dur=', header)
+        self.assertIn('db;desc=', header)
+        self.assertIn('total;dur=', header)
+
+    async def test_async_requests_count_queries_from_worker_threads(self):
+        quiz = await Quiz.objects.acreate(topic='Async', difficulty='Easy', question_type='tf', explanation='Notes',
+                                          questions_data=[{'question_text': 'Awaited?', 'type': 'tf', 'difficulty': 'Easy', 'answer': True}])
+        response = await self.async_client.get(reverse('quiz:quiz_api', args=[quiz.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'db;desc="[1-9]\d* queries"') # Run via sync_to_async, off the event loop
+
+    def test_metrics_endpoint_exposes_view_histogram(self):
+        self.client.get(reverse('quiz:index'))
+        self.assertEqual(self.client.get(reverse('quiz:metrics')).status_code, 302) # Staff or token only
+        with override_settings(METRICS_TOKEN='scrape-secret'):
+            self.assertEqual(self.client.get(reverse('quiz:metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 302)
+            self.assertEqual(self.client.get(reverse('quiz:metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret').status_code, 200)
+        self.client.force_login(User.objects.create_user('ops', password='x', is_staff=True))
+        response = self.client.get(reverse('quiz:metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'quizify_view_duration_seconds_count{view="quiz:index",method="GET",status="200"}')
+        self.assertContains(response, 'quizify_stage_duration_seconds_bucket{view="quiz:index",stage="render"')
+
+    @override_settings(INSTRUMENTATION_ENABLED=False)
+    def test_disabled_instrumentation_is_transparent(self):
+        response = self.client.get(reverse('quiz:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertEqual(self.client.get(reverse('quiz:metrics')).status_code, 404)
+
+
+@override_settings(GENERATION_TELEMETRY_ASYNC=False)
+class GenerationTelemetryTests(TestCase):
+    def _run(self, **overrides):
+        fields = {
+            'model_name': 'gemini-2.0-flash', 'topic': 'Cells', 'question_type': 'mcq', 'difficulty': 'Easy',
+            'num_questions_requested': 5, 'wall_time_ms': 1000.0, 'parse_path': 'direct', 'succeeded': True,
+        }
+        fields.update(overrides)
+        return GenerationRun(**fields)
+
+    def test_extract_json_payload_reports_parse_path(self):
+        self.assertEqual(_extract_json_payload('{"a": 1}'), ({'a': 1}, 'direct'))
+        self.assertEqual(_extract_json_payload('```json\n{"a": 1}\n```')[1], 'fenced')
+        self.assertEqual(_extract_json_payload('Sure! {"a": 1} Hope that helps.')[1], 'braces')
+
+    def test_record_generation_run_persists_inline_when_sync(self):
+        record_generation_run(self._run())
+        self.assertEqual(GenerationRun.objects.count(), 1)
+
+    def test_admin_changelist_shows_percentiles_per_model_and_type(self):
+        for wall_time in range(1, 101):
+            record_generation_run(self._run(wall_time_ms=float(wall_time), parse_path='fenced' if wall_time <= 10 else 'direct'))
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+
+        response = self.client.get(reverse('admin:quiz_generationrun_changelist'))
+        self.assertEqual(response.status_code, 200)
+        [row] = response.context['percentile_summary']
+        self.assertEqual(row['runs'], 100)
+        self.assertEqual(row['wall_p50'], 50.0)
+        self.assertEqual(row['wall_p99'], 99.0)
+        self.assertEqual(row['fallback_rate'], 10.0)
+        self.assertContains(response, 'generation-percentiles')
+
+    def test_admin_percentiles_default_to_a_recent_window(self):
+        record_generation_run(self._run(wall_time_ms=100.0))
+        old = self._run(wall_time_ms=9000.0)
+        record_generation_run(old)
+        GenerationRun.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=30))
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+
+        response = self.client.get(reverse('admin:quiz_generationrun_changelist'))
+        [row] = response.context['percentile_summary']
+        self.assertEqual((row['runs'], row['wall_p99']), (1, 100.0))
+        self.assertContains(response, 'from the last 7 days')
+
+        since = (timezone.now() - timedelta(days=60)).strftime('%Y-%m-%d')
+        response = self.client.get(reverse('admin:quiz_generationrun_changelist'), {'created_at__gte': since})
+        [row] = response.context['percentile_summary']
+        self.assertEqual(row['runs'], 2)
+        self.assertEqual(response.context['percentile_window'], 'the runs matching the current filters')
+
+        with mock.patch.object(quiz_admin.GenerationRunAdmin, 'PERCENTILE_MAX_ROWS', 1):
+            response = self.client.get(reverse('admin:quiz_generationrun_changelist'))
+        self.assertTrue(response.context['percentile_window'].startswith('the newest 1 of'))
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir, ignore_errors=True)
+        self.profiled = override_settings(
+            MIDDLEWARE=settings.MIDDLEWARE + ['quiz.profiling.ProfilingMiddleware'],
+            PROFILING_DIR=self.profile_dir,
+            PROFILING_SAMPLE_RATE=0.0,
+            PROFILING_URL_PATTERNS=[r'^/$'],
+            PROFILING_TOKEN='secret',
+            PROFILING_MAX_FILES=2,
+        )
+        self.profiled.enable()
+        self.addCleanup(self.profiled.disable)
+
+    def test_matching_url_is_profiled_and_rotated(self):
+        for _ in range(3):
+            self.client.get(reverse('quiz:index'))
+        captures = load_captures()
+        self.assertEqual(len(captures), 2) # Oldest capture rotated out
+        self.assertEqual(captures[0]['trigger'], 'url')
+        self.assertEqual(captures[0]['view'], 'quiz:index')
+
+    def test_async_view_code_is_in_wsgi_captures(self):
+        self.client.get(reverse('quiz:index'))
+        [capture] = load_captures()
+        functions = [row['function'] for row in top_functions(Path(self.profile_dir) / f"{capture['name']}.prof", limit=1000)]
+        self.assertTrue(any(function.endswith('(index)') and 'views.py' in function for function in functions), functions)
+
+    async def test_async_requests_are_profiled(self):
+        response = await self.async_client.get(reverse('quiz:index'))
+        self.assertEqual(response.status_code, 200)
+        captures = await sync_to_async(load_captures)()
+        self.assertEqual([(c['trigger'], c['view']) for c in captures], [('url', 'quiz:index')])
+
+    def test_header_token_triggers_profiling(self):
+        self.client.post(reverse('quiz:check_answers'), data='{}', content_type='application/json', HTTP_X_QUIZIFY_PROFILE='wrong')
+        self.assertEqual(load_captures(), [])
+        self.client.post(reverse('quiz:check_answers'), data='{}', content_type='application/json', HTTP_X_QUIZIFY_PROFILE='secret')
+        self.assertEqual([c['trigger'] for c in load_captures()], ['header'])
+
+    def test_profile_pages_are_staff_only(self):
+        self.client.get(reverse('quiz:index'))
+        name = load_captures()[0]['name']
+        self.assertEqual(self.client.get(reverse('quiz:profile_list')).status_code, 302)
+
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+        self.assertContains(self.client.get(reverse('quiz:profile_list')), name)
+        detail = self.client.get(reverse('quiz:profile_detail', args=[name]))
+        self.assertContains(detail, 'Top functions by cumulative time')
+        self.assertTrue(detail.context['functions'])
+
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+class ReplayTests(TestCase):
+    def setUp(self):
+        self.store_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.store_dir, ignore_errors=True)
+        self.live_calls = []
+
+    def _live(self, model, prompt):
+        self.live_calls.append(prompt)
+        return _FakeResponse(json.dumps({
+            'explanation': 'Recorded explanation',
+            'questions': [{'question_text': 'Recorded?', 'type': 'tf', 'difficulty': 'Easy', 'answer': True}],
+        }))
+
+    def test_record_then_replay_for_each_store_format(self):
+        for filename in ('generations.jsonl', 'generations.sqlite3'):
+            store = get_store(f"{self.store_dir}/{filename}")
+            ReplayProvider(self._live, 'record', store).generate('m', 'prompt')
+            replayed = ReplayProvider(None, 'replay', store).generate('m', 'prompt')
+            self.assertTrue(replayed.replayed)
+            self.assertIn('Recorded explanation', replayed.text)
+            with self.assertRaises(ReplayMiss):
+                ReplayProvider(None, 'replay', store).generate('m', 'another prompt')
+        self.assertEqual(len(self.live_calls), 2)
+
+    def test_async_generate_does_store_io_off_the_event_loop(self):
+        store = get_store(f"{self.store_dir}/generations.sqlite3")
+        threads = []
+        for method in ('get', 'append'):
+            original = getattr(store, method)
+            def tracked(*args, _original=original):
+                threads.append(threading.get_ident())
+                return _original(*args)
+            self.addCleanup(setattr, store, method, original)
+            setattr(store, method, tracked)
+
+        async def live(model, prompt):
+            return self._live(model, prompt)
+
+        async def generate_twice():
+            await ReplayProvider(None, 'auto', store, async_live_call=live).agenerate('m', 'prompt')
+            replayed = await ReplayProvider(None, 'replay', store).agenerate('m', 'prompt')
+            return threading.get_ident(), replayed
+
+        loop_thread, replayed = asyncio.run(generate_twice())
+        self.assertTrue(replayed.replayed)
+        self.assertEqual(len(threads), 3) # auto miss, record, replay hit
+        self.assertNotIn(loop_thread, threads)
+
+    def test_index_generates_from_recording_without_api_key(self):
+        store_path = f"{self.store_dir}/generations.jsonl"
+        prompt, _ = _build_generation_prompt('Recorded Topic', 'tf', 'Easy', 1)
+        ReplayProvider(self._live, 'record', get_store(store_path)).generate(settings.GENAI_MODEL, prompt)
+
+        with override_settings(GOOGLE_API_KEY=None, GENAI_REPLAY_MODE='replay', GENAI_REPLAY_STORE=store_path,
+                               GENERATION_TELEMETRY_ASYNC=False):
+            response = self.client.post(reverse('quiz:index'), {
+                'topic': 'Recorded Topic', 'question_type': 'tf', 'difficulty': 'Easy', 'num_questions': '1',
+            })
+        self.assertContains(response, 'Recorded explanation')
+        self.assertEqual(len(self.live_calls), 1) # Only the recording call reached the "live" model
+
+
+class AdminScalingTests(TestCase):
+    def _quiz(self, n_questions=2):
+        return Quiz.objects.create(topic='Cells', difficulty='Easy', question_type='tf',
+                                   questions_data=[{'question_text': 'Q?', 'type': 'tf', 'difficulty': 'Easy', 'answer': True}] * n_questions)
+
+    def test_question_count_is_maintained_on_save(self):
+        quiz = self._quiz(3)
+        self.assertEqual(Quiz.objects.get(pk=quiz.pk).question_count, 3)
+        quiz.questions_data = quiz.questions_data[:1]
+        quiz.save(update_fields=['questions_data'])
+        self.assertEqual(Quiz.objects.get(pk=quiz.pk).question_count, 1)
+
+    def test_unfiltered_changelist_uses_estimated_count(self):
+        quizzes = [self._quiz() for _ in range(3)]
+        quizzes[0].delete()
+        with mock.patch.object(quiz_admin, 'EXACT_COUNT_THRESHOLD', 0):
+            self.assertEqual(quiz_admin.EstimatedCountPaginator(Quiz.objects.all(), 10).count, 3) # MAX(rowid) upper bound
+            self.assertEqual(quiz_admin.EstimatedCountPaginator(Quiz.objects.filter(topic='Cells'), 10).count, 2)
+
+            User.objects.create_superuser('admin', 'admin@example.com', 'password')
+            self.client.login(username='admin', password='password')
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse('admin:quiz_quiz_changelist'))
+        self.assertEqual(response.status_code, 200)
+        quiz_queries = [q['sql'] for q in ctx.captured_queries if '"quiz_quiz"' in q['sql']]
+        self.assertFalse([sql for sql in quiz_queries if 'COUNT(' in sql])
+        self.assertFalse([sql for sql in quiz_queries if '"questions_data"' in sql]) # Deferred on the changelist
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.photosynthesis = Quiz.objects.create(topic='Photosynthesis', difficulty='Easy', question_type='tf',
+                                                  explanation='How plants turn light into sugar.',
+                                                  questions_data=[{'question_text': 'Do plants need chlorophyll?', 'type': 'tf', 'difficulty': 'Easy', 'answer': True}])
+        self.cells = Quiz.objects.create(topic='Cell biology', difficulty='Easy', question_type='tf',
+                                         explanation='Chloroplasts are where photosynthesis happens.', questions_data=[])
+
+    def test_topic_matches_rank_above_explanation_matches(self):
+        self.assertEqual([r['id'] for r in search_quizzes('photosynth')], [self.photosynthesis.id, self.cells.id])
+        self.assertEqual([r['id'] for r in search_quizzes('chlorophyll')], [self.photosynthesis.id]) # Question text
+
+    def test_index_follows_updates_and_deletes(self):
+        Quiz.objects.filter(pk=self.cells.pk).update(topic='Mitochondria') # update() bypasses save(); triggers still fire
+        self.assertEqual([r['topic'] for r in search_quizzes('mitochondria')], ['Mitochondria'])
+        self.photosynthesis.delete()
+        self.assertEqual([r['id'] for r in search_quizzes('chlorophyll')], [])
+
+    def test_search_endpoint_admin_and_rebuild(self):
+        response = self.client.get(reverse('quiz:search'), {'q': 'light sugar'})
+        self.assertEqual([r['topic'] for r in response.json()['results']], ['Photosynthesis'])
+        self.assertEqual(self.client.get(reverse('quiz:search')).status_code, 400)
+
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+        changelist = self.client.get(reverse('admin:quiz_quiz_changelist'), {'q': 'chloroplasts'})
+        self.assertEqual([quiz.id for quiz in changelist.context['cl'].result_list], [self.cells.id])
+
+        call_command('rebuild_search_index', stdout=io.StringIO())
+        self.assertEqual(len(search_quizzes('photosynthesis')), 2)
+
+
+class TopicAutocompleteTests(TestCase):
+    def test_index_ranks_by_popularity_and_merges_spellings(self):
+        index = TopicIndex([('Photosynthesis', 3), ('photosynthesis ', 2), ('Photons', 4), ('Physics', 9), ('Chemistry', 1)])
+        self.assertEqual(index.suggest('pho'), [('Photosynthesis', 5), ('Photons', 4)])
+        self.assertEqual(index.suggest('PHOTOS'), [('Photosynthesis', 5)])
+        index.add('Photoelectric effect', 6)
+        index.add('Photons', 3)
+        self.assertEqual(index.suggest('photo', limit=2), [('Photons', 7), ('Photoelectric effect', 6)])
+        self.assertEqual(index.suggest('ph', limit=1), [('Physics', 9)])
+        self.assertEqual(index.suggest('x'), [])
+
+    def test_topics_outside_the_basic_multilingual_plane_match_longer_prefixes(self):
+        index = TopicIndex([('Python basics', 3), ('Pyth\U0001F40D snakes', 5)])
+        self.assertEqual(index.suggest('p'), [('Pyth\U0001F40D snakes', 5), ('Python basics', 3)])
+        self.assertEqual(index.suggest('pyth'), [('Pyth\U0001F40D snakes', 5), ('Python basics', 3)])
+        self.assertEqual(index.suggest('pyth\U0001F40D'), [('Pyth\U0001F40D snakes', 5)])
+
+    def test_highest_code_point_in_topics_and_prefixes(self):
+        index = TopicIndex([('a\U0010ffff', 2), ('a\U0010ffffb', 4), ('\U0010ffff\U0010ffff\U0010ffff\U0010ffff', 1), ('b', 3)])
+        self.assertEqual(index.suggest('a\U0010ffff'), [('a\U0010ffffb', 4), ('a\U0010ffff', 2)])
+        self.assertEqual(index.suggest('\U0010ffff' * 4), [('\U0010ffff' * 4, 1)])
+        self.assertEqual(index.suggest('b\U0010ffff\U0010ffffx'), [])
+
+    def test_endpoint_loads_lazily_and_counts_new_quizzes(self):
+        reset_topic_index()
+        self.addCleanup(reset_topic_index)
+        for topic in ('World War II', 'World War II', 'World War I', 'Photosynthesis'):
+            Quiz.objects.create(topic=topic, difficulty='Easy', question_type='tf', questions_data=[])
+        response = self.client.get(reverse('quiz:topic_suggestions'), {'q': 'world'})
+        self.assertEqual(response.json()['suggestions'], [{'topic': 'World War II', 'count': 2}, {'topic': 'World War I', 'count': 1}])
+        self.assertEqual(self.client.get(reverse('quiz:topic_suggestions'), {'q': ' '}).json()['suggestions'], [])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        for i in range(5):
+            quiz = Quiz.objects.create(topic='Algebra' if i % 2 else 'Geometry', difficulty='Easy', question_type='tf',
+                                       questions_data=[{'question_text': f'Q{i}?', 'type': 'tf', 'difficulty': 'Easy', 'answer': True}])
+            QuizAttempt.objects.create(quiz=quiz, submitted_answers={'q1': 'True'}, score=1, total_questions=1, percentage=100, results_data=[])
+
+    def _export(self, *args, **kwargs):
+        return b''.join(export_chunks(*args, **kwargs))
+
+    def test_jsonl_keyset_resume_and_filters(self):
+        ids = list(Quiz.objects.order_by('id').values_list('id', flat=True))
+        first = [json.loads(line) for line in self._export('quizzes', 'jsonl', limit=2, chunk_size=1).splitlines()]
+        rest = [json.loads(line) for line in self._export('quizzes', 'jsonl', after_id=first[-1]['id'], chunk_size=2).splitlines()]
+        self.assertEqual([row['id'] for row in first + rest], ids)
+        self.assertEqual(first[0]['questions_data'][0]['question_text'], 'Q0?')
+
+        algebra = self._export('attempts', 'jsonl', topic='algebra', since='2000-01-01', until=timezone.now().date().isoformat())
+        self.assertEqual(len(algebra.splitlines()), 2)
+
+    def test_unclaimed_prefetched_quizzes_are_not_exported(self):
+        inventory = Quiz.objects.create(topic='Prefetched', difficulty='Easy', question_type='tf', questions_data=[])
+        PrefetchedQuiz.objects.create(key='tf|Easy|5|prefetched', quiz=inventory)
+        exported = [json.loads(line)['id'] for line in self._export('quizzes', 'jsonl').splitlines()]
+        self.assertEqual(len(exported), 5)
+        self.assertNotIn(inventory.id, exported)
+
+    def test_gzip_csv_and_endpoint(self):
+        csv_text = gzip.decompress(self._export('attempts', 'csv', compress=True)).decode()
+        self.assertTrue(csv_text.startswith('id,quiz_id,score'))
+        self.assertEqual(len(csv_text.strip().splitlines()), 6)
+
+        url = reverse('quiz:export', args=['quizzes', 'jsonl'])
+        self.assertEqual(self.client.get(url).status_code, 302) # Staff only
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+        response = self.client.get(url, {'difficulty': 'Easy', 'gzip': '1'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(len(gzip.decompress(b''.join(response.streaming_content)).splitlines()), 5)
+        self.assertEqual(self.client.get(url, {'since': 'yesterday'}).status_code, 400)
+
+    async def test_endpoint_streams_asynchronously_under_asgi(self):
+        admin_user = await User.objects.acreate(username='admin', is_staff=True, is_superuser=True)
+        await sync_to_async(self.client.force_login)(admin_user) # AsyncClient has no force_login in Django 4.2
+        self.async_client.cookies = self.client.cookies
+        response = await self.async_client.get(reverse('quiz:export', args=['attempts', 'jsonl']))
+        self.assertTrue(response.is_async) # A sync iterator would be buffered whole before sending
+        lines = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(b''.join(lines).splitlines()), 5)
+
+    def test_export_command_reports_resume_point(self):
+        output = tempfile.NamedTemporaryFile(suffix='.jsonl', delete=False)
+        output.close()
+        self.addCleanup(os.remove, output.name)
+        stderr = io.StringIO()
+        call_command('export_data', 'quizzes', '--limit', '3', '--output', output.name, stderr=stderr)
+        with open(output.name) as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual(len(rows), 3)
+        self.assertIn(f"--after-id {rows[-1]['id']}", stderr.getvalue())
+
+
+class ImportTests(TestCase):
+    def _line(self, topic, questions, **extra):
+        return json.dumps({'topic': topic, 'difficulty': 'Easy', 'explanation': 'Notes', 'questions': questions, **extra})
+
+    def test_import_validates_dedupes_and_reports_lines(self):
+        mcq = {'question_text': 'Pick one', 'type': 'mcq', 'difficulty': 'Easy', 'options': ['a', 'b', 'c', 'd'], 'answer': 'a'}
+        tf = {'question_text': 'Sky is blue?', 'type': 'tf', 'difficulty': 'Easy', 'answer': 'true'}
+        Quiz.objects.create(topic='Existing', difficulty='Easy', question_type='mcq', questions_data=[mcq])
+        lines = [
+            self._line('Letters', [mcq, tf]),
+            self._line('letters ', [mcq, tf]), # Same content after topic normalisation
+            self._line('Existing', [mcq]), # Already in the database
+            self._line('Broken', [{**mcq, 'answer': 'z'}]),
+            '{not json',
+            self._line('Sky', [tf], question_type='mcq'),
+            '',
+            self._line('Sky', [tf]),
+        ]
+        report = import_quizzes(lines, batch_size=2)
+
+        self.assertEqual((report.lines, report.created, report.duplicates), (7, 2, 2))
+        self.assertEqual([line for line, _ in report.errors], [4, 5, 6])
+        self.assertEqual(report.invalid, 3)
+        letters = Quiz.objects.get(topic='Letters')
+        self.assertEqual((letters.question_type, letters.question_count), ('mixed', 2))
+        self.assertIs(letters.questions_data[1]['answer'], True) # Coerced like AI output
+        self.assertEqual(Quiz.objects.get(topic='Sky').question_type, 'tf')
+        self.assertEqual(search_quizzes('letters')[0]['id'], letters.id) # FTS triggers index bulk inserts
+
+    def test_import_keeps_bounded_state(self):
+        tf = {'question_text': 'Is ice cold?', 'type': 'tf', 'difficulty': 'Easy', 'answer': True}
+        lines = [self._line('Ice', [tf]), self._line('Snow', [tf]), self._line('ICE', [tf])] + ['{not json'] * 5
+        with mock.patch('quiz.importer.MAX_REPORTED_ERRORS', 2):
+            report = import_quizzes(lines, batch_size=2)
+        self.assertEqual((report.created, report.duplicates), (2, 1)) # The repeat in the second batch is found in the database
+        self.assertEqual((report.invalid, [line for line, _ in report.errors]), (5, [4, 5]))
+
+    def test_export_round_trips_through_import_command(self):
+        Quiz.objects.create(topic='Round trip', difficulty='Hard', question_type='fill', explanation=None,
+                            questions_data=[{'question_text': 'H2O is ___', 'type': 'fill', 'difficulty': 'Hard', 'answer': 'water'}])
+        path = os.path.join(tempfile.mkdtemp(), 'quizzes.jsonl.gz')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        call_command('export_data', 'quizzes', '--gzip', '--output', path, stderr=io.StringIO())
+        Quiz.objects.all().delete()
+
+        stdout = io.StringIO()
+        call_command('import_quizzes', path, stdout=stdout, stderr=io.StringIO())
+        self.assertIn('Created 1 quizzes (1 questions)', stdout.getvalue())
+        call_command('import_quizzes', path, stdout=stdout, stderr=io.StringIO())
+        self.assertEqual(Quiz.objects.filter(topic='Round trip').count(), 1)
+
+
+@override_settings(GOOGLE_API_KEY='test-key', GENERATION_TELEMETRY_ASYNC=False)
+class PregenerationTests(TestCase):
+    def _generated(self, topic, question_type, difficulty, num_questions=5, num_questions_per_type=None):
+        if topic == 'Flaky' and self.flaky_failures:
+            self.flaky_failures -= 1
+            raise ValueError("Failed to parse the AI's response as valid JSON.")
+        question = {'question_text': f'{topic}?', 'type': question_type, 'difficulty': difficulty, 'answer': True}
+        return {'topic': topic, 'difficulty': difficulty, 'question_type': question_type, 'content': 'Notes',
+                'questions': [question] * num_questions, 'generation_run': GenerationRun(model_name='test', wall_time_ms=1, parse_path='direct')}
+
+    def _run(self, *args):
+        stdout = io.StringIO()
+        with mock.patch('quiz.pregenerate.agenerate_quiz_content', new=mock.AsyncMock(side_effect=self._generated)), \
+                mock.patch('quiz.pregenerate.RETRY_BACKOFF_SECONDS', 0):
+            call_command('pregenerate_quizzes', '--batch', 'exam', '--max-attempts', '2', *args, stdout=stdout, stderr=io.StringIO())
+        return stdout.getvalue()
+
+    def test_batch_checkpoints_and_resumes(self):
+        topics = os.path.join(tempfile.mkdtemp(), 'topics.txt')
+        self.addCleanup(shutil.rmtree, os.path.dirname(topics))
+        with open(topics, 'w') as f:
+            f.write("Algebra\n# Week 2\nFlaky\nalgebra\n")
+        self.flaky_failures = 4 # Both Flaky cells fail both attempts
+        output = self._run('--topics', topics, '--difficulties', 'Easy', 'Hard', '--types', 'tf', '--num-questions', '3')
+
+        self.assertIn("2 topics, 4 cells", output)
+        self.assertIn("2 done, 2 failed, 2 retries", output)
+        flaky = PregenerationTask.objects.filter(topic='Flaky')
+        self.assertEqual(set(flaky.values_list('status', 'attempts')), {('failed', 2)})
+        self.assertEqual(Quiz.objects.filter(topic='Algebra', question_count=3).count(), 2)
+
+        self.flaky_failures = 1 # One Flaky cell needs a retry
+        # As left behind by a run killed mid-call: marked running, no quiz saved.
+        Quiz.objects.filter(topic='Algebra', difficulty='Easy').delete()
+        PregenerationTask.objects.filter(topic='Algebra', difficulty='Easy').update(status='running')
+        output = self._run('--concurrency', '2', '--rate', '6000')
+        self.assertIn("3 generated this run, 0 cells not done", output)
+        self.assertFalse(PregenerationTask.objects.exclude(status='done').exists())
+        self.assertEqual(Quiz.objects.count(), 4)
+        self.assertEqual(sorted(GenerationRun.objects.values_list('retry_count', flat=True)), [0, 0, 0, 0, 1])
+
+    @override_settings(SERVE_BANKED_QUIZZES=True)
+    def test_banked_quiz_is_served_before_generating(self):
+        self.flaky_failures = 0
+        banked = Quiz.objects.create(topic='Algebra', difficulty='Easy', question_type='tf', explanation='Notes',
+                                     questions_data=self._generated('Algebra', 'tf', 'Easy', 2)['questions'])
+        with mock.patch('quiz.views.agenerate_quiz_content', new=mock.AsyncMock(side_effect=self._generated)) as live:
+            response = self.client.post(reverse('quiz:index'), {'topic': ' algebra', 'question_type': 'tf', 'difficulty': 'Easy', 'num_questions': '2'})
+            self.assertContains(response, f'data-quiz-id="{banked.id}"')
+            self.assertEqual(live.await_count, 0)
+            self.client.post(reverse('quiz:index'), {'topic': 'Algebra', 'question_type': 'tf', 'difficulty': 'Easy', 'num_questions': '3'})
+            self.assertEqual(live.await_count, 1) # No stored quiz with 3 questions
+
+
+@override_settings(PREFETCH_ENABLED=True, PREFETCH_BACKGROUND=False, PREFETCH_MIN_REQUESTS=2, PREFETCH_INVENTORY=2,
+                   PREFETCH_MAX_LIVE_GENERATIONS=1, GENERATION_TELEMETRY_ASYNC=False, GOOGLE_API_KEY='test-key')
+class PrefetchTests(TestCase):
+    def setUp(self):
+        prefetch.reset()
+        self.addCleanup(prefetch.reset)
+        self.generations = 0
+
+    def _generated(self, topic, question_type, difficulty, num_questions=5, num_questions_per_type=None):
+        self.generations += 1
+        question = {'question_text': f'{topic} #{self.generations}?', 'type': 'tf', 'difficulty': difficulty, 'answer': True}
+        return {'topic': topic, 'difficulty': difficulty, 'question_type': question_type, 'content': 'Notes',
+                'questions': [question] * num_questions, 'generation_run': GenerationRun(model_name='test', wall_time_ms=1, parse_path='direct')}
+
+    def _request(self, topic):
+        with mock.patch('quiz.views.agenerate_quiz_content', new=mock.AsyncMock(side_effect=self._generated)) as live:
+            response = self.client.post(reverse('quiz:index'), {'topic': topic, 'question_type': 'tf', 'difficulty': 'Easy', 'num_questions': '2'})
+        return response, live.await_count
+
+    def test_tracker_window_slides(self):
+        tracker = prefetch.RequestTracker(window=60, buckets=6)
+        for now in (0, 5, 15, 15):
+            tracker.record('a', {}, now=now)
+        tracker.record('b', {}, now=50)
+        self.assertEqual([(key, count) for key, _, count in tracker.hottest(5, now=55)], [('a', 4), ('b', 1)])
+        self.assertEqual([(key, count) for key, _, count in tracker.hottest(5, now=65)], [('a', 2), ('b', 1)])
+        self.assertEqual(tracker.hottest(5, min_requests=2, now=115), [])
+
+    def test_hot_configuration_is_served_from_inventory_and_replenished(self):
+        self.assertEqual(self._request('Volcanoes')[1], 1)
+        self.assertEqual(self._request(' volcanoes')[1], 1) # Same configuration after normalisation
+        with mock.patch('quiz.views.generate_quiz_content', side_effect=self._generated):
+            with prefetch.live_generation():
+                self.assertEqual(prefetch.refill(), 0) # No idle capacity while a user generation is in flight
+            self.assertEqual(prefetch.refill(), 2)
+            self.assertEqual(prefetch.refill(), 0) # Inventory full
+
+            ready = PrefetchedQuiz.objects.order_by('id').first().quiz_id
+            response, live_calls = self._request('VOLCANOES')
+            self.assertEqual(live_calls, 0)
+            self.assertContains(response, f'data-quiz-id="{ready}"')
+            self.assertEqual(prefetch.refill(), 1)
+
+        # Unclaimed inventory is never found by search or handed out as a banked fallback
+        inventory = list(PrefetchedQuiz.objects.values_list('quiz_id', flat=True))
+        self.assertEqual(len(inventory), 2)
+        self.assertFalse({hit['id'] for hit in search_quizzes('volcanoes')} & set(inventory))
+        self.assertNotIn(admission.find_banked_quiz('Volcanoes', 'tf', 'Easy', 2).id, inventory)
+
+        QuizAttempt.objects.create(quiz_id=inventory[0], submitted_answers={}, results_data=[], score=0, total_questions=2, percentage=0)
+        PrefetchedQuiz.objects.update(created_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(prefetch.expire_stale(), 1)
+        self.assertTrue(Quiz.objects.filter(pk=ready).exists()) # The served quiz is kept
+        self.assertTrue(QuizAttempt.objects.filter(quiz_id=inventory[0]).exists()) # Attempted: kept, out of the inventory
+        self.assertFalse(PrefetchedQuiz.objects.exists())
+        self.assertEqual(prefetch.stats(), {'hit': 1, 'miss': 2, 'generated': 3, 'failed': 0, 'wasted': 1,
+                                            'hit_rate': 0.3333, 'waste_rate': 0.3333})
+
+
+class _PromptEchoProvider:
+    """Answers questions-only prompts with JSON and explanation prompts with plain text, counting calls."""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def agenerate(self, model, prompt):
+        self.prompts.append(prompt)
+        if '"questions"' not in prompt:
+            return mock.Mock(text="```\nPlate tectonics moves continents.\nSlowly.\n```", usage_metadata=None)
+        question = {'question_text': 'Continents drift?', 'type': 'tf', 'difficulty': 'Easy', 'answer': True}
+        return mock.Mock(text=json.dumps({'questions': [question]}), usage_metadata=None)
+
+
+@override_settings(LAZY_EXPLANATIONS=True, LAZY_EXPLANATIONS_BACKGROUND=False, GOOGLE_API_KEY='test-key',
+                   GENERATION_TELEMETRY_ASYNC=False)
+class LazyExplanationTests(TestCase):
+    def test_prompt_without_explanation(self):
+        prompt, _ = _build_generation_prompt('Tides', 'mcq', 'Easy', 3, include_explanation=False)
+        self.assertNotIn('"explanation"', prompt)
+        self.assertIn('1.  A key "questions"', prompt)
+
+    def test_questions_first_then_explanation_on_demand(self):
+        provider = _PromptEchoProvider()
+        with mock.patch('quiz.views._get_generation_provider', return_value=provider):
+            response = self.client.post(reverse('quiz:index'), {'topic': 'Plate tectonics', 'question_type': 'tf',
+                                                                'difficulty': 'Easy', 'num_questions': '1'})
+            quiz = Quiz.objects.get()
+            self.assertIsNone(quiz.explanation)
+            url = reverse('quiz:quiz_explanation', args=[quiz.id])
+            self.assertContains(response, f'data-explanation-url="{url}"')
+            self.assertContains(response, 'Continents drift?')
+
+            first = self.client.get(url).json()
+            self.assertEqual(self.client.get(url).json(), first) # Stored; no second model call
+        self.assertEqual(first['explanation'], 'Plate tectonics moves continents.\nSlowly.')
+        self.assertEqual(len(provider.prompts), 2)
+        self.assertEqual(search_quizzes('continents')[0]['id'], quiz.id) # The FTS index picks up the update
+        self.assertEqual(self.client.get(reverse('quiz:quiz_explanation', args=[quiz.id + 1])).status_code, 404)
+
+
+class AssetPipelineTests(TestCase):
+    def test_minifiers_keep_literals(self):
+        js = "// header\nconst re = /\\/\\*x/g; // tail\nlet s = '/* not a comment */' + `a ${ {b: 1}.b } c`;\nreturn  x\n"
+        self.assertEqual(minify_js(js), "const re=/\\/\\*x/g;\nlet s='/* not a comment */'+`a ${{b:1}.b} c`;\nreturn x\n")
+        css = "/* c */\na > b ,  c { color: red ; content: '  x  ' ; }\n"
+        self.assertEqual(minify_css(css), "a>b,c{color:red;content:'  x  '}")
+
+    def test_collectstatic_and_serving(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root, ignore_errors=True)
+        self.addCleanup(reset_asset_index)
+        storages = {**settings.STORAGES, 'staticfiles': {'BACKEND': 'quiz.assets.MinifiedManifestStaticFilesStorage'}}
+        with override_settings(STATIC_ROOT=static_root, STORAGES=storages,
+                               MIDDLEWARE=['quiz.assets.StaticAssetMiddleware'] + settings.MIDDLEWARE):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            reset_asset_index()
+            hashed = staticfiles_storage.stored_name('js/script.js')
+            self.assertRegex(hashed, r'^js/script\.[0-9a-f]{12}\.js$')
+            self.assertTrue(os.path.exists(os.path.join(static_root, hashed + '.gz')))
+
+            response = self.client.get('/static/' + hashed, HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+            self.assertEqual(response['Vary'], 'Accept-Encoding')
+            source = open(os.path.join(settings.BASE_DIR, 'static', 'js', 'script.js'), encoding='utf-8').read()
+            self.assertEqual(gzip.decompress(response.content).decode(), minify_js(source))
+
+            plain = self.client.get('/static/' + hashed, HTTP_IF_NONE_MATCH='"nope"')
+            self.assertNotIn('Content-Encoding', plain)
+            self.assertEqual(self.client.get('/static/' + hashed, HTTP_IF_NONE_MATCH=plain['ETag']).status_code, 304)
+            self.assertEqual(self.client.get('/static/js/script.js')['Cache-Control'], 'public, max-age=60')
+
+
+class SharedQuizTests(TestCase):
+    def setUp(self):
+        self.quiz = Quiz.objects.create(topic='Volcanoes', difficulty='Easy', question_type='mixed', explanation='Hot rock.', questions_data=[
+            {'question_text': 'Molten rock above ground is ___.', 'type': 'fill', 'difficulty': 'Easy', 'answer': 'zz-lava-zz'},
+            {'question_text': 'Which is a volcano?', 'type': 'mcq', 'difficulty': 'Easy', 'options': ['Etna', 'Alps'], 'answer': 'Etna'},
+        ])
+
+    def test_page_is_public_and_conditional(self):
+        url = reverse('quiz:quiz_detail', args=[self.quiz.id])
+        response = self.client.get(url)
+        self.assertContains(response, 'Molten rock above ground')
+        self.assertNotContains(response, 'zz-lava-zz')
+        self.assertNotContains(response, 'csrfmiddlewaretoken')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=300, s-maxage=86400')
+        self.assertFalse(response.cookies)
+        self.assertNotIn('Cookie', response.get('Vary', ''))
+        fragment = make_template_fragment_key('quiz_questions', [self.quiz.id, self.quiz.content_hash, 2])
+        self.assertIn('Which is a volcano?', cache.get(fragment))
+
+        with self.assertNumQueries(1): # The questions are not even loaded
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(reverse('quiz:quiz_detail', args=[self.quiz.id + 1])).status_code, 404)
+
+    def test_json_without_answers(self):
+        url = reverse('quiz:quiz_api', args=[self.quiz.id])
+        response = self.client.get(url)
+        data = response.json()
+        self.assertEqual(data['questions'][1], {'question_text': 'Which is a volcano?', 'type': 'mcq', 'difficulty': 'Easy', 'options': ['Etna', 'Alps']})
+        self.assertFalse(any('answer' in question for question in data['questions']))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        Quiz.objects.filter(id=self.quiz.id).update(explanation='Hot rock, cooled.')
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+        self.assertTrue(self.client.get(reverse('quiz:csrf_token')).json()['csrf_token'])
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        self.quiz = Quiz.objects.create(topic='Rivers', difficulty='Medium', question_type='mixed', explanation='Rivers flow. ' * 200, questions_data=[
+            {'question_text': f'River question {i}?', 'type': 'tf', 'difficulty': 'Medium', 'answer': i % 2 == 0} for i in range(20)
+        ])
+
+    def test_gzip_negotiation_and_conditional_get(self):
+        url = reverse('quiz:quiz_api', args=[self.quiz.id])
+        plain = self.client.get(url)
+        self.assertNotIn('Content-Encoding', plain)
+        compressed = self.client.get(url, HTTP_ACCEPT_ENCODING='br;q=0, gzip')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', compressed['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(compressed.content)), plain.json())
+        self.assertLess(len(compressed.content), len(plain.content) / 5)
+        self.assertEqual(compressed['ETag'], 'W/' + plain['ETag'])
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=compressed['ETag']).status_code, 304)
+
+        small = self.client.get(reverse('quiz:topic_suggestions'), {'q': 'Ri'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', small) # Below COMPRESSION_MIN_SIZE
+        self.assertEqual(self.client.get(reverse('quiz:topic_suggestions'), {'q': 'Ri'}, HTTP_IF_NONE_MATCH=small['ETag']).status_code, 304)
+        search = self.client.get(reverse('quiz:search'), {'q': 'rivers'})
+        self.assertEqual(self.client.get(reverse('quiz:search'), {'q': 'rivers'}, HTTP_IF_NONE_MATCH=search['ETag']).status_code, 304)
+
+    def test_compact_check_answers(self):
+        body = {'quiz_id': self.quiz.id, 'answers': {'q1': 'True', 'q2': 'True'}}
+        full = self.client.post(reverse('quiz:check_answers'), body, content_type='application/json')
+        compact = self.client.post(reverse('quiz:check_answers'), {**body, 'compact': True}, content_type='application/json')
+        data = compact.json()
+        self.assertEqual(data['correct'][:3], [1, 0, 0])
+        self.assertEqual(data['correct_answers'][:2], [True, False])
+        self.assertEqual(data['score'], full.json()['score'])
+        self.assertNotIn('results', data)
+        self.assertLess(len(compact.content), len(full.content) / 3)
+
+
+@override_settings(RATE_LIMITS={'generation': '1/600', 'grading': '2/60'}, RATE_LIMIT_IP_MULTIPLIER=2,
+                   MIDDLEWARE=['quiz.ratelimit.RateLimitMiddleware'] + settings.MIDDLEWARE)
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_buckets_per_client_and_network(self):
+        check = lambda client: client.post(reverse('quiz:check_answers'), '{}', content_type='application/json')
+        self.client.cookies['csrftoken'] = 'a' * 32
+        self.assertEqual([check(self.client).status_code for _ in range(3)], [400, 400, 429])
+        throttled = check(self.client)
+        self.assertEqual(int(throttled['Retry-After']), 30)
+        self.assertIn('Too many requests', throttled.json()['error'])
+
+        other = self.client_class()
+        other.cookies['csrftoken'] = 'b' * 32
+        self.assertEqual([check(other).status_code for _ in range(3)], [400, 400, 429]) # Network bucket (2 x 2) now empty
+        self.assertEqual(ratelimit.stats()['grading'], 3)
+        self.assertEqual(self.client.get(reverse('quiz:index')).status_code, 200) # GETs are never limited
+
+    def test_refill_and_generation_page(self):
+        request = RequestFactory().post(reverse('quiz:check_answers'), REMOTE_ADDR='10.0.0.1')
+        self.assertIsNone(ratelimit.take_token(request, 'grading', now=1000.0))
+        self.assertIsNone(ratelimit.take_token(request, 'grading', now=1000.0))
+        self.assertAlmostEqual(ratelimit.take_token(request, 'grading', now=1000.0), 30.0)
+        self.assertIsNone(ratelimit.take_token(request, 'grading', now=1030.0)) # One token back after 60 / 2 seconds
+
+        self.client.cookies['csrftoken'] = 'c' * 32
+        form = {'topic': 'Owls', 'question_type': 'tf', 'difficulty': 'Easy', 'num_questions': '1'}
+        with mock.patch('quiz.views.agenerate_quiz_content', side_effect=ValueError('no model')):
+            self.assertEqual(self.client.post(reverse('quiz:index'), form).status_code, 200)
+            response = self.client.post(reverse('quiz:index'), form)
+        self.assertEqual(response.status_code, 429)
+        self.assertContains(response, 'Too many requests', status_code=429)
+        self.assertContains(response, 'value="Owls"', status_code=429)
+
+
+class AdmissionTests(TestCase):
+    def setUp(self):
+        admission.reset()
+        self.addCleanup(admission.reset)
+
+    def test_breaker_trips_probes_and_closes(self):
+        now = [0.0]
+        controller = admission.AdmissionController(max_in_flight=4, target_latency=10, window=60, min_calls=3,
+                                                   error_rate=0.5, slow_seconds=30, cooldown=20, clock=lambda: now[0])
+        for ok in (True, False, False):
+            controller.record_outcome(1.0, ok)
+        self.assertEqual(controller.state, admission.OPEN)
+        refused = controller.try_admit()
+        self.assertEqual((refused.admitted, refused.reason, refused.retry_after), (False, 'open', 20))
+
+        now[0] = 25.0
+        probe = controller.try_admit()
+        self.assertEqual((probe.admitted, probe.reason), (True, 'probe'))
+        self.assertEqual(controller.try_admit().reason, 'probing') # One probe at a time
+        controller.record_outcome(2.0, True)
+        controller.release(probe)
+        self.assertEqual(controller.state, admission.CLOSED)
+
+        for _ in range(2):
+            controller.record_outcome(20.0, True) # Twice the target latency: half the slots
+        self.assertEqual(controller.limit(), 2)
+        slots = [controller.try_admit() for _ in range(3)]
+        self.assertEqual([slot.admitted for slot in slots], [True, True, False])
+        self.assertEqual(slots[2].retry_after, 20.0)
+
+    def test_banked_quiz_lookup_is_exact_and_unaffected_by_search_rank(self):
+        question = {'question_text': 'Do glaciers move?', 'type': 'tf', 'difficulty': 'Easy', 'answer': True}
+        Quiz.objects.bulk_create([Quiz(topic='Glaciers glaciers', difficulty='Easy', question_type='tf', questions_data=[question])
+                                  for _ in range(150)]) # Better full-text hits, none an exact topic match
+        two = Quiz.objects.create(topic='Glaciers', difficulty='Easy', question_type='tf', questions_data=[question, question])
+        one = Quiz.objects.create(topic='Glaciers', difficulty='Easy', question_type='tf', questions_data=[question])
+        Quiz.objects.create(topic='Glaciers', difficulty='Hard', question_type='tf', questions_data=[question, question])
+        self.assertEqual(admission.find_banked_quiz('  GLACIERS ', 'tf', 'Easy', 2), two)
+        self.assertEqual(admission.find_banked_quiz('glaciers', 'tf', 'Easy', 5), one) # Most recent when no size matches
+        self.assertIsNone(admission.find_banked_quiz('Glacier', 'tf', 'Easy', 2))
+
+    @override_settings(INSTRUMENTATION_ENABLED=True)
+    def test_open_breaker_serves_banked_quiz_or_503(self):
+        controller = admission.get_controller()
+        for _ in range(controller.min_calls):
+            controller.record_outcome(1.0, False)
+        banked = Quiz.objects.create(topic='Glaciers', difficulty='Easy', question_type='tf', explanation='Ice.',
+                                     questions_data=[{'question_text': 'Ice moves?', 'type': 'tf', 'difficulty': 'Easy', 'answer': True}])
+        form = {'question_type': 'tf', 'difficulty': 'Easy', 'num_questions': '3'}
+        with mock.patch('quiz.views.agenerate_quiz_content') as live:
+            response = self.client.post(reverse('quiz:index'), {**form, 'topic': ' glaciers'})
+            self.assertContains(response, f'data-quiz-id="{banked.id}"')
+            self.assertContains(response, 'generated earlier')
+
+            shed = self.client.post(reverse('quiz:index'), {**form, 'topic': 'Deserts'})
+            self.assertEqual(shed.status_code, 503)
+            self.assertEqual(int(shed['Retry-After']), int(controller.cooldown))
+            self.assertContains(shed, 'try again in about', status_code=503)
+        live.assert_not_called()
+
+        graded = self.client.post(reverse('quiz:check_answers'), json.dumps({'quiz_id': banked.id, 'answers': {'q1': 'True'}}),
+                                  content_type='application/json')
+        self.assertEqual(graded.json()['score'], 1) # Grading never waits on the breaker
+        self.assertEqual((admission.stats()['fallback'], admission.stats()['shed']), (1, 1))
+        self.client.force_login(User.objects.create_user('ops', password='x', is_staff=True))
+        self.assertContains(self.client.get(reverse('quiz:metrics')), 'quizify_llm_breaker_state{} 2')
+
+    def test_explanations_respect_the_breaker(self):
+        controller = admission.get_controller()
+        for _ in range(controller.min_calls):
+            controller.record_outcome(1.0, False)
+        banked = Quiz.objects.create(topic='Tides', difficulty='Easy', question_type='tf', explanation=None,
+                                     questions_data=[{'question_text': 'Moon?', 'type': 'tf', 'difficulty': 'Easy', 'answer': True}])
+        with mock.patch('quiz.views.schedule_explanation') as schedule:
+            response = self.client.post(reverse('quiz:index'), {'topic': 'Tides', 'question_type': 'tf', 'difficulty': 'Easy', 'num_questions': '1'})
+        self.assertContains(response, f'data-quiz-id="{banked.id}"')
+        schedule.assert_not_called() # No background Gemini call behind a fallback
+
+        with mock.patch('quiz.views.generate_explanation') as explain:
+            self.assertIsNone(_fill_explanation(banked.id, banked.topic, banked.difficulty))
+        explain.assert_not_called()
+        self.assertEqual(controller.in_flight, 0)
+
+
+@override_settings(LARGE_QUIZ_BACKGROUND=False, LARGE_QUIZ_CHUNK_SIZE=3, LARGE_QUIZ_WINDOW=4, GENERATION_TELEMETRY_ASYNC=False)
+class LargeQuizTests(TestCase):
+    def _generated(self, topic, question_type, difficulty, num_questions=5, num_questions_per_type=None, lazy_explanation=None, extra_instructions=None):
+        batch = re.search(r'batch \d+( \(retry \d+\))?', extra_instructions).group(0) if extra_instructions else 'batch 1'
+        questions = [{'question_text': f'{batch}, question {i}?', 'type': 'tf', 'difficulty': difficulty, 'answer': i % 2 == 0}
+                     for i in range(num_questions)]
+        if batch == 'batch 2':
+            questions[0]['question_text'] = 'Batch 1 question 0' # Repeat of the first chunk, up to case and punctuation
+        return {'topic': topic, 'difficulty': difficulty, 'question_type': question_type, 'content': 'Notes', 'questions': questions,
+                'generation_run': GenerationRun(model_name='test', wall_time_ms=1, parse_path='direct')}
+
+    def test_plan_and_dedupe(self):
+        self.assertEqual([c['num_questions'] for c in plan_chunks('tf', 45, None, 20)], [15, 15, 15])
+        mixed = plan_chunks('mixed', 0, {'mcq': 25, 'fill': 0, 'tf': 10}, 20)
+        self.assertEqual([c['num_questions_per_type'] for c in mixed], [{'mcq': 12, 'fill': 0, 'tf': 5}, {'mcq': 13, 'fill': 0, 'tf': 5}])
+
+        deduper = QuestionDeduper([{'question_text': 'What is ice?'}])
+        fresh = deduper.add([{'question_text': 'what is ICE', 'type': 'tf'}, {'question_text': 'Is ice cold?', 'type': 'tf'},
+                             {'question_text': 'Is ice  cold?', 'type': 'tf'}])
+        self.assertEqual(fresh, [{'question_text': 'Is ice cold?', 'type': 'tf'}])
+        self.assertEqual(missing({'num_questions': 3, 'num_questions_per_type': {'mcq': 1, 'fill': 0, 'tf': 2}}, fresh),
+                         {'num_questions': 2, 'num_questions_per_type': {'mcq': 1, 'fill': 0, 'tf': 1}})
+
+    def test_chunked_generation_windows_and_partial_grading(self):
+        form = {'topic': 'Glaciers', 'question_type': 'tf', 'difficulty': 'Easy', 'num_questions': '8'}
+        with mock.patch('quiz.views.agenerate_quiz_content', new=mock.AsyncMock(side_effect=self._generated)), \
+                mock.patch('quiz.views.generate_quiz_content', side_effect=self._generated) as background:
+            response = self.client.post(reverse('quiz:index'), form)
+        self.assertIn('batch 2 (retry 1)', background.call_args_list[-1].kwargs['extra_instructions']) # Topped up the duplicate
+        quiz = Quiz.objects.get()
+        self.assertEqual((quiz.question_count, quiz.questions_pending), (8, 0))
+        self.assertEqual(len({q['question_text'].lower() for q in quiz.get_questions()}), 8)
+        self.assertContains(response, 'Question 4 of 8')
+        self.assertNotContains(response, 'Question 5 of 8') # Later windows are loaded by script.js
+
+        window = self.client.get(reverse('quiz:quiz_questions', args=[quiz.id]), {'offset': 4}).json()
+        self.assertEqual((window['count'], window['next_offset'], window['generating']), (4, None, False))
+        self.assertIn('name="q8"', window['html'])
+        self.assertIn('btn-submit-quiz', window['html'])
+
+        answers = {'q1': str(quiz.get_questions()[0]['answer']), 'q6': 'wrong'}
+        graded = self.client.post(reverse('quiz:check_answers'), json.dumps({'quiz_id': quiz.id, 'answers': answers, 'compact': True, 'partial': True}),
+                                  content_type='application/json').json()
+        self.assertEqual((graded['score'], graded['total_questions'], graded['quiz_total']), (1, 2, 8))
+        self.assertEqual((graded['question_indexes'], graded['correct']), ([0, 5], [1, 0]))
+
+        Quiz.objects.filter(pk=quiz.id).update(questions_pending=12)
+        self.assertEqual(self.client.get(reverse('quiz:quiz_detail', args=[quiz.id]))['Cache-Control'], 'public, no-cache')
+        self.assertEqual(largequiz.stats(), {'batches': 3, 'failed': 0, 'duplicates': 1, 'top_ups': 1})
+        self.assertEqual(sorted(GenerationRun.objects.values_list('retry_count', flat=True)), [0, 0, 0, 1])
+
+    def test_pending_count_ignores_how_many_questions_the_model_returned(self):
+        for requested, returned in ((3, 5), (3, 1)):
+            def generated(*args, **kwargs):
+                return self._generated(*args, **{**kwargs, 'num_questions': returned})
+            form = {'topic': f'Fjords {returned}', 'question_type': 'tf', 'difficulty': 'Easy', 'num_questions': str(requested)}
+            with mock.patch('quiz.views.agenerate_quiz_content', new=mock.AsyncMock(side_effect=generated)):
+                response = self.client.post(reverse('quiz:index'), form)
+            quiz = Quiz.objects.get(topic=form['topic'])
+            self.assertEqual((quiz.question_count, quiz.questions_pending), (returned, 0))
+            self.assertFalse(largequiz.still_generating(quiz))
+            self.assertIsNone(response.context.get('error'))
+
+        Quiz.objects.filter(topic='Fjords 1').update(questions_pending=1)
+        owed = largequiz.append_questions(Quiz.objects.get(topic='Fjords 1').id, {'num_questions': 1, 'num_questions_per_type': None},
+                                          [{'question_text': f'Extra {i}?', 'type': 'tf', 'answer': True} for i in range(3)])
+        self.assertEqual((owed['num_questions'], Quiz.objects.get(topic='Fjords 1').questions_pending), (0, 0))
+
+
+class ClassroomTests(TestCase):
+    def setUp(self):
+        classroom.reset()
+        cache.clear()
+        self.quiz = Quiz.objects.create(topic='Rivers', difficulty='Easy', question_type='tf', questions_data=[
+            {'question_text': 'Is the Nile long?', 'type': 'tf', 'difficulty': 'Easy', 'answer': True},
+            {'question_text': 'Is the Amazon dry?', 'type': 'tf', 'difficulty': 'Easy', 'answer': False},
+        ])
+
+    def _submit(self, answers, **extra):
+        return self.client.post(reverse('quiz:check_answers'), json.dumps({'quiz_id': self.quiz.id, 'answers': answers, 'compact': True, **extra}),
+                                content_type='application/json').json()
+
+    def test_best_attempt_per_participant(self):
+        board = classroom.Leaderboard(self.quiz.id)
+        now = timezone.now()
+        for attempt_id, name, percentage in [(1, 'Ada', 50), (2, 'Ben', 100), (3, ' ada ', 100), (4, 'Cy', 0), (5, 'Ben', 50), (6, '', 100), (3, 'Ada', 100)]:
+            board.add({'id': attempt_id, 'participant': name, 'score': 0, 'total_questions': 2, 'percentage': percentage, 'attempted_at': now})
+        self.assertEqual(len(board), 3)
+        self.assertEqual([(leader['rank'], leader['participant']) for leader in board.top(10)], [(1, 'Ben'), (1, 'ada'), (3, 'Cy')])
+        self.assertEqual((board.rank('ADA'), board.rank('Dee')), (1, None))
+        self.assertEqual(board.snapshot(1)['leaders'][0]['participant'], 'Ben')
+        self.assertEqual(board.snapshot(10)['average_percentage'], 66.7)
+
+    def test_attempts_reach_the_stream_and_other_processes(self):
+        self.assertEqual(self._submit({'q1': 'True', 'q2': 'False'}, participant='Ada')['rank'], 1)
+        self.assertNotIn('rank', self._submit({'q1': 'True'})) # Not in classroom mode
+        ben = self._submit({'q1': 'True'}, participant='Ben')
+        self.assertEqual((ben['rank'], ben['participants']), (2, 2))
+
+        response = self.client.get(reverse('quiz:leaderboard_stream', args=[self.quiz.id]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        event = next(iter(response.streaming_content)).decode()
+        self.assertIn('event: leaderboard', event)
+        self.assertEqual([leader['participant'] for leader in json.loads(event.split('data: ')[1])['leaders']], ['Ada', 'Ben'])
+        response.close()
+
+        # Recorded by another process: noticed through the cache version, then read from the database.
+        QuizAttempt.objects.create(quiz=self.quiz, score=2, total_questions=2, percentage=100, participant='Cy', submitted_answers={}, results_data=[])
+        cache.incr(f"classroom:{self.quiz.id}:version")
+        leaderboard = self.client.get(reverse('quiz:leaderboard', args=[self.quiz.id])).json()
+        self.assertEqual([(leader['rank'], leader['participant']) for leader in leaderboard['leaders']], [(1, 'Ada'), (1, 'Cy'), (3, 'Ben')])
+        self.assertContains(self.client.get(reverse('quiz:classroom', args=[self.quiz.id])), f'/quiz/{self.quiz.id}/?classroom=1')
+
+    def test_partial_submissions_rank_over_the_whole_quiz(self):
+        response = self.client.post(reverse('quiz:check_answers'), json.dumps({'quiz_id': self.quiz.id, 'answers': {'q1': 'True'}, 'partial': True}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400) # Not a large quiz
+
+        with override_settings(LARGE_QUIZ_WINDOW=1):
+            ada = self._submit({'q1': 'False', 'q2': 'False'}, participant='Ada')
+            ben = self._submit({'q1': 'True'}, participant='Ben', partial=True)
+        self.assertEqual((ada['percentage'], ada['rank']), (50, 1))
+        self.assertEqual((ben['score'], ben['total_questions'], ben['percentage'], ben['rank']), (1, 2, 50, 1))
+        classroom.reset()
+        leaders = self.client.get(reverse('quiz:leaderboard', args=[self.quiz.id])).json()['leaders']
+        self.assertEqual([(leader['participant'], leader['percentage']) for leader in leaders], [('Ada', 50), ('Ben', 50)])
+
+
+@override_settings(QUESTION_TIMING_ASYNC=False)
+class QuestionTimingTests(TestCase):
+    def setUp(self):
+        self.quiz = Quiz.objects.create(topic='Volcanoes', difficulty='Easy', question_type='tf', questions_data=[])
+        self.client = self.client_class(enforce_csrf_checks=True) # Beacons carry no CSRF token
+
+    def _send(self, payload):
+        return self.client.post(reverse('quiz:question_events'), json.dumps(payload), content_type='text/plain;charset=UTF-8')
+
+    def test_batches_are_validated_and_stored(self):
+        events = [[0, 4200, 1], [1, 900, 0], [1, -5, 0], [2, 'slow', 1], [3, 10 ** 9, 1], [0, 800, True]]
+        self.assertEqual(self._send({'quiz_id': self.quiz.id, 'client': 'abc123', 'events': events}).status_code, 204)
+        self.assertEqual(sorted(QuestionTiming.objects.values_list('question_index', 'dwell_ms', 'answered')), [(0, 4200, True), (1, 900, False)])
+
+        self.assertEqual(self._send({'quiz_id': self.quiz.id + 1, 'client': 'abc123', 'events': [[0, 1, 1]]}).status_code, 204) # Unknown quiz
+        self.assertEqual(self._send({'quiz_id': self.quiz.id, 'client': '<script>', 'events': [[0, 1, 1]]}).status_code, 400)
+        self.assertEqual(self._send({'quiz_id': self.quiz.id, 'client': 'abc123', 'events': [[0, 1, 1]] * 201}).status_code, 400)
+        self.assertEqual(self.client.post(reverse('quiz:question_events'), 'not json', content_type='text/plain').status_code, 400)
+        self.assertEqual(self.client.get(reverse('quiz:question_events')).status_code, 405)
+        self.assertEqual(QuestionTiming.objects.count(), 2)
+
+    def test_per_question_stats(self):
+        self._send({'quiz_id': self.quiz.id, 'client': 'a', 'events': [[0, 1000, 0], [0, 2000, 1], [1, 3000, 1]]}) # Came back to question 1
+        self._send({'quiz_id': self.quiz.id, 'client': 'b', 'events': [[0, 5000, 1]]})
+        self._send({'quiz_id': self.quiz.id, 'client': 'c', 'events': [[0, 9000, 0]]})
+        stats = interactions.timing_stats(self.quiz.id)
+        self.assertEqual(stats[0], {'question_index': 0, 'visitors': 3, 'answered': 2, 'mean_ms': 5667, 'p50_ms': 5000, 'p90_ms': 9000})
+        self.assertEqual((stats[1]['visitors'], stats[1]['p50_ms']), (1, 3000))
+
+        out = io.StringIO()
+        call_command('question_timing', str(self.quiz.id), stdout=out)
+        self.assertIn('Volcanoes', out.getvalue())
+        self.assertRegex(out.getvalue(), r'\n +1 +3 +2 +5\.7 +5\.0 +9\.0\n')
+
+
+class OfflineTests(TestCase):
+    def setUp(self):
+        self.quiz = Quiz.objects.create(topic='Tides', difficulty='Easy', question_type='tf', questions_data=[
+            {'question_text': 'Does the Moon cause tides?', 'type': 'tf', 'difficulty': 'Easy', 'answer': True},
+        ])
+
+    def _submit(self, key, quiz_id=None, answer='True'):
+        return self.client.post(reverse('quiz:check_answers'), json.dumps({'quiz_id': quiz_id or self.quiz.id, 'answers': {'q1': answer}, 'compact': True}),
+                                content_type='application/json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replayed_submissions_store_one_attempt(self):
+        first = self._submit('3f1c-offline-key')
+        replay = self._submit('3f1c-offline-key')
+        self.assertEqual(first.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', first)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual((replay.json()['attempt_id'], replay.json()['correct']), (first.json()['attempt_id'], [1]))
+        self.assertEqual(QuizAttempt.objects.count(), 1)
+        self.assertEqual(self._submit('3f1c-offline-key', answer='False').status_code, 422) # Same key, different answers
+
+        other = Quiz.objects.create(topic='Waves', difficulty='Easy', question_type='tf', questions_data=self.quiz.questions_data)
+        self.assertEqual(self._submit('3f1c-offline-key', quiz_id=other.id).status_code, 422)
+        self.assertEqual(self._submit('short').status_code, 400)
+        self.assertEqual(self._submit('another-offline-key').json()['attempt_id'], first.json()['attempt_id'] + 1)
+        self.assertEqual(QuizAttempt.objects.count(), 2)
+
+    def test_idempotency_keys_are_scoped_to_the_session(self):
+        first = self._submit('shared-offline-key')
+        self.client = self.client_class() # Another browser, with no session yet
+        other = self._submit('shared-offline-key', answer='False')
+        self.assertEqual(other.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', other)
+        self.assertNotEqual(other.json()['attempt_id'], first.json()['attempt_id'])
+        self.assertEqual(self.client.session['current_attempt_id'], other.json()['attempt_id'])
+        self.assertEqual(QuizAttempt.objects.filter(idempotency_key='shared-offline-key').count(), 2)
+
+    def test_service_worker(self):
+        response = self.client.get(reverse('quiz:service_worker'))
+        self.assertEqual((response.status_code, response['Cache-Control']), (200, 'no-cache'))
+        self.assertTrue(response['Content-Type'].startswith('text/javascript'))
+        config = json.loads(re.search(r'const CONFIG = (.*);\n', response.content.decode()).group(1))
+        self.assertTrue(config['enabled'])
+        self.assertIn(staticfiles_storage.url('js/script.js'), config['app_shell'])
+        self.assertEqual(config['check_url'], reverse('quiz:check_answers'))
+        self.assertRegex(reverse('quiz:quiz_questions', args=[7]), config['cached_api_pattern'])
+        self.assertNotRegex(reverse('quiz:leaderboard_stream', args=[7]), config['cached_api_pattern'])
+        self.assertRegex(reverse('quiz:quiz_detail', args=[7]), config['cached_page_pattern'])
+        for path in ('/admin/', reverse('quiz:profile_list'), reverse('quiz:export', args=['quizzes', 'csv'])):
+            self.assertNotRegex(path, config['cached_page_pattern']) # Never intercepted
+        with override_settings(OFFLINE_ENABLED=False):
+            self.assertIn('"enabled": false', self.client.get(reverse('quiz:service_worker')).content.decode())
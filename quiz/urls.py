@@ -1,10 +1,34 @@
 from django.urls import path
 from . import views
+from .instrumentation import metrics_view
+from .profiling import profile_list_view, profile_detail_view
+from .search import search_view
+from .autocomplete import topic_suggestions_view
+from .export import export_view
+from .classroom import classroom_view, leaderboard_view, leaderboard_stream_view
+from .interactions import question_events_view
+from .offline import service_worker_view
 
 app_name = 'quiz'
 
 urlpatterns = [
     path('', views.index, name='index'),
     path('check/', views.check_answers, name='check_answers'), # Added route for checking answers
+    path('api/quiz/<int:quiz_id>/explanation', views.quiz_explanation, name='quiz_explanation'), # Lazy explanations
+    path('quiz/<int:quiz_id>/', views.quiz_detail, name='quiz_detail'), # Shareable, cacheable quiz page
+    path('api/quiz/<int:quiz_id>', views.quiz_api, name='quiz_api'), # Same quiz as JSON, without answers
+    path('api/quiz/<int:quiz_id>/questions', views.quiz_questions, name='quiz_questions'), # Windows of a large quiz
+    path('quiz/<int:quiz_id>/classroom/', classroom_view, name='classroom'), # Teacher's live leaderboard
+    path('api/quiz/<int:quiz_id>/leaderboard', leaderboard_view, name='leaderboard'),
+    path('api/quiz/<int:quiz_id>/leaderboard/stream', leaderboard_stream_view, name='leaderboard_stream'), # Server-Sent Events
+    path('api/events', question_events_view, name='question_events'), # Batched question timings (sendBeacon)
+    path('sw.js', service_worker_view, name='service_worker'), # Offline quiz taking; at the root so its scope is the whole site
+    path('api/csrf', views.csrf_token_view, name='csrf_token'), # Token for cached pages
     path('send_quiz_email/', views.send_quiz_email, name='send_quiz_email'),
+    path('metrics', metrics_view, name='metrics'), # Prometheus scrape target (404 unless instrumentation is enabled)
+    path('profiles/', profile_list_view, name='profile_list'), # Staff only
+    path('profiles/<str:name>/', profile_detail_view, name='profile_detail'),
+    path('api/search', search_view, name='search'), # Ranked full-text quiz search
+    path('api/topics', topic_suggestions_view, name='topic_suggestions'), # Topic autocomplete
+    path('export/<str:dataset>.<str:fmt>', export_view, name='export'), # Staff only, streamed
 ]
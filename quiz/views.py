@@ -1,30 +1,72 @@
 
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpRequest, HttpResponse, Http404, JsonResponse # Use JsonResponse
+from django.http import HttpRequest, HttpResponse, HttpResponseNotAllowed, Http404, JsonResponse # Use JsonResponse
 from django.urls import reverse
 from django.conf import settings
+from django.middleware.csrf import get_token
+from django.templatetags.static import static
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from asgiref.sync import sync_to_async
 from google import genai
+from google.genai import types as genai_types
+import asyncio
+import hashlib
 import json
+import math
 import re # Import regular expressions
-from .models import Quiz, QuizAttempt # Import models
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .models import Quiz, QuizAttempt, GenerationRun, validate_generated_data # Import models
 from django.core.mail import EmailMultiAlternatives # Updated import
 from django.template.loader import render_to_string
 from django.contrib import messages
+from django.db import IntegrityError, close_old_connections, transaction
+from .instrumentation import span, record_llm_call
+from .telemetry import record_generation_run
+from .replay import ReplayProvider, get_store
+from .autocomplete import note_topic
+from .prefetch import live_generation, prefetch_enabled, take_prefetched
+from .admission import admission_enabled, find_banked_quiz, get_controller, record_decision, record_outcome
+from .chunking import plan_chunks
+from . import classroom, largequiz
 
-# --- Helper Function for AI Generation ---
-def generate_quiz_content(topic: str, question_type: str, difficulty: str, num_questions: int = 5, num_questions_per_type: dict = None):
+# --- Helper Functions for AI Generation ---
+_genai_clients = {}
+
+def _get_genai_client(api_key: str):
     """
-    Generates quiz content (explanation and questions) using the Gemini API.
-    Can handle single question type or a mix of types if question_type is 'mixed'.
+    Returns a shared Gemini client, pointed at settings.GENAI_BASE_URL when set
+    (e.g. the fake provider used by the load-test harness in benchmarks/).
     """
-    api_key = settings.GOOGLE_GENAI_API_KEY
-    if not api_key:
-        print("Error: GOOGLE_API_KEY not found in settings.")
-        raise ValueError("Google API Key not configured.")
+    base_url = getattr(settings, 'GENAI_BASE_URL', None)
+    client = _genai_clients.get((api_key, base_url))
+    if client is None:
+        http_options = genai_types.HttpOptions(base_url=base_url) if base_url else None
+        client = _genai_clients[(api_key, base_url)] = genai.Client(api_key=api_key, http_options=http_options)
+    return client
 
-    genai.configure(api_key=api_key)
-    model = "gemini-2.0-flash"
+def _get_generation_provider(api_key: str) -> ReplayProvider:
+    """
+    Wraps the live Gemini call with record/replay according to settings.GENAI_REPLAY_MODE.
+    In 'replay' mode no API key is needed.
+    """
+    mode = getattr(settings, 'GENAI_REPLAY_MODE', 'off')
+    live_call = async_live_call = None
+    if api_key:
+        client = _get_genai_client(api_key)
+        live_call = lambda model, prompt: client.models.generate_content(model=model, contents=prompt)
+        async_live_call = lambda model, prompt: client.aio.models.generate_content(model=model, contents=prompt)
+    store = get_store(settings.GENAI_REPLAY_STORE) if mode != 'off' else None
+    return ReplayProvider(live_call, mode, store, getattr(settings, 'GENAI_REPLAY_LATENCY', False), async_live_call=async_live_call)
 
+def _build_generation_prompt(topic: str, question_type: str, difficulty: str, num_questions: int, num_questions_per_type: dict = None, include_explanation: bool = True, extra_instructions: str = None):
+    """
+    Builds the Gemini prompt for the requested quiz.
+    Returns (prompt, actual_num_questions), where the latter is the total across types for 'mixed'.
+    Without ``include_explanation`` only the questions are requested (see generate_explanation).
+    ``extra_instructions`` is added before the output-format reminder (large quizzes use it; see quiz.chunking).
+    """
     type_map_display = {
         'mcq': 'Multiple Choice (MCQ)',
         'fill': 'Fill in the Blank',
@@ -37,16 +79,18 @@ def generate_quiz_content(topic: str, question_type: str, difficulty: str, num_q
         f"""
     Generate educational content about the topic "{topic}" suitable for a "{difficulty}" difficulty level.
     Include the following in your response, formatted STRICTLY as a single JSON object:
-
-    1.  A key "explanation" containing a concise explanation of the topic ({difficulty} level), appropriate for someone learning this topic."""
+"""
     ]
+    if include_explanation:
+        prompt_parts.append(f"""    1.  A key "explanation" containing a concise explanation of the topic ({difficulty} level), appropriate for someone learning this topic.""")
+    questions_item = "2." if include_explanation else "1."
 
     if question_type == 'mixed' and num_questions_per_type:
         actual_num_questions = sum(num_questions_per_type.values())
         if actual_num_questions == 0:
             raise ValueError("For 'mixed' question types, at least one question must be specified for one of the types.")
 
-        prompt_parts.append(f"2.  A key \"questions\" containing a JSON array of exactly {actual_num_questions} questions in total about the topic. The questions array MUST be structured to include:")
+        prompt_parts.append(f"{questions_item}  A key \"questions\" containing a JSON array of exactly {actual_num_questions} questions in total about the topic. The questions array MUST be structured to include:")
         
         question_details_prompt_parts = []
         example_questions_for_prompt = [] # For the example section
@@ -116,111 +160,312 @@ def generate_quiz_content(topic: str, question_type: str, difficulty: str, num_q
             }}"""
         
         prompt_parts.append(f"""
-    2.  A key "questions" containing a JSON array of exactly {actual_num_questions} questions about the topic. Each question object in the array MUST have:
+    {questions_item}  A key "questions" containing a JSON array of exactly {actual_num_questions} questions about the topic. Each question object in the array MUST have:
         *   A "question_text" key with the question itself (string).
         *   A "type" key with the value "{question_type}" (string).
         *   A "difficulty" key with the value "{difficulty}" (string).
         {question_specific_prompt_instruction}""")
 
+    if extra_instructions:
+        prompt_parts.append(extra_instructions)
+
     prompt_parts.append(f"""
     Ensure the entire output is **only** a single, valid JSON object starting with {{ and ending with }}. Do not include any text, explanations, or markdown formatting like ```json before or after the JSON object itself. The "questions" array must contain exactly {actual_num_questions} items in total, matching the specified counts for each type if 'mixed' type was requested.
     """)
     
     prompt = "\n".join(prompt_parts)
+    return prompt, actual_num_questions
+
+
+def _build_explanation_prompt(topic: str, difficulty: str) -> str:
+    """Prompt for the explanation alone, generated after the questions when explanations are lazy."""
+    return f"""
+    Write a concise explanation of the topic "{topic}" suitable for a "{difficulty}" difficulty level, appropriate for someone learning this topic.
+    Reply with the explanation as plain text only: no JSON, no markdown code fences and no introductory sentence.
+    """
+
 
+def _extract_json_payload(raw_text: str):
+    """
+    Parses the AI response as JSON, falling back to a fenced ```json block or the outermost braces.
+    Returns (data, parse_path) where parse_path is one of GenerationRun.PARSE_PATH_CHOICES.
+    """
     try:
-        response = client.models.generate_content(model=model, contents=prompt)
-        raw_text = response.text
-        try:
-            generated_data = json.loads(raw_text)
-        except json.JSONDecodeError:
-            json_match_md = re.search(r'```json\s*(\{.*\})\s*```', raw_text, re.DOTALL | re.IGNORECASE)
-            if json_match_md:
-                json_str = json_match_md.group(1)
+        return json.loads(raw_text), 'direct'
+    except json.JSONDecodeError:
+        json_match_md = re.search(r'```json\s*(\{.*\})\s*```', raw_text, re.DOTALL | re.IGNORECASE)
+        if json_match_md:
+            json_str = json_match_md.group(1)
+            parse_path = 'fenced'
+        else:
+            json_match_braces = re.search(r'\{.*\}', raw_text, re.DOTALL)
+            if json_match_braces:
+                json_str = json_match_braces.group(0)
+                parse_path = 'braces'
             else:
-                json_match_braces = re.search(r'\{.*\}', raw_text, re.DOTALL)
-                if json_match_braces:
-                    json_str = json_match_braces.group(0)
-                else:
-                    print(f"Failed to extract JSON. Raw response:\n{raw_text}")
-                    raise ValueError("Could not find valid JSON in the AI response after multiple cleaning attempts.")
-            try:
-                generated_data = json.loads(json_str)
-            except json.JSONDecodeError as e:
-                print(f"Error decoding cleaned JSON: {e}")
-                print(f"Cleaned JSON string was:\n{json_str}")
-                print(f"Original raw response was:\n{raw_text}")
-                raise ValueError(f"Failed to parse the AI's response as valid JSON even after cleaning. {e}") from e
-
-        if 'explanation' not in generated_data or not isinstance(generated_data['explanation'], str):
-            raise ValueError("Generated JSON is missing 'explanation' key or it's not a string.")
-        if 'questions' not in generated_data or not isinstance(generated_data['questions'], list):
-            raise ValueError("Generated JSON is missing 'questions' key or it's not a list.")
-        
-        # Validate number of questions returned vs requested
-        if question_type == "mixed" and num_questions_per_type:
-            type_counts_returned = {'mcq': 0, 'fill': 0, 'tf': 0}
-            for q_gen in generated_data['questions']:
-                q_gen_type = q_gen.get('type')
-                if q_gen_type in type_counts_returned:
-                    type_counts_returned[q_gen_type] += 1
-            
-            valid_mix = True
-            for q_type_req, count_req in num_questions_per_type.items():
-                if count_req > 0 and type_counts_returned.get(q_type_req, 0) != count_req:
-                    print(f"Warning: AI returned {type_counts_returned.get(q_type_req, 0)} '{q_type_req}' questions, but {count_req} were requested.")
-                    # valid_mix = False # Decided to proceed with what AI returned, but log warning
-            
-            if len(generated_data['questions']) != actual_num_questions:
-                 print(f"Warning: AI returned {len(generated_data['questions'])} total questions for mixed type, but {actual_num_questions} were expected. Using the {len(generated_data['questions'])} questions returned by the AI.")
-        elif question_type != "mixed":
-            if len(generated_data['questions']) != actual_num_questions:
-                 print(f"Warning: AI returned {len(generated_data['questions'])} questions, but {actual_num_questions} were requested for single type. Using the {len(generated_data['questions'])} questions returned by the AI.")
-
-        for i, q in enumerate(generated_data['questions']):
-             if not all(k in q for k in ['question_text', 'type', 'difficulty', 'answer']):
-                 raise ValueError(f"Question {i+1} is missing required keys (question_text, type, difficulty, answer).")
-             q_type_from_ai = q.get('type')
-             if q_type_from_ai == 'mcq' and (not isinstance(q.get('options'), list) or len(q['options']) != 4 or q.get('answer') not in q['options']):
-                 raise ValueError(f"MCQ Question {i+1} (text: {q.get('question_text')[:50]}...) has invalid 'options' or 'answer'. Options must be a list of 4 strings, and answer must match one option.")
-             if q_type_from_ai == 'tf' and not isinstance(q.get('answer'), bool):
-                 if isinstance(q.get('answer'), str):
-                     if q['answer'].lower() == 'true': q['answer'] = True
-                     elif q['answer'].lower() == 'false': q['answer'] = False
-                     else: raise ValueError(f"True/False Question {i+1} (text: {q.get('question_text')[:50]}...) has non-boolean answer: {q['answer']}.")
-                 else: raise ValueError(f"True/False Question {i+1} (text: {q.get('question_text')[:50]}...) has non-boolean answer: {q['answer']}.")
-             # Ensure the type in the question matches what was expected if single type, or is one of the mixed types.
-             if question_type != 'mixed' and q_type_from_ai != question_type:
-                 raise ValueError(f"Question {i+1} has type '{q_type_from_ai}' but '{question_type}' was expected.")
-             elif question_type == 'mixed' and q_type_from_ai not in num_questions_per_type:
-                 raise ValueError(f"Question {i+1} has unexpected type '{q_type_from_ai}' for mixed request.")
-
-
-        result = {
-            'topic': topic,
-            'difficulty': difficulty,
-            'question_type': question_type, # This is the overall request type ('mixed' or single)
-            'num_questions_requested_details': num_questions_per_type if question_type == 'mixed' else {question_type: actual_num_questions},
-            'content': generated_data.get('explanation', 'Explanation not generated.'),
-            'questions': generated_data.get('questions', [])
-        }
-        return result
+                print(f"Failed to extract JSON. Raw response:\n{raw_text}")
+                raise ValueError("Could not find valid JSON in the AI response after multiple cleaning attempts.")
+        try:
+            return json.loads(json_str), parse_path
+        except json.JSONDecodeError as e:
+            print(f"Error decoding cleaned JSON: {e}")
+            print(f"Cleaned JSON string was:\n{json_str}")
+            print(f"Original raw response was:\n{raw_text}")
+            raise ValueError(f"Failed to parse the AI's response as valid JSON even after cleaning. {e}") from e
+
+
+def _configured_provider():
+    """(provider, model) for the next Gemini call; raises ValueError when no API key is configured."""
+    api_key = settings.GOOGLE_API_KEY
+    if not api_key and getattr(settings, 'GENAI_REPLAY_MODE', 'off') != 'replay':
+        print("Error: GOOGLE_API_KEY not found in settings.")
+        raise ValueError("Google API Key not configured.")
+    return _get_generation_provider(api_key), settings.GENAI_MODEL
+
+def _prepare_generation(topic: str, question_type: str, difficulty: str, num_questions: int, num_questions_per_type: dict = None, include_explanation: bool = True, extra_instructions: str = None):
+    """
+    Everything before the model call, shared by the sync and async generators.
+    Returns (provider, model, prompt, actual_num_questions, run) where run is the unsaved GenerationRun.
+    """
+    provider, model = _configured_provider()
+
+    with span('prompt_build'):
+        prompt, actual_num_questions = _build_generation_prompt(topic, question_type, difficulty, num_questions, num_questions_per_type, include_explanation, extra_instructions)
+
+    # Telemetry for this call; saved off-request by the caller once the Quiz row exists, or by the generator on failure.
+    run = GenerationRun(
+        model_name=model,
+        topic=topic,
+        question_type=question_type,
+        difficulty=difficulty,
+        num_questions_requested=actual_num_questions,
+        prompt_chars=len(prompt),
+        parse_path='failed',
+    )
+    return provider, model, prompt, actual_num_questions, run
+
+def _finish_generation(response, run: GenerationRun, topic: str, question_type: str, difficulty: str, num_questions_per_type: dict, actual_num_questions: int, include_explanation: bool = True):
+    """Parses and validates the model response, filling in ``run``. Returns the quiz data dict ('content' is None when the explanation is deferred)."""
+    raw_text = response.text
+    run.response_chars = len(raw_text or '')
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None:
+        run.prompt_tokens = getattr(usage, 'prompt_token_count', None)
+        run.response_tokens = getattr(usage, 'candidates_token_count', None)
+
+    with span('json_extract'):
+        generated_data, run.parse_path = _extract_json_payload(raw_text)
 
-    except json.JSONDecodeError as e:
+    with span('validate'):
+        validate_generated_data(generated_data, question_type, num_questions_per_type, actual_num_questions, include_explanation)
+
+    run.succeeded = True
+    run.num_questions_returned = len(generated_data['questions'])
+
+    return {
+        'topic': topic,
+        'difficulty': difficulty,
+        'question_type': question_type, # This is the overall request type ('mixed' or single)
+        'num_questions_requested_details': num_questions_per_type if question_type == 'mixed' else {question_type: actual_num_questions},
+        'content': generated_data.get('explanation', 'Explanation not generated.') if include_explanation else None,
+        'questions': generated_data.get('questions', []),
+        'generation_run': run,
+    }
+
+def _generation_error(e: Exception, run: GenerationRun, response=None) -> Exception:
+    """Logs a failed generation and returns the exception the views expect."""
+    run.validation_error = str(e)
+    if isinstance(e, json.JSONDecodeError):
         print(f"Error decoding JSON response: {e}")
-        print(f"Raw response text was:\n{response.text if 'response' in locals() else 'No response object'}")
-        raise ValueError(f"Failed to parse the AI's response as valid JSON. Check the Gemini API response format. Error: {e}") from e
+        print(f"Raw response text was:\n{response.text if response is not None else 'No response object'}")
+        return ValueError(f"Failed to parse the AI's response as valid JSON. Check the Gemini API response format. Error: {e}")
+    print(f"An unexpected error occurred during AI generation: {e}")
+    import traceback
+    traceback.print_exc()
+    return Exception(f"An error occurred while communicating with the AI service: {e}")
+
+
+def _include_explanation(lazy_explanation) -> bool:
+    return not (getattr(settings, 'LAZY_EXPLANATIONS', False) if lazy_explanation is None else lazy_explanation)
+
+def _record_provider_call(model: str, started: float, response=None):
+    """Counts a provider call and reports it to the admission controller. Replayed responses say nothing about the provider's health."""
+    if response is None:
+        record_llm_call(model, 'error')
+        record_outcome(time.perf_counter() - started, ok=False)
+    elif getattr(response, 'replayed', False):
+        record_llm_call(model, 'replayed')
+    else:
+        record_llm_call(model, 'ok')
+        record_outcome(time.perf_counter() - started, ok=True)
+
+def _call_provider(provider, model: str, prompt: str):
+    started = time.perf_counter()
+    try:
+        response = provider.generate(model, prompt)
+    except Exception:
+        _record_provider_call(model, started)
+        raise
+    _record_provider_call(model, started, response)
+    return response
+
+async def _acall_provider(provider, model: str, prompt: str):
+    started = time.perf_counter()
+    try:
+        response = await provider.agenerate(model, prompt)
+    except Exception:
+        _record_provider_call(model, started)
+        raise
+    _record_provider_call(model, started, response)
+    return response
+
+def generate_quiz_content(topic: str, question_type: str, difficulty: str, num_questions: int = 5, num_questions_per_type: dict = None, lazy_explanation: bool = None, extra_instructions: str = None):
+    """
+    Generates quiz content (explanation and questions) using the Gemini API.
+    Can handle single question type or a mix of types if question_type is 'mixed'.
+    With lazy explanations (default: settings.LAZY_EXPLANATIONS) only the questions are generated
+    and 'content' is None; generate_explanation fills it in later.
+    """
+    include_explanation = _include_explanation(lazy_explanation)
+    provider, model, prompt, actual_num_questions, run = _prepare_generation(topic, question_type, difficulty, num_questions, num_questions_per_type, include_explanation, extra_instructions)
+    started = time.perf_counter()
+    response = None
+
+    try:
+        with span('llm_call'):
+            response = _call_provider(provider, model, prompt)
+        return _finish_generation(response, run, topic, question_type, difficulty, num_questions_per_type, actual_num_questions, include_explanation)
     except Exception as e:
-        print(f"An unexpected error occurred during AI generation: {e}")
-        import traceback
-        traceback.print_exc() 
-        raise Exception(f"An error occurred while communicating with the AI service: {e}") from e
+        raise _generation_error(e, run, response) from e
+    finally:
+        run.wall_time_ms = (time.perf_counter() - started) * 1000
+        if not run.succeeded:
+            record_generation_run(run)
+
+
+async def agenerate_quiz_content(topic: str, question_type: str, difficulty: str, num_questions: int = 5, num_questions_per_type: dict = None, lazy_explanation: bool = None, extra_instructions: str = None):
+    """
+    Async twin of generate_quiz_content: awaits the Gemini call instead of blocking a thread on it,
+    so one ASGI worker can keep many generations in flight.
+    """
+    include_explanation = _include_explanation(lazy_explanation)
+    provider, model, prompt, actual_num_questions, run = _prepare_generation(topic, question_type, difficulty, num_questions, num_questions_per_type, include_explanation, extra_instructions)
+    started = time.perf_counter()
+    response = None
+
+    try:
+        with span('llm_call'):
+            response = await _acall_provider(provider, model, prompt)
+        return _finish_generation(response, run, topic, question_type, difficulty, num_questions_per_type, actual_num_questions, include_explanation)
+    except Exception as e:
+        raise _generation_error(e, run, response) from e
+    finally:
+        run.wall_time_ms = (time.perf_counter() - started) * 1000
+        if not run.succeeded:
+            await sync_to_async(record_generation_run)(run)
+
+
+def _clean_explanation(text: str) -> str:
+    text = (text or '').strip()
+    fenced = re.match(r'^```\w*\s*(.*?)\s*```$', text, re.DOTALL) # Models sometimes fence it anyway
+    return fenced.group(1) if fenced else text
+
+def generate_explanation(topic: str, difficulty: str) -> str:
+    """Generates just the topic explanation (the second half of a lazy-explanation quiz)."""
+    provider, model = _configured_provider()
+    prompt = _build_explanation_prompt(topic, difficulty)
+    with span('llm_call'):
+        response = _call_provider(provider, model, prompt)
+    return _clean_explanation(response.text)
+
+async def agenerate_explanation(topic: str, difficulty: str) -> str:
+    provider, model = _configured_provider()
+    prompt = _build_explanation_prompt(topic, difficulty)
+    with span('llm_call'):
+        response = await _acall_provider(provider, model, prompt)
+    return _clean_explanation(response.text)
+
+def _store_explanation(quiz_id: int, explanation: str) -> str:
+    """Saves the explanation unless another request got there first; returns the stored one."""
+    if not Quiz.objects.filter(pk=quiz_id, explanation__isnull=True).update(explanation=explanation):
+        explanation = Quiz.objects.filter(pk=quiz_id).values_list('explanation', flat=True).first() or explanation
+    return explanation
+
+# Background fills started right after a lazy quiz is served, by quiz id, so the endpoint can wait for one
+# instead of making a second Gemini call for the same explanation.
+_explanation_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='quizify-explanations')
+_pending_explanations = {}
+
+def _fill_explanation(quiz_id: int, topic: str, difficulty: str):
+    # Takes a generation slot like any other Gemini call; when none is free the fill is dropped and
+    # quiz_explanation generates (or sheds) the explanation when it is asked for.
+    admission = get_controller().try_admit() if admission_enabled() else None
+    try:
+        if admission is not None:
+            record_decision(admission.reason if admission.admitted else 'shed')
+            if not admission.admitted:
+                return None
+        close_old_connections()
+        return _store_explanation(quiz_id, generate_explanation(topic, difficulty))
+    except Exception as e:
+        print(f"Background explanation for quiz {quiz_id} failed: {e}")
+    finally:
+        if admission is not None and admission.admitted:
+            get_controller().release(admission)
+        _pending_explanations.pop(quiz_id, None)
+        close_old_connections()
+
+def schedule_explanation(quiz: Quiz):
+    """Starts generating a lazy quiz's explanation in the background (LAZY_EXPLANATIONS_BACKGROUND)."""
+    if quiz.explanation is None and quiz.id not in _pending_explanations:
+        _pending_explanations[quiz.id] = _explanation_executor.submit(_fill_explanation, quiz.id, quiz.topic, quiz.difficulty)
 
 
 # --- Django Views ---
+# The views are async so a slow Gemini call or SMTP send does not pin a worker thread under ASGI
+# (quizify/asgi.py); they still work unchanged under WSGI, where Django runs them in an event loop per request.
+
+def _quiz_result(quiz: Quiz) -> dict:
+    """Template context for quiz/_quiz_container.html. Quizzes longer than one window only carry their first window of questions."""
+    questions = quiz.get_questions()
+    question_total = max(len(questions), largequiz.expected_questions(quiz))
+    windowed = largequiz.is_windowed(quiz)
+    return {
+        'quiz_id': quiz.id,
+        'topic': quiz.topic,
+        'difficulty': quiz.difficulty,
+        'question_type_display': 'Mixed Types' if quiz.question_type == 'mixed' else dict(Quiz.QUESTION_TYPE_CHOICES).get(quiz.question_type, quiz.question_type.capitalize()),
+        'content': quiz.explanation,
+        'questions': questions[:largequiz.window_size()] if windowed else questions,
+        'question_total': question_total,
+        'windowed': windowed,
+        'content_hash': quiz.content_hash,
+        'fragment_timeout': getattr(settings, 'QUIZ_FRAGMENT_CACHE_SECONDS', 86400),
+    }
+
 
-def index(request: HttpRequest) -> HttpResponse:
-    context = {'form_data': {}} 
+async def _session_set(request: HttpRequest, key: str, value):
+    # Django 4.2 sessions have no async API and may hit the database on first access.
+    await sync_to_async(request.session.__setitem__)(key, value)
+
+async def _session_get(request: HttpRequest, key: str):
+    return await sync_to_async(request.session.get)(key)
+
+def _shed_message(retry_after: float) -> tuple:
+    seconds = max(1, math.ceil(retry_after))
+    return seconds, f"Quiz generation is temporarily overloaded. Please try again in about {seconds} seconds."
+
+def _shed_response(request: HttpRequest, context: dict, admission) -> HttpResponse:
+    """503 for a generation that was not admitted and has no stored fallback."""
+    record_decision('shed')
+    seconds, context['error'] = _shed_message(admission.retry_after)
+    response = render(request, 'quiz/index.html', context, status=503)
+    response['Retry-After'] = str(seconds)
+    return response
+
+async def index(request: HttpRequest) -> HttpResponse:
+    max_questions = largequiz.max_questions()
+    context = {'form_data': {}, 'max_questions': max_questions}
 
     if request.method == 'POST':
         topic = request.POST.get('topic', '').strip()
@@ -251,8 +496,8 @@ def index(request: HttpRequest) -> HttpResponse:
 
                 if num_questions == 0:
                     raise ValueError("For 'Mixed' type, please specify at least one question for any category.")
-                if num_questions > 20: # Overall limit for mixed
-                     raise ValueError("Total number of questions for 'Mixed' type cannot exceed 20.")
+                if num_questions > max_questions: # Overall limit for mixed
+                     raise ValueError(f"Total number of questions for 'Mixed' type cannot exceed {max_questions}.")
 
 
                 context['form_data'].update({
@@ -267,8 +512,8 @@ def index(request: HttpRequest) -> HttpResponse:
             num_questions_str = request.POST.get('num_questions', '5')
             try:
                 num_questions = int(num_questions_str)
-                if not (1 <= num_questions <= 20):
-                    raise ValueError("Number of questions must be between 1 and 20.")
+                if not (1 <= num_questions <= max_questions):
+                    raise ValueError(f"Number of questions must be between 1 and {max_questions}.")
                 context['form_data']['num_questions'] = num_questions
             except ValueError as ve:
                 context['error'] = str(ve)
@@ -288,31 +533,72 @@ def index(request: HttpRequest) -> HttpResponse:
              return render(request, 'quiz/index.html', context)
 
         try:
-            quiz_data = generate_quiz_content(
-                topic, 
-                question_type, 
-                difficulty, 
-                num_questions=num_questions, # This is total for mixed, or specific for single
-                num_questions_per_type=num_questions_per_type_dict if question_type == 'mixed' else None
-            )
+            per_type = num_questions_per_type_dict if question_type == 'mixed' else None
+            # Large quizzes: the first chunk is generated here, the rest in the background (quiz.largequiz)
+            chunks = plan_chunks(question_type, num_questions, per_type, largequiz.chunk_size())
+            first_chunk = chunks[0]
+            new_quiz = None
+            if prefetch_enabled() and len(chunks) == 1:
+                with span('prefetch_lookup'):
+                    new_quiz = await sync_to_async(take_prefetched)(topic, question_type, difficulty, num_questions, per_type)
+            if new_quiz is None and getattr(settings, 'SERVE_BANKED_QUIZZES', False) and per_type is None and len(chunks) == 1:
+                with span('bank_lookup'):
+                    new_quiz = await sync_to_async(find_banked_quiz)(topic, question_type, difficulty, num_questions)
+                if new_quiz is not None and (new_quiz.question_count != num_questions or new_quiz.questions_pending):
+                    new_quiz = None # Only an exact match stands in for a generation
 
-            new_quiz = Quiz.objects.create(
-                topic=quiz_data['topic'],
-                difficulty=quiz_data['difficulty'],
-                question_type=quiz_data['question_type'], # Stores 'mixed' or the single type
-                explanation=quiz_data['content'],
-                questions_data=quiz_data['questions']
-            )
-            request.session['current_quiz_id'] = new_quiz.id
+            admission = None
+            fallback = False
+            if new_quiz is None and admission_enabled():
+                admission = get_controller().try_admit()
+                if not admission.admitted:
+                    # Shed the generation instead of queueing it behind a slow or failing provider
+                    with span('fallback_lookup'):
+                        new_quiz = await sync_to_async(find_banked_quiz)(topic, question_type, difficulty, num_questions)
+                    if new_quiz is None:
+                        return _shed_response(request, context, admission)
+                    record_decision('fallback')
+                    fallback = True
+                    context['notice'] = "Quiz generation is busy right now, so here is a quiz on this topic that was generated earlier."
+                else:
+                    record_decision(admission.reason)
+
+            if new_quiz is None:
+                try:
+                    with live_generation():
+                        quiz_data = await agenerate_quiz_content(
+                            topic, 
+                            question_type, 
+                            difficulty, 
+                            num_questions=first_chunk['num_questions'], # This is total for mixed, or specific for single
+                            num_questions_per_type=first_chunk['num_questions_per_type']
+                        )
+                finally:
+                    if admission is not None:
+                        get_controller().release(admission)
 
-            context['quiz_result'] = {
-                'quiz_id': new_quiz.id,
-                'topic': new_quiz.topic,
-                'difficulty': new_quiz.difficulty,
-                'question_type_display': 'Mixed Types' if new_quiz.question_type == 'mixed' else dict(Quiz.QUESTION_TYPE_CHOICES).get(new_quiz.question_type, new_quiz.question_type.capitalize()),
-                'content': new_quiz.explanation,
-                'questions': new_quiz.get_questions() 
-            }
+                with span('db_insert'):
+                    new_quiz = await Quiz.objects.acreate(
+                        topic=quiz_data['topic'],
+                        difficulty=quiz_data['difficulty'],
+                        question_type=quiz_data['question_type'], # Stores 'mixed' or the single type
+                        explanation=quiz_data['content'],
+                        questions_data=quiz_data['questions'],
+                        # Only the chunks still to come are pending; the model may return more or fewer than asked
+                        questions_pending=sum(chunk['num_questions'] for chunk in chunks[1:]),
+                    )
+                generation_run = quiz_data['generation_run']
+                generation_run.quiz = new_quiz
+                await sync_to_async(record_generation_run)(generation_run)
+                if len(chunks) > 1:
+                    await sync_to_async(largequiz.schedule_chunks)(new_quiz, chunks[1:])
+                    await new_quiz.arefresh_from_db() # Background chunks may have landed already
+            note_topic(new_quiz.topic)
+            if new_quiz.explanation is None and not fallback and getattr(settings, 'LAZY_EXPLANATIONS_BACKGROUND', True):
+                schedule_explanation(new_quiz)
+            await _session_set(request, 'current_quiz_id', new_quiz.id)
+
+            context['quiz_result'] = _quiz_result(new_quiz)
 
         except ValueError as ve:
              context['error'] = f"Generation Error: {ve}"
@@ -322,10 +608,79 @@ def index(request: HttpRequest) -> HttpResponse:
             import traceback
             traceback.print_exc()
 
-    return render(request, 'quiz/index.html', context)
+    with span('render'):
+        return render(request, 'quiz/index.html', context)
+
 
+_IDEMPOTENCY_KEY_RE = re.compile(r'[A-Za-z0-9_-]{8,64}')
 
-def check_answers(request: HttpRequest) -> JsonResponse:
+
+def _check_response(attempt: QuizAttempt, quiz: Quiz, compact: bool, partial: bool, standing: dict) -> dict:
+    """check/ response body for a stored attempt, so a replayed submission gets the same answer as the first."""
+    results = attempt.get_detailed_results()
+    if compact:
+        return {
+            'attempt_id': attempt.id,
+            'score': attempt.score,
+            'total_questions': attempt.total_questions,
+            'percentage': attempt.percentage,
+            'correct': [int(result['is_correct']) for result in results], # In question order
+            'correct_answers': [result['correct_answer'] for result in results],
+            **({'question_indexes': [result['question_index'] for result in results], 'quiz_total': len(quiz.get_questions())} if partial else {}),
+            **standing,
+        }
+    return {
+        'attempt_id': attempt.id,
+        'score': attempt.score,
+        'total_questions': attempt.total_questions,
+        'percentage': attempt.percentage,
+        'results': results,
+        **({'quiz_total': len(quiz.get_questions())} if partial else {}),
+        **standing,
+        'topic': quiz.topic,
+        'difficulty': quiz.difficulty
+    }
+
+
+def _idempotency_scope(session) -> str:
+    """Hash of the session's key, which scopes idempotency keys to one client. Creates the session if needed."""
+    if session.session_key is None:
+        session.save()
+    return hashlib.sha256(session.session_key.encode()).hexdigest()
+
+
+def _store_attempt(**fields) -> tuple:
+    """
+    Saves a new QuizAttempt: (attempt, False), or (the attempt this session already stored under its
+    idempotency key, True).
+    """
+    if fields['idempotency_key'] is None:
+        return QuizAttempt.objects.create(**fields), False
+    try:
+        with transaction.atomic(): # Keeps an enclosing transaction usable after the IntegrityError
+            return QuizAttempt.objects.create(**fields), False
+    except IntegrityError:
+        return QuizAttempt.objects.get(idempotency_scope=fields['idempotency_scope'], idempotency_key=fields['idempotency_key']), True
+
+
+async def _replay_attempt(request: HttpRequest, attempt: QuizAttempt, quiz_id, submitted_answers: dict, participant: str,
+                          compact: bool, partial: bool) -> JsonResponse:
+    if str(attempt.quiz_id) != str(quiz_id):
+        return JsonResponse({'error': 'Idempotency key already used for another quiz.'}, status=422)
+    if attempt.submitted_answers != submitted_answers or attempt.participant != participant:
+        return JsonResponse({'error': 'Idempotency key already used for a different submission.'}, status=422)
+    quiz = await Quiz.objects.aget(pk=attempt.quiz_id)
+    await _session_set(request, 'current_attempt_id', attempt.id)
+    standing = {}
+    if attempt.participant:
+        rank, participants = await sync_to_async(classroom.standing)(attempt)
+        standing = {'rank': rank, 'participants': participants}
+    response = JsonResponse(_check_response(attempt, quiz, compact, partial, standing), status=200)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+async def check_answers(request: HttpRequest) -> JsonResponse:
     if request.method != 'POST':
         return JsonResponse({'error': 'Invalid request method. Use POST.'}, status=405)
 
@@ -333,6 +688,9 @@ def check_answers(request: HttpRequest) -> JsonResponse:
         submitted_data = json.loads(request.body)
         submitted_answers = submitted_data.get('answers')
         quiz_id = submitted_data.get('quiz_id') 
+        compact = submitted_data.get('compact') is True # Client already has the questions and its own answers
+        partial = submitted_data.get('partial') is True # Grade only the answered questions (large quizzes)
+        participant = classroom.clean_participant(submitted_data.get('participant')) # Classroom mode
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON data.'}, status=400)
 
@@ -341,8 +699,15 @@ def check_answers(request: HttpRequest) -> JsonResponse:
     if not quiz_id:
          return JsonResponse({'error': 'Missing quiz ID.'}, status=400)
 
+    # Retries of one submission (the offline queue in sw.js, a flaky network) carry the same key. Retries are rare,
+    # so they are graded again and recognised by the unique key when stored (see _store_attempt).
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key is not None and not _IDEMPOTENCY_KEY_RE.fullmatch(idempotency_key):
+        return JsonResponse({'error': 'Invalid Idempotency-Key header.'}, status=400)
+
     try:
-        correct_quiz = Quiz.objects.get(pk=quiz_id)
+        with span('db_lookup'):
+            correct_quiz = await Quiz.objects.aget(pk=quiz_id)
     except Quiz.DoesNotExist:
         return JsonResponse({'error': 'Quiz not found.'}, status=404)
 
@@ -354,64 +719,257 @@ def check_answers(request: HttpRequest) -> JsonResponse:
     if total_questions == 0:
          return JsonResponse({'error': 'Quiz has no questions.'}, status=400)
 
-    for i, question in enumerate(correct_questions):
-        question_key = f"q{i+1}" 
-        submitted_answer = submitted_answers.get(question_key)
-        correct_answer = question.get('answer') 
-        is_correct = False
-
-        if submitted_answer is not None:
-            if question['type'] == 'tf':
-                submitted_bool = None
-                if isinstance(submitted_answer, str):
-                    submitted_bool = submitted_answer.lower() == 'true'
-                elif isinstance(submitted_answer, bool): 
-                     submitted_bool = submitted_answer
-                is_correct = (submitted_bool is not None and submitted_bool == correct_answer)
-            elif question['type'] == 'fill':
-                 is_correct = str(submitted_answer).strip().lower() == str(correct_answer).strip().lower()
-            else: # mcq
-                 is_correct = str(submitted_answer) == str(correct_answer)
-
-        if is_correct:
-            score += 1
-
-        results.append({
-            'question_index': i,
-            'question_key': question_key,
-            'submitted_answer': submitted_answer,
-            'correct_answer': correct_answer,
-            'is_correct': is_correct,
-            'question_text': question.get('question_text', 'N/A') 
-        })
+    if partial and not largequiz.is_windowed(correct_quiz):
+        return JsonResponse({'error': 'Partial submissions are only accepted for large quizzes.'}, status=400)
+    if partial:
+        graded = [i for i in range(total_questions) if submitted_answers.get(f"q{i+1}") is not None]
+        if not graded:
+            return JsonResponse({'error': 'No answers to check.'}, status=400)
+    else:
+        graded = range(total_questions)
+
+    with span('grade'):
+        for i in graded:
+            question = correct_questions[i]
+            question_key = f"q{i+1}" 
+            submitted_answer = submitted_answers.get(question_key)
+            correct_answer = question.get('answer') 
+            is_correct = False
+
+            if submitted_answer is not None:
+                if question['type'] == 'tf':
+                    submitted_bool = None
+                    if isinstance(submitted_answer, str):
+                        submitted_bool = submitted_answer.lower() == 'true'
+                    elif isinstance(submitted_answer, bool): 
+                         submitted_bool = submitted_answer
+                    is_correct = (submitted_bool is not None and submitted_bool == correct_answer)
+                elif question['type'] == 'fill':
+                     is_correct = str(submitted_answer).strip().lower() == str(correct_answer).strip().lower()
+                else: # mcq
+                     is_correct = str(submitted_answer) == str(correct_answer)
+
+            if is_correct:
+                score += 1
+
+            results.append({
+                'question_index': i,
+                'question_key': question_key,
+                'submitted_answer': submitted_answer,
+                'correct_answer': correct_answer,
+                'is_correct': is_correct,
+                'question_text': question.get('question_text', 'N/A') 
+            })
 
+    total_questions = len(results) # Answered questions only, for partial submissions
+    if participant:
+        total_questions = len(correct_questions) # Leaderboards rank on the whole quiz; unanswered questions count as wrong
     percentage = round((score / total_questions) * 100) if total_questions > 0 else 0
 
-    attempt = QuizAttempt.objects.create(
-        quiz=correct_quiz,
-        submitted_answers=submitted_answers, 
-        score=score,
-        total_questions=total_questions,
-        percentage=percentage,
-        results_data=results 
-    )
-    request.session['current_attempt_id'] = attempt.id
+    idempotency_scope = await sync_to_async(_idempotency_scope)(request.session) if idempotency_key is not None else ''
+    with span('db_insert'):
+        attempt, stored_before = await sync_to_async(_store_attempt)(
+            quiz=correct_quiz,
+            submitted_answers=submitted_answers, 
+            score=score,
+            total_questions=total_questions,
+            percentage=percentage,
+            results_data=results,
+            participant=participant,
+            idempotency_key=idempotency_key,
+            idempotency_scope=idempotency_scope,
+        )
+    if stored_before:
+        return await _replay_attempt(request, attempt, quiz_id, submitted_answers, participant, compact, partial)
+    await _session_set(request, 'current_attempt_id', attempt.id)
+    standing = {}
+    if participant:
+        with span('leaderboard'):
+            rank, participants = await sync_to_async(classroom.record_attempt)(attempt)
+        standing = {'rank': rank, 'participants': participants}
 
+    return JsonResponse(_check_response(attempt, correct_quiz, compact, partial, standing), status=200)
+
+
+async def quiz_explanation(request: HttpRequest, quiz_id: int) -> JsonResponse:
+    """
+    GET /api/quiz/<id>/explanation - the quiz's explanation, generating it on first request
+    for quizzes created with lazy explanations.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid request method. Use GET.'}, status=405)
+    try:
+        with span('db_lookup'):
+            quiz = await Quiz.objects.only('id', 'topic', 'difficulty', 'explanation').aget(pk=quiz_id)
+    except Quiz.DoesNotExist:
+        return JsonResponse({'error': 'Quiz not found.'}, status=404)
+
+    explanation = quiz.explanation
+    if explanation is None:
+        pending = _pending_explanations.get(quiz.id)
+        if pending is not None:
+            explanation = await asyncio.wrap_future(pending) # Already being generated in the background
+        if explanation is None:
+            admission = get_controller().try_admit() if admission_enabled() else None
+            if admission is not None and not admission.admitted:
+                record_decision('shed')
+                seconds, message = _shed_message(admission.retry_after)
+                response = JsonResponse({'error': message}, status=503)
+                response['Retry-After'] = str(seconds)
+                return response
+            try:
+                with live_generation():
+                    generated = await agenerate_explanation(quiz.topic, quiz.difficulty)
+            except Exception as e:
+                print(f"Error generating explanation for quiz {quiz.id}: {e}")
+                return JsonResponse({'error': f"Could not generate the explanation: {e}"}, status=502)
+            finally:
+                if admission is not None:
+                    record_decision(admission.reason)
+                    get_controller().release(admission)
+            with span('db_insert'):
+                explanation = await sync_to_async(_store_explanation)(quiz.id, generated)
+
+    response = JsonResponse({'quiz_id': quiz.id, 'explanation': explanation})
+    response['Cache-Control'] = 'private, max-age=3600' # Never changes once generated
+    return response
+
+
+# --- Shared quiz pages ---
+
+_PUBLIC_QUESTION_KEYS = ('question_text', 'type', 'difficulty', 'options')
+
+
+def _public_questions(questions: list) -> list:
+    """The questions as students see them: everything but the answers."""
+    return [{key: question[key] for key in _PUBLIC_QUESTION_KEYS if key in question} for question in questions]
+
+
+def _shared_quiz_etag(quiz: Quiz, *variant) -> str:
+    """Strong ETag over everything a shared quiz response is rendered from."""
+    seed = json.dumps([quiz.id, quiz.content_hash, largequiz.expected_questions(quiz), quiz.topic, quiz.difficulty, quiz.question_type, quiz.explanation, *variant])
+    return '"%s"' % hashlib.sha256(seed.encode()).hexdigest()[:32]
+
+
+def _shared_cache_control(response: HttpResponse, quiz: Quiz) -> HttpResponse:
+    if largequiz.still_generating(quiz):
+        response['Cache-Control'] = 'public, no-cache' # Still growing: revalidate every time (cheap with the ETag)
+        return response
+    response['Cache-Control'] = 'public, max-age=%d, s-maxage=%d' % (
+        getattr(settings, 'SHARED_QUIZ_MAX_AGE', 300), getattr(settings, 'SHARED_QUIZ_PROXY_MAX_AGE', 86400))
+    return response
+
+
+async def _load_shared_quiz(request: HttpRequest, quiz_id: int, *variant):
+    """
+    Returns (quiz, etag, response). ``response`` is a 304 when the client's
+    copy is current, in which case the questions are never loaded; otherwise None.
+    Raises Quiz.DoesNotExist.
+    """
+    with span('db_lookup'):
+        quiz = await Quiz.objects.defer('questions_data').aget(pk=quiz_id)
+    etag = _shared_quiz_etag(quiz, *variant)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        not_modified['ETag'] = etag
+        return quiz, etag, _shared_cache_control(not_modified, quiz)
+    with span('db_lookup'):
+        quiz.questions_data = await Quiz.objects.filter(pk=quiz.pk).values_list('questions_data', flat=True).aget()
+    return quiz, etag, None
+
+
+async def quiz_detail(request: HttpRequest, quiz_id: int) -> HttpResponse:
+    """
+    GET /quiz/<id>/ - shareable page for a stored quiz, without the answers. The page is the
+    same for every visitor (no CSRF token or session), so browsers and reverse proxies can cache it.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    # The page also depends on the asset URLs and the footer year.
+    variant = ('html', static('css/style.css'), static('js/script.js'), timezone.now().year)
+    try:
+        quiz, etag, not_modified = await _load_shared_quiz(request, quiz_id, *variant)
+    except Quiz.DoesNotExist:
+        raise Http404("Quiz not found.")
+    if not_modified is not None:
+        return not_modified
+    with span('render'):
+        response = render(request, 'quiz/quiz_detail.html', {'quiz_result': _quiz_result(quiz)})
+    response['ETag'] = etag
+    return _shared_cache_control(response, quiz)
+
+
+async def quiz_api(request: HttpRequest, quiz_id: int) -> JsonResponse:
+    """GET /api/quiz/<id> - a stored quiz as JSON, without the answers; cached like quiz_detail."""
+    if request.method not in ('GET', 'HEAD'):
+        return JsonResponse({'error': 'Invalid request method. Use GET.'}, status=405)
+    try:
+        quiz, etag, not_modified = await _load_shared_quiz(request, quiz_id, 'json')
+    except Quiz.DoesNotExist:
+        return JsonResponse({'error': 'Quiz not found.'}, status=404)
+    if not_modified is not None:
+        return not_modified
+    response = JsonResponse({
+        'quiz_id': quiz.id,
+        'topic': quiz.topic,
+        'difficulty': quiz.difficulty,
+        'question_type': quiz.question_type,
+        'explanation': quiz.explanation, # None until a lazy explanation is generated; see explanation_url
+        'explanation_url': reverse('quiz:quiz_explanation', args=[quiz.id]),
+        'questions': _public_questions(quiz.get_questions()),
+    })
+    response['ETag'] = etag
+    return _shared_cache_control(response, quiz)
+
+
+async def quiz_questions(request: HttpRequest, quiz_id: int) -> JsonResponse:
+    """
+    GET /api/quiz/<id>/questions?offset=<n>&limit=<n> - one window of a quiz's question cards as HTML
+    (quiz/_question_cards.html), for the lazily loaded pages of large quizzes. ``generating`` is true while
+    more questions are still being generated; ``next_offset`` is null once there is nothing more to load.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return JsonResponse({'error': 'Invalid request method. Use GET.'}, status=405)
+    try:
+        offset = max(0, int(request.GET.get('offset', 0)))
+        limit = max(1, min(int(request.GET.get('limit', largequiz.window_size())), largequiz.window_size() * 5))
+    except ValueError:
+        return JsonResponse({'error': 'offset and limit must be integers.'}, status=400)
+    try:
+        with span('db_lookup'):
+            quiz = await Quiz.objects.aget(pk=quiz_id)
+    except Quiz.DoesNotExist:
+        return JsonResponse({'error': 'Quiz not found.'}, status=404)
+
+    questions = quiz.get_questions()
+    window = questions[offset:offset + limit]
+    generating = largequiz.still_generating(quiz)
+    question_total = max(len(questions), largequiz.expected_questions(quiz))
+    with span('render'):
+        html = render_to_string('quiz/_question_cards.html', {'cards': window, 'offset': offset, 'total': question_total, 'windowed': True})
+    more = offset + len(window) < len(questions) or generating
+    response = JsonResponse({
+        'quiz_id': quiz.id,
+        'offset': offset,
+        'count': len(window),
+        'question_count': len(questions),
+        'question_total': question_total,
+        'generating': generating,
+        'next_offset': offset + len(window) if more else None,
+        'html': html,
+    })
+    response['Cache-Control'] = 'no-cache' if generating else 'public, max-age=%d' % getattr(settings, 'SHARED_QUIZ_MAX_AGE', 300)
+    return response
 
-    response_data = {
-        'attempt_id': attempt.id, 
-        'score': score,
-        'total_questions': total_questions,
-        'percentage': percentage,
-        'results': results,
-        'topic': correct_quiz.topic, 
-        'difficulty': correct_quiz.difficulty 
-    }
 
-    return JsonResponse(response_data, status=200)
+async def csrf_token_view(request: HttpRequest) -> JsonResponse:
+    """GET /api/csrf - a CSRF token (and cookie) for cached pages, which cannot embed one."""
+    response = JsonResponse({'csrf_token': get_token(request)})
+    response['Cache-Control'] = 'private, no-store'
+    return response
 
 
-def send_quiz_email(request: HttpRequest) -> JsonResponse:
+async def send_quiz_email(request: HttpRequest) -> JsonResponse:
     if request.method != 'POST':
         return JsonResponse({'error': 'Invalid request method. Use POST.'}, status=405)
 
@@ -429,16 +987,17 @@ def send_quiz_email(request: HttpRequest) -> JsonResponse:
     
     attempt_id = attempt_id_from_request
     if not attempt_id:
-        attempt_id = request.session.get('current_attempt_id')
+        attempt_id = await _session_get(request, 'current_attempt_id')
         if not attempt_id:
             return JsonResponse({'error': 'Quiz attempt ID is required and was not found in request or session.'}, status=400)
             
     print(f"Attempting to send email for attempt_id: {attempt_id} to {email_address}")
 
     try:
-        quiz_attempt = get_object_or_404(QuizAttempt, pk=int(attempt_id))
-        quiz = quiz_attempt.quiz
-    except (QuizAttempt.DoesNotExist, Http404):
+        with span('db_lookup'):
+            quiz_attempt = await QuizAttempt.objects.select_related('quiz').aget(pk=int(attempt_id)) # One query for attempt + quiz
+            quiz = quiz_attempt.quiz
+    except QuizAttempt.DoesNotExist:
         print(f"QuizAttempt with ID {attempt_id} not found.")
         return JsonResponse({'error': 'Quiz attempt not found.'}, status=404)
     except ValueError:
@@ -451,7 +1010,7 @@ def send_quiz_email(request: HttpRequest) -> JsonResponse:
     email_context = {
         'quiz_topic': quiz.topic,
         'quiz_difficulty': quiz.difficulty,
-        'quiz_explanation': quiz.explanation,
+        'quiz_explanation': quiz.explanation or '', # None while a lazy explanation has not been generated
         'quiz_questions': quiz.get_questions(), 
         'quiz_attempt_score': quiz_attempt.score,
         'quiz_attempt_total_questions': quiz_attempt.total_questions,
@@ -460,7 +1019,8 @@ def send_quiz_email(request: HttpRequest) -> JsonResponse:
     }
 
     try:
-        html_content = render_to_string('quiz/email/quiz_results_email.html', email_context)
+        with span('render_email'):
+            html_content = render_to_string('quiz/email/quiz_results_email.html', email_context)
     except Exception as e:
         print(f"Error rendering email template: {e}")
         return JsonResponse({'error': 'Failed to render email content.'}, status=500)
@@ -469,7 +1029,7 @@ def send_quiz_email(request: HttpRequest) -> JsonResponse:
     Quiz Results for: {quiz.topic} (Difficulty: {quiz.difficulty})
     Your Score: {quiz_attempt.score}/{quiz_attempt.total_questions} ({quiz_attempt.percentage}%)
     Explanation:
-    {quiz.explanation}
+    {quiz.explanation or ''}
     --- Detailed Results ---
     """
     for result in email_context['detailed_results']:
@@ -497,7 +1057,9 @@ def send_quiz_email(request: HttpRequest) -> JsonResponse:
             [email_address] 
         )
         msg.attach_alternative(html_content, "text/html") 
-        msg.send()
+        with span('smtp_send'):
+            # SMTP does not touch the database, so it need not queue behind ORM work on the shared sync thread.
+            await sync_to_async(msg.send, thread_sensitive=False)()
         
         print(f"Email successfully sent to {email_address} for attempt {attempt_id}.")
         return JsonResponse({'success': True, 'message': f'Quiz results sent to {email_address}.'})
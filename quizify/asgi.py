@@ -1,11 +1,11 @@
-"\""
+"""
 ASGI config for quizify project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
-"\""
+"""
 
 import os
 
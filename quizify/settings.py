@@ -33,6 +33,18 @@ DEBUG = os.environ.get('DJANGO_DEBUG', 'True') == 'True'
 
 # Google Gemini API Key
 GOOGLE_API_KEY = os.environ.get('GOOGLE_GENAI_API_KEY')
+GENAI_MODEL = os.environ.get('QUIZIFY_GENAI_MODEL', 'gemini-2.0-flash')
+# Override the Gemini endpoint, e.g. to point at benchmarks/fake_gemini.py for load tests.
+GENAI_BASE_URL = os.environ.get('QUIZIFY_GENAI_BASE_URL') or None
+# Record/replay of Gemini responses (quiz.replay): 'off', 'record', 'replay' or 'auto' (replay, recording misses).
+# The store is JSONL, or SQLite when the path ends in .sqlite3/.db. streamlit_app.py reads the same variables.
+GENAI_REPLAY_MODE = os.environ.get('QUIZIFY_GENAI_REPLAY_MODE', 'off')
+GENAI_REPLAY_STORE = os.environ.get('QUIZIFY_GENAI_REPLAY_STORE', str(BASE_DIR / 'recordings' / 'generations.jsonl'))
+GENAI_REPLAY_LATENCY = os.environ.get('QUIZIFY_GENAI_REPLAY_LATENCY', 'False') == 'True' # Sleep for the recorded latency
+# Lazy explanations: generate only the questions first and fill Quiz.explanation with a second call, started in the
+# background right after the quiz is served (LAZY_EXPLANATIONS_BACKGROUND) or when the user expands the explanation.
+LAZY_EXPLANATIONS = os.environ.get('QUIZIFY_LAZY_EXPLANATIONS', 'False') == 'True'
+LAZY_EXPLANATIONS_BACKGROUND = os.environ.get('QUIZIFY_LAZY_EXPLANATIONS_BACKGROUND', 'True') == 'True'
 
 if not GOOGLE_API_KEY and DEBUG:
     print("Warning: GOOGLE_API_KEY is not set in the environment variables. AI generation will fail.")
@@ -59,12 +71,46 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware', # ETag + 304 for GET responses that do not set their own
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Request-stage timing (Server-Timing headers, JSON request logs and the /metrics endpoint).
+# Off by default; when off the middleware and span() calls are effectively free. /metrics is served to staff users and
+# to scrapers sending "Authorization: Bearer <METRICS_TOKEN>" (no token access when empty).
+INSTRUMENTATION_ENABLED = os.environ.get('QUIZIFY_INSTRUMENTATION', 'False') == 'True'
+METRICS_TOKEN = os.environ.get('QUIZIFY_METRICS_TOKEN', '')
+if INSTRUMENTATION_ENABLED:
+    MIDDLEWARE.insert(0, 'quiz.instrumentation.InstrumentationMiddleware')
+
+# Response compression (quiz.compression): HTML, JSON and other text responses of at least COMPRESSION_MIN_SIZE bytes
+# are sent brotli-encoded (needs the optional Brotli package) or gzip-encoded, whichever the client accepts.
+COMPRESSION_ENABLED = os.environ.get('QUIZIFY_COMPRESSION', 'True') == 'True'
+COMPRESSION_MIN_SIZE = int(os.environ.get('QUIZIFY_COMPRESSION_MIN_SIZE', 1024))
+if COMPRESSION_ENABLED:
+    MIDDLEWARE.insert(0, 'quiz.compression.CompressionMiddleware')
+
+# Rate limiting (quiz.ratelimit): token buckets per client and per IP address for each budget, written
+# '<tokens>/<seconds>' (a bucket holds <tokens> and refills completely over <seconds>). The buckets live in the
+# RATE_LIMIT_CACHE cache, so configure a shared backend (see CACHES) to enforce the limits across worker processes.
+# Only enable RATE_LIMIT_TRUST_X_FORWARDED_FOR behind a proxy that sets the header.
+RATE_LIMIT_ENABLED = os.environ.get('QUIZIFY_RATE_LIMIT', str(not DEBUG)) == 'True'
+RATE_LIMITS = {
+    'generation': os.environ.get('QUIZIFY_RATE_LIMIT_GENERATION', '10/600'),
+    'grading': os.environ.get('QUIZIFY_RATE_LIMIT_GRADING', '60/60'),
+    'email': os.environ.get('QUIZIFY_RATE_LIMIT_EMAIL', '5/3600'),
+    'events': os.environ.get('QUIZIFY_RATE_LIMIT_EVENTS', '120/60'),
+}
+RATE_LIMIT_IP_MULTIPLIER = int(os.environ.get('QUIZIFY_RATE_LIMIT_IP_MULTIPLIER', 10))
+RATE_LIMIT_CACHE = 'default'
+RATE_LIMIT_TRUST_X_FORWARDED_FOR = os.environ.get('QUIZIFY_RATE_LIMIT_TRUST_X_FORWARDED_FOR', 'False') == 'True'
+if RATE_LIMIT_ENABLED:
+    # Right after SecurityMiddleware: throttled requests never load a session or run CSRF checks.
+    MIDDLEWARE.insert(MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1, 'quiz.ratelimit.RateLimitMiddleware')
+
 ROOT_URLCONF = 'quizify.urls'
 
 TEMPLATES = [
@@ -92,7 +138,19 @@ WSGI_APPLICATION = 'quizify.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('QUIZIFY_DB_PATH', BASE_DIR / 'db.sqlite3'),
+    }
+}
+
+
+# Cache (template fragments, rate-limit buckets). Per-process memory by default; with several worker processes point
+# it at a shared backend, e.g. QUIZIFY_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache (needs the redis
+# package) with QUIZIFY_CACHE_LOCATION=redis://127.0.0.1:6379, or django.core.cache.backends.db.DatabaseCache with a
+# table name (create it with "python manage.py createcachetable").
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('QUIZIFY_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('QUIZIFY_CACHE_LOCATION', ''),
     }
 }
 
@@ -128,12 +186,37 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Shared quiz pages (GET /quiz/<id>/ and /api/quiz/<id>) carry a strong ETag of the quiz content and may be cached
+# by browsers for SHARED_QUIZ_MAX_AGE seconds and by reverse proxies/CDNs for SHARED_QUIZ_PROXY_MAX_AGE. The rendered
+# question list is kept in the default cache (per-process memory unless CACHES is configured) for
+# QUIZ_FRAGMENT_CACHE_SECONDS.
+SHARED_QUIZ_MAX_AGE = int(os.environ.get('QUIZIFY_SHARED_QUIZ_MAX_AGE', 300))
+SHARED_QUIZ_PROXY_MAX_AGE = int(os.environ.get('QUIZIFY_SHARED_QUIZ_PROXY_MAX_AGE', 86400))
+QUIZ_FRAGMENT_CACHE_SECONDS = int(os.environ.get('QUIZIFY_QUIZ_FRAGMENT_CACHE_SECONDS', 86400))
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static'] # Directory for project-wide static files
-# STATIC_ROOT = BASE_DIR / 'staticfiles' # Uncomment for production collection
+STATIC_ROOT = os.environ.get('QUIZIFY_STATIC_ROOT', str(BASE_DIR / 'staticfiles')) # Target of collectstatic
+
+# Static asset pipeline (quiz.assets). With STATIC_MANIFEST, collectstatic minifies JS/CSS, writes content-hashed
+# copies referenced through {% static %} and .gz/.br variants (.br needs the optional Brotli package), so run
+# collectstatic before starting the server. With SERVE_STATIC the app serves STATIC_ROOT itself, negotiating the
+# precompressed variant and sending hashed files with a one-year immutable Cache-Control.
+STATIC_MANIFEST = os.environ.get('QUIZIFY_STATIC_MANIFEST', str(not DEBUG)) == 'True'
+SERVE_STATIC = os.environ.get('QUIZIFY_SERVE_STATIC', str(not DEBUG)) == 'True'
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': 'quiz.assets.MinifiedManifestStaticFilesStorage' if STATIC_MANIFEST
+        else 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+if SERVE_STATIC:
+    MIDDLEWARE.insert(0, 'quiz.assets.StaticAssetMiddleware')
 
 
 # Default primary key field type
@@ -150,9 +233,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # For Gmail, EMAIL_HOST_USER would be your Gmail address (e.g., Somanathreddy12345@gmail.com)
 # and EMAIL_HOST_PASSWORD would be your Gmail App Password (e.g., isxm kbvg spcf qxmu).
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = 'smtp.gmail.com'
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', '587'))
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'True') == 'True'
 EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = "Quizify" # Sender email address
@@ -162,4 +245,108 @@ if not EMAIL_HOST_USER or not EMAIL_HOST_PASSWORD:
         print("Warning: EMAIL_HOST_USER or EMAIL_HOST_PASSWORD is not set in .env. Real email sending will fail. Falling back to console output.")
         EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
     else:
-        raise ValueError("EMAIL_HOST_USER and EMAIL_HOST_PASSWORD must be set in the environment for production email sending.")
\ No newline at end of file
+        raise ValueError("EMAIL_HOST_USER and EMAIL_HOST_PASSWORD must be set in the environment for production email sending.")
+
+# Sampling profiler (quiz.profiling). Profiles a random fraction of requests, requests whose path matches
+# one of PROFILING_URL_PATTERNS, or requests sent with "X-Quizify-Profile: <PROFILING_TOKEN>".
+PROFILING_ENABLED = os.environ.get('QUIZIFY_PROFILING', 'False') == 'True'
+PROFILING_SAMPLE_RATE = float(os.environ.get('QUIZIFY_PROFILING_SAMPLE_RATE', '0.01'))
+PROFILING_URL_PATTERNS = [p for p in os.environ.get('QUIZIFY_PROFILING_URL_PATTERNS', '').split(',') if p]
+PROFILING_TOKEN = os.environ.get('QUIZIFY_PROFILING_TOKEN', '')
+PROFILING_DIR = Path(os.environ.get('QUIZIFY_PROFILING_DIR', BASE_DIR / 'profiles'))
+PROFILING_MAX_FILES = int(os.environ.get('QUIZIFY_PROFILING_MAX_FILES', '200'))
+if PROFILING_ENABLED:
+    MIDDLEWARE.append('quiz.profiling.ProfilingMiddleware')
+
+# Generation telemetry (quiz.GenerationRun rows). Rows are written by a background thread so the
+# request never waits on the insert; set QUIZIFY_TELEMETRY_ASYNC=False to write inline.
+GENERATION_TELEMETRY_ENABLED = os.environ.get('QUIZIFY_TELEMETRY', 'True') == 'True'
+GENERATION_TELEMETRY_ASYNC = os.environ.get('QUIZIFY_TELEMETRY_ASYNC', 'True') == 'True'
+
+# Question timing (quiz.interactions): batches of per-question dwell times sent by the quiz page with sendBeacon, stored
+# as QuestionTiming rows by a background thread; QUIZIFY_QUESTION_TIMING_ASYNC=False writes inline.
+QUESTION_TIMING_ENABLED = os.environ.get('QUIZIFY_QUESTION_TIMING', 'True') == 'True'
+QUESTION_TIMING_ASYNC = os.environ.get('QUIZIFY_QUESTION_TIMING_ASYNC', 'True') == 'True'
+
+# Offline quiz taking (quiz.offline): the service worker at /sw.js caches the app shell and the quiz being taken, and
+# queues check/ submissions made without a connection. Cached pages are served when the network has not answered within
+# OFFLINE_NETWORK_TIMEOUT_MS. QUIZIFY_OFFLINE=False serves a worker that only clears what earlier ones cached.
+OFFLINE_ENABLED = os.environ.get('QUIZIFY_OFFLINE', 'True') == 'True'
+OFFLINE_NETWORK_TIMEOUT_MS = int(os.environ.get('QUIZIFY_OFFLINE_NETWORK_TIMEOUT_MS', '4000'))
+
+# Topic autocomplete (quiz.autocomplete). The in-memory index keeps at most this many distinct topics and is
+# rebuilt from the database after MAX_AGE seconds so quizzes generated by other processes show up.
+TOPIC_AUTOCOMPLETE_MAX_TOPICS = int(os.environ.get('QUIZIFY_TOPIC_AUTOCOMPLETE_MAX_TOPICS', '500000'))
+TOPIC_AUTOCOMPLETE_MAX_AGE = int(os.environ.get('QUIZIFY_TOPIC_AUTOCOMPLETE_MAX_AGE', '3600'))
+
+# Predictive prefetching (quiz.prefetch). Generation requests are counted per configuration over the last
+# PREFETCH_WINDOW seconds; while fewer than PREFETCH_MAX_LIVE_GENERATIONS user generations are in flight, a background
+# thread keeps PREFETCH_INVENTORY ready quizzes for each of the PREFETCH_TOP_KEYS busiest configurations (those with at
+# least PREFETCH_MIN_REQUESTS requests). Ready quizzes unserved after PREFETCH_MAX_AGE seconds are discarded.
+PREFETCH_ENABLED = os.environ.get('QUIZIFY_PREFETCH', 'False') == 'True'
+PREFETCH_WINDOW = int(os.environ.get('QUIZIFY_PREFETCH_WINDOW', '900'))
+PREFETCH_MIN_REQUESTS = int(os.environ.get('QUIZIFY_PREFETCH_MIN_REQUESTS', '3'))
+PREFETCH_TOP_KEYS = int(os.environ.get('QUIZIFY_PREFETCH_TOP_KEYS', '20'))
+PREFETCH_INVENTORY = int(os.environ.get('QUIZIFY_PREFETCH_INVENTORY', '2'))
+PREFETCH_MAX_LIVE_GENERATIONS = int(os.environ.get('QUIZIFY_PREFETCH_MAX_LIVE_GENERATIONS', '4'))
+PREFETCH_MAX_AGE = int(os.environ.get('QUIZIFY_PREFETCH_MAX_AGE', '86400'))
+PREFETCH_INTERVAL = float(os.environ.get('QUIZIFY_PREFETCH_INTERVAL', '5'))
+
+# With SERVE_BANKED_QUIZZES, a generation request (single question type, up to one chunk) is first answered with a
+# stored quiz of the same normalised topic, type, difficulty and number of questions, e.g. one from pregenerate_quizzes,
+# and Gemini is only called when there is none.
+SERVE_BANKED_QUIZZES = os.environ.get('QUIZIFY_SERVE_BANKED', 'False') == 'True'
+
+# Admission control (quiz.admission): a circuit breaker opens when, over the last ADMISSION_WINDOW seconds and at least
+# ADMISSION_MIN_CALLS provider calls, the error rate reaches ADMISSION_ERROR_RATE or the median latency reaches
+# ADMISSION_SLOW_SECONDS, and admits a single probe after ADMISSION_COOLDOWN seconds. At most ADMISSION_MAX_IN_FLIGHT
+# generations run at once per process, fewer while the median latency exceeds ADMISSION_TARGET_LATENCY. Requests that
+# are not admitted get a stored quiz for the same topic, or a 503 with Retry-After. The cap is per process and sized for
+# an ASGI worker, where generations are awaited rather than holding a thread; a WSGI worker is bounded by its threads.
+ADMISSION_ENABLED = os.environ.get('QUIZIFY_ADMISSION', 'True') == 'True'
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get('QUIZIFY_ADMISSION_MAX_IN_FLIGHT', '64'))
+ADMISSION_TARGET_LATENCY = float(os.environ.get('QUIZIFY_ADMISSION_TARGET_LATENCY', '15'))
+ADMISSION_WINDOW = float(os.environ.get('QUIZIFY_ADMISSION_WINDOW', '60'))
+ADMISSION_MIN_CALLS = int(os.environ.get('QUIZIFY_ADMISSION_MIN_CALLS', '5'))
+ADMISSION_ERROR_RATE = float(os.environ.get('QUIZIFY_ADMISSION_ERROR_RATE', '0.5'))
+ADMISSION_SLOW_SECONDS = float(os.environ.get('QUIZIFY_ADMISSION_SLOW_SECONDS', '45'))
+ADMISSION_COOLDOWN = float(os.environ.get('QUIZIFY_ADMISSION_COOLDOWN', '30'))
+
+# Large quizzes (quiz.largequiz): requests for more than LARGE_QUIZ_CHUNK_SIZE questions (up to LARGE_QUIZ_MAX_QUESTIONS)
+# are split into chunks. The first is generated during the request; the rest run LARGE_QUIZ_CONCURRENCY at a time in
+# the background and are appended as they arrive. Pages load LARGE_QUIZ_WINDOW questions at a time.
+LARGE_QUIZ_ENABLED = os.environ.get('QUIZIFY_LARGE_QUIZ', 'True') == 'True'
+LARGE_QUIZ_MAX_QUESTIONS = int(os.environ.get('QUIZIFY_LARGE_QUIZ_MAX_QUESTIONS', '500'))
+LARGE_QUIZ_CHUNK_SIZE = int(os.environ.get('QUIZIFY_LARGE_QUIZ_CHUNK_SIZE', '20'))
+LARGE_QUIZ_CONCURRENCY = int(os.environ.get('QUIZIFY_LARGE_QUIZ_CONCURRENCY', '4'))
+LARGE_QUIZ_TOP_UPS = int(os.environ.get('QUIZIFY_LARGE_QUIZ_TOP_UPS', '2'))
+LARGE_QUIZ_WINDOW = int(os.environ.get('QUIZIFY_LARGE_QUIZ_WINDOW', '20'))
+LARGE_QUIZ_TIMEOUT = int(os.environ.get('QUIZIFY_LARGE_QUIZ_TIMEOUT', '900'))
+LARGE_QUIZ_BACKGROUND = os.environ.get('QUIZIFY_LARGE_QUIZ_BACKGROUND', 'True') == 'True'
+
+# Classroom mode (quiz.classroom): live leaderboards pushed to the teacher page at most every CLASSROOM_PUSH_INTERVAL
+# seconds. Streams end after CLASSROOM_STREAM_SECONDS and the browser reconnects. Each process keeps the leaderboards of
+# up to CLASSROOM_MAX_BOARDS quizzes; attempts recorded by other processes are noticed through the CLASSROOM_CACHE cache,
+# so with several worker processes configure a shared backend (see CACHES).
+CLASSROOM_PUSH_INTERVAL = float(os.environ.get('QUIZIFY_CLASSROOM_PUSH_INTERVAL', '1.0'))
+CLASSROOM_LEADERBOARD_SIZE = int(os.environ.get('QUIZIFY_CLASSROOM_LEADERBOARD_SIZE', '20'))
+CLASSROOM_STREAM_SECONDS = int(os.environ.get('QUIZIFY_CLASSROOM_STREAM_SECONDS', '300'))
+CLASSROOM_MAX_BOARDS = int(os.environ.get('QUIZIFY_CLASSROOM_MAX_BOARDS', '64'))
+CLASSROOM_CACHE = 'default'
+
+# Logging: request timing lines from quiz.instrumentation are emitted as one JSON object per line.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'quiz': {
+            'handlers': ['console'],
+            'level': os.environ.get('QUIZIFY_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
@@ -150,6 +150,223 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
 
+    // --- Topic Autocomplete ---
+    const topicInput = document.getElementById('topic');
+    const topicSuggestionsList = document.getElementById('topic-suggestions');
+    const TOPIC_SUGGEST_DEBOUNCE_MS = 150;
+    let topicSuggestTimer = null;
+    let topicSuggestController = null;
+    const topicSuggestCache = new Map(); // prefix -> suggestions, so backspacing does not refetch
+
+    function renderTopicSuggestions(suggestions) {
+        topicSuggestionsList.replaceChildren(...suggestions.map(s => {
+            const option = document.createElement('option');
+            option.value = s.topic;
+            return option;
+        }));
+    }
+
+    function fetchTopicSuggestions(prefix) {
+        if (topicSuggestCache.has(prefix)) {
+            renderTopicSuggestions(topicSuggestCache.get(prefix));
+            return;
+        }
+        if (topicSuggestController) topicSuggestController.abort(); // Drop the response for a stale prefix
+        topicSuggestController = new AbortController();
+        fetch(`${TOPIC_SUGGESTIONS_URL}?q=${encodeURIComponent(prefix)}&limit=8`, { signal: topicSuggestController.signal })
+            .then(response => response.ok ? response.json() : { suggestions: [] })
+            .then(data => {
+                topicSuggestCache.set(prefix, data.suggestions);
+                if (topicInput.value.trim() === prefix) renderTopicSuggestions(data.suggestions);
+            })
+            .catch(error => {
+                if (error.name !== 'AbortError') console.warn("Topic suggestions unavailable:", error);
+            });
+    }
+
+    if (topicInput && topicSuggestionsList && typeof TOPIC_SUGGESTIONS_URL !== 'undefined') {
+        topicInput.addEventListener('input', function() {
+            clearTimeout(topicSuggestTimer);
+            const prefix = this.value.trim();
+            if (prefix.length < 2) {
+                renderTopicSuggestions([]);
+                return;
+            }
+            topicSuggestTimer = setTimeout(() => fetchTopicSuggestions(prefix), TOPIC_SUGGEST_DEBOUNCE_MS);
+        });
+    }
+
+
+    // --- CSRF Token ---
+    // Shared quiz pages (/quiz/<id>/) are cached for everyone, so they embed no token; fetch one on first use.
+    let csrfTokenRequest = null;
+    function getCsrfToken() {
+        if (CSRF_TOKEN) return Promise.resolve(CSRF_TOKEN);
+        if (!csrfTokenRequest) {
+            csrfTokenRequest = fetch(CSRF_URL, { credentials: 'same-origin' })
+                .then(response => response.json())
+                .then(data => data.csrf_token)
+                .catch(error => {
+                    csrfTokenRequest = null; // Retry on the next submit
+                    throw error;
+                });
+        }
+        return csrfTokenRequest;
+    }
+
+
+    // --- Offline Support ---
+    // The service worker (/sw.js) caches the app shell and the quiz being taken, and queues check/ submissions made
+    // without a connection. Each submission carries an Idempotency-Key, so the server stores it once however often
+    // it is retried; the worker reports queued submissions it has sent with a 'check-synced' message.
+    let submission = null; // { key, body, button, label } of the last submission until its results arrive
+    let offlineSubmissionPending = false;
+
+    function newIdempotencyKey() {
+        if (window.crypto?.randomUUID) return crypto.randomUUID();
+        return Array.from({ length: 32 }, () => Math.floor(Math.random() * 36).toString(36)).join('');
+    }
+
+    if ('serviceWorker' in navigator && typeof SERVICE_WORKER_URL !== 'undefined') {
+        navigator.serviceWorker.register(SERVICE_WORKER_URL).catch(error => console.warn('Service worker not registered:', error));
+        const askToReplay = () => navigator.serviceWorker.ready.then(registration => registration.active?.postMessage({ type: 'replay' }));
+        window.addEventListener('online', askToReplay); // Browsers without Background Sync
+        askToReplay();
+        const shareLink = document.querySelector('#quiz-container .share-link');
+        if (shareLink) {
+            navigator.serviceWorker.ready.then(registration => registration.active?.postMessage({ type: 'cache-quiz', urls: [shareLink.href] }));
+        }
+        navigator.serviceWorker.addEventListener('message', event => {
+            const message = event.data || {};
+            if (message.type !== 'check-synced' || !submission || message.key !== submission.key) return;
+            offlineSubmissionPending = false;
+            if (message.ok) {
+                showCheckResult(message.data);
+            } else {
+                displaySubmissionError(`Submission Error: ${message.data.error}`);
+                resetSubmitButton();
+            }
+        });
+    }
+
+
+    // --- Lazy Explanation ---
+    const lazyExplanation = document.querySelector('.lazy-explanation');
+    if (lazyExplanation) {
+        lazyExplanation.addEventListener('toggle', function() {
+            if (!this.open || this.dataset.loaded) return;
+            this.dataset.loaded = 'true';
+            const box = this.querySelector('.explanation-box');
+            fetch(this.dataset.explanationUrl)
+                .then(response => response.json().then(data => ({ ok: response.ok, data })))
+                .then(({ ok, data }) => {
+                    if (!ok) throw new Error(data.error || 'Request failed');
+                    box.replaceChildren(...data.explanation.split('\n').flatMap((line, i) =>
+                        i === 0 ? [document.createTextNode(line)] : [document.createElement('br'), document.createTextNode(line)]));
+                })
+                .catch(error => {
+                    delete this.dataset.loaded; // Allow a retry on the next expand
+                    box.textContent = `Could not load the explanation: ${error.message}`;
+                });
+        });
+    }
+
+
+    // --- Classroom Mode ---
+    // Students: a share link opened with ?classroom=1 asks for a name, which is sent with the answers.
+    const classroomJoin = document.getElementById('classroom-join');
+    const participantInput = document.getElementById('participant-name');
+    const classroomMode = Boolean(classroomJoin) && new URLSearchParams(window.location.search).has('classroom');
+    if (classroomMode) classroomJoin.style.display = 'block';
+
+    // Teachers: the classroom page's table follows the leaderboard stream (Server-Sent Events), or polls without it.
+    const LEADERBOARD_POLL_MS = 5000;
+    const leaderboardTable = document.getElementById('classroom-leaderboard');
+    const leaderboardStatusEl = document.getElementById('leaderboard-status');
+
+    function renderLeaderboard(data) {
+        document.getElementById('leaderboard-participants').textContent = data.participants;
+        document.getElementById('leaderboard-average').textContent = data.average_percentage === null ? '-' : `${data.average_percentage}%`;
+        const rows = data.leaders.map(leader => {
+            const row = document.createElement('tr');
+            [leader.rank, leader.participant, `${leader.score}/${leader.total_questions}`, leader.percentage].forEach(value => {
+                const cell = document.createElement('td');
+                cell.textContent = value; // Names come from students: never innerHTML
+                row.appendChild(cell);
+            });
+            return row;
+        });
+        if (rows.length > 0) leaderboardTable.tBodies[0].replaceChildren(...rows);
+    }
+
+    if (leaderboardTable) {
+        if (window.EventSource) {
+            const source = new EventSource(leaderboardTable.dataset.streamUrl);
+            source.addEventListener('leaderboard', event => renderLeaderboard(JSON.parse(event.data)));
+            source.addEventListener('open', () => { leaderboardStatusEl.textContent = 'Live'; });
+            source.addEventListener('error', () => { leaderboardStatusEl.textContent = 'Reconnecting...'; }); // EventSource retries by itself
+        } else {
+            const pollLeaderboard = () => fetch(leaderboardTable.dataset.url)
+                .then(response => response.json())
+                .then(renderLeaderboard)
+                .catch(error => { leaderboardStatusEl.textContent = `Could not load the leaderboard: ${error.message}`; })
+                .finally(() => setTimeout(pollLeaderboard, LEADERBOARD_POLL_MS));
+            pollLeaderboard();
+        }
+    }
+
+
+    // --- Question Timing ---
+    // Time spent on each question card is buffered as [question index, milliseconds, answered 0/1] and sent in
+    // batches with navigator.sendBeacon: when the buffer fills, on submit and when the page is hidden.
+    const TIMING_BATCH_SIZE = 25;
+    const timingClient = Math.random().toString(36).slice(2, 14); // Anonymous, one per page view
+    let timingEvents = [];
+    let timedQuestion = null; // { index, since }
+    let pausedQuestionIndex = null;
+
+    function startQuestionTimer(index) {
+        stopQuestionTimer();
+        timedQuestion = { index, since: performance.now() };
+    }
+
+    function stopQuestionTimer() {
+        if (!timedQuestion) return;
+        const answered = answers[`q${timedQuestion.index + 1}`] !== undefined ? 1 : 0;
+        timingEvents.push([timedQuestion.index, Math.round(performance.now() - timedQuestion.since), answered]);
+        timedQuestion = null;
+        if (timingEvents.length >= TIMING_BATCH_SIZE) flushQuestionTimings();
+    }
+
+    function flushQuestionTimings() {
+        if (timingEvents.length === 0 || typeof QUESTION_EVENTS_URL === 'undefined' || !quizForm?.dataset.quizId) return;
+        const payload = JSON.stringify({ quiz_id: Number(quizForm.dataset.quizId), client: timingClient, events: timingEvents });
+        timingEvents = [];
+        if (navigator.sendBeacon) {
+            navigator.sendBeacon(QUESTION_EVENTS_URL, payload);
+        } else {
+            fetch(QUESTION_EVENTS_URL, { method: 'POST', body: payload, keepalive: true }).catch(() => {});
+        }
+    }
+
+    // A hidden tab is not time spent on the question: pause the timer, and send what is buffered in case the page
+    // is never shown again.
+    document.addEventListener('visibilitychange', () => {
+        if (document.visibilityState === 'hidden') {
+            pausedQuestionIndex = timedQuestion ? timedQuestion.index : null;
+            stopQuestionTimer();
+            flushQuestionTimings();
+        } else if (pausedQuestionIndex !== null) {
+            startQuestionTimer(pausedQuestionIndex);
+            pausedQuestionIndex = null;
+        }
+    });
+    window.addEventListener('pagehide', () => {
+        stopQuestionTimer();
+        flushQuestionTimings();
+    });
+
+
     // --- Quiz Generation & Display Logic ---
     if (generationForm) {
         generationForm.addEventListener('submit', function(event) {
@@ -201,42 +418,115 @@ document.addEventListener('DOMContentLoaded', function() {
     if (quizForm) {
         allQuestions = quizForm.querySelectorAll('.question-card');
         setupQuestionNavigation();
+        startQuestionTimer(0);
         showElementSmoothly(quizContainer, 'animate__zoomInUp');
         adjustQuizFormHeight(); 
     }
 
     function setupQuestionNavigation() {
-        allQuestions.forEach((card, index) => {
-            const nextBtn = card.querySelector('.btn-next');
-            const submitBtn = card.querySelector('.btn-submit-quiz');
-            const questionIndex = parseInt(card.dataset.questionIndex); 
-
-            [nextBtn, submitBtn].forEach(btn => {
-                if (btn) {
-                    btn.addEventListener('mouseenter', () => btn.classList.add('animate__animated', 'animate__pulse'));
-                    btn.addEventListener('animationend', () => btn.classList.remove('animate__animated', 'animate__pulse'));
-                }
-            });
+        allQuestions.forEach(setupQuestionCard);
+    }
 
-            if (nextBtn) {
-                nextBtn.addEventListener('click', () => {
-                    if (validateAndStoreAnswer(card, questionIndex)) {
-                        showNextQuestion(questionIndex);
-                    }
-                });
-            }
+    function setupQuestionCard(card) {
+        const nextBtn = card.querySelector('.btn-next');
+        const submitBtn = card.querySelector('.btn-submit-quiz');
+        const partialBtn = card.querySelector('.btn-submit-partial');
+        const questionIndex = parseInt(card.dataset.questionIndex); 
 
-            if (submitBtn) {
-                submitBtn.addEventListener('click', () => {
-                    if (validateAndStoreAnswer(card, questionIndex)) {
-                         submitQuiz();
-                    }
-                });
+        [nextBtn, submitBtn, partialBtn].forEach(btn => {
+            if (btn) {
+                btn.addEventListener('mouseenter', () => btn.classList.add('animate__animated', 'animate__pulse'));
+                btn.addEventListener('animationend', () => btn.classList.remove('animate__animated', 'animate__pulse'));
             }
         });
+
+        if (nextBtn) {
+            nextBtn.addEventListener('click', () => {
+                if (validateAndStoreAnswer(card, questionIndex)) {
+                    if (isWindowed) {
+                        advanceWindowed(questionIndex);
+                    } else {
+                        showNextQuestion(questionIndex);
+                    }
+                }
+            });
+        }
+
+        if (submitBtn) {
+            submitBtn.addEventListener('click', () => {
+                if (validateAndStoreAnswer(card, questionIndex)) {
+                     submitQuiz();
+                }
+            });
+        }
+
+        if (partialBtn) {
+            partialBtn.addEventListener('click', () => {
+                validateAndStoreAnswer(card, questionIndex, { optional: true });
+                if (Object.keys(answers).length > 0) {
+                    submitQuiz(partialBtn);
+                } else {
+                    validateAndStoreAnswer(card, questionIndex); // Shows the "please answer" hint
+                }
+            });
+        }
     }
 
-    function validateAndStoreAnswer(card, questionIndex) {
+
+    // --- Large Quizzes: question windows ---
+    // Long quizzes render their first window of questions; the rest are fetched as HTML cards while the student
+    // works through them, starting WINDOW_PREFETCH_AHEAD questions before the loaded ones run out.
+    const WINDOW_PREFETCH_AHEAD = 5;
+    const WINDOW_RETRY_MS = 3000; // While the next questions are still being generated
+    const isWindowed = quizForm?.dataset.windowed === 'true';
+    let windowRequest = null;
+    let windowsDone = !isWindowed;
+
+    function loadNextWindow() {
+        if (windowsDone) return Promise.resolve(0);
+        if (windowRequest) return windowRequest;
+        windowRequest = fetch(`${quizForm.dataset.windowUrl}?offset=${allQuestions.length}`)
+            .then(response => response.json().then(data => ({ ok: response.ok, data })))
+            .then(({ ok, data }) => {
+                if (!ok) throw new Error(data.error || 'Request failed');
+                if (data.offset === allQuestions.length && data.count > 0) {
+                    const firstNew = allQuestions.length;
+                    submissionErrorEl.insertAdjacentHTML('beforebegin', data.html);
+                    allQuestions = quizForm.querySelectorAll('.question-card');
+                    Array.from(allQuestions).slice(firstNew).forEach(setupQuestionCard);
+                    submissionErrorEl.style.display = 'none'; // Clears the "still being generated" note
+                }
+                if (data.next_offset === null) windowsDone = true;
+                return data.count;
+            })
+            .finally(() => { windowRequest = null; });
+        return windowRequest;
+    }
+
+    function advanceWindowed(currentIndex) {
+        if (currentIndex + 1 + WINDOW_PREFETCH_AHEAD >= allQuestions.length) {
+            loadNextWindow().catch(error => console.error('Error loading questions:', error));
+        }
+        if (currentIndex + 1 < allQuestions.length) {
+            showNextQuestion(currentIndex);
+            return;
+        }
+        // At the end of the loaded questions: wait for the next window, or finish when there is none
+        loadNextWindow()
+            .then(() => {
+                if (currentIndex + 1 < allQuestions.length) {
+                    showNextQuestion(currentIndex);
+                } else if (windowsDone) {
+                    submitQuiz(allQuestions[currentIndex].querySelector('.btn-next'));
+                } else {
+                    displaySubmissionError('More questions are still being generated. Hold on...');
+                    setTimeout(() => advanceWindowed(currentIndex), WINDOW_RETRY_MS);
+                }
+            })
+            .catch(error => displaySubmissionError(`Could not load more questions: ${error.message}`));
+    }
+
+    function validateAndStoreAnswer(card, questionIndex, { optional = false } = {}) {
         const questionKey = `q${questionIndex + 1}`;
         const inputs = card.querySelectorAll(`[name="${questionKey}"]`);
         const validationErrorEl = card.querySelector('.validation-error');
@@ -266,6 +556,7 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         }
 
+        if (!answered && optional) return false;
         if (!answered) {
             if (validationErrorEl) {
                 validationErrorEl.textContent = 'Please select or enter an answer before proceeding.';
@@ -288,6 +579,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
         if (nextIndex < allQuestions.length) {
             const nextCard = allQuestions[nextIndex];
+            startQuestionTimer(nextIndex);
 
             currentCard.classList.add('exiting');
             currentCard.classList.remove('active');
@@ -322,16 +614,27 @@ document.addEventListener('DOMContentLoaded', function() {
      }
      window.addEventListener('resize', adjustQuizFormHeight);
 
-    function submitQuiz() {
+    function submitQuiz(triggerBtn = null) {
         console.log("Submitting quiz with answers:", answers);
         if (submissionErrorEl) {
             submissionErrorEl.style.display = 'none'; 
             submissionErrorEl.textContent = '';
              submissionErrorEl.classList.remove('animate__animated', 'animate__shakeX');
         }
-
-        let submitBtn = null;
-        if (allQuestions.length > 0) {
+        if (classroomMode && !participantInput.value.trim()) {
+            displaySubmissionError("Please enter your name for the class leaderboard (at the top of the page).");
+            participantInput.focus();
+            return;
+        }
+        stopQuestionTimer();
+        flushQuestionTimings();
+
+        let submitBtn = triggerBtn;
+        const submitLabel = triggerBtn ? triggerBtn.textContent : 'Submit Quiz';
+        if (triggerBtn) {
+            triggerBtn.disabled = true;
+            triggerBtn.innerHTML = '<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span> Checking...';
+        } else if (allQuestions.length > 0) {
              const lastCard = allQuestions[allQuestions.length - 1];
              submitBtn = lastCard.querySelector('.btn-submit-quiz');
              if (submitBtn) {
@@ -345,7 +648,7 @@ document.addEventListener('DOMContentLoaded', function() {
             displaySubmissionError("Error: Could not find Quiz ID. Please regenerate the quiz.");
             if (submitBtn) {
                  submitBtn.disabled = false;
-                 submitBtn.textContent = 'Submit Quiz';
+                 submitBtn.textContent = submitLabel;
             }
             return;
         }
@@ -353,16 +656,26 @@ document.addEventListener('DOMContentLoaded', function() {
         const dataToSend = {
             quiz_id: quizId,
             answers: answers, 
+            compact: true, // Only correctness and correct answers come back; see expandCompactResults
+            partial: isWindowed, // Large quizzes: grade the questions answered so far
         };
+        if (classroomMode) dataToSend.participant = participantInput.value.trim();
+
+        // A retry of the same answers reuses the key, so a submission that reached the server is not stored twice.
+        const body = JSON.stringify(dataToSend);
+        if (!submission || submission.body !== body) submission = { key: newIdempotencyKey(), body };
+        Object.assign(submission, { button: submitBtn, label: submitLabel });
 
-        fetch(CHECK_ANSWERS_URL, {
+        // Offline, no token can be fetched: the service worker queues the submission and adds a fresh one when sending it.
+        getCsrfToken().catch(error => { if (navigator.onLine) throw error; return ''; }).then(csrfToken => fetch(CHECK_ANSWERS_URL, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
-                'X-CSRFToken': CSRF_TOKEN
+                'X-CSRFToken': csrfToken,
+                'Idempotency-Key': submission.key
             },
-            body: JSON.stringify(dataToSend)
-        })
+            body: body
+        }))
         .then(response => {
             if (!response.ok) {
                 return response.json().then(errData => {
@@ -377,12 +690,12 @@ document.addEventListener('DOMContentLoaded', function() {
             console.log("Received check_answers data:", data);
             if (data.error) {
                 displaySubmissionError(`Submission Error: ${data.error}`);
+            } else if (data.queued) {
+                // Stored by the service worker: the results arrive in a 'check-synced' message once back online
+                offlineSubmissionPending = true;
+                displaySubmissionError("You are offline. Your answers are saved on this device and will be checked as soon as the connection is back.");
             } else {
-                currentAttemptId = data.attempt_id; 
-                hideElementSmoothly(quizContainer, 'animate__zoomOut'); 
-                setTimeout(() => {
-                     displayFeedbackAndResults(data);
-                }, 500); 
+                showCheckResult(data);
             }
         })
         .catch(error => {
@@ -390,15 +703,55 @@ document.addEventListener('DOMContentLoaded', function() {
             displaySubmissionError(`An error occurred: ${error.message}. Please check your connection and try again.`);
         })
         .finally(() => {
-             if (submitBtn && submitBtn.disabled) {
+             if (submitBtn && submitBtn.disabled && !offlineSubmissionPending) {
                  if (submissionErrorEl && submissionErrorEl.style.display !== 'none') {
                     submitBtn.disabled = false;
-                    submitBtn.textContent = 'Submit Quiz';
+                    submitBtn.textContent = submitLabel;
                  }
              }
         });
     }
 
+    function showCheckResult(data) {
+        submission = null;
+        if (Array.isArray(data.correct)) expandCompactResults(data);
+        currentAttemptId = data.attempt_id; 
+        hideElementSmoothly(quizContainer, 'animate__zoomOut'); 
+        setTimeout(() => {
+             displayFeedbackAndResults(data);
+        }, 500); 
+    }
+
+    function resetSubmitButton() {
+        if (!submission?.button) return;
+        submission.button.disabled = false;
+        submission.button.textContent = submission.label;
+    }
+
+    // A compact check_answers response leaves out what the page already has: question texts, the submitted
+    // answers, topic and difficulty. Rebuild the full response shape from the DOM.
+    function expandCompactResults(data) {
+        // Partial submissions list the graded questions' indexes; otherwise every question is graded, in order.
+        const indexes = data.question_indexes || data.correct.map((_, index) => index);
+        data.results = data.correct.map((isCorrect, position) => {
+            const index = indexes[position];
+            const questionKey = `q${index + 1}`;
+            // Already-escaped markup: populateDetailedResultsList assigns question_text to innerHTML, and innerText
+            // would be empty for the cards hidden with visibility: hidden.
+            const textEl = allQuestions[index]?.querySelector('.question-text strong');
+            return {
+                question_index: index,
+                question_key: questionKey,
+                submitted_answer: answers[questionKey] ?? null,
+                correct_answer: data.correct_answers[position],
+                is_correct: isCorrect === 1,
+                question_text: textEl ? textEl.innerHTML : 'N/A',
+            };
+        });
+        data.topic = quizContainer?.dataset.topic;
+        data.difficulty = quizContainer?.dataset.difficulty;
+    }
+
     function displayFeedbackAndResults(data) {
         showElementSmoothly(scoreContainer, 'animate__bounceInUp'); 
 
@@ -407,6 +760,12 @@ document.addEventListener('DOMContentLoaded', function() {
         if (scorePercentageEl) scorePercentageEl.textContent = data.percentage;
         if (resultsTopicEl) resultsTopicEl.textContent = data.topic || 'N/A';
         if (resultsDifficultyEl) resultsDifficultyEl.textContent = data.difficulty || 'N/A';
+        const classroomRankEl = document.getElementById('classroom-rank');
+        if (classroomRankEl && data.rank) {
+            document.getElementById('classroom-rank-value').textContent = data.rank;
+            document.getElementById('classroom-participants').textContent = data.participants;
+            classroomRankEl.style.display = 'block';
+        }
 
         populateDetailedResultsList(data.results);
         scoreContainer?.scrollIntoView({ behavior: 'smooth', block: 'start' });
@@ -504,14 +863,14 @@ document.addEventListener('DOMContentLoaded', function() {
                 attempt_id: currentAttemptId,
             };
 
-            fetch(SEND_EMAIL_URL, {
+            getCsrfToken().then(csrfToken => fetch(SEND_EMAIL_URL, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
-                    'X-CSRFToken': CSRF_TOKEN
+                    'X-CSRFToken': csrfToken
                 },
                 body: JSON.stringify(dataToSend)
-            })
+            }))
             .then(response => {
                 if (!response.ok) {
                     return response.json().then(errData => {
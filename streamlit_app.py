@@ -4,13 +4,27 @@ import os
 import json
 import re
 import smtplib
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from quiz.replay import provider_from_env # Django-free record/replay of Gemini responses
+from quiz.chunking import QuestionDeduper, batch_instructions, plan_chunks # Django-free large-quiz chunking
 
 # --- Page Config (Must be the first Streamlit command) ---
 st.set_page_config(page_title="Quizify Streamlit", layout="wide", initial_sidebar_state="expanded")
 
 # --- Global Variables & Setup ---
+genai = None # Set below when the library and API key are available
+SINGLE_PROMPT_MAX_QUESTIONS = 20 # More than this is generated in concurrent chunks (see generate_large_quiz_st)
+LARGE_QUIZ_MAX_QUESTIONS = 500
+LARGE_QUIZ_CONCURRENCY = 4
+QUESTIONS_PER_PAGE = 20
+GENERATION_MODEL = 'gemini-2.0-flash'
+GENERATION_CACHE_TTL_SECONDS = 3600 # Identical quiz requests within this window are served from the cache
+GENERATION_CACHE_MAX_ENTRIES = 256
 
 try:
     import google.generativeai as genai_module
@@ -31,13 +45,101 @@ except ImportError:
     library_warning_message = "google.generativeai or python-dotenv library not found. AI generation will use placeholders."
 
 
+# --- Shared Resources (one per server process, reused across reruns and sessions) ---
+@st.cache_resource
+def get_generation_provider(model_name: str):
+    """The Gemini model (when configured) wrapped in the record/replay provider from quiz/replay.py."""
+    live_call = None
+    if genai and GOOGLE_API_KEY:
+        model = genai.GenerativeModel(model_name)
+        live_call = lambda _model_name, prompt_text: model.generate_content(
+            prompt_text,
+            generation_config=genai.types.GenerationConfig(temperature=0.7)
+        )
+    # QUIZIFY_GENAI_REPLAY_MODE=record|replay|auto records/serves responses (see quiz/replay.py).
+    return provider_from_env(live_call)
+
+
+class SmtpConnection:
+    """A logged-in SMTP connection shared by all sessions, reopened when the server has closed it."""
+    def __init__(self, host: str, port: int, user: str, password: str):
+        self.host, self.port, self.user, self.password = host, port, user, password
+        self._server = None
+        self._lock = threading.Lock() # smtplib connections are not thread-safe
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        server.starttls()
+        server.login(self.user, self.password)
+        return server
+
+    def sendmail(self, from_email: str, to_email: str, message: str):
+        with self._lock:
+            for retry in (False, True):
+                if self._server is None:
+                    self._server = self._connect()
+                try:
+                    self._server.sendmail(from_email, to_email, message)
+                    return
+                except smtplib.SMTPServerDisconnected:
+                    self._server = None # Idle connections are dropped by the server: reconnect once
+                    if retry:
+                        raise
+
+
+@st.cache_resource
+def get_smtp_connection(host: str, port: int, user: str, password: str) -> SmtpConnection:
+    return SmtpConnection(host, port, user, password)
+
+
+class GenerationStats:
+    """Process-wide counts of quiz requests and cache hits, and the latency of recent generations and requests."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hits = 0
+        self.generation_seconds = deque(maxlen=200) # Cache misses only
+        self.last_request_seconds = None
+
+    def record(self, hit: bool, seconds: float):
+        with self._lock:
+            self.requests += 1
+            self.hits += hit
+            if not hit:
+                self.generation_seconds.append(seconds)
+            self.last_request_seconds = seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            timings = sorted(self.generation_seconds)
+        percentile = lambda p: timings[min(len(timings) - 1, int(p * len(timings)))] if timings else None
+        return {
+            'requests': self.requests,
+            'hits': self.hits,
+            'hit_rate': self.hits / self.requests if self.requests else None,
+            'generation_p50_seconds': percentile(0.5),
+            'generation_p90_seconds': percentile(0.9),
+            'last_request_seconds': self.last_request_seconds,
+        }
+
+
+@st.cache_resource
+def generation_stats() -> GenerationStats:
+    return GenerationStats()
+
+
+_generation_thread = threading.local() # Tells generate_quiz_cached whether the cached function body ran
+
+
 # --- Helper Function for AI Generation (adapted from Django views) ---
-def generate_quiz_content_st(topic: str, question_type: str, difficulty: str, num_questions: int = 5, num_questions_per_type: dict = None):
+def generate_quiz_content_st(topic: str, question_type: str, difficulty: str, num_questions: int = 5, num_questions_per_type: dict = None, extra_instructions: str = ''):
     """
     Generates quiz content (explanation and questions) using the Gemini API if available,
     otherwise returns placeholder data. Handles single or mixed question types.
+    extra_instructions is appended to the prompt (used for the batches of a large quiz).
     """
-    if not genai or not GOOGLE_API_KEY:
+    replay_only = os.environ.get('QUIZIFY_GENAI_REPLAY_MODE', 'off') == 'replay'
+    if (not genai or not GOOGLE_API_KEY) and not replay_only:
         # Placeholder logic for mixed types
         questions_list = []
         actual_total_questions = 0
@@ -81,7 +183,8 @@ def generate_quiz_content_st(topic: str, question_type: str, difficulty: str, nu
             'questions': questions_list
         }
 
-    model = genai.GenerativeModel('gemini-2.0-flash')
+    model_name = GENERATION_MODEL
+    provider = get_generation_provider(model_name)
     
     actual_num_questions_for_prompt = num_questions # Default total, will be sum if mixed
 
@@ -174,6 +277,9 @@ def generate_quiz_content_st(topic: str, question_type: str, difficulty: str, nu
         *   A "difficulty" key with the value "{difficulty}" (string).
         {question_specific_prompt_instruction}""")
 
+    if extra_instructions:
+        prompt_parts.append(extra_instructions)
+
     prompt_parts.append(f"""
     Ensure the entire output is **only** a single, valid JSON object starting with {{ and ending with }}. Do not include any text, explanations, or markdown formatting like ```json before or after the JSON object itself. The "questions" array must contain exactly {actual_num_questions_for_prompt} items in total, matching the specified counts for each type if 'mixed' type was requested.
     """)
@@ -181,10 +287,7 @@ def generate_quiz_content_st(topic: str, question_type: str, difficulty: str, nu
     prompt = "\n".join(prompt_parts)
 
     try:
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(temperature=0.7)
-        )
+        response = provider.generate(model_name, prompt)
         raw_text = response.text
         try:
             generated_data = json.loads(raw_text)
@@ -263,6 +366,72 @@ def generate_quiz_content_st(topic: str, question_type: str, difficulty: str, nu
         raise Exception(f"An error occurred while communicating with the AI service: {e}") from e
 
 
+def generate_large_quiz_st(topic: str, question_type: str, difficulty: str, num_questions: int = 5, num_questions_per_type: dict = None):
+    """
+    Generates quizzes of more than SINGLE_PROMPT_MAX_QUESTIONS questions: the first chunk is generated
+    alone (it also provides the explanation), the rest concurrently, each prompt numbered and told which
+    questions already exist. Repeats across chunks are dropped, so the quiz can come out a little short.
+    """
+    chunks = plan_chunks(question_type, num_questions, num_questions_per_type, SINGLE_PROMPT_MAX_QUESTIONS)
+    placeholders = (not genai or not GOOGLE_API_KEY) and os.environ.get('QUIZIFY_GENAI_REPLAY_MODE', 'off') != 'replay'
+    if len(chunks) == 1 or placeholders:
+        return generate_quiz_content_st(topic, question_type, difficulty, num_questions, num_questions_per_type)
+
+    def generate_chunk(chunk, extra_instructions=''):
+        return generate_quiz_content_st(topic, question_type, difficulty, chunk['num_questions'], chunk['num_questions_per_type'], extra_instructions)
+
+    quiz_data = generate_chunk(chunks[0])
+    first_questions = list(quiz_data['questions'])
+    deduper = QuestionDeduper(first_questions)
+    with ThreadPoolExecutor(max_workers=LARGE_QUIZ_CONCURRENCY) as executor:
+        futures = [executor.submit(generate_chunk, chunk, batch_instructions(batch, first_questions))
+                   for batch, chunk in enumerate(chunks[1:], start=2)]
+        for future in futures: # In batch order, so the quiz order does not depend on which call finished first
+            try:
+                quiz_data['questions'].extend(deduper.add(future.result()['questions']))
+            except Exception as e:
+                st.warning(f"One batch of questions could not be generated and was skipped: {e}")
+    if len(quiz_data['questions']) < num_questions:
+        st.warning(f"Requested {num_questions} questions; {len(quiz_data['questions'])} distinct questions were generated.")
+    quiz_data['num_questions_requested_details'] = num_questions_per_type if question_type == 'mixed' else {question_type: num_questions}
+    return quiz_data
+
+
+class _IncompleteQuiz(Exception):
+    """Carries a quiz that came back short (failed batches) out of _generate_quiz_cached: exceptions are not cached."""
+    def __init__(self, quiz_data: dict):
+        super().__init__("Fewer questions were generated than requested.")
+        self.quiz_data = quiz_data
+
+
+@st.cache_data(ttl=GENERATION_CACHE_TTL_SECONDS, max_entries=GENERATION_CACHE_MAX_ENTRIES, show_spinner=False)
+def _generate_quiz_cached(topic_key: str, question_type: str, difficulty: str, num_questions: int, per_type: tuple, _topic: str):
+    # Keyed on every argument but _topic (Streamlit skips arguments starting with an underscore)
+    _generation_thread.ran = True
+    quiz_data = generate_large_quiz_st(_topic, question_type, difficulty, num_questions, dict(per_type) if per_type else None)
+    if len(quiz_data.get('questions', [])) < num_questions:
+        raise _IncompleteQuiz(quiz_data)
+    return quiz_data
+
+
+def generate_quiz_cached(topic: str, question_type: str, difficulty: str, num_questions: int = 5, num_questions_per_type: dict = None):
+    """
+    generate_large_quiz_st behind st.cache_data: requests that differ only in the topic's case and spacing share
+    one entry for GENERATION_CACHE_TTL_SECONDS, whichever session made the first. Failed generations, and quizzes
+    that came back with fewer questions than requested, are returned but not cached.
+    """
+    topic = ' '.join(topic.split())
+    per_type = tuple(sorted(num_questions_per_type.items())) if question_type == 'mixed' and num_questions_per_type else ()
+    _generation_thread.ran = False
+    started = time.perf_counter()
+    try:
+        quiz_data = _generate_quiz_cached(topic.casefold(), question_type, difficulty, num_questions, per_type, topic)
+    except _IncompleteQuiz as incomplete:
+        quiz_data = incomplete.quiz_data
+    generation_stats().record(hit=not _generation_thread.ran, seconds=time.perf_counter() - started)
+    return quiz_data
+
+
 # --- Email Sending Helper Functions (Same as before) ---
 def generate_email_html_content_st(quiz_topic, quiz_difficulty, quiz_explanation, score, total_questions, percentage, detailed_results_list):
     html_body = f"""
@@ -392,11 +561,7 @@ def send_quiz_email_st(to_email, quiz_main_data, score, total_questions, percent
     msg.attach(part2)
 
     try:
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        server.login(EMAIL_HOST_USER, EMAIL_HOST_PASSWORD)
-        server.sendmail(from_email, to_email, msg.as_string())
-        server.quit()
+        get_smtp_connection('smtp.gmail.com', 587, EMAIL_HOST_USER, EMAIL_HOST_PASSWORD).sendmail(from_email, to_email, msg.as_string())
         st.success(f"Quiz results successfully sent to {to_email}!")
         return True
     except Exception as e:
@@ -418,6 +583,7 @@ def main():
     if 'last_quiz_score' not in st.session_state: st.session_state.last_quiz_score = 0
     if 'last_quiz_total_questions' not in st.session_state: st.session_state.last_quiz_total_questions = 0
     if 'last_quiz_percentage' not in st.session_state: st.session_state.last_quiz_percentage = 0.0
+    if 'question_page' not in st.session_state: st.session_state.question_page = 0
 
 
     with st.sidebar:
@@ -437,15 +603,15 @@ def main():
             num_questions_per_type_st_dict = None
 
             if question_type_st == 'mixed':
-                st.markdown("<small>Specify number of questions for each type (total max 20):</small>", unsafe_allow_html=True)
-                num_mcq_st = st.number_input("Number of MCQs:", min_value=0, max_value=20, value=st.session_state.get('num_mcq_st_val', 2), key="num_mcq_st")
-                num_fill_st = st.number_input("Number of Fill-in-the-Blanks:", min_value=0, max_value=20, value=st.session_state.get('num_fill_st_val', 2), key="num_fill_st")
-                num_tf_st = st.number_input("Number of True/False:", min_value=0, max_value=20, value=st.session_state.get('num_tf_st_val',1), key="num_tf_st")
+                st.markdown(f"<small>Specify number of questions for each type (total max {LARGE_QUIZ_MAX_QUESTIONS}; more than {SINGLE_PROMPT_MAX_QUESTIONS} are generated in batches):</small>", unsafe_allow_html=True)
+                num_mcq_st = st.number_input("Number of MCQs:", min_value=0, max_value=LARGE_QUIZ_MAX_QUESTIONS, value=st.session_state.get('num_mcq_st_val', 2), key="num_mcq_st")
+                num_fill_st = st.number_input("Number of Fill-in-the-Blanks:", min_value=0, max_value=LARGE_QUIZ_MAX_QUESTIONS, value=st.session_state.get('num_fill_st_val', 2), key="num_fill_st")
+                num_tf_st = st.number_input("Number of True/False:", min_value=0, max_value=LARGE_QUIZ_MAX_QUESTIONS, value=st.session_state.get('num_tf_st_val',1), key="num_tf_st")
                 num_questions_per_type_st_dict = {'mcq': num_mcq_st, 'fill': num_fill_st, 'tf': num_tf_st}
                 num_questions_st = num_mcq_st + num_fill_st + num_tf_st
                 st.caption(f"Total questions for mixed: {num_questions_st}")
             else:
-                num_questions_st = st.number_input("Number of Questions:", min_value=1, max_value=20, value=st.session_state.get('num_questions_single_st_val', 5), key="num_questions_single_st")
+                num_questions_st = st.number_input("Number of Questions:", min_value=1, max_value=LARGE_QUIZ_MAX_QUESTIONS, value=st.session_state.get('num_questions_single_st_val', 5), key="num_questions_single_st")
 
             difficulty_st = st.select_slider("Select Difficulty:", options=['Easy', 'Medium', 'Hard'], value=st.session_state.get('difficulty_st_val','Medium'))
             generate_button_st = st.form_submit_button(label="🚀 Generate Quiz")
@@ -454,6 +620,7 @@ def main():
             st.session_state.quiz_data = None
             st.session_state.submitted_answers = {}
             st.session_state.show_results = False
+            st.session_state.question_page = 0
             st.session_state.current_topic = "" # Reset topic
             # Reset specific form field values if needed
             st.session_state.num_mcq_st_val = 2
@@ -468,6 +635,19 @@ def main():
             st.session_state.last_quiz_percentage = 0.0
             st.rerun()
 
+        # Generation results are cached for all sessions (generate_quiz_cached); this server process's numbers.
+        with st.expander("📊 Generation Cache"):
+            cache_stats = generation_stats().snapshot()
+            format_ms = lambda seconds: '-' if seconds is None else f"{seconds * 1000:,.0f} ms"
+            hit_col, requests_col = st.columns(2)
+            hit_col.metric("Hit rate", '-' if cache_stats['hit_rate'] is None else f"{cache_stats['hit_rate']:.0%}")
+            requests_col.metric("Requests", cache_stats['requests'])
+            p50_col, p90_col = st.columns(2)
+            p50_col.metric("Generation p50", format_ms(cache_stats['generation_p50_seconds']))
+            p90_col.metric("Generation p90", format_ms(cache_stats['generation_p90_seconds']))
+            st.caption(f"Last request: {format_ms(cache_stats['last_request_seconds'])}. Identical requests are served "
+                       f"from the cache for {GENERATION_CACHE_TTL_SECONDS // 60} minutes (at most {GENERATION_CACHE_MAX_ENTRIES} quizzes).")
+
 
     if generate_button_st:
         # Store current form values in session_state to repopulate after generation if needed
@@ -484,14 +664,14 @@ def main():
             st.error("Please enter a topic for the quiz.")
         elif question_type_st == 'mixed' and num_questions_st == 0:
             st.error("For 'Mixed' type, please specify at least one question for any category (total must be > 0).")
-        elif question_type_st == 'mixed' and num_questions_st > 20:
-            st.error(f"Total number of questions for 'Mixed' type ({num_questions_st}) cannot exceed 20.")
-        elif question_type_st != 'mixed' and not (1 <= num_questions_st <= 20) :
-             st.error("Number of questions must be between 1 and 20 for single type.")
+        elif question_type_st == 'mixed' and num_questions_st > LARGE_QUIZ_MAX_QUESTIONS:
+            st.error(f"Total number of questions for 'Mixed' type ({num_questions_st}) cannot exceed {LARGE_QUIZ_MAX_QUESTIONS}.")
+        elif question_type_st != 'mixed' and not (1 <= num_questions_st <= LARGE_QUIZ_MAX_QUESTIONS) :
+             st.error(f"Number of questions must be between 1 and {LARGE_QUIZ_MAX_QUESTIONS} for single type.")
         else:
             with st.spinner(f"Generating quiz on '{topic}'..."):
                 try:
-                    st.session_state.quiz_data = generate_quiz_content_st(
+                    st.session_state.quiz_data = generate_quiz_cached(
                         topic, 
                         question_type_st, 
                         difficulty_st, 
@@ -506,6 +686,7 @@ def main():
                     
                     st.session_state.submitted_answers = {} 
                     st.session_state.show_results = False 
+                    st.session_state.question_page = 0
                     st.success("Quiz generated!")
                     st.rerun() # Rerun to display the generated quiz
                 except Exception as e:
@@ -535,9 +716,16 @@ def main():
                      st.session_state.submitted_answers[question_key_st] = None
 
 
+            # Large quizzes are shown QUESTIONS_PER_PAGE at a time; answers on other pages stay in submitted_answers.
+            page_count = (len(quiz['questions']) + QUESTIONS_PER_PAGE - 1) // QUESTIONS_PER_PAGE
+            page = min(st.session_state.question_page, page_count - 1)
+            page_start = page * QUESTIONS_PER_PAGE
             with st.form(key="user_answers_form_st"):
-                for i, q in enumerate(quiz['questions']):
+                if page_count > 1:
+                    st.caption(f"Page {page + 1} of {page_count} (questions {page_start + 1}-{min(page_start + QUESTIONS_PER_PAGE, len(quiz['questions']))} of {len(quiz['questions'])})")
+                for i, q in enumerate(quiz['questions'][page_start:page_start + QUESTIONS_PER_PAGE], start=page_start):
                     question_key_st = f"q_st_{i}"
+                    previous_answer = st.session_state.submitted_answers.get(question_key_st)
                     q_type_display_item = q.get('type', 'N/A').upper()
                     st.markdown(f"**Question {i+1} ({q_type_display_item}):** {q['question_text']}")
 
@@ -545,25 +733,38 @@ def main():
                         options_st = q.get('options', [])
                         if options_st:
                             st.session_state.submitted_answers[question_key_st] = st.radio(
-                                "Your answer:", options_st, key=question_key_st, index=None, label_visibility="collapsed" 
+                                "Your answer:", options_st, key=question_key_st, label_visibility="collapsed",
+                                index=options_st.index(previous_answer) if previous_answer in options_st else None
                             )
                         else:
                             st.markdown("_MCQ options missing for this question._")
                     elif q['type'] == 'fill':
                         st.session_state.submitted_answers[question_key_st] = st.text_input(
-                            "Your answer:", key=question_key_st, label_visibility="collapsed"
+                            "Your answer:", key=question_key_st, label_visibility="collapsed", value=previous_answer or ""
                         )
                     elif q['type'] == 'tf':
                         st.session_state.submitted_answers[question_key_st] = st.radio(
-                            "Your answer:", ["True", "False"], key=question_key_st, index=None, label_visibility="collapsed"
+                            "Your answer:", ["True", "False"], key=question_key_st, label_visibility="collapsed",
+                            index=["True", "False"].index(previous_answer) if previous_answer in ("True", "False") else None
                         )
                     else:
                          st.markdown(f"_Unsupported question type: {q.get('type', 'Unknown')}_")
                          st.session_state.submitted_answers[question_key_st] = None
                     st.markdown("---")
 
+                previous_page_button_st = next_page_button_st = False
+                if page_count > 1:
+                    nav_prev_col, nav_next_col = st.columns(2)
+                    with nav_prev_col:
+                        previous_page_button_st = st.form_submit_button("⬅️ Previous Page", disabled=page == 0)
+                    with nav_next_col:
+                        next_page_button_st = st.form_submit_button("Next Page ➡️", disabled=page == page_count - 1)
                 submit_answers_button_st = st.form_submit_button("✅ Submit Answers")
 
+            if previous_page_button_st or next_page_button_st:
+                st.session_state.question_page = page + (1 if next_page_button_st else -1)
+                st.rerun()
+
             if submit_answers_button_st:
                 st.session_state.show_results = True
                 current_score = 0
@@ -0,0 +1,197 @@
+// Quizify service worker, served by quiz.offline.service_worker_view (see that module for the overview).
+const CONFIG = {{ config|safe }};
+{% verbatim %}
+const SHELL_CACHE = `quizify-shell-${CONFIG.version}`; // App shell and static assets
+const PAGES_CACHE = `quizify-pages-${CONFIG.version}`; // Pages and quiz JSON, refreshed on every successful fetch
+const QUEUE_DB = 'quizify-offline';
+const QUEUE_STORE = 'submissions';
+const cachedPage = new RegExp(CONFIG.cached_page_pattern);
+const cachedApi = new RegExp(CONFIG.cached_api_pattern);
+
+// With OFFLINE_ENABLED off the worker caches nothing and only deletes what earlier versions cached.
+self.addEventListener('install', event => {
+    if (!CONFIG.enabled) {
+        event.waitUntil(self.skipWaiting());
+        return;
+    }
+    event.waitUntil(caches.open(SHELL_CACHE).then(cache => {
+        // The CDN assets are best-effort: an unreachable CDN must not keep the worker from installing.
+        CONFIG.cdn_assets.forEach(url => cache.add(new Request(url, { mode: 'cors' })).catch(() => {}));
+        return cache.addAll(CONFIG.app_shell);
+    }).then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(caches.keys()
+        .then(names => Promise.all(names
+            .filter(name => name.startsWith('quizify-') && !(CONFIG.enabled && [SHELL_CACHE, PAGES_CACHE].includes(name)))
+            .map(name => caches.delete(name))))
+        .then(() => self.clients.claim())
+        .then(() => CONFIG.enabled && replayQueue().catch(() => {})));
+});
+
+if (CONFIG.enabled) {
+    self.addEventListener('fetch', event => {
+        const request = event.request;
+        const url = new URL(request.url);
+        if (url.origin !== self.location.origin) {
+            if (request.method === 'GET' && CONFIG.cdn_assets.includes(request.url)) event.respondWith(cacheFirst(request));
+            return;
+        }
+        if (request.method === 'POST' && url.pathname === CONFIG.check_url && request.headers.has('Idempotency-Key')) {
+            event.respondWith(submitOrQueue(request));
+        } else if (request.method !== 'GET') {
+            return;
+        } else if (url.pathname.startsWith(CONFIG.static_prefix)) {
+            event.respondWith(staleWhileRevalidate(request, event));
+        } else if ((request.mode === 'navigate' && cachedPage.test(url.pathname)) || cachedApi.test(url.pathname)) {
+            event.respondWith(networkFirst(request, event));
+        }
+    });
+
+    self.addEventListener('sync', event => {
+        if (event.tag === CONFIG.sync_tag) event.waitUntil(replayQueue());
+    });
+
+    self.addEventListener('message', event => {
+        const message = event.data || {};
+        if (message.type === 'replay') {
+            event.waitUntil(replayQueue().catch(() => {}));
+        } else if (message.type === 'cache-quiz') {
+            // The quiz being taken, so it can be reopened offline
+            event.waitUntil(caches.open(PAGES_CACHE).then(cache => Promise.all(message.urls
+                .filter(url => cachedPage.test(new URL(url, self.location.origin).pathname))
+                .map(url => fetch(url).then(response => cacheable(response) && cache.put(url, response)).catch(() => {})))));
+        }
+    });
+}
+
+
+// --- Caching strategies ---
+// Responses the server marked as not for storing (no-store, private) and downloads are never cached.
+function cacheable(response) {
+    return response.ok && !/no-store|private/i.test(response.headers.get('Cache-Control') || '') &&
+        !/attachment/i.test(response.headers.get('Content-Disposition') || '');
+}
+
+function cacheFirst(request) {
+    return caches.match(request).then(cached => cached || fetch(request).then(response => {
+        if (cacheable(response)) {
+            const copy = response.clone();
+            caches.open(SHELL_CACHE).then(cache => cache.put(request, copy));
+        }
+        return response;
+    }));
+}
+
+function staleWhileRevalidate(request, event) {
+    return caches.match(request).then(cached => {
+        const refresh = fetch(request).then(response => {
+            if (cacheable(response)) {
+                const copy = response.clone();
+                event.waitUntil(caches.open(SHELL_CACHE).then(cache => cache.put(request, copy)));
+            }
+            return response;
+        });
+        if (!cached) return refresh;
+        event.waitUntil(refresh.catch(() => {})); // Content-hashed assets never change; the others catch up next time
+        return cached;
+    });
+}
+
+// The network's answer when it comes within network_timeout_ms, else the cached copy (the network's answer still
+// refreshes the cache). Pages never cached before wait for the network, and get a short notice when it fails.
+function networkFirst(request, event) {
+    const network = fetch(request).then(response => {
+        if (cacheable(response)) {
+            const copy = response.clone();
+            event.waitUntil(caches.open(PAGES_CACHE).then(cache => cache.put(request, copy)));
+        }
+        return response;
+    });
+    event.waitUntil(network.catch(() => {}));
+    const fromCache = () => caches.match(request).then(cached => cached || caches.match(request, { ignoreSearch: true }));
+    const timeout = new Promise(resolve => setTimeout(resolve, CONFIG.network_timeout_ms));
+    return Promise.race([network, timeout.then(fromCache)])
+        .then(response => response || network)
+        .catch(() => fromCache())
+        .then(response => response || (request.mode === 'navigate' ? offlinePage() : Response.error()));
+}
+
+function offlinePage() {
+    return new Response('<!DOCTYPE html><meta charset="utf-8"><meta name="viewport" content="width=device-width, initial-scale=1">' +
+        '<title>Offline - Quizify</title><p style="font-family: sans-serif; margin: 2em">You are offline and this page ' +
+        'has not been opened on this device before. Reconnect and reload to continue.</p>',
+        { status: 503, headers: { 'Content-Type': 'text/html; charset=utf-8' } });
+}
+
+
+// --- Offline check/ submissions ---
+function openQueue() {
+    return new Promise((resolve, reject) => {
+        const open = indexedDB.open(QUEUE_DB, 1);
+        open.onupgradeneeded = () => open.result.createObjectStore(QUEUE_STORE, { keyPath: 'key' });
+        open.onsuccess = () => resolve(open.result);
+        open.onerror = () => reject(open.error);
+    });
+}
+
+function queueTransaction(mode, work) {
+    return openQueue().then(db => new Promise((resolve, reject) => {
+        const transaction = db.transaction(QUEUE_STORE, mode);
+        const request = work(transaction.objectStore(QUEUE_STORE));
+        transaction.oncomplete = () => { db.close(); resolve(request.result); };
+        transaction.onerror = () => { db.close(); reject(transaction.error); };
+    }));
+}
+
+// Sends a submission; without a connection it is queued and the page is told so with 202 {"queued": true}.
+function submitOrQueue(request) {
+    const stored = request.clone();
+    return fetch(request).catch(() => stored.text().then(body => {
+        const submission = {
+            key: stored.headers.get('Idempotency-Key'),
+            url: stored.url,
+            headers: [...stored.headers],
+            body,
+            queued_at: Date.now(),
+        };
+        return queueTransaction('readwrite', store => store.put(submission))
+            .then(() => self.registration.sync ? self.registration.sync.register(CONFIG.sync_tag).catch(() => {}) : null)
+            .then(() => new Response(JSON.stringify({ queued: true, idempotency_key: submission.key }),
+                { status: 202, headers: { 'Content-Type': 'application/json' } }));
+    }));
+}
+
+// Sends the queued submissions in order and tells the open pages how each went. Stops at the first network error
+// or server failure, leaving the rest queued (a rejected promise makes Background Sync try again later). Submissions
+// are queued without a usable CSRF token (tokens are never cached), so a fresh one is fetched first.
+function replayQueue() {
+    return queueTransaction('readonly', store => store.getAll()).then(submissions => {
+        if (submissions.length === 0) return null;
+        return fetch(CONFIG.csrf_url, { credentials: 'same-origin' }).then(response => response.json()).then(({ csrf_token }) => submissions
+            .sort((a, b) => a.queued_at - b.queued_at)
+            .reduce((previous, submission) => previous.then(() => replaySubmission(submission, csrf_token)), Promise.resolve()));
+    });
+}
+
+function replaySubmission(submission, csrfToken) {
+    const headers = new Headers(submission.headers);
+    headers.set('X-CSRFToken', csrfToken);
+    return fetch(submission.url, {
+        method: 'POST',
+        headers,
+        body: submission.body,
+        credentials: 'same-origin',
+    }).then(response => {
+        if (response.status >= 500 || response.status === 429) throw new Error(`HTTP ${response.status}`);
+        return response.json().catch(() => ({ error: `HTTP ${response.status}` }))
+            .then(data => queueTransaction('readwrite', store => store.delete(submission.key))
+                .then(() => notifyPages({ type: 'check-synced', key: submission.key, ok: response.ok, data })));
+    });
+}
+
+function notifyPages(message) {
+    return self.clients.matchAll({ type: 'window' }).then(pages => pages.forEach(page => page.postMessage(message)));
+}
+{% endverbatim %}